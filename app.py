@@ -4,15 +4,60 @@ import time
 import os
 import json
 import datetime
+import functools
+import hmac
+import logging
 from dotenv import load_dotenv
-from google import genai
-from PIL import Image
+from streamlit.errors import StreamlitAPIException
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from google.genai import types
+from fitchef.alimentos import base_desde_entorno
+from fitchef.almacen import EstadoUsuario, almacen_desde_entorno, nuevo_usuario, usuario_valido
+from fitchef.barras import indice_desde_entorno, interpretar_respuesta, leer_codigo
+from fitchef.biometria import SerieBiometrica
+from fitchef.cache_ia import CacheRespuestas, ClienteConCache, cache_desde_entorno
+from fitchef.casete import ClienteConCasete, casete_desde_entorno
+from fitchef.cliente import conexion_desde_entorno
+from fitchef.despensa import IndiceDespensa, fusionar
+from fitchef.dieta import DIAS_SEMANA, generar_plan_paralelo, ordenar_plan
+from fitchef.perfilado import perfil_desde_entorno
+from fitchef.parches import aplicar, fusionar_dia_entreno, fusionar_ejercicio, presupuesto_comida, tiene_registro
+from fitchef.raciones import ajustar_dia
+from fitchef.planificador import (IASaturada, PRIORIDAD_INTERACTIVA, PRIORIDAD_MASIVA,
+                                   ClientePlanificado, planificador_desde_entorno)
+from fitchef.registro_subidas import RegistroSubidas
+from fitchef.imagenes import anotar_llamada, preparar_imagen, resumen_metricas as resumen_imagenes
+from fitchef.ingesta import procesar_lote, separar_items
+from fitchef.telemetria import ClienteMedido, telemetria_desde_entorno
+from fitchef.trabajos import gestor_desde_entorno
+from fitchef.video import VIDEO_DISPONIBLE, ArchivosSubidos, CacheVideos, adjuntos_video, duracion_video
+from fitchef.esquemas import (FORMATO_COMIDA, FORMATO_DIA_ENTRENO, FORMATO_MICROCICLO, FORMATO_SESION,
+                              FORMATO_SUSTITUTO, formato_dia, formato_plan)
+from fitchef.json_ia import interpretar, resumen_metricas as resumen_json
+from fitchef.json_incremental import ParserJSONIncremental
+from fitchef.macros import AnaliticaPlan, huella_plan, objetivos_macros, reglas_dia
 
 # ==========================================
 # 1. CONFIGURACIÓN DEL SISTEMA Y UI
 # ==========================================
 load_dotenv()
+# Los módulos de fitchef/ dejan sus métricas (bytes ahorrados, latencias...) en este logger
+logging.basicConfig(format="%(asctime)s %(name)s %(levelname)s %(message)s")
+logging.getLogger("fitchef").setLevel(os.getenv("FITCHEF_LOG", "INFO"))
 st.set_page_config(page_title="FitChef AI Pro | Nivel God-Tier", layout="wide", page_icon="🚀")
+# Perfilado opcional del rerun (?perfil=1 o FITCHEF_PERFIL=1; ?perfil=cprofile para un volcado pstats)
+def cerrar_perfil_pendiente():
+    """Cierra el rerun perfilado que no llegó al final (lo cortó un st.rerun()/st.stop() o un rerun
+    solo de fragmentos): si no, con ?perfil=cprofile el perfilador seguiría activo en los parciales"""
+    pendiente = st.session_state.pop('_perfil_rerun', None)
+    if pendiente is not None:
+        pendiente.terminar(interrumpido=True)
+
+cerrar_perfil_pendiente()
+perfilador = perfil_desde_entorno(os.path.dirname(os.path.abspath(__file__)), st.query_params.get("perfil"))
+if perfilador.activo:
+    st.session_state._perfil_rerun = perfilador
+perfilador.abrir("Arranque")
 # --- PARCHE DE VISIBILIDAD (Añadir al principio del script) ---
 st.markdown("""
     <style>
@@ -32,16 +77,60 @@ st.markdown("""
 # ==========================================
 # 2. CONEXIÓN AL MOTOR IA (GEMINI 2.5 PRO)
 # ==========================================
-if "GEMINI_API_KEY" in st.secrets:
-    api_key = st.secrets["GEMINI_API_KEY"]
-else:
+try:
+    api_key = st.secrets["GEMINI_API_KEY"] if "GEMINI_API_KEY" in st.secrets else os.getenv("GEMINI_API_KEY")
+except FileNotFoundError: # Sin secrets.toml (p. ej. reproduciendo un casete sin red)
     api_key = os.getenv("GEMINI_API_KEY")
 
+MODELO_IA = 'gemini-2.5-pro' 
+
+@st.cache_resource
+def casete_ia():
+    """Casete para grabar/reproducir las llamadas a la IA (solo con FITCHEF_CASETE)"""
+    return casete_desde_entorno()
+
+@st.cache_resource
+def abrir_cache_ia():
+    """Una sola caché SQLite de respuestas para todo el proceso (la comparten todas las sesiones)"""
+    if casete_ia() is not None:
+        # Con casete, la caché del disco no puede tapar peticiones al grabar ni cambiar lo que se reproduce
+        return CacheRespuestas(":memory:")
+    return cache_desde_entorno(os.path.dirname(os.path.abspath(__file__)))
+
+@st.cache_resource
+def planificador_ia():
+    """Cola global de llamadas a la IA: ritmo, tope en vuelo y prioridades para TODAS las sesiones"""
+    return planificador_desde_entorno()
+
+@st.cache_resource
+def telemetria_ia():
+    """Registro de cada llamada a la IA (latencia, tokens, coste) de todo el proceso"""
+    return telemetria_desde_entorno(os.path.dirname(os.path.abspath(__file__)))
+
+# Al invalidarla (chequeo de salud fallido) no se cierra en el acto: otras sesiones pueden tener llamadas en vuelo
+@st.cache_resource(validate=lambda conexion: conexion.sana, on_release=lambda conexion: conexion.retirar())
+def conexion_gemini(api_key):
+    """Un único genai.Client con su pool HTTP (keep-alive) para todo el proceso, no uno por rerun"""
+    return conexion_desde_entorno(api_key, MODELO_IA)
+
+def cliente_base_ia():
+    """El genai.Client del proceso; con casete, envuelto en él (y sin API key, solo lo grabado)"""
+    casete = casete_ia()
+    try:
+        cliente = conexion_gemini(api_key).cliente
+    except Exception:
+        if casete is None or casete.modo == "grabar":
+            raise
+        cliente = None # Reproducir sin red: lo que no esté grabado es un error
+    return cliente if casete is None else ClienteConCasete(cliente, casete)
+
 try:
     # Usamos la API de pago para desatar todo el potencial
-    client = genai.Client(api_key=api_key)
+    # (envuelta en la caché: mismo prompt + mismos adjuntos = respuesta en milisegundos;
+    #  y lo que no está en caché hace cola en el planificador global; por fuera, la telemetría
+    #  mide lo que nota el usuario, con funcion="..." para saber de qué pantalla sale cada llamada)
+    client = ClienteMedido(ClienteConCache(ClientePlanificado(cliente_base_ia(), planificador_ia()), abrir_cache_ia()), telemetria_ia())
     IA_ACTIVA = True
-    MODELO_IA = 'gemini-2.5-pro' 
 except Exception as e:
     st.error("⚠️ Error crítico: API Key no detectada. La IA está apagada.")
     IA_ACTIVA = False
@@ -96,7 +185,7 @@ for key, default in {
 
 # C) El Analista Biométrico (DataFrames y Mapas Complejos)
 if 'historial_biometrico' not in st.session_state: 
-    st.session_state.historial_biometrico = pd.DataFrame(columns=["Fecha", "Peso (kg)"])
+    st.session_state.historial_biometrico = SerieBiometrica("Peso (kg)")
 
 # D) MAPA DE FATIGA MUSCULAR (La idea del siglo)
 # 100% = Totalmente recuperado | 0% = Frito/Destruido
@@ -118,6 +207,63 @@ if 'checkin_hoy' not in st.session_state:
 if 'historial_medico' not in st.session_state:
     st.session_state.historial_medico = {"analiticas": "Sin datos.", "lesiones": "Sin lesiones."}
 
+# F) PERSISTENCIA (lo de arriba son solo los valores por defecto; lo guardado manda)
+# Cada usuario se identifica por ?u=... en la URL: recargar o volver mañana con el mismo enlace recupera todo.
+# No hay contraseña: el enlace ES la llave (quien lo tenga lee y cambia esos datos). Sin ?u= se abre un
+# usuario nuevo y vacío; con FITCHEF_USUARIOS_NUEVOS=0 no se crean y solo entra quien ya tiene enlace.
+CLAVES_GLOBALES = ('perfil', 'racha_nutricion', 'racha_entreno', 'agua_bebida', 'meta_agua', 'modo_bestia',
+                   'checkin_hoy', 'historial_medico', 'mapa_muscular')
+CLAVES_PANTALLA = {
+    "👤 Perfil": ('gustos_positivos', 'gustos_negativos'),
+    "🥗 Nutrición Pro": ('despensa', 'plan_estructurado', 'lista_compra_sugerida'),
+    "🏋️‍♂️ Entrenador IA": ('rutina_estructurada', 'historial_cargas', 'maximos_rm'),
+    "🩸 Progreso": ('historial_biometrico',),
+}
+CLAVES_PERSISTENTES = CLAVES_GLOBALES + tuple(c for claves in CLAVES_PANTALLA.values() for c in claves)
+
+@st.cache_resource
+def almacen_usuarios():
+    """Backend de persistencia compartido por todas las sesiones (SQLite por defecto)"""
+    return almacen_desde_entorno(os.path.dirname(os.path.abspath(__file__)))
+
+def estado_usuario():
+    """Puente sesión ↔ almacén de este usuario (se crea una vez por sesión)"""
+    if '_estado_usuario' not in st.session_state:
+        usuario = st.query_params.get("u")
+        if not usuario_valido(usuario):
+            if os.getenv("FITCHEF_USUARIOS_NUEVOS", "1") == "0":
+                st.error("🔒 Aquí no se crean perfiles nuevos. Entra con tu enlace personal (…?u=...).")
+                st.stop()
+            usuario = nuevo_usuario()
+            st.query_params["u"] = usuario
+            st.session_state._usuario_nuevo = True # Se avisa en la Bóveda de que guarde el enlace
+            st.toast("Perfil nuevo: guarda el enlace de esta página para volver a tus datos.", icon="🔑")
+        st.session_state._estado_usuario = EstadoUsuario(almacen_usuarios(), usuario)
+    return st.session_state._estado_usuario
+
+def hidratar(*claves):
+    """Carga (solo la primera vez en la sesión) las claves que va a usar una pantalla"""
+    estado_usuario().hidratar(st.session_state, claves)
+
+def persistir(pantalla=None):
+    """Guarda solo las claves que han cambiado desde la última vez. Por dentro solo han podido cambiar
+    las globales y las de la pantalla en pie; del resto basta con ver si se les asignó otro objeto"""
+    if pantalla is None:
+        pantalla = st.session_state.get("nav_principal")
+    estado_usuario().sincronizar(st.session_state, CLAVES_GLOBALES + CLAVES_PANTALLA.get(pantalla, ()))
+
+def rerun_parcial():
+    """¿Este rerun es solo de fragmentos (no pasa por el principio ni por el final del script)?"""
+    ctx = get_script_run_ctx()
+    return bool(ctx and ctx.fragment_ids_this_run)
+
+hidratar(*CLAVES_GLOBALES)
+# Se guarda una vez por rerun, al final. Si el anterior lo cortó un st.rerun() antes de llegar, aquí
+# (con la pantalla en la que estaba, que se apunta en '_rerun_a_medias' mientras dura el rerun)
+if st.session_state.get('_rerun_a_medias') is not None:
+    persistir(st.session_state._rerun_a_medias)
+st.session_state._rerun_a_medias = "" # Aún sin pantalla: solo las globales
+
 # ==========================================
 # 4. FUNCIONES DEL SISTEMA (Motor Interno)
 # ==========================================
@@ -126,6 +272,24 @@ def cambiar_pestana(nombre):
     st.session_state.menu_val = nombre
     st.rerun()
 
+def restaurar_boveda(datos_cargados):
+    """Mete un backup de la Bóveda en la sesión; el guardado incremental lo lleva al almacén"""
+    hidratar(*CLAVES_PERSISTENTES) # Para que ninguna pantalla sin visitar lo pise luego con lo antiguo
+    p_cargado = datos_cargados.get('perfil')
+    if isinstance(p_cargado, dict):
+        # Re-convertir texto "07:00" a objeto tiempo real
+        for k in ['hora_despertar', 'hora_dormir']:
+            if k in p_cargado and isinstance(p_cargado[k], str):
+                h, m = map(int, p_cargado[k].split(':')[:2])
+                p_cargado[k] = datetime.time(h, m)
+    if isinstance(datos_cargados.get('historial_biometrico'), list):
+        datos_cargados['historial_biometrico'] = SerieBiometrica.desde(datos_cargados['historial_biometrico'])
+    for clave in CLAVES_PERSISTENTES:
+        if clave in datos_cargados:
+            st.session_state[clave] = datos_cargados[clave]
+    persistir()
+    return True
+
 def generar_ics(plan_json):
     """Convierte el JSON de la dieta en un archivo de Calendario (Apple/Google)"""
     lineas = ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//FitChef AI//ES"]
@@ -150,12 +314,695 @@ def generar_ics(plan_json):
             hora_comida += 3 # Espaciamos 3 horas por comida
     lineas.append("END:VCALENDAR")
     return "\n".join(lineas)
+
+def prompt_dieta(p, dia=None):
+    """Prompt del Chef: la semana entera o, si se pasa 'dia', solo ese día (para el modo paralelo)"""
+    if dia:
+        encargo = f"Genera SOLO el menú del {dia} (es un día de una dieta semanal de Lunes a Domingo; dale variedad propia de ese día)."
+        estructura = """[
+                    {
+                      "tipo": "Desayuno",
+                      "plato": "Nombre del plato",
+                      "ingredientes": ["150 g de ingrediente 1", "2 ingrediente 2"],
+                      "instrucciones": "Paso a paso breve",
+                      "nota_ciencia": "Bio-hack de este plato y cómo ayuda a tu Historial Médico",
+                      "kcal": 400,
+                      "prot": 30,
+                      "cho": 40,
+                      "fat": 15
+                    }
+                ]"""
+    else:
+        encargo = "Genera una dieta semanal de Lunes a Domingo."
+        estructura = """{
+                  "Lunes": [
+                    {
+                      "tipo": "Desayuno",
+                      "plato": "Nombre del plato",
+                      "ingredientes": ["150 g de ingrediente 1", "2 ingrediente 2"],
+                      "instrucciones": "Paso a paso breve",
+                      "nota_ciencia": "Bio-hack de este plato y cómo ayuda a tu Historial Médico",
+                      "kcal": 400,
+                      "prot": 30,
+                      "cho": 40,
+                      "fat": 15
+                    }
+                  ],
+                  "Martes": [ ... ]
+                }"""
+    return f"""
+                Eres un Chef Michelin y Nutricionista Clínico. {encargo}
+                
+                🩺 [HISTORIAL MÉDICO Y ANALÍTICAS]: {st.session_state.historial_medico.get('analiticas', 'Sin datos')}
+                
+                REGLAS: 
+                1. Grasas min 1g/kg. Post-entreno ({p.get('horario_entreno', 'Tarde')}) alto en CH. 
+                2. Fase Hormonal: {p.get('perfil_hormonal', 'Ninguno')}. 
+                3. Usa esta despensa si es posible: {st.session_state.despensa}.
+                4. OBLIGATORIO: Adapta los ingredientes y macros para corregir los problemas del [HISTORIAL MÉDICO] (ej: si falta hierro pon alimentos ricos en él + Vitamina C, si el azúcar es alto baja el índice glucémico).
+                🩺 [FASE DEL MESOCICLO]: Semana {p.get('semana_mesociclo', 1)} de 4. 
+                - Si es Semana 4 (Descarga/Deload): Aumenta ligeramente los carbohidratos (Refeed/Diet Break) para dar un respiro a la adaptación metabólica.
+                
+                DEVUELVE ÚNICA Y EXCLUSIVAMENTE UN JSON VÁLIDO. NI UNA SOLA PALABRA MÁS. SIN SALUDOS.
+                Estructura EXACTA obligatoria:
+                {estructura}
+                """
+
+def config_json(formato):
+    """Salida estructurada: la IA devuelve JSON puro que cumple el esquema del formato"""
+    return types.GenerateContentConfig(response_mime_type="application/json", response_json_schema=formato.esquema)
+
+def generar_json(prompt, formato, prioridad=PRIORIDAD_MASIVA, fresca=False):
+    """Llamada con esquema + validación en registros tipados (con reparación local si hace falta).
+    fresca=True se salta la caché: para "dame otro" el mismo prompt tiene que dar algo distinto."""
+    config = config_json(formato)
+    if fresca:
+        client.models.olvidar(model=MODELO_IA, contents=prompt, config=config)
+    res = client.models.generate_content(model=MODELO_IA, contents=prompt, config=config, prioridad=prioridad, funcion=formato.nombre)
+    try:
+        return interpretar(res.text, formato)
+    except ValueError:
+        client.telemetria.marcar_ultimo("json_invalido")
+        client.models.olvidar(model=MODELO_IA, contents=prompt, config=config) # Que el reintento sea una llamada de verdad
+        raise
+
+def generar_en_directo(prompt, pintar, prioridad=PRIORIDAD_MASIVA, config=None, funcion="general"):
+    """Streaming: llama a pintar(ruta, objeto) con cada objeto JSON según se cierra y devuelve el texto completo"""
+    parser = ParserJSONIncremental()
+    trozos = []
+    for trozo in client.models.generate_content_stream(model=MODELO_IA, contents=prompt, config=config, prioridad=prioridad, funcion=funcion):
+        texto = trozo.text or ""
+        trozos.append(texto)
+        for ruta, valor in parser.alimentar(texto):
+            if isinstance(valor, dict):
+                pintar(ruta, valor)
+    return "".join(trozos)
+
+def indice_despensa():
+    """Índice de la despensa para esta sesión: solo se reconstruye cuando la despensa cambia"""
+    items = tuple(st.session_state.despensa)
+    indice = st.session_state.get('_indice_despensa')
+    if indice is None or indice.items != items:
+        indice = IndiceDespensa(items)
+        st.session_state._indice_despensa = indice
+    return indice
+
+def ingerir_fotos(funcion, prompt, subidas, titulo):
+    """Varias fotos de una vez: las ya vistas salen del registro, las nuevas van a la IA en paralelo
+    (con tope de hilos) y todo entra en la despensa en una sola actualización sin duplicados.
+
+    Si entra algo nuevo se hace UN rerun al final (no uno por foto) y el resumen se enseña después.
+    """
+    registro = registro_subidas()
+    items, pendientes = [], []
+    for subida in subidas:
+        ya_hecha, resultado = registro.buscar(funcion, subida)
+        if ya_hecha:
+            items.extend(resultado)
+        else:
+            pendientes.append(subida)
+    errores = {}
+    if pendientes:
+        with st.status(f"{titulo} ({len(pendientes)} fotos)...", expanded=True) as estado:
+            barra = st.progress(0.0)
+            hechas = []
+            def al_terminar(i, resultado, error):
+                hechas.append(i)
+                nombre = getattr(pendientes[i], "name", f"foto {i + 1}")
+                if error is None:
+                    registro.anotar(funcion, pendientes[i], resultado)
+                    st.write(f"✅ {nombre}: {len(resultado)} alimentos")
+                else:
+                    st.write(f"❌ {nombre}: {error}")
+                barra.progress(len(hechas) / len(pendientes), text=f"{len(hechas)}/{len(pendientes)}")
+            resultados, errores = procesar_lote(
+                pendientes, lambda subida: separar_items(analizar_imagen(funcion, prompt, subida)),
+                max_hilos=int(os.getenv("FITCHEF_HILOS_FOTOS", "4")), al_terminar=al_terminar)
+            for i in sorted(resultados):
+                items.extend(resultados[i])
+            estado.update(label=f"{titulo}: {len(resultados)}/{len(pendientes)} fotos leídas",
+                          state="error" if errores else "complete", expanded=bool(errores))
+    st.session_state.despensa, anadidos = fusionar(st.session_state.despensa, items)
+    if anadidos:
+        st.session_state._aviso_ingesta = f"Añadidos a la despensa: {', '.join(anadidos)}"
+        if not errores:
+            st.rerun()
+    elif subidas and not pendientes:
+        st.caption(f"✔️ {'Esta foto ya está procesada' if len(subidas) == 1 else f'Las {len(subidas)} fotos ya están procesadas'}.")
+
+@st.cache_resource
+def indice_productos():
+    """Índice código EAN → producto en disco (mapeado en memoria), compartido por todo el proceso"""
+    return indice_desde_entorno(os.path.dirname(os.path.abspath(__file__)))
+
+def identificar_producto(subida):
+    """Foto de un código de barras → (nombre, código, origen). Primero lector local + índice;
+    la IA solo si no se lee el código o aún no se conoce, y lo que diga se guarda en el índice"""
+    codigo = leer_codigo(subida.getvalue())
+    indice = indice_productos()
+    if codigo:
+        nombre = indice.buscar(codigo)
+        if nombre:
+            return nombre, codigo, "índice local"
+    if not IA_ACTIVA:
+        return None, codigo, "sin IA"
+    pista = f"El código de barras es {codigo}. " if codigo else ""
+    texto = analizar_imagen("barras", f"{pista}¿Qué alimento es este código de barras o envase? Responde en una sola línea: "
+                                      "<los 13 dígitos del código, o 'sin código' si no se leen> | <nombre genérico del alimento en español>", subida)
+    codigo_ia, nombre = interpretar_respuesta(texto)
+    codigo = codigo or codigo_ia
+    if codigo and nombre:
+        indice.guardar(codigo, nombre)
+    return nombre, codigo, "IA"
+
+@st.cache_resource
+def base_alimentos():
+    """Tabla de composición de alimentos (local, sin IA) compartida por todo el proceso"""
+    return base_desde_entorno(os.path.dirname(os.path.abspath(__file__)))
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def _analitica_por_huella(huella, objetivos, _plan):
+    return AnaliticaPlan(_plan, dict(objetivos))
+
+def analitica_plan():
+    """Macros del plan de esta sesión: solo se recalculan si cambia el plan (por huella) o los objetivos"""
+    plan = st.session_state.plan_estructurado
+    objetivos = objetivos_macros(st.session_state.perfil)
+    previa = st.session_state.get('_analitica_plan')
+    if previa is None or previa[0] is not plan or previa[1] != objetivos:
+        # El plan nunca se modifica en sitio (se sustituye entero), así que si es el mismo objeto ni se hashea
+        analitica = _analitica_por_huella(huella_plan(plan), tuple(sorted(objetivos.items())), plan)
+        previa = (plan, objetivos, analitica)
+        st.session_state._analitica_plan = previa
+    return previa[2]
+
+def registro_subidas():
+    """Libro de fotos/audios ya procesados en esta sesión (para no repagar la IA en cada rerun)"""
+    if '_registro_subidas' not in st.session_state:
+        st.session_state._registro_subidas = RegistroSubidas()
+    return st.session_state._registro_subidas
+
+def analizar_imagen(funcion, prompt, subida):
+    """Prepara la foto según la función (tamaño, formato, sin EXIF), llama a la IA y apunta bytes y latencia"""
+    datos, mime = preparar_imagen(subida, funcion)
+    t0 = time.perf_counter()
+    res = client.models.generate_content(model=MODELO_IA, contents=[prompt, types.Part.from_bytes(data=datos, mime_type=mime)], prioridad=PRIORIDAD_INTERACTIVA, funcion=funcion)
+    anotar_llamada(funcion, time.perf_counter() - t0, len(datos))
+    return res.text
+
+@st.cache_resource
+def cache_videos():
+    """Vídeos ya troceados en fotogramas, compartidos por todo el proceso (clave: sha256 + parámetros)"""
+    return CacheVideos()
+
+@st.cache_data(max_entries=16)
+def duracion_video_cacheada(datos):
+    return duracion_video(datos)
+
+@st.cache_resource
+def archivos_subidos():
+    """URIs de client.files por contenido: los fotogramas de un vídeo se suben una vez para todas sus preguntas"""
+    return ArchivosSubidos()
+
+def partes_video(datos, mime, fps=2.0, ventana=None):
+    """Lo que se manda a la IA: fotogramas clave de la serie (con OpenCV) o, si no, el vídeo entero.
+    Van por referencia a client.files; si la subida falla, en línea como antes"""
+    adjuntos = adjuntos_video(cache_videos(), datos, mime, fps=fps, ventana=ventana)
+    try:
+        archivos, partes = client.files, []
+        for a in adjuntos:
+            if isinstance(a, str):
+                partes.append(a)
+            else:
+                uri, tipo = archivos_subidos().referencia(archivos, *a)
+                partes.append(types.Part.from_uri(file_uri=uri, mime_type=tipo))
+        return partes
+    except Exception as e:
+        logging.getLogger("fitchef.video").warning("No se pudieron subir los fotogramas, van en línea: %s", e)
+        return [a if isinstance(a, str) else types.Part.from_bytes(data=a[0], mime_type=a[1]) for a in adjuntos]
+
+# --- EDICIÓN PARCIAL (una comida, un día o un ejercicio; el resto del plan no se toca) ---
+def prompt_comida(p, dia, comidas, i):
+    """Otra comida para el hueco i del día, con el presupuesto de macros que deja libre"""
+    hueco, total = presupuesto_comida(comidas, i)
+    otras = [f"{c['tipo']}: {c['plato']}" for j, c in enumerate(comidas) if j != i]
+    return f"""
+                Eres un Chef Michelin y Nutricionista Clínico. Cambia SOLO el {comidas[i]['tipo']} del {dia} ("{comidas[i]['plato']}") por un plato distinto.
+                El resto del día no cambia: {otras}. Total del día ahora: {total['kcal']} kcal.
+                Para que el día siga cuadrando, el plato nuevo debe aportar aprox. {hueco['kcal']} kcal, {hueco['prot']}g de proteína, {hueco['cho']}g de hidratos y {hueco['fat']}g de grasa.
+                🩺 [HISTORIAL MÉDICO Y ANALÍTICAS]: {st.session_state.historial_medico.get('analiticas', 'Sin datos')}
+                Dieta: {p.get('dieta_base', 'Omnívora')}. Evita: {p.get('restricciones') or 'nada'}. Usa esta despensa si es posible: {st.session_state.despensa}.
+                Devuelve la comida con tipo, plato, ingredientes, instrucciones, nota_ciencia, kcal, prot, cho y fat.
+                """
+
+def prompt_ejercicio(p, dia, ejercicios, i):
+    otros = [e['nombre'] for j, e in enumerate(ejercicios) if j != i]
+    return f"""
+                Dame 1 sustituto para {ejercicios[i]['nombre']} en la sesión "{dia}" (mismo patrón de movimiento y grupo muscular).
+                No repitas ninguno de los que ya hay: {otros}. Material: {p['lugar_entreno']}.
+                🚨 [LESIONES]: {st.session_state.historial_medico.get('lesiones', 'Sin lesiones')}
+                Incluye calentamiento, series, reps, rir, tut, descanso y video (URL de Youtube).
+                """
+
+def prompt_dia_entreno(p, dia, ejercicios):
+    fijos = [e['nombre'] for e in ejercicios if tiene_registro(e)]
+    return f"""
+                Rehaz la sesión "{dia}" de un microciclo para {p['objetivo']} con {len(ejercicios)} ejercicios. Material: {p['lugar_entreno']}.
+                Sesión actual: {[e['nombre'] for e in ejercicios]}. Propón ejercicios distintos trabajando lo mismo.
+                {f"Estos ya están a medias y se quedan en su sitio, no los repitas: {fijos}." if fijos else ""}
+                🚨 [LESIONES]: {st.session_state.historial_medico.get('lesiones', 'Sin lesiones')}
+                Semana {p.get('semana_mesociclo', 1)} de 4 del mesociclo. Incluye SIEMPRE "calentamiento" y un "video" de Youtube.
+                """
+
+def regenerar_comida(dia, i):
+    """Parche de una comida: se pide solo esa y se encaja en su hueco"""
+    plan = st.session_state.plan_estructurado
+    nueva = generar_json(prompt_comida(st.session_state.perfil, dia, plan[dia], i), FORMATO_COMIDA, PRIORIDAD_INTERACTIVA, fresca=True)
+    st.session_state.plan_estructurado = aplicar(plan, (dia, i), nueva)
+
+def regenerar_dia_plan(dia):
+    plan = st.session_state.plan_estructurado
+    comidas = generar_json(prompt_dieta(st.session_state.perfil, dia), formato_dia(), PRIORIDAD_INTERACTIVA, fresca=True)
+    st.session_state.plan_estructurado = aplicar(plan, (dia,), comidas)
+
+def regenerar_ejercicio(dia, i):
+    """Parche de un hueco del microciclo: cambia el ejercicio (sus series registradas solo se quedan si es el mismo)"""
+    rutina = st.session_state.rutina_estructurada
+    viejo = rutina["dias"][dia][i]
+    nuevo = generar_json(prompt_ejercicio(st.session_state.perfil, dia, rutina["dias"][dia], i), FORMATO_SUSTITUTO, PRIORIDAD_INTERACTIVA, fresca=True)
+    st.session_state.rutina_estructurada = aplicar(rutina, ("dias", dia, i), fusionar_ejercicio(viejo, nuevo))
+
+def regenerar_dia_entreno(dia):
+    rutina = st.session_state.rutina_estructurada
+    viejos = rutina["dias"][dia]
+    nuevos = generar_json(prompt_dia_entreno(st.session_state.perfil, dia, viejos), FORMATO_DIA_ENTRENO, PRIORIDAD_INTERACTIVA, fresca=True)
+    st.session_state.rutina_estructurada = aplicar(rutina, ("dias", dia), fusionar_dia_entreno(viejos, nuevos))
+
+def editar_plan(editar, *args):
+    """Lanza una edición parcial con spinner. Si falla, se avisa y el plan queda como estaba"""
+    try:
+        with st.spinner("✏️ Rehaciendo solo esa parte..."):
+            editar(*args)
+        return True
+    except IASaturada as e:
+        st.warning(f"⏳ {e}")
+    except ValueError as e:
+        st.error(f"La IA no ha dado una versión válida ({e}). Prueba otra vez.")
+    return False
+
+# --- TRABAJOS EN SEGUNDO PLANO (generaciones largas) ---
+# Estas funciones corren en hilos del GestorTrabajos: NO pueden tocar st.* ni st.session_state.
+def trabajo_plan_paralelo(trabajo, prompts_dia, max_hilos):
+    """Plan semanal en 7 llamadas a la vez; solo se repiten los días que salgan mal"""
+    formato = formato_dia()
+    def generar_dia(dia):
+        return generar_json(prompts_dia[dia], formato)
+
+    def al_terminar(dia, comidas, error):
+        if comidas is not None:
+            trabajo.entregar(dia, comidas) # El vigilante lo emplata sin esperar al resto de la semana
+        trabajo.avisar(f"🍳 {dia} listo ({len(comidas)} comidas)" if comidas is not None else f"🔥 {dia} se ha quemado, repitiendo...")
+
+    return generar_plan_paralelo(generar_dia, dias=list(prompts_dia), max_hilos=max_hilos, al_terminar=al_terminar)
+
+def trabajo_plan_completo(trabajo, prompt):
+    """Plan semanal en una sola llamada en streaming (cada comida cerrada sale como progreso)"""
+    return trabajo_en_directo(trabajo, prompt, describir_comida, formato_plan(DIAS_SEMANA)), {}
+
+def trabajo_en_directo(trabajo, prompt, describir, formato):
+    """Streaming en segundo plano: cada objeto JSON que se cierra se convierte en una línea de progreso"""
+    def pintar(ruta, objeto):
+        linea = describir(ruta, objeto)
+        if linea: trabajo.avisar(linea)
+    config = config_json(formato)
+    texto = generar_en_directo(prompt, pintar, config=config, funcion=formato.nombre)
+    try:
+        return interpretar(texto, formato)
+    except ValueError:
+        client.telemetria.marcar_ultimo("json_invalido")
+        client.models.olvidar(model=MODELO_IA, contents=prompt, config=config) # Que el reintento no devuelva el mismo JSON roto
+        raise
+
+def trabajo_texto(trabajo, contents, prioridad=PRIORIDAD_MASIVA):
+    return client.models.generate_content(model=MODELO_IA, contents=contents, prioridad=prioridad, funcion=trabajo.tipo).text
+
+def trabajo_video(trabajo, prompt_video, datos, mime, fps, ventana):
+    trabajo.avisar("✂️ Recortando la serie y sacando fotogramas...")
+    partes = partes_video(datos, mime, fps, ventana)
+    trabajo.avisar(f"🧠 Analizando {sum(1 for x in partes if not isinstance(x, str))} fotogramas...")
+    return client.models.generate_content(model=MODELO_IA, contents=[prompt_video, *partes], prioridad=PRIORIDAD_MASIVA, funcion=trabajo.tipo).text
+
+def describir_comida(ruta, c):
+    if len(ruta) == 2 and "plato" in c:
+        return f"🍽️ {ruta[0]} · {c.get('tipo', '')}: {c['plato']} ({c.get('kcal', '?')} kcal)"
+
+def describir_ejercicio_microciclo(ruta, ej):
+    if len(ruta) == 3 and ruta[0] == "dias" and "nombre" in ej:
+        return f"🏋️ {ruta[1]} · {ej['nombre']} — {ej.get('series', '?')}x{ej.get('reps', '?')}"
+
+@st.cache_resource
+def gestor_trabajos():
+    """Pool de hilos + registro de trabajos, compartido por todo el proceso"""
+    return gestor_desde_entorno()
+
+def id_usuario():
+    """Id persistido del usuario (?u=...): sus trabajos sobreviven a reruns, pestañas y a recargar el navegador"""
+    return estado_usuario().usuario
+
+def lanzar_trabajo(tipo, etiqueta, funcion, *args):
+    """Manda un trabajo al fondo. Si ya hay uno igual en marcha no se duplica (ni se paga dos veces)"""
+    st.session_state.pop(f"aviso_{tipo}", None)
+    _, es_nuevo = gestor_trabajos().enviar(id_usuario(), tipo, funcion, *args, etiqueta=etiqueta)
+    if not es_nuevo:
+        st.toast("⏳ Ya estaba en marcha, no lo lanzo dos veces.")
+
+def mostrar_trabajo(tipo, texto_en_curso):
+    """En la pantalla: si el trabajo sigue en marcha lo dice; si terminó, enseña el aviso que dejó"""
+    trabajo = gestor_trabajos().obtener(id_usuario(), tipo) if IA_ACTIVA else None
+    if trabajo is not None and trabajo.activo:
+        st.info(texto_en_curso)
+    aviso = st.session_state.pop(f"aviso_{tipo}", None)
+    if aviso:
+        getattr(st, aviso[0])(aviso[1])
+
+def recoger_trabajo(trabajo):
+    """Vuelca en la sesión el resultado de un trabajo terminado (se llama desde el vigilante)"""
+    if trabajo.estado == "error":
+        e = trabajo.error
+        st.session_state[f"aviso_{trabajo.tipo}"] = ("warning", f"⏳ {e}") if isinstance(e, IASaturada) else \
+            ("error", f"Error de la IA en '{trabajo.etiqueta}'. Detalle técnico: {e}. 💡 Dale al botón de nuevo.")
+        return
+    if trabajo.tipo == "plan_semanal":
+        plan_nuevo, fallidos = trabajo.resultado
+        hidratar('plan_estructurado') # Puede terminar estando en otra pantalla
+        if plan_nuevo:
+            # Fusionamos: los días que fallen conservan lo que hubiera del plan anterior
+            st.session_state.plan_estructurado = ordenar_plan({**(st.session_state.plan_estructurado or {}), **plan_nuevo})
+        if fallidos:
+            st.session_state.aviso_plan_semanal = ("error", f"Estos días no han salido ni reintentando: {', '.join(fallidos)}. Detalle técnico: {next(iter(fallidos.values()))}. 💡 Dale al botón de nuevo.")
+        else:
+            st.session_state.aviso_plan_semanal = ("success", f"¡Dieta lista y emplatada en {trabajo.segundos:.0f}s!")
+    elif trabajo.tipo == "microciclo":
+        hidratar('rutina_estructurada')
+        st.session_state.rutina_estructurada = trabajo.resultado
+        st.session_state.aviso_microciclo = ("success", "¡Microciclo generado con fases de calentamiento!")
+    elif trabajo.tipo == "analisis_sesion":
+        st.session_state.analisis_sesion = trabajo.resultado
+    elif trabajo.tipo == "analisis_video":
+        st.session_state.analisis_video = trabajo.resultado
+
+def recoger_parciales(trabajo):
+    """Vuelca en la sesión los días del plan paralelo que ya han salido. Devuelve si había alguno nuevo"""
+    vistos = st.session_state.setdefault(f"_parciales_{trabajo.id}", set())
+    nuevos = {dia: comidas for dia, comidas in list(trabajo.parciales.items()) if dia not in vistos}
+    if not nuevos:
+        return False
+    vistos.update(nuevos)
+    hidratar('plan_estructurado')
+    st.session_state.plan_estructurado = ordenar_plan({**(st.session_state.plan_estructurado or {}), **nuevos})
+    return True
+
+@st.fragment(run_every=1.5)
+def vigilar_trabajos():
+    """Sondea los trabajos de este usuario: pinta su progreso y recoge los que terminen (sin rerun completo)"""
+    if rerun_parcial():
+        cerrar_perfil_pendiente()
+    terminados = False
+    for trabajo in gestor_trabajos().de_usuario(id_usuario()):
+        if trabajo.activo:
+            if trabajo.tipo == "plan_semanal" and recoger_parciales(trabajo):
+                terminados = True # Un día más en la mesa: se pinta ya, no cuando acabe la semana
+            with st.status(f"⏳ {trabajo.etiqueta} ({trabajo.segundos:.0f}s)", expanded=True):
+                for linea in trabajo.progreso[-6:]:
+                    st.caption(linea)
+        else:
+            recogido = gestor_trabajos().recoger(id_usuario(), trabajo.tipo)
+            if recogido is not None:
+                recoger_trabajo(recogido)
+                terminados = True
+    if terminados:
+        st.rerun() # Ahora sí, rerun completo para pintar el resultado (o los días ya listos) en su pantalla
+
+# --- ZONAS DE INTERACCIÓN RÁPIDA ---
+# Cada una es un fragmento: un clic dentro solo re-ejecuta esa zona, no las ~1400 líneas de la app.
+# Lo que se pinta fuera (rachas de la barra lateral, mapa SNC, aviso de faltantes) se pone al día en
+# el siguiente rerun completo; mientras, la propia zona enseña el dato que acaba de cambiar.
+log_ui = logging.getLogger("fitchef.ui")
+
+def zona_rapida(funcion):
+    """@st.fragment que además anota en el log lo que tarda cada rerun parcial"""
+    @functools.wraps(funcion)
+    def medida(*args, **kwargs):
+        if rerun_parcial():
+            cerrar_perfil_pendiente()
+        t0 = time.perf_counter()
+        try:
+            return funcion(*args, **kwargs)
+        finally:
+            if rerun_parcial():
+                persistir() # Un rerun parcial no llega al final del script: guardamos aquí lo que haya cambiado
+            log_ui.debug("fragmento %s: %.1f ms", funcion.__name__, (time.perf_counter() - t0) * 1000)
+    return st.fragment(medida)
+
+def repintar_zona():
+    """Rerun solo del fragmento; si el clic llegó en un rerun completo (p. ej. en tests), rerun completo"""
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
+@zona_rapida
+def panel_hidratacion():
+    col_w1, col_w2 = st.columns([2, 1])
+    with col_w2: # El botón va antes que la métrica para que esta ya salga con el vaso sumado
+        if st.button("🥤 +0.25L", use_container_width=True):
+            st.session_state.agua_bebida += 0.25
+    with col_w1: st.metric(label=f"Meta: {st.session_state.meta_agua}L", value=f"{st.session_state.agua_bebida:.2f} L")
+
+    if st.session_state.agua_bebida >= st.session_state.meta_agua:
+        st.success("¡Meta de hidratación alcanzada! 🌊")
+
+def faltantes_dia(dia_sel):
+    """Ingredientes del plan de ese día que no están en la despensa"""
+    return indice_despensa().faltantes([i.lower() for c in st.session_state.plan_estructurado.get(dia_sel, [])
+                                        for i in c.get('ingredientes', [])])
+
+@zona_rapida
+def tarjeta_comida(dia_sel, i):
+    """Una comida del plan con sus ingredientes, 'Hecho' y la auditoría rebelde"""
+    c = st.session_state.plan_estructurado[dia_sel][i]
+    indice = indice_despensa()
+    with st.expander(f"🍽️ {c['tipo']}: {c['plato']} ({c.get('kcal', 0)} kcal)", expanded=True):
+        st.info(f"🧬 **Bio-Hack:** {c.get('nota_ciencia', 'Optimización metabólica activa.')}")
+
+        col1, col2 = st.columns(2)
+        with col1:
+            st.write("**🛒 Ingredientes:**")
+            for ing in c.get('ingredientes', []): # <--- Corregido de 'ingredients' a 'ingredientes'
+                tienes = indice.tiene(ing.lower())
+                st.write(f"{'✅' if tienes else '❌'} {ing}")
+        with col2:
+            st.write("**👨‍🍳 Instrucciones:**")
+            st.write(c.get('instrucciones', 'Cocinar a fuego lento y disfrutar.')) # <--- Corregido de 'instructions'
+
+        # Contraste en local: macros de los ingredientes según la tabla de alimentos (sin llamar a la IA)
+        contraste = base_alimentos().contrastar(c)
+        if contraste['lineas']:
+            local = contraste['total']
+            aviso = ""
+            if contraste['desvio_kcal_pct'] is not None and abs(contraste['desvio_kcal_pct']) > 25 and contraste['cobertura'] >= 0.7:
+                aviso = f" · ⚠️ la IA dice {c.get('kcal', 0)} kcal ({contraste['desvio_kcal_pct']:+.0f}%)"
+            st.caption(f"🧮 Cálculo local: {local['kcal']} kcal · {local['prot']}P / {local['cho']}C / {local['fat']}G "
+                       f"({len(contraste['lineas'])}/{len(c.get('ingredientes', []))} ingredientes reconocidos){aviso}")
+
+        # BOTONERA DE ACCIÓN
+        c_act1, c_act2, c_act3 = st.columns(3)
+
+        with c_act1:
+            if st.button(f"✅ Hecho (Restar Plan)", key=f"ok_{dia_sel}_{i}"):
+                st.session_state.despensa, _ = indice.restar([ing.lower() for ing in c.get('ingredientes', [])])
+                st.session_state.racha_nutricion += 10
+                st.balloons()
+                st.toast(f"🔥 Racha de dieta: {st.session_state.racha_nutricion} pts", icon="🥗")
+                repintar_zona() # Solo esta tarjeta (sus ✅/❌ ya salen con la despensa restada)
+
+        with c_act2:
+            if st.button(f"📸 He comido otra cosa", key=f"fail_{dia_sel}_{i}"):
+                st.session_state[f"rebelde_{i}"] = True
+
+        with c_act3:
+            if st.button("🔁 Otro plato", key=f"otro_{dia_sel}_{i}", disabled=not IA_ACTIVA):
+                if editar_plan(regenerar_comida, dia_sel, i):
+                    st.rerun() # Cambian los macros del día (fuera de esta tarjeta)
+
+        # ZONA DE AUDITORÍA REBELDE
+        if st.session_state.get(f"rebelde_{i}", False):
+            with st.container(border=True):
+                st.write("🕵️‍♂️ **Auditoría IA:** Sube foto de lo que has comido realmente.")
+                foto_rebelde = st.file_uploader("Captura del plato real", type=['jpg', 'png'], key=f"foto_reb_{i}")
+                if foto_rebelde and IA_ACTIVA:
+                    with st.spinner("Analizando plato improvisado..."):
+                        ingredientes_f, es_nueva = registro_subidas().procesar(f"rebelde_{dia_sel}_{i}", foto_rebelde, lambda: [
+                            x.strip().lower() for x in analizar_imagen(
+                                "rebelde", "Analiza este plato. Dime qué ingredientes lleva que suelan estar en una despensa. Sepáralos por comas.", foto_rebelde
+                            ).split(",") if x.strip()])
+                    if es_nueva: # Solo se resta una vez por foto, por muchos reruns que haya
+                        st.session_state.despensa, _ = indice_despensa().restar(ingredientes_f)
+                    st.warning(f"Detectado y restado de despensa: {', '.join(ingredientes_f)}")
+                    if st.button("Cerrar Auditoría", key=f"close_{i}"):
+                        st.session_state[f"rebelde_{i}"] = False
+                        repintar_zona()
+
+@zona_rapida
+def tarjeta_ejercicio_microciclo(dia_entreno, i):
+    """Un ejercicio del microciclo: registro serie a serie, 1RM y sustituto"""
+    ej = st.session_state.rutina_estructurada["dias"][dia_entreno][i]
+    id_ej = f"ej_{dia_entreno}_{i}"
+
+    if "series_completadas" not in ej: ej["series_completadas"] = []
+
+    series_totales = int(ej.get('series', 3))
+    series_hechas = len(ej["series_completadas"])
+    rm_historico = st.session_state.maximos_rm.get(ej['nombre'], 0)
+
+    def tras_registrar():
+        # Mientras quedan series solo se repinta esta tarjeta; al cerrar el ejercicio (una vez por
+        # ejercicio, no por serie) todo: el cierre del día depende de los demás ejercicios
+        if len(ej["series_completadas"]) >= series_totales:
+            st.rerun()
+        repintar_zona()
+
+    with st.container(border=True):
+        # Cabecera con nombre e indicador de RM histórico
+        st.subheader(f"🎯 {ej['nombre']} ({series_hechas}/{series_totales})")
+        if rm_historico > 0:
+            st.caption(f"🏆 Tu 1RM Histórico: **{rm_historico} kg**")
+
+        # Detalles e incrustación de vídeo
+        c_info1, c_info2 = st.columns([2, 1])
+        with c_info1:
+            st.write(f"**Reps:** {ej['reps']} | **Descanso:** {ej['descanso']}")
+            st.markdown(f"⏱️ **TUT:** `{ej.get('tut', 'Controlado')}` | 🎯 **RIR Objetivo:** `{ej.get('rir', '1-2')}`")
+        with c_info2, perfilador.seccion("Vídeo ejercicio"):
+            if "youtube.com/watch" in ej.get('video', '') or "youtu.be" in ej.get('video', ''):
+                st.video(ej['video'])
+            else:
+                st.markdown(f"[📺 Ver Ejecución]({ej.get('video', '#')})")
+
+        st.divider()
+
+        # Mostrar Calentamiento SOLO si estamos en la Serie 0 (Aproximación inicial)
+        if series_hechas == 0 and ej.get("calentamiento"):
+            st.info(f"🔥 **Fase de Aproximación:** {ej['calentamiento']}")
+
+        # LÓGICA DE SERIES Y CAJETINES
+        if series_hechas >= series_totales:
+            st.success("✅ EJERCICIO TERMINADO")
+            st.write("Registro:", ej["series_completadas"])
+            return
+
+        st.write(f"▶️ **Registrando Serie Efectiva {series_hechas + 1} de {series_totales}**")
+
+        c_e1, c_e2, c_e3 = st.columns([1,1,1])
+        with c_e1: carga = st.number_input("Peso (kg)", 0.0, 500.0, step=2.5, key=f"w_{id_ej}")
+        with c_e2: rir_real = st.slider("RIR Real", 0, 5, 2, key=f"rir_{id_ej}")
+        with c_e3:
+            if st.button("🔄 SUSTITUIR", key=f"occ_{id_ej}", use_container_width=True):
+                if editar_plan(regenerar_ejercicio, dia_entreno, i):
+                    repintar_zona()
+
+        # Botonera de Acción dividida (Serie normal vs RM)
+        fatiga_actual = st.session_state.mapa_muscular["SNC"]
+        st.caption(f"🧠 SNC: {fatiga_actual}%") # El mapa de arriba se pone al día en el siguiente rerun completo
+        if fatiga_actual < 40:
+            st.error("🚨 SNC CRÍTICO. Detén el entreno para evitar lesiones.")
+        else:
+            b1, b2 = st.columns(2)
+            with b1:
+                if st.button("✅ REGISTRAR SERIE", key=f"reg_{id_ej}", type="primary", use_container_width=True):
+                    ej["series_completadas"].append({"peso": carga, "rir": rir_real})
+                    st.session_state.mapa_muscular["SNC"] = max(0, fatiga_actual - 3)
+                    st.toast(f"⏱️ Descansa {ej['descanso']} para la siguiente serie.", icon="⏳")
+                    tras_registrar()
+            with b2:
+                if st.button("🏆 GUARDAR COMO NUEVO 1RM", key=f"rm_{id_ej}", use_container_width=True):
+                    ej["series_completadas"].append({"peso": carga, "rir": rir_real, "es_rm": True})
+                    st.session_state.maximos_rm[ej['nombre']] = carga
+                    st.session_state.mapa_muscular["SNC"] = max(0, fatiga_actual - 6) # El RM fatiga el doble
+                    st.toast(f"🎉 ¡NUEVO RÉCORD! {carga}kg anotados en tu bóveda.", icon="🏆")
+                    st.balloons()
+                    tras_registrar()
+
+@zona_rapida
+def tarjeta_ejercicio_simple(ej, id_ej, boton_sustituto, prompt_sustituto, rir_inicial=2):
+    """Ejercicio de una sesión suelta: registra la carga en el historial"""
+    with st.container(border=True):
+        st.subheader(f"🎯 {ej['nombre']}")
+
+        # Variables de hipertrofia
+        st.write(f"**Series:** {ej['series']} | **Reps:** {ej['reps']} | **Descanso:** {ej['descanso']}")
+        st.markdown(f"⏱️ **TUT (Tempo):** `{ej.get('tut', 'Controlado')}` | 🎯 **RIR Objetivo:** `{ej.get('rir', '1-2')}`")
+        st.markdown(f"📺 [Ver Técnica en Vídeo]({ej.get('video', '#')})")
+
+        st.divider()
+
+        c_e1, c_e2, c_e3 = st.columns([1,1,1])
+
+        with c_e1:
+            carga = st.number_input("Peso (kg)", 0.0, 300.0, step=2.5, key=f"w_{id_ej}")
+
+        with c_e2:
+            rir_real = st.slider("RIR Real logrado", 0, 5, rir_inicial, help="0 = Llegaste al fallo. 3 = Podías hacer 3 más.", key=f"rir_{id_ej}")
+
+        with c_e3:
+            if st.button(boton_sustituto, key=f"occ_{id_ej}", use_container_width=True):
+                with st.spinner("Buscando alternativa..."):
+                    res_alt = client.models.generate_content(model=MODELO_IA, contents=prompt_sustituto, prioridad=PRIORIDAD_INTERACTIVA, funcion="sustituto_rapido")
+                    st.warning(f"Alternativa IA: {res_alt.text}")
+
+            if st.button("✅ REGISTRAR SERIE", key=f"reg_{id_ej}", type="primary", use_container_width=True):
+                st.session_state.historial_cargas[ej['nombre']] = {"peso": carga, "rir": rir_real}
+                st.session_state.racha_entreno += 1
+                # Castigo muscular al SNC
+                st.session_state.mapa_muscular["SNC"] = max(0, st.session_state.mapa_muscular["SNC"] - 5)
+                st.toast(f"¡Carga guardada! RIR anotado: {rir_real} · 🔥 Racha: {st.session_state.racha_entreno} d · "
+                         f"🧠 SNC: {st.session_state.mapa_muscular['SNC']}%", icon="✅")
+                repintar_zona() # Solo esta tarjeta; la barra lateral y el mapa se ponen al día en el siguiente rerun completo
+
+def pintar_perfil(registro):
+    """Superposición con los tiempos del rerun (y el top de cProfile si se pidió)"""
+    with st.sidebar.expander(f"⏱️ Rerun: {registro['total_ms']:.0f} ms", expanded=True):
+        if not registro["secciones"]:
+            st.caption("Sin secciones medidas.")
+        else:
+            tabla = pd.DataFrame(registro["secciones"])
+            tabla["seccion"] = ["· " * n + r.split(" › ")[-1] for r, n in zip(tabla["seccion"], tabla["nivel"])]
+            tabla["%"] = tabla["ms"] / registro["total_ms"]
+            st.dataframe(tabla[["seccion", "ms", "veces", "%"]].style.format({"ms": "{:.1f}", "%": "{:.0%}"}),
+                         use_container_width=True, hide_index=True)
+        if registro["pstats_top"]:
+            st.caption(f"cProfile guardado en {registro['pstats'] or '(sin disco)'}")
+            st.code(registro["pstats_top"], language="text")
+            if st.query_params.get("perfil") == "cprofile":
+                st.query_params["perfil"] = "1" # cProfile solo para un rerun; los siguientes, solo tiempos
+
 # ==========================================
 # 5. BARRA LATERAL (El HUD Permanente)
 # ==========================================
-with st.sidebar:
+perfilador.cerrar() # Arranque
+with st.sidebar, perfilador.seccion("Barra lateral"):
     st.title("🛡️ FitChef AI")
     st.caption("Modo Dios: ACTIVADO" if IA_ACTIVA else "Modo IA: OFFLINE")
+    if IA_ACTIVA:
+        stats_cache = client.cache.estadisticas()
+        st.caption(f"⚡ Caché IA: {stats_cache['aciertos']} aciertos / {stats_cache['fallos']} fallos ({stats_cache['entradas']} guardadas)")
+        stats_cola = client.planificador.metricas()
+        st.caption(f"🚦 Cola IA: {stats_cola['en_cola']} esperando · {stats_cola['en_vuelo']} en vuelo · {stats_cola['reintentos']} reintentos")
+        stats_json = resumen_json()
+        if casete_ia() is not None:
+            stats_casete = casete_ia().estadisticas()
+            st.caption(f"📼 Casete ({stats_casete['modo']}): {stats_casete['reproducidas']} reproducidas · {stats_casete['grabadas']} grabadas · {stats_casete['sin_grabar']} sin grabar")
+        st.caption(f"🧩 JSON IA: {stats_json['generaciones']} generados · {stats_json['reparado']} reparados en local · {stats_json['tasa_regeneracion']:.0%} tirados")
     
     st.subheader("🔥 Tus Rachas")
     col_r1, col_r2 = st.columns(2)
@@ -163,15 +1010,7 @@ with st.sidebar:
     with col_r2: st.metric(label="🏋️ Entreno", value=f"{st.session_state.racha_entreno} d")
     
     st.subheader("💧 Hidratación Hoy")
-    col_w1, col_w2 = st.columns([2, 1])
-    with col_w1: st.metric(label=f"Meta: {st.session_state.meta_agua}L", value=f"{st.session_state.agua_bebida:.2f} L")
-    with col_w2: 
-        if st.button("🥤 +0.25L", use_container_width=True): 
-            st.session_state.agua_bebida += 0.25
-            st.rerun()
-    
-    if st.session_state.agua_bebida >= st.session_state.meta_agua:
-        st.success("¡Meta de hidratación alcanzada! 🌊")
+    panel_hidratacion()
         
     st.divider()
     # Interruptor del Modo Bestia
@@ -180,35 +1019,18 @@ with st.sidebar:
 # ==========================================
     # 💾 SISTEMA DE GUARDADO Y CARGA (BÓVEDA)
     # ==========================================
-with st.sidebar.expander("💾 Bóveda de ADN (Backup)"):
-    st.write("Guarda o restaura tu configuración completa.")
-
-    # 1. PREPARACIÓN DE DATOS (Para evitar el error de las horas)
-    # Hacemos copia para no romper el perfil real
-    perfil_para_exportar = st.session_state.perfil.copy()
-    
-    # Convertimos objetos de tiempo a texto
-    for k in ['hora_despertar', 'hora_dormir']:
-        if k in perfil_para_exportar and isinstance(perfil_para_exportar[k], datetime.time):
-            perfil_para_exportar[k] = perfil_para_exportar[k].strftime("%H:%M")
-
-    # 2. CREACIÓN DEL DICCIONARIO GLOBAL
-    datos_completos = {
-        "perfil": perfil_para_exportar,
-        "despensa": st.session_state.get('despensa', {}),
-        "historial_medico": st.session_state.get('historial_medico', {}),
-        "mapa_muscular": st.session_state.get('mapa_muscular', {}),
-        "racha_entreno": st.session_state.get('racha_entreno', 0)
-    }
-
-    # 3. GENERACIÓN DEL JSON (Aquí definimos la variable con el nombre correcto)
-    # Usamos json_guardado para que coincida con lo que tu app busca
-    json_guardado = json.dumps(datos_completos, indent=4)
+with st.sidebar.expander("💾 Bóveda de ADN (Backup)"), perfilador.seccion("Bóveda de ADN"):
+    st.write("Todo se guarda solo y va ligado a tu enlace (?u=...). Aquí puedes descargarlo o restaurar un backup.")
+    if st.session_state.get('_usuario_nuevo'):
+        st.info("🔑 Perfil nuevo y vacío. Guarda el enlace de esta página: es tu llave para volver. "
+                "No lo compartas: quien lo tenga puede ver y cambiar tus datos.")
+    else:
+        st.caption("🔑 No compartas tu enlace: quien lo tenga puede ver y cambiar tus datos.")
 
-    # 4. BOTÓN DE DESCARGA (Usando la variable definida arriba)
+    # 1. DESCARGA: el JSON se monta al pulsar el botón, leyendo del almacén (no en cada rerun)
     st.download_button(
         label="📥 Descargar mi ADN",
-        data=json_guardado,  # <--- Fíjate que el nombre sea IDÉNTICO al de arriba
+        data=estado_usuario().exportar,
         file_name="mi_perfil_human_os.json",
         mime="application/json",
         use_container_width=True
@@ -216,50 +1038,41 @@ with st.sidebar.expander("💾 Bóveda de ADN (Backup)"):
 
     st.divider()
 
-    # 5. RESTAURAR DATOS (Cargar archivo)
+    # 2. RESTAURAR DATOS (Cargar archivo)
     archivo_carga = st.file_uploader("Subir archivo .json", type=['json'])
     if archivo_carga is not None:
         try:
-            datos_cargados = json.load(archivo_carga)
-            p_cargado = datos_cargados.get('perfil', {})
-            
-            # Re-convertir texto "07:00" a objeto tiempo real
-            for k in ['hora_despertar', 'hora_dormir']:
-                if k in p_cargado and isinstance(p_cargado[k], str):
-                    h, m = map(int, p_cargado[k].split(':'))
-                    p_cargado[k] = datetime.time(h, m)
-            
-            # Actualizar memoria
-            st.session_state.perfil = p_cargado
-            st.session_state.despensa = datos_cargados.get('despensa', {})
-            st.session_state.historial_medico = datos_cargados.get('historial_medico', {})
-            
+            _, es_nuevo = registro_subidas().procesar("boveda", archivo_carga, lambda: restaurar_boveda(json.load(archivo_carga)))
+            if es_nuevo:
+                st.rerun() # Una sola vez por archivo: repintamos con el ADN restaurado
             st.success("¡ADN Restaurado!")
-            st.rerun()
         except Exception as e:
             st.error(f"Error: {e}")
     
-    # 2. CARGAR UNA COPIA DE SEGURIDAD ANTERIOR
+    # 3. CARGAR UNA COPIA DE SEGURIDAD ANTERIOR
     archivo_carga = st.sidebar.file_uploader("📂 Restaurar Copia de Seguridad", type=["json"], key="carga_boveda")
-    
+
     if archivo_carga is not None:
         try:
-            datos_cargados = json.load(archivo_carga)
-            
-            # Inyectamos los datos cargados directamente en las venas de la app
-            for clave, valor in datos_cargados.items():
-                st.session_state[clave] = valor
-                
+            # Clave propia: si compartiera "boveda" con el de arriba, el mismo archivo aquí no restauraría nada
+            _, es_nuevo = registro_subidas().procesar("boveda_copia", archivo_carga, lambda: restaurar_boveda(json.load(archivo_carga)))
+            if es_nuevo:
+                st.rerun() # Recargamos la app para que aplique los cambios visualmente
             st.sidebar.success("¡Perfil Restaurado con Éxito!")
-            time.sleep(1)
-            st.rerun() # Recargamos la app para que aplique los cambios visualmente
         except Exception as e:
             st.sidebar.error("Error al leer el archivo. ¿Es un backup válido?")
 
 # ==========================================
 # 6. NAVEGACIÓN PRINCIPAL
 # ==========================================
+def modo_admin():
+    """Pantalla oculta: ?admin=<FITCHEF_ADMIN_CLAVE>. Sin clave configurada no se abre (enseña prompts y costes)"""
+    clave = os.getenv("FITCHEF_ADMIN_CLAVE")
+    return bool(clave) and hmac.compare_digest(st.query_params.get("admin", "").encode(), clave.encode())
+
 opciones_menu = ["🏠 Inicio", "👤 Perfil", "🏥 Clínica Bio-Hacking", "🥗 Nutrición Pro", "🏋️‍♂️ Entrenador IA", "🍷 Vida Social", "🩸 Progreso"]
+if IA_ACTIVA and modo_admin():
+    opciones_menu.append("📡 Telemetría IA")
 menu = st.radio(
     "Navegación:", 
     opciones_menu, 
@@ -267,6 +1080,10 @@ menu = st.radio(
     horizontal=True,
     key="nav_principal"
 )
+perfilador.pantalla = menu
+perfilador.abrir(menu)
+hidratar(*CLAVES_PANTALLA.get(menu, ()))
+st.session_state._rerun_a_medias = menu
 st.divider()
 
 # ==========================================
@@ -311,12 +1128,13 @@ if menu == "🏠 Inicio":
     if audio_grabado and IA_ACTIVA:
         with st.spinner("Escuchando y transcribiendo..."):
             try:
-                # Aquí enviamos el audio directamente a Gemini 2.5 Pro
-                res_audio = client.models.generate_content(
+                # Aquí enviamos el audio directamente a Gemini 2.5 Pro (solo la primera vez que llega este audio)
+                texto_jarvis, _ = registro_subidas().procesar("jarvis", audio_grabado, lambda: client.models.generate_content(
                     model=MODELO_IA,
-                    contents=["Eres el asistente personal de fitness. Transcribe y resume brevemente qué acción debe tomar el sistema según este audio.", audio_grabado]
-                )
-                st.info(f"🤖 **Jarvis dice:** {res_audio.text}")
+                    contents=["Eres el asistente personal de fitness. Transcribe y resume brevemente qué acción debe tomar el sistema según este audio.", audio_grabado],
+                    prioridad=PRIORIDAD_INTERACTIVA, funcion="jarvis"
+                ).text)
+                st.info(f"🤖 **Jarvis dice:** {texto_jarvis}")
             except Exception as e:
                 st.error("Error al procesar el audio. Asegúrate de hablar claro.")
 
@@ -542,7 +1360,7 @@ elif menu == "🥗 Nutrición Pro":
                     - Ten en cuenta su presupuesto {p['presupuesto']} y dieta {p['dieta_tipo']}.
                     - Formato: Devuelve una lista categorizada (Proteínas, Grasas, Hidratos, Vegetales).
                     """
-                    res = client.models.generate_content(model=MODELO_IA, contents=prompt_compra)
+                    res = client.models.generate_content(model=MODELO_IA, contents=prompt_compra, funcion="lista_compra")
                     st.session_state.lista_compra_sugerida = res.text
         
         if 'lista_compra_sugerida' in st.session_state:
@@ -563,68 +1381,75 @@ elif menu == "🥗 Nutrición Pro":
         ])
         
         # 1. ESCÁNER DE NEVERA
-        with t_nev:
+        if '_aviso_ingesta' in st.session_state:
+            st.success(st.session_state.pop('_aviso_ingesta'))
+
+        with t_nev, perfilador.seccion("Nevera"):
             col_n1, col_n2 = st.columns(2)
             with col_n1: foto_n = st.camera_input("Hacer foto a la nevera", key="cam_nev")
-            with col_n2: archivo_n = st.file_uploader("O subir desde galería", type=['jpg', 'png', 'jpeg'], key="up_nev")
+            with col_n2: archivos_n = st.file_uploader("O subir desde galería (varias a la vez)", type=['jpg', 'png', 'jpeg'], key="up_nev", accept_multiple_files=True)
             
-            input_nevera = foto_n if foto_n else archivo_n
-            if input_nevera and IA_ACTIVA:
-                with st.spinner("Chef IA escaneando..."):
-                    res = client.models.generate_content(model=MODELO_IA, contents=["Lista alimentos saludables separados por comas.", Image.open(input_nevera)])
-                    nuevos = [i.strip().lower() for i in res.text.split(",") if i.strip()]
-                    st.session_state.despensa = list(set(st.session_state.despensa + nuevos))
-                    st.success(f"Detectados: {', '.join(nuevos)}")
-                    time.sleep(1); st.rerun()
+            fotos_nevera = ([foto_n] if foto_n else []) + list(archivos_n or [])
+            if fotos_nevera and IA_ACTIVA:
+                ingerir_fotos("nevera", "Lista alimentos saludables separados por comas.", fotos_nevera, "Chef IA escaneando")
 
         # 2. ESCÁNER DE TICKETS
-        with t_ticket:
-            st.info("🧾 Haz una foto al ticket en directo o súbela de tu galería.")
+        with t_ticket, perfilador.seccion("Ticket"):
+            st.info("🧾 Haz una foto al ticket en directo o sube de tu galería todos los de la compra a la vez.")
             col_t1, col_t2 = st.columns(2)
             with col_t1: foto_t = st.camera_input("Hacer foto al ticket", key="cam_tick")
-            with col_t2: archivo_t = st.file_uploader("O subir ticket", type=['jpg', 'png', 'jpeg'], key="up_tick")
+            with col_t2: archivos_t = st.file_uploader("O subir tickets", type=['jpg', 'png', 'jpeg'], key="up_tick", accept_multiple_files=True)
             
-            input_ticket = foto_t if foto_t else archivo_t
-            if input_ticket and IA_ACTIVA:
-                with st.spinner("Leyendo ticket y descartando ultraprocesados..."):
-                    res = client.models.generate_content(model=MODELO_IA, contents=["Extrae nombres de alimentos saludables del ticket separados por comas. Ignora precios y basura.", Image.open(input_ticket)])
-                    nuevos = [i.strip().lower() for i in res.text.split(",") if i.strip()]
-                    st.session_state.despensa = list(set(st.session_state.despensa + nuevos))
-                    st.success("Ticket hackeado. Despensa actualizada.")
-                    time.sleep(1); st.rerun()
+            tickets = ([foto_t] if foto_t else []) + list(archivos_t or [])
+            if tickets and IA_ACTIVA:
+                ingerir_fotos("ticket", "Extrae nombres de alimentos saludables del ticket separados por comas. Ignora precios y basura.",
+                              tickets, "Leyendo tickets y descartando ultraprocesados")
 
         # 3. ESCÁNER DE CÓDIGO DE BARRAS / PRODUCTOS
-        with t_barras:
+        with t_barras, perfilador.seccion("Código de barras"):
             st.info("🔍 Haz una foto nítida al código de barras o al envase del producto.")
             col_b1, col_b2 = st.columns(2)
             with col_b1: foto_b = st.camera_input("Escanear código", key="cam_bar")
             with col_b2: archivo_b = st.file_uploader("O subir foto del código", type=['jpg', 'png', 'jpeg'], key="up_bar")
             
             input_barras = foto_b if foto_b else archivo_b
-            if input_barras and IA_ACTIVA:
-                with st.spinner("Buscando base de datos nutricional..."):
-                    res = client.models.generate_content(model=MODELO_IA, contents=["¿Qué alimento es este código de barras o envase? Solo devuelve el nombre genérico del alimento en español.", Image.open(input_barras)])
-                    nuevo_prod = res.text.strip().lower()
-                    st.session_state.despensa.append(nuevo_prod)
-                    st.success(f"Producto identificado y añadido: {nuevo_prod.title()}")
-                    time.sleep(1); st.rerun()
+            if input_barras:
+                with st.spinner("Leyendo el código..."):
+                    (nuevo_prod, codigo, origen), es_nuevo = registro_subidas().procesar(
+                        "barras", input_barras, lambda: identificar_producto(input_barras),
+                        anotar_si=lambda r: r[0] is not None) # Sin producto (foto ilegible, IA apagada) se reintenta
+                if not nuevo_prod:
+                    st.warning(f"Código {codigo} leído, pero no está en el índice local y la IA no está activa." if codigo
+                               else "No se pudo leer el código. Prueba con una foto más nítida y de frente.")
+                elif es_nuevo:
+                    st.session_state.despensa, anadidos = fusionar(st.session_state.despensa, [nuevo_prod])
+                    if anadidos:
+                        st.success(f"Producto identificado y añadido: {nuevo_prod.title()}")
+                    else:
+                        st.caption(f"✔️ {nuevo_prod.title()} ya estaba en la despensa.")
+                else:
+                    st.caption(f"✔️ Producto ya añadido: {nuevo_prod.title()}")
+                if nuevo_prod:
+                    st.caption(f"🏷️ {codigo or 'Sin código legible'} · {origen} · {len(indice_productos())} productos en el índice")
 
         # 4. DICTADO POR VOZ
-        with t_voz:
+        with t_voz, perfilador.seccion("Dictado"):
             audio = st.audio_input("Dicta tus ingredientes:")
             if audio and IA_ACTIVA:
                 with st.spinner("Transcribiendo ingredientes..."):
-                    res = client.models.generate_content(model=MODELO_IA, contents=["Extrae los alimentos de este audio separados por comas.", audio])
-                    nuevos = [i.strip().lower() for i in res.text.split(",") if i.strip()]
-                    st.session_state.despensa = list(set(st.session_state.despensa + nuevos))
+                    nuevos, es_nuevo = registro_subidas().procesar("dictado", audio, lambda: [
+                        i.strip().lower() for i in client.models.generate_content(model=MODELO_IA, contents=["Extrae los alimentos de este audio separados por comas.", audio], prioridad=PRIORIDAD_INTERACTIVA, funcion="dictado_despensa").text.split(",") if i.strip()])
+                if es_nuevo:
+                    st.session_state.despensa, _ = fusionar(st.session_state.despensa, nuevos)
                     st.success(f"Añadidos por voz: {', '.join(nuevos)}")
-                    time.sleep(1); st.rerun()
+                else:
+                    st.caption(f"✔️ Dictado ya añadido: {', '.join(nuevos)}")
 
         # 5. AÑADIDO MANUAL
-        with t_man:
+        with t_man, perfilador.seccion("Manual"):
             manual = st.text_input("Añadir manual (ej: atún, pasta, huevos):")
             if st.button("➕ Añadir a Despensa", use_container_width=True):
-                st.session_state.despensa = list(set(st.session_state.despensa + [i.strip().lower() for i in manual.split(",") if i.strip()]))
+                st.session_state.despensa, _ = fusionar(st.session_state.despensa, [i.strip().lower() for i in manual.split(",") if i.strip()])
                 st.rerun()
 
         st.divider()
@@ -636,89 +1461,67 @@ elif menu == "🥗 Nutrición Pro":
                 st.rerun()
 
     # --- 3. EL CHEF IA (GENERADOR CON RECETAS DETALLADAS Y MACROS) ---
+    modo_paralelo = st.toggle("⚡ Generación paralela (7 días a la vez)", value=True, help="Pide cada día por separado y al mismo tiempo. Si un día sale mal, solo se repite ese día.")
     if st.button("👨‍🍳 GENERAR PLAN SEMANAL Y RECETAS (GOD-TIER)", type="primary", use_container_width=True):
         if IA_ACTIVA:
-            with st.spinner("El Chef está cuadrando tus macros y diseñando la semana..."):
-                p = st.session_state.perfil
-                prompt = f"""
-                Eres un Chef Michelin y Nutricionista Clínico. Genera una dieta semanal de Lunes a Domingo.
-                
-                🩺 [HISTORIAL MÉDICO Y ANALÍTICAS]: {st.session_state.historial_medico.get('analiticas', 'Sin datos')}
-                
-                REGLAS: 
-                1. Grasas min 1g/kg. Post-entreno ({p.get('horario_entreno', 'Tarde')}) alto en CH. 
-                2. Fase Hormonal: {p.get('perfil_hormonal', 'Ninguno')}. 
-                3. Usa esta despensa si es posible: {st.session_state.despensa}.
-                4. OBLIGATORIO: Adapta los ingredientes y macros para corregir los problemas del [HISTORIAL MÉDICO] (ej: si falta hierro pon alimentos ricos en él + Vitamina C, si el azúcar es alto baja el índice glucémico).
-                🩺 [FASE DEL MESOCICLO]: Semana {p.get('semana_mesociclo', 1)} de 4. 
-                - Si es Semana 4 (Descarga/Deload): Aumenta ligeramente los carbohidratos (Refeed/Diet Break) para dar un respiro a la adaptación metabólica.
-                
-                DEVUELVE ÚNICA Y EXCLUSIVAMENTE UN JSON VÁLIDO. NI UNA SOLA PALABRA MÁS. SIN SALUDOS.
-                Estructura EXACTA obligatoria:
-                {{
-                  "Lunes": [
-                    {{
-                      "tipo": "Desayuno",
-                      "plato": "Nombre del plato",
-                      "ingredientes": ["ingrediente 1", "ingrediente 2"],
-                      "instrucciones": "Paso a paso breve",
-                      "nota_ciencia": "Bio-hack de este plato y cómo ayuda a tu Historial Médico",
-                      "kcal": 400,
-                      "prot": 30,
-                      "cho": 40,
-                      "fat": 15
-                    }}
-                  ],
-                  "Martes": [ ... ]
-                }}
-                """
-                try:
-                    res = client.models.generate_content(model=MODELO_IA, contents=prompt)
-                    
-                    # Limpieza extrema: buscamos solo lo que hay entre la primera { y la última }
-                    texto = res.text.replace("```json", "").replace("```", "").strip()
-                    inicio = texto.find('{')
-                    fin = texto.rfind('}') + 1
-                    
-                    if inicio != -1 and fin != 0:
-                        texto_limpio = texto[inicio:fin]
-                        st.session_state.plan_estructurado = json.loads(texto_limpio)
-                        st.success("¡Dieta lista y emplatada!")
-                        time.sleep(1)
-                        st.rerun()
-                    else:
-                        raise ValueError("La IA no devolvió corchetes de JSON.")
-                        
-                except Exception as e: 
-                    st.error(f"Error en la cocina. Detalle técnico: {e}")
-                    st.info("💡 Sugerencia: Dale al botón de nuevo. A veces la IA tiene un pequeño lapsus de formato.")
+            p = st.session_state.perfil
+            # Los prompts se montan aquí: los hilos no pueden tocar st.session_state
+            if modo_paralelo:
+                lanzar_trabajo("plan_semanal", "Plan semanal (7 fogones)", trabajo_plan_paralelo,
+                               {d: prompt_dieta(p, d) for d in DIAS_SEMANA}, int(os.getenv("FITCHEF_HILOS_PLAN", "7")))
+            else:
+                lanzar_trabajo("plan_semanal", "Plan semanal", trabajo_plan_completo, prompt_dieta(p))
+    mostrar_trabajo("plan_semanal", "👨‍🍳 El Chef está cocinando la semana en segundo plano. Puedes seguir navegando: los días irán apareciendo en la barra lateral.")
 
   # --- 4. VISUALIZACIÓN, MACROS, FALTANTES Y AUDITORÍA DE DESVÍOS ---
     if st.session_state.plan_estructurado: # <--- Corregido de 'structured' a 'estructurado'
-        dia_sel = st.selectbox("📅 Selecciona Día:", list(st.session_state.plan_estructurado.keys()))
+        c_dia1, c_dia2 = st.columns([3, 1])
+        with c_dia1: dia_sel = st.selectbox("📅 Selecciona Día:", list(st.session_state.plan_estructurado.keys()))
+        with c_dia2:
+            st.write("")
+            if st.button(f"🔁 Rehacer solo el {dia_sel}", use_container_width=True, disabled=not IA_ACTIVA):
+                if editar_plan(regenerar_dia_plan, dia_sel):
+                    st.rerun()
         
-        # A) RESUMEN DE MACROS DEL DÍA
-        macros_dia = {"kcal": 0, "prot": 0, "cho": 0, "fat": 0}
-        for c in st.session_state.plan_estructurado.get(dia_sel, []):
-            macros_dia["kcal"] += c.get("kcal", 0)
-            macros_dia["prot"] += c.get("prot", 0)
-            macros_dia["cho"] += c.get("cho", 0)
-            macros_dia["fat"] += c.get("fat", 0)
+        # A) RESUMEN DE MACROS DEL DÍA (contra los objetivos del perfil)
+        analitica = analitica_plan()
+        macros_dia = analitica.dia(dia_sel)
+        objetivos = analitica.objetivos
             
         st.subheader(f"📊 Resumen Nutricional: {dia_sel}")
         m_col1, m_col2, m_col3, m_col4 = st.columns(4)
-        m_col1.metric("🔥 Kcal", f"{macros_dia['kcal']}")
-        m_col2.metric("🥩 Prot", f"{macros_dia['prot']}g")
-        m_col3.metric("🍞 Hidratos", f"{macros_dia['cho']}g")
-        m_col4.metric("🥑 Grasas", f"{macros_dia['fat']}g")
+        m_col1.metric("🔥 Kcal", f"{macros_dia['kcal']}", f"{macros_dia['kcal'] - objetivos['kcal']:+} vs {objetivos['kcal']}", delta_color="off")
+        m_col2.metric("🥩 Prot", f"{macros_dia['prot']}g", f"{macros_dia['prot'] - objetivos['prot']:+}g vs {objetivos['prot']}g", delta_color="off")
+        m_col3.metric("🍞 Hidratos", f"{macros_dia['cho']}g", f"{macros_dia['cho'] - objetivos['cho']:+}g vs {objetivos['cho']}g", delta_color="off")
+        m_col4.metric("🥑 Grasas", f"{macros_dia['fat']}g", f"{macros_dia['fat'] - objetivos['fat']:+}g vs {objetivos['fat']}g", delta_color="off")
+
+        # Reglas del plan (grasa mínima, kcal y proteína del perfil) y ajuste de raciones en local, sin IA
+        avisos = reglas_dia(macros_dia, st.session_state.perfil, objetivos)
+        if avisos:
+            c_av1, c_av2 = st.columns([3, 1])
+            with c_av1: st.warning("⚖️ " + " · ".join(avisos))
+            with c_av2:
+                if st.button("⚖️ Ajustar raciones", use_container_width=True, help="Reescala las cantidades de este día para cuadrar tus objetivos (sin llamar a la IA)."):
+                    nuevas, informe = ajustar_dia(st.session_state.plan_estructurado[dia_sel], objetivos, base_alimentos())
+                    st.session_state.plan_estructurado = aplicar(st.session_state.plan_estructurado, (dia_sel,), nuevas)
+                    st.toast(f"Raciones ajustadas: {informe['antes']['kcal']} → {informe['despues']['kcal']} kcal, "
+                             f"{informe['antes']['prot']} → {informe['despues']['prot']} g de proteína")
+                    st.rerun()
+
+        with st.expander("📈 Semana completa vs objetivos"):
+            t_sem, t_dias, t_tipos = st.tabs(["Semana", "Por día", "Por tipo de comida"])
+            with t_sem, perfilador.seccion("Semana"):
+                st.dataframe(analitica.semana.round(0), use_container_width=True)
+                st.caption(f"Objetivos estimados con tu perfil (Mifflin-St Jeor × actividad, programa {st.session_state.perfil['objetivo']}).")
+            with t_dias, perfilador.seccion("Por día"):
+                st.bar_chart(analitica.reparto, y_label="% de las kcal")
+                st.dataframe(analitica.desvio_pct.round(0).rename(columns=lambda m: f"{m} (% vs objetivo)"), use_container_width=True)
+            with t_tipos, perfilador.seccion("Por tipo"):
+                st.dataframe(analitica.por_tipo.round(0), use_container_width=True)
 
         # B) ESCÁNER DE FALTANTES CRÍTICOS
-        ingredientes_dia = []
-        for c in st.session_state.plan_estructurado.get(dia_sel, []):
-            ingredientes_dia.extend([i.lower() for i in c.get('ingredientes', [])])
-        
-        faltantes = [i for i in ingredientes_dia if not any(d in i or i in d for d in st.session_state.despensa)]
-        
+        faltantes = faltantes_dia(dia_sel)
+
         if faltantes:
             with st.status("⚠️ Alerta de Suministros: Faltan ingredientes para hoy", state="error"):
                 st.write("Para cumplir el plan al 100%, necesitas comprar:")
@@ -729,59 +1532,8 @@ elif menu == "🥗 Nutrición Pro":
         st.divider()
 
         # C) DETALLE DE LAS COMIDAS CON AUDITORÍA
-        for i, c in enumerate(st.session_state.plan_estructurado.get(dia_sel, [])):
-            with st.expander(f"🍽️ {c['tipo']}: {c['plato']} ({c.get('kcal', 0)} kcal)", expanded=True):
-                st.info(f"🧬 **Bio-Hack:** {c.get('nota_ciencia', 'Optimización metabólica activa.')}")
-                
-                col1, col2 = st.columns(2)
-                with col1:
-                    st.write("**🛒 Ingredientes:**")
-                    for ing in c.get('ingredientes', []): # <--- Corregido de 'ingredients' a 'ingredientes'
-                        tienes = any(d in ing.lower() or ing.lower() in d for d in st.session_state.despensa)
-                        st.write(f"{'✅' if tienes else '❌'} {ing}")
-                with col2:
-                    st.write("**👨‍🍳 Instrucciones:**")
-                    st.write(c.get('instrucciones', 'Cocinar a fuego lento y disfrutar.')) # <--- Corregido de 'instructions'
-                
-                # BOTONERA DE ACCIÓN DOBLE
-                c_act1, c_act2 = st.columns(2)
-                
-                with c_act1:
-                    if st.button(f"✅ Hecho (Restar Plan)", key=f"ok_{dia_sel}_{i}"):
-                        for ing in c.get('ingredientes', []):
-                            for item in st.session_state.despensa:
-                                if item in ing.lower() or ing.lower() in item:
-                                    try: st.session_state.despensa.remove(item); break
-                                    except: pass
-                        st.session_state.racha_nutricion += 10
-                        st.balloons()
-                        st.rerun()
-
-                with c_act2:
-                    if st.button(f"📸 He comido otra cosa", key=f"fail_{dia_sel}_{i}"):
-                        st.session_state[f"rebelde_{i}"] = True
-
-                # ZONA DE AUDITORÍA REBELDE
-                if st.session_state.get(f"rebelde_{i}", False):
-                    with st.container(border=True):
-                        st.write("🕵️‍♂️ **Auditoría IA:** Sube foto de lo que has comido realmente.")
-                        foto_rebelde = st.file_uploader("Captura del plato real", type=['jpg', 'png'], key=f"foto_reb_{i}")
-                        if foto_rebelde and IA_ACTIVA:
-                            with st.spinner("Analizando plato improvisado..."):
-                                res = client.models.generate_content(
-                                    model=MODELO_IA,
-                                    contents=["Analiza este plato. Dime qué ingredientes lleva que suelan estar en una despensa. Sepáralos por comas.", Image.open(foto_rebelde)]
-                                )
-                                ingredientes_f = [x.strip().lower() for x in res.text.split(",") if x.strip()]
-                                for ing_f in ingredientes_f:
-                                    for item in st.session_state.despensa:
-                                        if item in ing_f or ing_f in item:
-                                            try: st.session_state.despensa.remove(item); break
-                                            except: pass
-                                st.warning(f"Detectado y restado de despensa: {', '.join(ingredientes_f)}")
-                                if st.button("Cerrar Auditoría", key=f"close_{i}"):
-                                    st.session_state[f"rebelde_{i}"] = False
-                                    st.rerun()
+        for i in range(len(st.session_state.plan_estructurado.get(dia_sel, []))):
+            tarjeta_comida(dia_sel, i)
 # ==========================================
 # 🏋️‍♂️ PANTALLA: ENTRENADOR IA (Biomecánica y Fatiga)
 # ==========================================
@@ -790,7 +1542,7 @@ elif menu == "🏋️‍♂️ Entrenador IA":
     
     t_rutina, t_coach = st.tabs(["📋 Tu Microciclo Semanal", "📹 Coach Técnico (Vídeo)"])
         
-    with t_rutina:
+    with t_rutina, perfilador.seccion("Microciclo"):
         # --- INICIALIZAR BÓVEDA DE RÉCORDS (Por si es la primera vez) ---
         if "maximos_rm" not in st.session_state:
             st.session_state.maximos_rm = {}
@@ -810,151 +1562,73 @@ elif menu == "🏋️‍♂️ Entrenador IA":
         # --- GENERADOR SEMANAL CON APROXIMACIÓN (CALENTAMIENTO) ---
         if st.button("💪 GENERAR MICROCICLO SEMANAL", type="primary", use_container_width=True):
             if IA_ACTIVA:
-                with st.spinner("Programando la semana con telemetría avanzada y aproximaciones..."):
-                    p = st.session_state.perfil
-                    ck = st.session_state.checkin_hoy
-                    
-                    prompt_entreno = f"""
-                    Diseña un Microciclo de {p.get('dias_entreno', 4)} días para {p['objetivo']}. 
-                    Material: {p['lugar_entreno']}. 
-                    
-                    🚨 [INFORME DE LESIONES Y FISIOTERAPIA]: {st.session_state.historial_medico.get('lesiones', 'Sin lesiones')}
-                    
-                    Devuelve un JSON estricto:
-                    {{
-                      "diagnostico_semanal": "Estrategia adaptada a tus lesiones...",
-                      "dias": {{
-                        "Día 1": [
-                          {{
-                            "nombre": "Press Banca", 
-                            "calentamiento": "2x15 (barra vacía), 1x5 (50%), 1x2 (70%)", 
-                            "series": 3, 
-                            "reps": "8-10", 
-                            "rir": "1-2", 
-                            "tut": "3-1-X-1", 
-                            "descanso": "90s", 
-                            "video": "https://www.youtube.com/watch?v=tu_url", 
-                            "series_completadas": []
-                          }}
-                        ]
+                p = st.session_state.perfil
+                ck = st.session_state.checkin_hoy
+                
+                prompt_entreno = f"""
+                Diseña un Microciclo de {p.get('dias_entreno', 4)} días para {p['objetivo']}. 
+                Material: {p['lugar_entreno']}. 
+                
+                🚨 [INFORME DE LESIONES Y FISIOTERAPIA]: {st.session_state.historial_medico.get('lesiones', 'Sin lesiones')}
+                
+                Devuelve un JSON estricto:
+                {{
+                  "diagnostico_semanal": "Estrategia adaptada a tus lesiones...",
+                  "dias": {{
+                    "Día 1": [
+                      {{
+                        "nombre": "Press Banca", 
+                        "calentamiento": "2x15 (barra vacía), 1x5 (50%), 1x2 (70%)", 
+                        "series": 3, 
+                        "reps": "8-10", 
+                        "rir": "1-2", 
+                        "tut": "3-1-X-1", 
+                        "descanso": "90s", 
+                        "video": "https://www.youtube.com/watch?v=tu_url", 
+                        "series_completadas": []
                       }}
-                    }}
-                    REGLAS VITALES:
-                    1. ADAPTA EL ENTRENO AL INFORME MÉDICO: Prohíbe totalmente ejercicios incompatibles con las lesiones y añade ejercicios específicos de rehabilitación o seguros.
-                    2. El "video" debe ser una URL válida y directa de Youtube.
-                    3. Incluye SIEMPRE la clave "calentamiento" para prescribir las series de aproximación.
-                    🚨 [FASE DEL MESOCICLO]: Semana {p.get('semana_mesociclo', 1)} de 4. 
-                    - Si es Semana 1: RIR 2-3, volumen moderado.
-                    - Si es Semana 2 o 3: RIR 0-1 (Fallo), alta intensidad.
-                    - Si es Semana 4 (DESCARGA): OBLIGATORIO bajar las series a la mitad y subir el RIR a 3-4 para recuperar el Sistema Nervioso.
-                    """
-                    try:
-                        res = client.models.generate_content(model=MODELO_IA, contents=prompt_entreno)
-                        texto = res.text.replace("```json", "").replace("```", "").strip()
-                        inicio = texto.find('{')
-                        fin = texto.rfind('}') + 1
-                        st.session_state.rutina_estructurada = json.loads(texto[inicio:fin])
-                        st.success("¡Microciclo generado con fases de calentamiento!")
-                    except Exception as e: 
-                        st.error(f"Error de la IA: {e}")
+                    ]
+                  }}
+                }}
+                REGLAS VITALES:
+                1. ADAPTA EL ENTRENO AL INFORME MÉDICO: Prohíbe totalmente ejercicios incompatibles con las lesiones y añade ejercicios específicos de rehabilitación o seguros.
+                2. El "video" debe ser una URL válida y directa de Youtube.
+                3. Incluye SIEMPRE la clave "calentamiento" para prescribir las series de aproximación.
+                🚨 [FASE DEL MESOCICLO]: Semana {p.get('semana_mesociclo', 1)} de 4. 
+                - Si es Semana 1: RIR 2-3, volumen moderado.
+                - Si es Semana 2 o 3: RIR 0-1 (Fallo), alta intensidad.
+                - Si es Semana 4 (DESCARGA): OBLIGATORIO bajar las series a la mitad y subir el RIR a 3-4 para recuperar el Sistema Nervioso.
+                """
+                lanzar_trabajo("microciclo", "Microciclo semanal", trabajo_en_directo, prompt_entreno, describir_ejercicio_microciclo, FORMATO_MICROCICLO)
+        mostrar_trabajo("microciclo", "💪 Programando la semana en segundo plano. Los ejercicios irán apareciendo en la barra lateral.")
 
         # --- CUADRO DE MANDOS DEL DÍA ---
         if st.session_state.rutina_estructurada and "dias" in st.session_state.rutina_estructurada:
-            dia_entreno = st.selectbox("📅 Selecciona tu sesión:", list(st.session_state.rutina_estructurada["dias"].keys()))
+            c_ses1, c_ses2 = st.columns([3, 1])
+            with c_ses1: dia_entreno = st.selectbox("📅 Selecciona tu sesión:", list(st.session_state.rutina_estructurada["dias"].keys()), key="dia_microciclo")
+            with c_ses2:
+                st.write("")
+                if st.button("🔁 Rehacer esta sesión", use_container_width=True, disabled=not IA_ACTIVA, help="Cambia los ejercicios que aún no has empezado. Lo registrado se queda."):
+                    if editar_plan(regenerar_dia_entreno, dia_entreno):
+                        st.rerun()
             
             ejercicios = st.session_state.rutina_estructurada["dias"].get(dia_entreno, [])
-            todos_terminados = True
-            
-            for i, ej in enumerate(ejercicios):
-                id_ej = f"ej_{dia_entreno}_{i}"
-                
-                if "series_completadas" not in ej: ej["series_completadas"] = []
-                    
-                series_totales = int(ej.get('series', 3))
-                series_hechas = len(ej["series_completadas"])
-                rm_historico = st.session_state.maximos_rm.get(ej['nombre'], 0)
-                
-                if series_hechas < series_totales: todos_terminados = False
-
-                with st.container(border=True):
-                    # Cabecera con nombre e indicador de RM histórico
-                    st.subheader(f"🎯 {ej['nombre']} ({series_hechas}/{series_totales})")
-                    if rm_historico > 0:
-                        st.caption(f"🏆 Tu 1RM Histórico: **{rm_historico} kg**")
-                    
-                    # Detalles e incrustación de vídeo
-                    c_info1, c_info2 = st.columns([2, 1])
-                    with c_info1:
-                        st.write(f"**Reps:** {ej['reps']} | **Descanso:** {ej['descanso']}")
-                        st.markdown(f"⏱️ **TUT:** `{ej.get('tut', 'Controlado')}` | 🎯 **RIR Objetivo:** `{ej.get('rir', '1-2')}`")
-                    with c_info2:
-                        if "youtube.com/watch" in ej.get('video', '') or "youtu.be" in ej.get('video', ''):
-                            st.video(ej['video'])
-                        else:
-                            st.markdown(f"[📺 Ver Ejecución]({ej.get('video', '#')})")
-                    
-                    st.divider()
-
-                    # Mostrar Calentamiento SOLO si estamos en la Serie 0 (Aproximación inicial)
-                    if series_hechas == 0 and ej.get("calentamiento"):
-                        st.info(f"🔥 **Fase de Aproximación:** {ej['calentamiento']}")
-
-                    # LÓGICA DE SERIES Y CAJETINES
-                    if series_hechas >= series_totales:
-                        st.success("✅ EJERCICIO TERMINADO")
-                        st.write("Registro:", ej["series_completadas"])
-                    else:
-                        st.write(f"▶️ **Registrando Serie Efectiva {series_hechas + 1} de {series_totales}**")
-                        
-                        c_e1, c_e2, c_e3 = st.columns([1,1,1])
-                        with c_e1: carga = st.number_input("Peso (kg)", 0.0, 500.0, step=2.5, key=f"w_{id_ej}")
-                        with c_e2: rir_real = st.slider("RIR Real", 0, 5, 2, key=f"rir_{id_ej}")
-                        with c_e3:
-                            if st.button("🔄 SUSTITUIR", key=f"occ_{id_ej}", use_container_width=True):
-                                with st.spinner("Generando variante..."):
-                                    prompt_sust = f"Dame 1 sustituto para {ej['nombre']}. JSON exacto: nombre, calentamiento, series (int), reps, rir, tut, descanso, video, series_completadas (vacio)."
-                                    res_alt = client.models.generate_content(model=MODELO_IA, contents=prompt_sust)
-                                    texto_alt = res_alt.text.replace("```json", "").replace("```", "").strip()
-                                    inicio, fin = texto_alt.find('{'), texto_alt.rfind('}') + 1
-                                    nuevo_ej = json.loads(texto_alt[inicio:fin])
-                                    nuevo_ej["series_completadas"] = []
-                                    st.session_state.rutina_estructurada["dias"][dia_entreno][i] = nuevo_ej
-                                    st.rerun()
-
-                        # Botonera de Acción dividida (Serie normal vs RM)
-                        fatiga_actual = st.session_state.mapa_muscular["SNC"]
-                        if fatiga_actual < 40:
-                            st.error("🚨 SNC CRÍTICO. Detén el entreno para evitar lesiones.")
-                        else:
-                            b1, b2 = st.columns(2)
-                            with b1:
-                                if st.button("✅ REGISTRAR SERIE", key=f"reg_{id_ej}", type="primary", use_container_width=True):
-                                    ej["series_completadas"].append({"peso": carga, "rir": rir_real})
-                                    st.session_state.mapa_muscular["SNC"] = max(0, fatiga_actual - 3)
-                                    st.toast(f"⏱️ Descansa {ej['descanso']} para la siguiente serie.", icon="⏳")
-                                    st.rerun()
-                            with b2:
-                                if st.button("🏆 GUARDAR COMO NUEVO 1RM", key=f"rm_{id_ej}", use_container_width=True):
-                                    ej["series_completadas"].append({"peso": carga, "rir": rir_real, "es_rm": True})
-                                    st.session_state.maximos_rm[ej['nombre']] = carga
-                                    st.session_state.mapa_muscular["SNC"] = max(0, fatiga_actual - 6) # El RM fatiga el doble
-                                    st.toast(f"🎉 ¡NUEVO RÉCORD! {carga}kg anotados en tu bóveda.", icon="🏆")
-                                    st.balloons()
-                                    st.rerun()
+            for i in range(len(ejercicios)):
+                tarjeta_ejercicio_microciclo(dia_entreno, i)
+            todos_terminados = all(len(ej.get("series_completadas", [])) >= int(ej.get('series', 3)) for ej in ejercicios)
 
             # --- CIERRE DEL DÍA Y RESUMEN DEL COACH ---
             if todos_terminados and len(ejercicios) > 0:
                 st.success("🏆 ¡HAS COMPLETADO TODAS LAS SERIES DEL DÍA!")
                 if st.button("🧠 Pedir Análisis de la Sesión al Coach", type="primary", use_container_width=True):
-                    with st.spinner("El Coach está evaluando tus RIRs y pesos..."):
-                        datos_sesion = str([{"ejercicio": e["nombre"], "registro": e["series_completadas"]} for e in ejercicios])
-                        res_coach = client.models.generate_content(
-                            model=MODELO_IA, 
-                            contents=f"El usuario ha terminado su entreno. Datos: {datos_sesion}. Haz una valoración técnica breve (¿se ha quedado muy lejos del fallo?, ¿ha hecho RMs?) y da 1 consejo de recuperación."
-                        )
-                        st.info(f"🗣️ **Coach Biomecánico:** {res_coach.text}")
-
-    with t_coach:
+                    datos_sesion = str([{"ejercicio": e["nombre"], "registro": e["series_completadas"]} for e in ejercicios])
+                    lanzar_trabajo("analisis_sesion", "Análisis de la sesión", trabajo_texto,
+                                   f"El usuario ha terminado su entreno. Datos: {datos_sesion}. Haz una valoración técnica breve (¿se ha quedado muy lejos del fallo?, ¿ha hecho RMs?) y da 1 consejo de recuperación.")
+                mostrar_trabajo("analisis_sesion", "🧠 El Coach está evaluando tus RIRs y pesos...")
+                if st.session_state.get('analisis_sesion'):
+                    st.info(f"🗣️ **Coach Biomecánico:** {st.session_state.analisis_sesion}")
+
+    with t_coach, perfilador.seccion("Coach vídeo"):
         st.subheader("📹 Coach Técnico Biomecánico")
         st.write("Grábate en directo haciendo tu serie o sube un vídeo de tu galería (máximo 10-15 segundos). La IA analizará tu postura, tempo y posibles fallos técnicos.")
         
@@ -963,80 +1637,71 @@ elif menu == "🏋️‍♂️ Entrenador IA":
         
         if video_file and IA_ACTIVA:
             st.video(video_file) # Te muestra el vídeo en pantalla para confirmar
+            datos_video = video_file.getvalue()
+            fps_video, ventana_video = 2.0, None
+            if VIDEO_DISPONIBLE:
+                # Solo mandamos fotogramas clave de la serie, no el vídeo entero
+                c_v1, c_v2 = st.columns(2)
+                with c_v1: fps_video = st.slider("🎞️ Fotogramas por segundo a analizar", 0.5, 5.0, 2.0, step=0.5, key="fps_video")
+                with c_v2: recorte_auto = st.toggle("✂️ Detectar la serie automáticamente", value=True, key="recorte_auto")
+                if not recorte_auto:
+                    duracion = max(0.5, duracion_video_cacheada(datos_video))
+                    ventana_video = st.slider("⏱️ Ventana de la serie (segundos)", 0.0, duracion, (0.0, duracion), step=0.5, key="ventana_video")
             
-            if st.button("🔍 Analizar Biomecánica", type="primary", use_container_width=True):
-                with st.spinner("La visión artificial está procesando tus ángulos articulares y fotogramas..."):
-                    try:
-                        prompt_video = """
+            prompt_video = """
                         Eres un experto en biomecánica deportiva y fisioterapia. 
                         Analiza este levantamiento y devuelve un diagnóstico estructurado en 3 puntos:
                         1. ✅ Puntos Fuertes (¿Qué estoy haciendo bien?).
                         2. 🚨 Correcciones Urgentes (Riesgo de lesión o pérdida de fuerza).
                         3. ⏱️ Valoración del Tempo/TUT (¿Bajo muy rápido? ¿Hay rebote?).
                         """
-                        res_vid = client.models.generate_content(
+            if st.button("🔍 Analizar Biomecánica", type="primary", use_container_width=True):
+                # El troceado del vídeo y la llamada van en segundo plano (cambiar de pestaña no la cancela)
+                lanzar_trabajo("analisis_video", "Análisis biomecánico", trabajo_video, prompt_video, datos_video, video_file.type, fps_video, ventana_video)
+            mostrar_trabajo("analisis_video", "📹 La visión artificial está procesando tus ángulos articulares y fotogramas...")
+            if st.session_state.get('analisis_video'):
+                st.success("Análisis Biomecánico completado:")
+                st.markdown(st.session_state.analisis_video)
+
+            # Preguntas de seguimiento: reutilizan los mismos fotogramas ya preparados
+            pregunta_video = st.text_input("❓ Pregunta de seguimiento sobre este vídeo", key="pregunta_video")
+            if pregunta_video and st.button("💬 Preguntar al Coach", key="btn_pregunta_video"):
+                with st.spinner("El Coach está revisando los fotogramas..."):
+                    try:
+                        res_preg = client.models.generate_content(
                             model=MODELO_IA,
-                            contents=[prompt_video, video_file]
+                            contents=[f"Eres un experto en biomecánica deportiva. Sobre este levantamiento, responde: {pregunta_video}", *partes_video(datos_video, video_file.type, fps_video, ventana_video)],
+                            funcion="coach_pregunta"
                         )
-                        st.success("Análisis Biomecánico completado:")
-                        st.markdown(res_vid.text)
+                        st.info(f"🗣️ **Coach Biomecánico:** {res_preg.text}")
+                    except IASaturada as e:
+                        st.warning(f"⏳ {e}")
                     except Exception as e:
-                        st.error("Error al procesar el vídeo. Intenta grabar una toma más corta (menos de 15 segundos).")    
+                        st.error("Error al procesar el vídeo. Intenta grabar una toma más corta (menos de 15 segundos).")
 
             # --- MOSTRAR EL PLAN SEMANAL (CUADRO DE MANDOS) ---
         if st.session_state.rutina_estructurada and "dias" in st.session_state.rutina_estructurada:
             st.info(f"🧠 **Estrategia del Coach:** {st.session_state.rutina_estructurada.get('diagnostico_semanal', '')}")
             
             # Selector de días como en nutrición
-            dia_entreno = st.selectbox("📅 Selecciona tu sesión:", list(st.session_state.rutina_estructurada["dias"].keys()))
+            dia_entreno = st.selectbox("📅 Selecciona tu sesión:", list(st.session_state.rutina_estructurada["dias"].keys()), key="dia_coach")
             
             st.write(f"### 🏋️‍♂️ Rutina: {dia_entreno}")
             
             for i, ej in enumerate(st.session_state.rutina_estructurada["dias"].get(dia_entreno, [])):
-                id_ej = f"ej_{dia_entreno}_{i}"
-                with st.container(border=True):
-                    st.subheader(f"🎯 {ej['nombre']}")
-                    
-                    # Variables de hipertrofia
-                    st.write(f"**Series:** {ej['series']} | **Reps:** {ej['reps']} | **Descanso:** {ej['descanso']}")
-                    st.markdown(f"⏱️ **TUT (Tempo):** `{ej.get('tut', 'Controlado')}` | 🎯 **RIR Objetivo:** `{ej.get('rir', '1-2')}`")
-                    st.markdown(f"📺 [Ver Técnica en Vídeo]({ej.get('video', '#')})")
-                    
-                    st.divider()
-                    
-                    c_e1, c_e2, c_e3 = st.columns([1,1,1])
-                    
-                    with c_e1: 
-                        carga = st.number_input("Peso (kg)", 0.0, 300.0, step=2.5, key=f"w_{id_ej}")
-                    
-                    with c_e2:
-                        rir_real = st.slider("RIR Real logrado", 0, 5, 2, help="0 = Fallo. 3 = Podías 3 más.", key=f"rir_{id_ej}")
-                    
-                    with c_e3:
-                        if st.button("🔄 SUSTITUIR", key=f"occ_{id_ej}", use_container_width=True):
-                            with st.spinner("Buscando alternativa..."):
-                                res_alt = client.models.generate_content(model=MODELO_IA, contents=f"Dame 1 sustituto para {ej['nombre']}. Solo el nombre.")
-                                st.warning(f"Alternativa: {res_alt.text}")
-                        
-                        if st.button("✅ REGISTRAR SERIE", key=f"reg_{id_ej}", type="primary", use_container_width=True):
-                            st.session_state.historial_cargas[ej['nombre']] = {"peso": carga, "rir": rir_real}
-                            st.session_state.racha_entreno += 1
-                            st.session_state.mapa_muscular["SNC"] = max(0, st.session_state.mapa_muscular["SNC"] - 5)
-                            st.success(f"¡Registrado! RIR {rir_real} anotado. SNC fatigado.")
-                            time.sleep(1)
-                            st.rerun()
+                tarjeta_ejercicio_simple(ej, f"coach_{dia_entreno}_{i}", "🔄 SUSTITUIR", f"Dame 1 sustituto para {ej['nombre']}. Solo el nombre.")
 
         # --- GENERADOR DE ENTRENAMIENTO INTELIGENTE (CON RIR Y TUT) ---
         if st.button("💪 GENERAR SESIÓN ADAPTATIVA", type="primary", use_container_width=True):
             if IA_ACTIVA:
-                with st.spinner("Calculando volumen, RIR y Tempo (TUT) óptimos para hoy..."):
+                with st.status("Calculando volumen, RIR y Tempo (TUT) óptimos para hoy...", expanded=True) as estado:
                     p = st.session_state.perfil
                     ck = st.session_state.checkin_hoy
                     mapa = st.session_state.mapa_muscular
                     bestia = "¡MODO BESTIA ACTIVADO! Sube la intensidad, RIR al 0 (Fallo) y volumen un 15%." if st.session_state.modo_bestia else ""
                     
                     prompt_entreno = f"""
-                    Eres un entrenador de fuerza de élite. Cliente: {p['objetivo']}, Nivel: {p['experiencia']}, Lugar: {p['lugar_entreno']}. Lesiones: {p['lesiones']}.
+                    Eres un entrenador de fuerza de élite. Cliente: {p['objetivo']}, Nivel: {p['experiencia']}, Lugar: {p['lugar_entreno']}. Lesiones: {p.get('lesiones_historial') or st.session_state.historial_medico.get('lesiones', 'Sin lesiones')}.
                     {bestia}
                     
                     [ESTADO FÍSICO HOY]: Sueño: {ck['horas_sueno_anoche']}h. Agujetas: {ck['nivel_agujetas']}. Estrés: {ck['estres_hoy']}.
@@ -1055,53 +1720,35 @@ elif menu == "🏋️‍♂️ Entrenador IA":
                       ]
                     }}
                     """
+                    def pintar_ejercicio(ruta, ej):
+                        if len(ruta) == 2 and ruta[0] == "rutina" and "nombre" in ej:
+                            st.write(f"🎯 {ej['nombre']} — {ej.get('series', '?')}x{ej.get('reps', '?')} · RIR {ej.get('rir', '?')} · TUT {ej.get('tut', '?')}")
+
+                    config = config_json(FORMATO_SESION)
                     try:
-                        res = client.models.generate_content(model=MODELO_IA, contents=prompt_entreno)
-                        texto = res.text.replace("```json", "").replace("```", "").strip()
-                        st.session_state.rutina_estructurada = json.loads(texto)
+                        texto = generar_en_directo(prompt_entreno, pintar_ejercicio, config=config, funcion=FORMATO_SESION.nombre)
+                        try:
+                            st.session_state.rutina_estructurada = interpretar(texto, FORMATO_SESION)
+                        except ValueError:
+                            client.telemetria.marcar_ultimo("json_invalido")
+                            raise
+                        estado.update(label="Sesión lista", state="complete", expanded=False)
                         st.success("¡Sesión generada con telemetría avanzada (RIR/TUT)!")
                     except Exception as e:
-                        st.error("Error al generar la rutina. La IA devolvió un formato incorrecto.")
+                        client.models.olvidar(model=MODELO_IA, contents=prompt_entreno, config=config)
+                        estado.update(label="Error al generar la sesión", state="error")
+                        st.error(f"⏳ {e}" if isinstance(e, IASaturada) else "Error al generar la rutina. La IA devolvió un formato incorrecto.")
 
         # --- MOSTRAR LA RUTINA (CUADRO DE MANDOS AVANZADO) ---
         if st.session_state.rutina_estructurada:
             st.info(f"🧠 **Diagnóstico de tu Coach:** {st.session_state.rutina_estructurada.get('diagnostico', '')}")
             
             for i, ej in enumerate(st.session_state.rutina_estructurada.get('rutina', [])):
-                id_ej = f"ej_{i}"
-                with st.container(border=True):
-                    st.subheader(f"🎯 {ej['nombre']}")
-                    
-                    # Mostrar las variables de programación arriba
-                    st.write(f"**Series:** {ej['series']} | **Reps:** {ej['reps']} | **Descanso:** {ej['descanso']}")
-                    st.markdown(f"⏱️ **TUT (Tempo):** `{ej.get('tut', 'Controlado')}` | 🎯 **RIR Objetivo:** `{ej.get('rir', '1-2')}`")
-                    st.markdown(f"📺 [Ver Técnica en Vídeo]({ej['video']})")
-                    
-                    st.divider()
-                    
-                    c_e1, c_e2, c_e3 = st.columns([1,1,1])
-                    
-                    with c_e1: 
-                        carga = st.number_input("Peso (kg)", 0.0, 300.0, step=2.5, key=f"w_{id_ej}")
-                    
-                    with c_e2:
-                        # Cambiamos el viejo RPE por el RIR Real
-                        rir_real = st.slider("RIR Real logrado", 0, 5, int(ej.get('rir', '2')[0]) if ej.get('rir', '2')[0].isdigit() else 2, help="0 = Llegaste al fallo. 3 = Podías hacer 3 más.", key=f"rir_{id_ej}")
-                    
-                    with c_e3:
-                        if st.button("🔄 MÁQUINA OCUPADA", key=f"occ_{id_ej}", use_container_width=True):
-                            with st.spinner("Buscando alternativa..."):
-                                res_alt = client.models.generate_content(model=MODELO_IA, contents=f"Dame 1 sustituto directo para {ej['nombre']} usando material de {st.session_state.perfil['lugar_entreno']}. Solo di el nombre.")
-                                st.warning(f"Alternativa IA: {res_alt.text}")
-                        
-                        if st.button("✅ REGISTRAR SERIE", key=f"reg_{id_ej}", type="primary", use_container_width=True):
-                            st.session_state.historial_cargas[ej['nombre']] = {"peso": carga, "rir": rir_real}
-                            st.session_state.racha_entreno += 1
-                            # Castigo muscular al SNC
-                            st.session_state.mapa_muscular["SNC"] = max(0, st.session_state.mapa_muscular["SNC"] - 5)
-                            st.success(f"¡Carga guardada! RIR anotado: {rir_real}")
-                            time.sleep(1)
-                            st.rerun()
+                # Cambiamos el viejo RPE por el RIR Real
+                rir_inicial = int(ej.get('rir', '2')[0]) if ej.get('rir', '2')[0].isdigit() else 2
+                tarjeta_ejercicio_simple(ej, f"ej_{i}", "🔄 MÁQUINA OCUPADA",
+                                         f"Dame 1 sustituto directo para {ej['nombre']} usando material de {st.session_state.perfil['lugar_entreno']}. Solo di el nombre.",
+                                         rir_inicial)
 # ==========================================
 # 🍷 PANTALLA: VIDA SOCIAL (Supervivencia)
 # ==========================================
@@ -1109,23 +1756,41 @@ elif menu == "🍷 Vida Social":
     st.header("🍷 Vida Social y Supervivencia")
     t_carta, t_plato, t_resaca = st.tabs(["📜 Hackear Menú", "📸 Analizar Plato", "🤕 Protocolo Resaca"])
     
-    with t_carta:
+    with t_carta, perfilador.seccion("Hackear menú"):
         usar_cam = st.toggle("Cámara frontal", key="tc")
         f_carta = st.camera_input("Enfoca el menú del restaurante") if usar_cam else st.file_uploader("📷 Subir Foto de la Carta", type=['jpg', 'png'])
         if f_carta and IA_ACTIVA:
             with st.spinner("Buscando las mejores opciones proteicas..."):
-                res = client.models.generate_content(model=MODELO_IA, contents=[f"Dime los 2 platos que mejor encajan para un objetivo de {st.session_state.perfil['objetivo']}. Ignora fritos.", Image.open(f_carta)])
-                st.info(res.text)
+                objetivo = st.session_state.perfil['objetivo']
+                texto_carta, _ = registro_subidas().procesar(f"carta_{objetivo}", f_carta, lambda: analizar_imagen(
+                    "carta", f"Dime los 2 platos que mejor encajan para un objetivo de {objetivo}. Ignora fritos.", f_carta))
+                st.info(texto_carta)
 
-    with t_plato:
+    with t_plato, perfilador.seccion("Analizar plato"):
         usar_camp = st.toggle("Cámara frontal", key="tp")
         f_plato = st.camera_input("Enfoca tu plato servido") if usar_camp else st.file_uploader("📷 Subir Foto del Plato", type=['jpg', 'png'])
         if f_plato and IA_ACTIVA:
             with st.spinner("Calculando macros visuales..."):
-                res = client.models.generate_content(model=MODELO_IA, contents=["Desglosa calorías y macros estimados de esto. ¿Hay buena cantidad de proteína?", Image.open(f_plato)])
-                st.success(res.text)
-
-    with t_resaca:
+                texto_plato, _ = registro_subidas().procesar("plato", f_plato, lambda: analizar_imagen(
+                    "plato", "Lista los ingredientes que ves con su cantidad estimada, uno por línea y empezando por '- ' "
+                             "(ej: '- 150 g de arroz', '- 2 huevos'). Después, en 2 frases: ¿hay buena cantidad de proteína?", f_plato))
+            # Las cantidades las estima la IA; las calorías y macros salen de la tabla local
+            ingredientes_plato = [l.strip()[2:] for l in texto_plato.splitlines() if l.strip().startswith(("- ", "* "))]
+            calculo = base_alimentos().macros_ingredientes(ingredientes_plato)
+            if calculo['lineas']:
+                t = calculo['total']
+                cp1, cp2, cp3, cp4 = st.columns(4)
+                cp1.metric("🔥 Kcal", t['kcal'])
+                cp2.metric("🥩 Prot", f"{t['prot']}g")
+                cp3.metric("🍞 Hidratos", f"{t['cho']}g")
+                cp4.metric("🥑 Grasas", f"{t['fat']}g")
+                st.dataframe(pd.DataFrame(calculo['lineas'])[["ingrediente", "alimento", "gramos", "kcal", "prot", "cho", "fat"]].round(0),
+                             use_container_width=True, hide_index=True)
+                if calculo['sin_datos']:
+                    st.caption(f"Sin datos en la tabla local: {', '.join(calculo['sin_datos'])}")
+            st.success(texto_plato)
+
+    with t_resaca, perfilador.seccion("Resaca"):
         st.subheader("🤕 S.O.S Rescate (El día después)")
         c_res1, c_res2 = st.columns(2)
         with c_res1:
@@ -1140,7 +1805,7 @@ elif menu == "🍷 Vida Social":
             st.session_state.meta_agua = 4.0 if intensidad > 6 else 3.5
             with st.spinner("Generando suero de recuperación..."):
                 prompt = f"Protocolo rescate. Daño: {intensidad}/10. Basura: {comida_basura}. Estado: {estado}. Genera: 1 bebida de reposición de electrolitos (Sodio/Potasio), 1 comida sólida para asentar el estómago y ajusta el entreno de hoy."
-                res = client.models.generate_content(model=MODELO_IA, contents=prompt)
+                res = client.models.generate_content(model=MODELO_IA, contents=prompt, funcion="rescate_resaca")
                 st.error(f"🚨 PROTOCOLO ACTIVADO. Tu racha se ha reseteado. Nueva meta de agua hoy: {st.session_state.meta_agua}L.")
                 st.markdown(res.text)
 
@@ -1152,63 +1817,130 @@ elif menu == "🩸 Progreso":
     
     t_peso, t_reloj, t_sangre, t_espejo = st.tabs(["⚖️ Peso", "⌚ Sincronizar Reloj", "🩸 Analíticas", "📸 Espejo IA"])
     
-    with t_peso:
+    with t_peso, perfilador.seccion("Peso"):
+        # Historiales antiguos (DataFrame o lista de la Bóveda) pasan a la serie de arrays una sola vez
+        serie_peso = st.session_state.historial_biometrico = SerieBiometrica.desde(st.session_state.historial_biometrico)
         col_p1, col_p2 = st.columns([1, 2])
         with col_p1:
             st.subheader("Registrar Hoy")
             nuevo_peso = st.number_input("Peso actual (kg)", value=float(st.session_state.perfil['peso']), step=0.1)
             if st.button("Guardar Registro", type="primary"):
-                hoy = datetime.date.today().strftime("%Y-%m-%d")
-                nuevo_dato = pd.DataFrame({"Fecha": [hoy], "Peso (kg)": [nuevo_peso]})
-                st.session_state.historial_biometrico = pd.concat([st.session_state.historial_biometrico, nuevo_dato], ignore_index=True)
+                serie_peso.anotar(datetime.date.today(), nuevo_peso) # Si ya había peso de hoy, se corrige
                 st.session_state.perfil['peso'] = nuevo_peso
                 st.success("¡Peso guardado! La tendencia es tu amiga.")
         with col_p2:
             st.subheader("Tu Evolución")
-            if len(st.session_state.historial_biometrico) > 0:
-                df = st.session_state.historial_biometrico.set_index("Fecha")
-                st.line_chart(df)
+            if len(serie_peso) > 0:
+                est = serie_peso.estadisticas()
+                c_t1, c_t2, c_t3 = st.columns(3)
+                c_t1.metric("📉 Tendencia", f"{est['tendencia']:.1f} kg", f"{est['ritmo_semanal']:+.2f} kg/sem", delta_color="off")
+                c_t2.metric("Media 7 días", f"{est['media_7d']:.1f} kg")
+                c_t3.metric("Media 30 días", f"{est['media_30d']:.1f} kg")
+                st.line_chart(serie_peso.para_grafica()) # Como mucho ~1 punto por día de un año, aunque haya 5 años
             else:
                 st.info("Registra tu peso para ver la gráfica.")
                 
-    with t_reloj:
+    with t_reloj, perfilador.seccion("Reloj"):
         st.subheader("⌚ Sincronización Visual (Garmin/Apple Watch/Oura)")
         st.write("Sube una captura de pantalla del resumen diario de tu reloj inteligente.")
         f_reloj = st.file_uploader("Subir captura del reloj", type=['jpg', 'png', 'jpeg'])
         if f_reloj and IA_ACTIVA:
             if st.button("Extraer Datos del Reloj"):
                 with st.spinner("Leyendo métricas..."):
-                    res_reloj = client.models.generate_content(
-                        model=MODELO_IA, 
-                        contents=["Extrae de esta imagen: Pasos totales, Calorías activas, Horas de sueño y Frecuencia Cardíaca (si las hay). Haz un resumen corto.", Image.open(f_reloj)]
+                    texto_reloj = analizar_imagen(
+                        "reloj",
+                        "Extrae de esta imagen: Pasos totales, Calorías activas, Horas de sueño y Frecuencia Cardíaca (si las hay). Haz un resumen corto.", f_reloj
                     )
                     st.success("Datos sincronizados en el sistema:")
-                    st.write(res_reloj.text)
+                    st.write(texto_reloj)
                     
-    with t_sangre:
+    with t_sangre, perfilador.seccion("Analíticas"):
         st.subheader("🩸 Analista Clínico (Análisis de Sangre)")
         st.write("Sube una foto o PDF (captura) de tu último análisis de sangre. La IA buscará deficiencias para adaptar tu dieta.")
         f_sangre = st.file_uploader("Subir Analítica", type=['jpg', 'png'])
         if f_sangre and IA_ACTIVA:
             if st.button("Analizar Biomarcadores"):
                 with st.spinner("Revisando colesterol, hierro, glucosa..."):
-                    res_sangre = client.models.generate_content(
-                        model=MODELO_IA,
-                        contents=["Eres un endocrino. Lee estos análisis de sangre. Resume los 3 valores que están fuera de rango (si los hay) y dime qué 3 alimentos exactos debo añadir a mi dieta para corregirlos.", Image.open(f_sangre)]
+                    texto_sangre = analizar_imagen(
+                        "analitica",
+                        "Eres un endocrino. Lee estos análisis de sangre. Resume los 3 valores que están fuera de rango (si los hay) y dime qué 3 alimentos exactos debo añadir a mi dieta para corregirlos.", f_sangre
                     )
                     st.warning("Diagnóstico Nutricional completado:")
-                    st.write(res_sangre.text)
+                    st.write(texto_sangre)
                     
-    with t_espejo:
+    with t_espejo, perfilador.seccion("Espejo"):
         st.subheader("📸 Espejo Inteligente (Body Comp)")
         st.write("Sube tu foto de progreso mensual frente al espejo. La IA analizará la hipertrofia y tu postura.")
         f_espejo = st.file_uploader("Subir foto de progreso", type=['jpg', 'png'])
         if f_espejo and IA_ACTIVA:
             if st.button("Evaluar Físico"):
                 with st.spinner("Analizando recomposición corporal..."):
-                    res_espejo = client.models.generate_content(
-                        model=MODELO_IA,
-                        contents=[f"Evalúa esta foto de progreso fitness de una persona que busca {st.session_state.perfil['objetivo']}. Comenta amablemente sobre su desarrollo muscular visible y su postura.", Image.open(f_espejo)]
+                    texto_espejo = analizar_imagen(
+                        "espejo",
+                        f"Evalúa esta foto de progreso fitness de una persona que busca {st.session_state.perfil['objetivo']}. Comenta amablemente sobre su desarrollo muscular visible y su postura.", f_espejo
                     )
                     st.success("Evaluación de tu Coach:")
-                    st.write(res_espejo.text)                        
+                    st.write(texto_espejo)                        
+
+# ==========================================
+# 📡 PANTALLA OCULTA: TELEMETRÍA IA (solo con ?admin=<FITCHEF_ADMIN_CLAVE>)
+# ==========================================
+elif menu == "📡 Telemetría IA":
+    st.title("📡 Telemetría IA")
+    telemetria = client.telemetria
+    st.caption(f"Últimas {len(telemetria.registros())} llamadas de este proceso · JSONL: {telemetria.ruta or 'desactivado'}")
+    filas = telemetria.resumen()
+    if not filas:
+        st.info("Aún no hay llamadas registradas.")
+    else:
+        resumen = pd.DataFrame(filas).set_index("funcion")
+        c_t1, c_t2, c_t3, c_t4 = st.columns(4)
+        c_t1.metric("Llamadas", int(resumen["llamadas"].sum()))
+        c_t2.metric("Coste", f"${resumen['coste_usd'].sum():.4f}")
+        c_t3.metric("Tokens (entrada / salida)", f"{int(resumen['tokens_entrada'].sum())} / {int(resumen['tokens_salida'].sum())}")
+        c_t4.metric("Fallos", int(resumen["json_invalido"].sum() + resumen["error_api"].sum()))
+        st.subheader("Por función")
+        st.dataframe(resumen.style.format({
+            "p50_s": "{:.2f}", "p95_s": "{:.2f}", "p99_s": "{:.2f}", "ttft_p50_s": "{:.2f}",
+            "kb_adjuntos": "{:.0f}", "coste_usd": "${:.4f}", "aciertos_cache": "{:.0%}",
+        }, na_rep="—"), use_container_width=True)
+        st.bar_chart(resumen[["p50_s", "p95_s", "p99_s"]])
+        st.subheader("Últimas llamadas")
+        ultimas = pd.DataFrame(telemetria.registros()[-50:][::-1])
+        ultimas["ts"] = pd.to_datetime(ultimas["ts"], unit="s")
+        st.dataframe(ultimas.drop(columns=["id"]), use_container_width=True, hide_index=True)
+
+    metricas_imagenes = resumen_imagenes()
+    if metricas_imagenes:
+        st.subheader("Fotos (preprocesado antes de mandarlas)")
+        imagenes = pd.DataFrame.from_dict(metricas_imagenes, orient="index")
+        imagenes["kb_entrada"], imagenes["kb_salida"] = imagenes["bytes_entrada"] / 1024, imagenes["bytes_salida"] / 1024
+        imagenes["ms_medio_preproceso"] = imagenes["ms_preproceso"] / imagenes["imagenes"].clip(lower=1)
+        st.dataframe(imagenes[["imagenes", "kb_entrada", "kb_salida", "ahorro_pct", "ms_medio_preproceso",
+                               "llamadas", "s_media_llamada"]].style.format({
+            "kb_entrada": "{:.0f}", "kb_salida": "{:.0f}", "ahorro_pct": "{:.0f} %",
+            "ms_medio_preproceso": "{:.1f}", "s_media_llamada": "{:.2f}",
+        }), use_container_width=True)
+
+perfilador.cerrar() # Pantalla
+
+# ==========================================
+# ⏳ TRABAJOS EN SEGUNDO PLANO (vigilante en la barra lateral)
+# ==========================================
+if IA_ACTIVA and gestor_trabajos().de_usuario(id_usuario()):
+    with st.sidebar, perfilador.seccion("Trabajos"):
+        vigilar_trabajos()
+
+# ==========================================
+# 💾 GUARDADO INCREMENTAL (solo las claves que han cambiado en este rerun)
+# ==========================================
+with perfilador.seccion("Guardado"):
+    persistir()
+    st.session_state._rerun_a_medias = None
+
+# ==========================================
+# ⏱️ PERFIL DEL RERUN (solo con ?perfil=1)
+# ==========================================
+if perfilador.activo:
+    st.session_state.pop('_perfil_rerun', None)
+    pintar_perfil(perfilador.terminar())
@@ -0,0 +1 @@
+"""Benchmarks de FitChef AI (se lanzan a mano: python -m benchmarks.<nombre>)."""
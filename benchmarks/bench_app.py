@@ -0,0 +1,303 @@
+"""Coste de los reruns de app.py sin API key: AppTest + IA simulada, por escenarios.
+
+Cada escenario arranca la app de cero (almacén, caché y demás en una carpeta temporal), la
+conduce con clics como un usuario y mide cada rerun: tiempo de reloj y pico de memoria
+(tracemalloc, que ralentiza algo; con --sin-memoria los tiempos son más limpios).
+
+Uso: python -m benchmarks.bench_app [--escenarios microciclo,plan,peso,boveda] [--repeticiones 3]
+                                    [--latencia-ms 0] [--guardar] [--comparar] [--umbral 0.25]
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(RAIZ, "app.py")
+LINEA_BASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "linea_base_app.json")
+ESPERA_MAX_S = 60  # Lo más que se espera a un trabajo en segundo plano (plan, microciclo)
+
+
+# ==========================================
+# DATOS SINTÉTICOS
+# ==========================================
+def historial_peso(anios, rnd, peso=82.0):
+    """Un pesaje diario durante 'anios' años, con tendencia lenta y ruido de báscula (formato Bóveda)"""
+    hoy = datetime.date.today()
+    dias = int(anios * 365.25)
+    filas = []
+    for i in range(dias):
+        peso += rnd.gauss(-0.004, 0.05)
+        filas.append({"Fecha": (hoy - datetime.timedelta(days=dias - i)).isoformat(),
+                      "Peso (kg)": round(peso + rnd.gauss(0, 0.4), 1)})
+    return filas
+
+
+def boveda_sintetica(rnd, items_despensa, perfil):
+    """Backup como el que descarga la Bóveda: perfil, despensa grande, plan, microciclo y 5 años de peso"""
+    from benchmarks.bench_despensa import despensa_sintetica
+    from fitchef.dieta import DIAS_SEMANA
+    from fitchef.esquemas import FORMATO_MICROCICLO, formato_plan
+    from fitchef.ia_simulada import desde_esquema
+    return {
+        "perfil": {k: v.strftime("%H:%M") if isinstance(v, datetime.time) else v for k, v in perfil.items()},
+        "despensa": despensa_sintetica(items_despensa, rnd),
+        "plan_estructurado": desde_esquema(formato_plan(DIAS_SEMANA).esquema, rnd),
+        "rutina_estructurada": desde_esquema(FORMATO_MICROCICLO.esquema, rnd),
+        "historial_biometrico": historial_peso(5, rnd),
+        "agua_bebida": 1.5,
+    }
+
+
+# ==========================================
+# CONDUCIR LA APP
+# ==========================================
+class Sesion:
+    """Una AppTest con cada rerun cronometrado: [(paso, ms, pico_mb)]"""
+
+    def __init__(self, memoria=True):
+        from streamlit.testing.v1 import AppTest
+        self.at = AppTest.from_file(APP, default_timeout=ESPERA_MAX_S)
+        self.at.secrets["GEMINI_API_KEY"] = "stub"  # app.py lee st.secrets; con el backend simulado no se usa
+        self.memoria = memoria
+        self.reruns = []
+
+    def rerun(self, paso, accion=None):
+        """Ejecuta accion() (que deja algo pendiente: clic, valor...) y el rerun que provoca"""
+        if accion:
+            accion()
+        if self.memoria:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        t0 = time.perf_counter()
+        self.at.run()
+        ms = (time.perf_counter() - t0) * 1000
+        pico = (tracemalloc.get_traced_memory()[1] - base) / 2**20 if self.memoria else None
+        if self.at.exception:
+            raise RuntimeError(f"{paso}: {self.at.exception[0].value}")
+        self.reruns.append((paso, ms, pico))
+
+    def importar_boveda(self, paso, rnd, items):
+        """Sube una Bóveda sintética (con el perfil completo de la sesión, como una de verdad)"""
+        datos = json.dumps(boveda_sintetica(rnd, items, self.at.session_state["perfil"]), ensure_ascii=False)
+        self.rerun(paso, lambda: self.at.file_uploader(key="carga_boveda").set_value(
+            ("mi_perfil_human_os.json", datos.encode(), "application/json")))
+
+    def boton(self, texto):
+        return next((b for b in self.at.button if texto in b.label), None)
+
+    def pulsar(self, paso, texto):
+        boton = self.boton(texto)
+        if boton is None:
+            raise RuntimeError(f"{paso}: no está el botón '{texto}'")
+        self.rerun(paso, boton.click)
+
+    def ir_a(self, pantalla):
+        self.rerun(f"ir a {pantalla}", lambda: self.at.radio(key="nav_principal").set_value(pantalla))
+
+    def esperar(self, paso, clave):
+        """Reruns (como los del vigilante de trabajos) hasta que session_state[clave] tenga algo"""
+        limite = time.time() + ESPERA_MAX_S
+        while not self.at.session_state[clave]:
+            if time.time() > limite:
+                raise RuntimeError(f"{paso}: el trabajo no terminó en {ESPERA_MAX_S}s")
+            time.sleep(0.05)
+            self.rerun(paso)
+
+
+def escenario_microciclo(s, rnd, args):
+    """Generar el microciclo y registrar todas sus series: sesión a sesión, serie a serie"""
+    s.rerun("arranque")
+    s.ir_a("🏋️‍♂️ Entrenador IA")
+    s.pulsar("generar microciclo", "GENERAR MICROCICLO")
+    s.esperar("esperando microciclo", "rutina_estructurada")
+    registradas = 0
+    for dia in list(s.at.session_state["rutina_estructurada"]["dias"]):
+        # Entre sesiones se recupera: con el SNC por debajo de 40 la app ya no deja registrar
+        s.at.session_state["mapa_muscular"] = dict(s.at.session_state["mapa_muscular"], SNC=100)
+        s.rerun("cambiar de sesión", lambda: s.at.selectbox(key="dia_microciclo").set_value(dia))
+        while registradas < args.series_max:
+            # Solo las tarjetas del microciclo (la pestaña del coach tiene sus propios botones)
+            boton = next((b for b in s.at.button if (b.key or "").startswith(f"reg_ej_{dia}_")), None)
+            if boton is None:
+                break
+            s.rerun("registrar serie", boton.click)
+            registradas += 1
+
+
+def escenario_plan(s, rnd, args):
+    """Plan de 7 días con una despensa grande: generarlo y moverse por Nutrición"""
+    from benchmarks.bench_despensa import despensa_sintetica
+    s.rerun("arranque")
+    s.at.session_state["despensa"] = despensa_sintetica(args.items, rnd)
+    s.ir_a("🥗 Nutrición Pro")
+    s.pulsar("generar plan", "GENERAR PLAN SEMANAL")
+    s.esperar("esperando plan", "plan_estructurado")
+    for _ in range(3):
+        s.rerun("rerun con plan")
+
+
+def escenario_peso(s, rnd, args):
+    """Progreso con 5 años de pesajes diarios: primera carga, nuevo registro y reruns en caliente"""
+    s.rerun("arranque")
+    s.at.session_state["historial_biometrico"] = historial_peso(5, rnd)
+    s.ir_a("🩸 Progreso")
+    s.pulsar("guardar peso", "Guardar Registro")
+    for _ in range(3):
+        s.rerun("rerun con historial")
+
+
+def escenario_boveda(s, rnd, args):
+    """Restaurar una Bóveda completa y recorrer las pantallas que la usan"""
+    s.rerun("arranque")
+    s.importar_boveda("importar bóveda", rnd, args.items)
+    if len(s.at.session_state["despensa"]) != args.items:
+        raise RuntimeError("importar bóveda: la despensa no se ha restaurado")
+    for pantalla in ("🥗 Nutrición Pro", "🏋️‍♂️ Entrenador IA", "🩸 Progreso", "🏠 Inicio"):
+        s.ir_a(pantalla)
+
+
+ESCENARIOS = {
+    "microciclo": escenario_microciclo,
+    "plan": escenario_plan,
+    "peso": escenario_peso,
+    "boveda": escenario_boveda,
+}
+
+
+def entorno_aislado(carpeta, args):
+    """Todo lo que la app escribe, a una carpeta temporal; la IA, simulada"""
+    os.environ.update({
+        "FITCHEF_BACKEND_IA": "stub",
+        "FITCHEF_IA_SIMULADA_MS": str(args.latencia_ms),
+        "FITCHEF_ALMACEN_RUTA": os.path.join(carpeta, "usuarios.sqlite"),
+        "FITCHEF_CACHE_IA": os.path.join(carpeta, "cache_ia.sqlite"),
+        "FITCHEF_PRODUCTOS_RUTA": os.path.join(carpeta, "productos.idx"),
+        "FITCHEF_ALIMENTOS_RUTA": os.path.join(carpeta, "alimentos.sqlite"),
+        "FITCHEF_TELEMETRIA": "0",
+        "FITCHEF_LOG": "WARNING",
+    })
+    os.environ.pop("FITCHEF_PERFIL", None)
+
+
+def correr(nombre, args):
+    """Una pasada del escenario en limpio → [(paso, ms, pico_mb)]"""
+    import streamlit as st
+    with tempfile.TemporaryDirectory(prefix="fitchef-bench-") as carpeta:
+        entorno_aislado(carpeta, args)
+        st.cache_resource.clear()  # Nada de la pasada anterior (almacén, caché IA...) puede valer aquí
+        st.cache_data.clear()
+        s = Sesion(memoria=not args.sin_memoria)
+        ESCENARIOS[nombre](s, random.Random(args.semilla), args)
+        return s.reruns
+
+
+def calentar(args):
+    """Una vuelta sin medir por todas las pantallas, con datos (si no, las gráficas no se pintan):
+    los imports y la primera carga de cada librería solo se pagan una vez por proceso"""
+    import streamlit as st
+    with tempfile.TemporaryDirectory(prefix="fitchef-bench-") as carpeta:
+        entorno_aislado(carpeta, args)
+        s = Sesion(memoria=False)
+        s.rerun("calentar")
+        s.importar_boveda("calentar", random.Random(args.semilla), 20)
+        for pantalla in s.at.radio(key="nav_principal").options:
+            s.ir_a(pantalla)
+        st.cache_resource.clear()
+
+
+def resumir(pasadas):
+    """Pasadas de un escenario → por paso (en orden): reruns, mediana de ms y de pico"""
+    pasos = {}
+    for reruns in pasadas:
+        por_paso = {}
+        for paso, ms, pico in reruns:
+            acumulado = por_paso.setdefault(paso, [0, 0.0, 0.0])
+            acumulado[0] += 1
+            acumulado[1] += ms
+            acumulado[2] = max(acumulado[2], pico or 0.0)
+        for paso, valores in por_paso.items():
+            pasos.setdefault(paso, []).append(valores)
+    filas = [{"paso": paso, "reruns": round(statistics.median(v[0] for v in vs)),
+              "ms": statistics.median(v[1] for v in vs), "pico_mb": statistics.median(v[2] for v in vs)}
+             for paso, vs in pasos.items()]
+    totales = [sum(ms for _, ms, _ in reruns) for reruns in pasadas]
+    return {"pasos": filas, "total_ms": statistics.median(totales),
+            "pico_mb": max(f["pico_mb"] for f in filas) if filas else 0.0}
+
+
+def comparar(resultados, base, umbral):
+    """Imprime la diferencia con la línea base y dice si algo empeoró más de 'umbral'"""
+    peor = False
+    print(f"\nContra {os.path.relpath(LINEA_BASE, RAIZ)} ({base['meta']['fecha']}):")
+    for nombre, r in resultados.items():
+        anterior = base["escenarios"].get(nombre)
+        if not anterior:
+            print(f"  {nombre:<12} (sin línea base)")
+            continue
+        cambios = []
+        for medida in ("total_ms", "pico_mb"):
+            if anterior[medida]:
+                cambio = r[medida] / anterior[medida] - 1
+                peor |= cambio > umbral
+                cambios.append(f"{medida} {cambio:+.0%}{' ⚠️' if cambio > umbral else ''}")
+        print(f"  {nombre:<12} " + " · ".join(cambios))
+    return peor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--escenarios", default=",".join(ESCENARIOS))
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--latencia-ms", type=float, default=0, help="latencia de cada llamada a la IA simulada")
+    parser.add_argument("--items", type=int, default=500, help="tamaño de la despensa sintética")
+    parser.add_argument("--series-max", type=int, default=200)
+    parser.add_argument("--semilla", type=int, default=7)
+    parser.add_argument("--sin-memoria", action="store_true", help="sin tracemalloc (tiempos más limpios)")
+    parser.add_argument("--guardar", action="store_true", help=f"escribe {os.path.basename(LINEA_BASE)}")
+    parser.add_argument("--comparar", action="store_true", help="compara con la línea base (sale con 1 si empeora)")
+    parser.add_argument("--umbral", type=float, default=0.25)
+    args = parser.parse_args()
+
+    sys.path.insert(0, RAIZ)
+    logging.disable(logging.WARNING)  # Avisos de AppTest (sin runtime) y deprecaciones: aquí solo son ruido
+    calentar(args)
+    if not args.sin_memoria:
+        tracemalloc.start()
+    resultados = {}
+    for nombre in args.escenarios.split(","):
+        resultados[nombre] = r = resumir([correr(nombre, args) for _ in range(args.repeticiones)])
+        print(f"{nombre}: {r['total_ms']:.0f} ms en total · pico {r['pico_mb']:.1f} MB")
+        for f in r["pasos"]:
+            print(f"  {f['paso']:<24} {f['reruns']:>3} reruns {f['ms']:9.1f} ms  pico {f['pico_mb']:6.1f} MB")
+    print(f"RSS máximo del proceso: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+
+    import streamlit
+    informe = {
+        "meta": {"fecha": datetime.datetime.now().isoformat(timespec="seconds"), "python": platform.python_version(),
+                 "streamlit": streamlit.__version__, "latencia_ms": args.latencia_ms, "items": args.items,
+                 "repeticiones": args.repeticiones, "memoria": not args.sin_memoria},
+        "escenarios": resultados,
+    }
+    peor = False
+    if args.comparar and os.path.exists(LINEA_BASE):
+        with open(LINEA_BASE, encoding="utf-8") as f:
+            peor = comparar(resultados, json.load(f), args.umbral)
+    if args.guardar:
+        with open(LINEA_BASE, "w", encoding="utf-8") as f:
+            json.dump(informe, f, ensure_ascii=False, indent=2)
+        print(f"Línea base guardada en {os.path.relpath(LINEA_BASE, RAIZ)}")
+    sys.exit(1 if peor else 0)
+
+
+if __name__ == "__main__":
+    main()
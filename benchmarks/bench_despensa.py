@@ -0,0 +1,81 @@
+"""Coste del cruce despensa ↔ plan: escaneo por subcadenas (antiguo) vs IndiceDespensa.
+
+Uso: python -m benchmarks.bench_despensa [--items 500] [--comidas 35] [--repeticiones 20]
+"""
+import argparse
+import random
+import time
+
+from fitchef.despensa import IndiceDespensa
+
+BASES = ["pollo", "pavo", "ternera", "cerdo", "salmón", "atún", "merluza", "bacalao", "gambas", "huevos",
+         "arroz", "pasta", "quinoa", "avena", "patata", "boniato", "pan integral", "lentejas", "garbanzos",
+         "alubias", "tofu", "tempeh", "yogur griego", "queso fresco", "leche", "kéfir", "aguacate", "nueces",
+         "almendras", "aceite de oliva", "espinacas", "brócoli", "calabacín", "pimiento", "cebolla", "ajo",
+         "tomate", "zanahoria", "champiñones", "plátano", "manzana", "fresas", "arándanos", "limón", "naranja"]
+APELLIDOS = ["", "ecológico", "integral", "congelado", "de corral", "en conserva", "light", "bio", "casero"]
+CANTIDADES = ["", "150 g de ", "2 ", "1 cucharada de ", "un puñado de ", "200 ml de ", "1 lata de "]
+
+
+def despensa_sintetica(n, rnd):
+    return [f"{rnd.choice(BASES)} {rnd.choice(APELLIDOS)}".strip() + (f" {i}" if i >= len(BASES) * 3 else "")
+            for i in range(n)]
+
+
+def semana_sintetica(comidas, rnd, ingredientes_por_comida=6):
+    return [[f"{rnd.choice(CANTIDADES)}{rnd.choice(BASES + ['sal', 'pimienta', 'comino', 'cúrcuma'])}"
+             for _ in range(ingredientes_por_comida)] for _ in range(comidas)]
+
+
+def escaneo_antiguo(despensa, semana):
+    """Lo que hacía app.py en cada rerun: faltantes + ✅/❌ por ingrediente"""
+    ingredientes = [i.lower() for comida in semana for i in comida]
+    faltantes = [i for i in ingredientes if not any(d in i or i in d for d in despensa)]
+    marcas = [any(d in i or i in d for d in despensa) for i in ingredientes]
+    return faltantes, marcas
+
+
+def escaneo_indice(despensa, semana, indice=None):
+    indice = indice or IndiceDespensa(despensa)
+    ingredientes = [i.lower() for comida in semana for i in comida]
+    return indice.faltantes(ingredientes), [indice.tiene(i) for i in ingredientes]
+
+
+def cronometrar(fn, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        fn()
+        tiempos.append(time.perf_counter() - t0)
+    tiempos.sort()
+    return tiempos[len(tiempos) // 2] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=500)
+    parser.add_argument("--comidas", type=int, default=35)
+    parser.add_argument("--repeticiones", type=int, default=20)
+    parser.add_argument("--semilla", type=int, default=7)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.semilla)
+    despensa = [d.lower() for d in despensa_sintetica(args.items, rnd)]
+    semana = semana_sintetica(args.comidas, rnd)
+    n_ing = sum(len(c) for c in semana)
+    indice = IndiceDespensa(despensa)
+
+    filas = [
+        ("subcadenas (antiguo)", cronometrar(lambda: escaneo_antiguo(despensa, semana), args.repeticiones)),
+        ("índice: construir", cronometrar(lambda: IndiceDespensa(despensa), args.repeticiones)),
+        ("índice: construir + cruzar", cronometrar(lambda: escaneo_indice(despensa, semana), args.repeticiones)),
+        # En la app el índice vive en la sesión: en un rerun sin cambios de despensa solo se consulta
+        ("índice ya hecho (rerun)", cronometrar(lambda: escaneo_indice(despensa, semana, indice), args.repeticiones)),
+    ]
+    print(f"Despensa: {args.items} items | Semana: {args.comidas} comidas, {n_ing} ingredientes")
+    for nombre, ms in filas:
+        print(f"  {nombre:<28} {ms:9.3f} ms (mediana de {args.repeticiones})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,569 @@
+"""Carga con muchos usuarios a la vez contra un servidor Streamlit de verdad (IA simulada).
+
+Levanta `streamlit run app.py` con la IA simulada (latencia log-normal, como la API: casi todas
+parecidas y alguna muy lenta) y todo lo que la app escribe en una carpeta temporal. Luego le abre
+sesiones WebSocket como las del navegador (/_stcore/stream, BackMsg/ForwardMsg en protobuf): cada
+usuario virtual tiene su ?u=, guarda el valor de sus widgets, lanza los reruns automáticos de los
+fragmentos (el vigilante de trabajos) y repite flujos reales con pausas de persona: check-in,
+plan semanal y registrar series del microciclo.
+
+Sube por escalones (--usuarios 1,5,10,20): en cada uno añade sesiones hasta N (las anteriores
+siguen abiertas) y durante --duracion segundos mide el throughput, los percentiles de latencia de
+cada interacción (de mandar el clic a que el script termina), el RSS y los hilos del servidor y,
+de su telemetría, las llamadas a la IA en vuelo (cola del planificador incluida).
+
+Necesita las dependencias de benchmarks/requirements.txt (websockets, además de las de la app).
+
+Uso: python -m benchmarks.carga_app [--usuarios 1,5,10,20] [--duracion 60] [--latencia-ms 6000]
+                                    [--sigma 0.5] [--pensar-s 3] [--mezcla checkin=4,series=5,plan=1]
+                                    [--cache] [--entorno FITCHEF_IA_RPM=600] [--salida carga.json]
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import numpy as np
+
+from fitchef.telemetria import leer_jsonl
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(RAIZ, "app.py")
+ESPERA_MAX_S = 180  # Lo más que se espera a un rerun o a un trabajo en segundo plano
+MUESTREO_S = 0.5  # Cada cuánto se mira el RSS y los hilos del servidor
+
+# Tipo de elemento → campo de WidgetState con el que el navegador manda su valor
+WIDGETS = {
+    "button": "trigger_value",
+    "radio": "string_value",
+    "selectbox": "string_value",
+    "number_input": "double_value",
+    "slider": "double_array_value",
+    "checkbox": "bool_value",
+}
+
+
+# ==========================================
+# EL SERVIDOR
+# ==========================================
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def entorno_servidor(carpeta, args):
+    """Como el del bench de reruns, pero con telemetría (para ver la IA en vuelo) y latencia realista"""
+    entorno = {
+        **os.environ,
+        "FITCHEF_BACKEND_IA": "stub",
+        "FITCHEF_IA_SIMULADA_MS": str(args.latencia_ms),
+        "FITCHEF_IA_SIMULADA_TTFT_MS": str(args.ttft_ms),
+        "FITCHEF_IA_SIMULADA_VARIACION": str(args.sigma),
+        "FITCHEF_IA_SIMULADA_REPARTO": "lognormal",
+        "FITCHEF_ALMACEN_RUTA": os.path.join(carpeta, "usuarios.sqlite"),
+        "FITCHEF_CACHE_IA": os.path.join(carpeta, "cache_ia.sqlite"),
+        "FITCHEF_PRODUCTOS_RUTA": os.path.join(carpeta, "productos.idx"),
+        "FITCHEF_ALIMENTOS_RUTA": os.path.join(carpeta, "alimentos.sqlite"),
+        "FITCHEF_TELEMETRIA_RUTA": os.path.join(carpeta, "telemetria.jsonl"),
+        "FITCHEF_TELEMETRIA_MB": "1024",  # Sin rotar: se lee entero al final
+        "FITCHEF_LOG": "WARNING",
+    }
+    if not args.cache:
+        # Todos los usuarios virtuales tienen el mismo perfil: con caché, solo el primero llamaría a la IA
+        entorno["FITCHEF_CACHE_IA_TTL_H"] = "0"
+    for par in args.entorno:
+        clave, _, valor = par.partition("=")
+        entorno[clave] = valor
+    for clave in ("FITCHEF_PERFIL", "FITCHEF_CASETE", "GEMINI_API_KEY"):
+        entorno.pop(clave, None)
+    return entorno
+
+
+def arrancar_servidor(carpeta, args):
+    """streamlit run app.py en un puerto libre → (proceso, url de la app)"""
+    puerto = puerto_libre()
+    salida = open(os.path.join(carpeta, "servidor.log"), "w", encoding="utf-8")
+    proceso = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", APP, "--server.headless=true", "--server.address=127.0.0.1",
+         f"--server.port={puerto}", "--server.fileWatcherType=none", "--browser.gatherUsageStats=false"],
+        cwd=RAIZ, env=entorno_servidor(carpeta, args), stdout=salida, stderr=subprocess.STDOUT)
+    url = f"http://127.0.0.1:{puerto}"
+    limite = time.time() + 60
+    while time.time() < limite:
+        if proceso.poll() is not None:
+            break
+        try:
+            with urllib.request.urlopen(f"{url}/_stcore/health", timeout=1) as r:
+                if r.status == 200:
+                    return proceso, url
+        except OSError:
+            time.sleep(0.2)
+    proceso.kill()
+    with open(salida.name, encoding="utf-8") as f:
+        raise RuntimeError(f"El servidor no arrancó:\n{f.read()[-2000:]}")
+
+
+def leer_proceso(pid):
+    """(RSS en MB, hilos) del proceso, de /proc (None, None fuera de Linux)"""
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as f:
+            campos = dict(linea.split(":", 1) for linea in f if ":" in linea)
+    except OSError:
+        return None, None
+    return int(campos["VmRSS"].split()[0]) / 1024, int(campos["Threads"])
+
+
+async def vigilar_servidor(pid, muestras):
+    while True:
+        rss, hilos = leer_proceso(pid)
+        if rss is not None:
+            muestras.append((time.time(), rss, hilos))
+        await asyncio.sleep(MUESTREO_S)
+
+
+# ==========================================
+# UN USUARIO VIRTUAL (una pestaña del navegador)
+# ==========================================
+class Widget:
+    """Lo que hace falta para tocar un widget: su id, etiqueta, opciones y el fragmento en el que vive"""
+
+    def __init__(self, tipo, proto, fragmento):
+        self.tipo = tipo
+        self.id = proto.id
+        self.etiqueta = proto.label
+        self.opciones = list(proto.options) if tipo in ("radio", "selectbox") else []
+        self.fragmento = fragmento
+        clave = proto.id.split("-", 2)[-1]  # $$ID-<hash>-<key> (mismo formato que usa Streamlit)
+        self.clave = None if clave == "None" else clave
+
+
+class UsuarioVirtual:
+    """Sesión WebSocket con lo mínimo que hace el frontend: reenviar el valor de los widgets
+    tocados en cada rerun, quitar los que desaparecen y disparar los fragmentos con run_every"""
+
+    def __init__(self, n, url, rnd, medidas):
+        self.n = n
+        self.url = url.replace("http", "ws", 1) + "/_stcore/stream"
+        self.rnd = rnd
+        self.medidas = medidas  # Compartida por todos: (interacción, fin, ms, ok)
+        self.query = f"u=carga{n:04d}"
+        self.pantalla = None
+        self.widgets = {}  # id → Widget que hay ahora en pantalla
+        self.valores = {}  # id → WidgetState que este usuario ha cambiado (el navegador los manda siempre)
+        self.auto = {}  # fragment_id → segundos (st.fragment(run_every=...))
+        self.proximo_sondeo = None  # Cuándo toca el siguiente rerun automático (reloj de perf_counter)
+        self.completos = 0  # Reruns completos (sin fragmento) que ha hecho el servidor
+        self.errores = 0  # Excepciones que ha pintado la app
+        self.bytes = 0
+        self.ws = None
+        self._escucha = None
+        self._terminado = asyncio.Event()
+        self._fragmentos, self._nuevos, self._nuevos_auto = [], {}, {}
+
+    # --- Conexión ---
+    async def conectar(self):
+        from websockets.asyncio.client import connect
+        self.ws = await connect(self.url, subprotocols=["streamlit"], max_size=None, open_timeout=30)
+        self._escucha = asyncio.create_task(self._escuchar())
+        await self.medir("abrir sesión", self._rerun())
+        self.pantalla = next((w.opciones[0] for w in self.widgets.values() if w.clave == "nav_principal"), None)
+
+    async def cerrar(self):
+        if self._escucha:
+            self._escucha.cancel()
+        if self.ws:
+            await self.ws.close()
+
+    async def _escuchar(self):
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+        async for datos in self.ws:
+            self.bytes += len(datos)
+            msg = ForwardMsg()
+            msg.ParseFromString(datos)
+            tipo = msg.WhichOneof("type")
+            if tipo == "new_session":  # Empieza un rerun (completo o de fragmentos)
+                self._fragmentos = list(msg.new_session.fragment_ids_this_run)
+                self._nuevos, self._nuevos_auto = {}, {}
+                self.completos += not self._fragmentos
+            elif tipo == "delta" and msg.delta.WhichOneof("type") == "new_element":
+                self._elemento(msg.delta.new_element, msg.delta.fragment_id)
+            elif tipo == "auto_rerun":
+                self._nuevos_auto[msg.auto_rerun.fragment_id] = msg.auto_rerun.interval
+            elif tipo == "stop_auto_rerun":
+                for fragmento in msg.stop_auto_rerun.fragment_ids:
+                    self.auto.pop(fragmento, None)
+            elif tipo == "script_finished":
+                self._fin_rerun(msg.script_finished)
+
+    def _elemento(self, elemento, fragmento):
+        tipo = elemento.WhichOneof("type")
+        if tipo == "exception":
+            self.errores += 1
+        elif tipo in WIDGETS:
+            proto = getattr(elemento, tipo)
+            widget = Widget(tipo, proto, fragmento)
+            self._nuevos[widget.id] = widget
+            if getattr(proto, "set_value", False):
+                # La app ha cambiado el valor por código (p. ej. cambiar_pestana): manda el servidor
+                self.valores.pop(widget.id, None)
+                if widget.clave == "nav_principal":
+                    self.pantalla = None
+
+    def _fin_rerun(self, estado):
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+        if estado == ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+            return  # st.rerun(): detrás viene otro rerun, el que cuenta
+        if self._fragmentos:
+            self.widgets = {i: w for i, w in self.widgets.items() if w.fragmento not in self._fragmentos}
+            self.widgets.update(self._nuevos)
+            self.auto.update(self._nuevos_auto)
+        else:
+            self.widgets, self.auto = self._nuevos, self._nuevos_auto
+        self.valores = {i: v for i, v in self.valores.items() if i in self.widgets}
+        if not self.auto:
+            self.proximo_sondeo = None
+        elif self.proximo_sondeo is None:
+            self.proximo_sondeo = time.perf_counter() + min(self.auto.values())
+        self._terminado.set()
+
+    async def _rerun(self, fragmento="", auto=False, disparo=None):
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        msg = BackMsg()
+        estado = msg.rerun_script
+        estado.query_string = self.query
+        estado.fragment_id = fragmento
+        estado.is_auto_rerun = auto
+        estado.widget_states.widgets.extend(self.valores.values())
+        if disparo is not None:
+            estado.widget_states.widgets.append(disparo)
+        self._terminado.clear()
+        await self.ws.send(msg.SerializeToString())
+        await asyncio.wait_for(self._terminado.wait(), ESPERA_MAX_S)
+
+    # --- Lo que hace la persona ---
+    async def medir(self, interaccion, rerun):
+        errores = self.errores
+        t0 = time.perf_counter()
+        try:
+            await rerun
+            ok = self.errores == errores
+        except asyncio.TimeoutError:
+            ok = False
+        self.medidas.append((interaccion, time.time(), (time.perf_counter() - t0) * 1000, ok))
+        return ok
+
+    def buscar(self, tipo, etiqueta=None, clave=None):
+        """El primer widget de ese tipo cuya etiqueta contenga 'etiqueta' o cuya key empiece por 'clave'"""
+        for w in self.widgets.values():
+            if w.tipo == tipo and (etiqueta is None or etiqueta in w.etiqueta) and \
+                    (clave is None or (w.clave or "").startswith(clave)):
+                return w
+        return None
+
+    async def tocar(self, interaccion, widget, valor=None):
+        """Pulsa el botón o cambia el valor del widget, y espera a que termine su rerun"""
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+        if widget is None:
+            self.medidas.append((interaccion, time.time(), 0.0, False))  # La pantalla no es la que esperaba
+            return False
+        estado = WidgetState(id=widget.id)
+        campo = WIDGETS[widget.tipo]
+        if campo == "trigger_value":
+            estado.trigger_value = True
+            return await self.medir(interaccion, self._rerun(widget.fragmento, disparo=estado))
+        if campo == "double_array_value":
+            estado.double_array_value.data.append(valor)
+        else:
+            setattr(estado, campo, valor)
+        self.valores[widget.id] = estado
+        return await self.medir(interaccion, self._rerun(widget.fragmento))
+
+    async def ir_a(self, pantalla):
+        if self.pantalla != pantalla:
+            await self.tocar("navegar", self.buscar("radio", clave="nav_principal"), pantalla)
+            self.pantalla = pantalla
+
+    async def pensar(self, segundos):
+        """Pausa de persona; mientras, los fragmentos con run_every se re-ejecutan solos, como en el navegador"""
+        fin = time.perf_counter() + segundos
+        while time.perf_counter() < fin:
+            if self.proximo_sondeo is None or self.proximo_sondeo > fin:
+                await asyncio.sleep(fin - time.perf_counter())
+                return
+            await asyncio.sleep(max(0.0, self.proximo_sondeo - time.perf_counter()))
+            self.proximo_sondeo = time.perf_counter() + min(self.auto.values())
+            for fragmento in list(self.auto):
+                await self.medir("sondeo de trabajos", self._rerun(fragmento, auto=True))
+
+    async def esperar_trabajo(self, interaccion, t0):
+        """Del clic hasta que el vigilante recoge el trabajo y pide el rerun completo que lo pinta"""
+        completos = self.completos
+        while self.completos == completos:
+            if not self.auto or time.perf_counter() - t0 > ESPERA_MAX_S:
+                self.medidas.append((interaccion, time.time(), (time.perf_counter() - t0) * 1000, False))
+                return False
+            await self.pensar(min(self.auto.values()))
+        self.medidas.append((interaccion, time.time(), (time.perf_counter() - t0) * 1000, True))
+        return True
+
+    def pausa(self, args):
+        return self.rnd.uniform(0.5, 1.5) * args.pensar_s
+
+
+# ==========================================
+# FLUJOS
+# ==========================================
+async def flujo_checkin(u, args):
+    """Check-in del día: sueño, agujetas y calibrar (si ya estaba hecho, primero se resetea: día nuevo)"""
+    await u.ir_a("🏠 Inicio")
+    resetear = u.buscar("button", "Resetear Check-in")
+    if resetear:
+        await u.tocar("check-in: resetear", resetear)
+    await u.pensar(u.pausa(args))
+    await u.tocar("check-in: campo", u.buscar("number_input", "Horas de sueño"), u.rnd.choice([5.5, 6.0, 7.0, 7.5, 8.0]))
+    await u.pensar(u.pausa(args))
+    await u.tocar("check-in: campo", u.buscar("slider", "Agujetas"), float(u.rnd.randint(1, 8)))
+    await u.pensar(u.pausa(args))
+    await u.tocar("check-in: calibrar", u.buscar("button", "Calibrar mi día"))
+
+
+async def flujo_plan(u, args):
+    """Generar el plan semanal (7 llamadas a la IA en segundo plano) y esperar a verlo"""
+    await u.ir_a("🥗 Nutrición Pro")
+    await u.pensar(u.pausa(args))
+    t0 = time.perf_counter()
+    if await u.tocar("plan: pedir", u.buscar("button", "GENERAR PLAN SEMANAL")):
+        await u.esperar_trabajo("plan: listo", t0)
+
+
+async def flujo_series(u, args):
+    """Entrenar: el microciclo (si aún no lo tiene), elegir sesión y registrar series con su peso.
+    Cada serie baja el SNC 3 puntos y por debajo de 40 la app ya no deja registrar (~20 series)"""
+    await u.ir_a("🏋️‍♂️ Entrenador IA")
+    if u.buscar("selectbox", clave="dia_microciclo") is None:
+        t0 = time.perf_counter()
+        if not await u.tocar("microciclo: pedir", u.buscar("button", "GENERAR MICROCICLO")):
+            return
+        if not await u.esperar_trabajo("microciclo: listo", t0):
+            return
+    sesiones = u.buscar("selectbox", clave="dia_microciclo")
+    if sesiones is None:
+        return
+    dia = u.rnd.choice(sesiones.opciones)
+    await u.tocar("series: cambiar sesión", sesiones, dia)
+    ejercicio = None
+    for _ in range(args.series):
+        # Series seguidas del mismo ejercicio; cuando lo termina (o no tiene), el siguiente
+        registrar = (ejercicio and u.buscar("button", clave=ejercicio)) or u.buscar("button", clave=f"reg_ej_{dia}_")
+        if registrar is None:
+            return  # SNC crítico o sesión sin ejercicios
+        ejercicio = registrar.clave
+        await u.pensar(u.pausa(args))
+        peso = u.buscar("number_input", clave="w_" + registrar.clave[len("reg_"):])
+        if peso is not None:
+            await u.tocar("series: peso", peso, u.rnd.randrange(8, 48) * 2.5)
+        await u.tocar("series: registrar", u.buscar("button", clave=registrar.clave))
+
+
+FLUJOS = {
+    "checkin": flujo_checkin,
+    "plan": flujo_plan,
+    "series": flujo_series,
+}
+
+
+async def usuario(u, args, mezcla):
+    """Bucle de un usuario virtual hasta que lo cancelen"""
+    flujos, pesos = zip(*mezcla.items())
+    try:
+        await u.conectar()
+        while True:
+            await FLUJOS[u.rnd.choices(flujos, pesos)[0]](u, args)
+            await u.pensar(u.pausa(args))
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:  # Conexión cortada, servidor caído...: cuenta como fallo y el usuario se va
+        u.medidas.append((f"desconexión ({type(e).__name__})", time.time(), 0.0, False))
+    finally:
+        await u.cerrar()
+
+
+# ==========================================
+# ESCALONES Y RESUMEN
+# ==========================================
+async def calentar(url, args):
+    """Una sesión sin medir por todos los flujos: imports y primeras cargas se pagan aquí, no en el escalón 1"""
+    u = UsuarioVirtual(-1, url, random.Random(args.semilla), [])
+    await u.conectar()
+    for flujo in FLUJOS.values():
+        await flujo(u, argparse.Namespace(**{**vars(args), "pensar_s": 0}))
+    await u.cerrar()
+
+
+async def escalonar(url, pid, args, mezcla):
+    """Sube de escalón en escalón → (escalones, medidas, muestras del servidor, RSS en reposo, usuarios)"""
+    medidas, muestras, tareas, usuarios, escalones = [], [], [], [], []
+    monitor = asyncio.create_task(vigilar_servidor(pid, muestras)) if pid else None
+    await asyncio.sleep(MUESTREO_S * 2)
+    rss_base = leer_proceso(pid)[0] if pid else None
+    try:
+        for n in args.usuarios:
+            nuevos = n - len(usuarios)
+            for _ in range(max(0, nuevos)):
+                u = UsuarioVirtual(len(usuarios), url, random.Random(args.semilla * 1000 + len(usuarios)), medidas)
+                usuarios.append(u)
+                tareas.append(asyncio.create_task(usuario(u, args, mezcla)))
+                await asyncio.sleep(args.rampa_s / nuevos)  # Entradas repartidas, no todas a la vez
+            t0 = time.time()
+            await asyncio.sleep(args.duracion)
+            escalones.append({"usuarios": n, "t0": t0, "t1": time.time()})
+            print(f"  escalón de {n} usuarios terminado", file=sys.stderr)
+    finally:
+        for tarea in tareas:
+            tarea.cancel()
+        await asyncio.gather(*tareas, return_exceptions=True)
+        if monitor:
+            monitor.cancel()
+    return escalones, medidas, muestras, rss_base, usuarios
+
+
+def percentiles(valores):
+    p50, p95, p99 = np.percentile(valores, (50, 95, 99)) if valores else (None, None, None)
+    return {"p50_ms": p50, "p95_ms": p95, "p99_ms": p99}
+
+
+def llamadas_ia(ruta):
+    """Registros de la telemetría del servidor (se vuelca entera al pararlo)"""
+    if not ruta or not os.path.exists(ruta):
+        return []
+    return leer_jsonl(ruta)
+
+
+def en_vuelo_max(llamadas):
+    """Máximo de llamadas a la IA a la vez (cola del planificador incluida): barrido de inicios y fines"""
+    eventos = sorted([(r["ts"] - r["latencia_s"], 1) for r in llamadas] + [(r["ts"], -1) for r in llamadas])
+    actual = maximo = 0
+    for _, paso in eventos:
+        actual += paso
+        maximo = max(maximo, actual)
+    return maximo
+
+
+def resumir(escalones, medidas, muestras, rss_base, llamadas):
+    """Por escalón: throughput, percentiles por interacción, servidor (RSS, hilos) e IA"""
+    informe, anterior = [], None
+    for e in escalones:
+        dentro = [m for m in medidas if e["t0"] <= m[1] < e["t1"]]
+        segundos = e["t1"] - e["t0"]
+        interacciones = {}
+        for nombre, _, ms, ok in dentro:
+            interacciones.setdefault(nombre, []).append((ms, ok))
+        servidor = [s for s in muestras if e["t0"] <= s[0] < e["t1"]]
+        rss = servidor[-1][1] if servidor else None
+        ia = [r for r in llamadas if e["t0"] <= r["ts"] < e["t1"]]
+        fila = {
+            "usuarios": e["usuarios"], "segundos": segundos,
+            "interacciones_s": sum(1 for m in dentro if m[3]) / segundos,
+            "fallos": sum(1 for m in dentro if not m[3]),
+            "interacciones": {nombre: {"n": len(vs), "ok": sum(ok for _, ok in vs) / len(vs),
+                                       **percentiles([ms for ms, ok in vs if ok])}
+                              for nombre, vs in sorted(interacciones.items())},
+            "rss_mb": rss,
+            "rss_max_mb": max(s[1] for s in servidor) if servidor else None,
+            "mb_por_sesion": (rss - rss_base) / e["usuarios"] if rss is not None and rss_base else None,
+            "mb_por_sesion_nueva": ((rss - anterior["rss_mb"]) / (e["usuarios"] - anterior["usuarios"])
+                                    if anterior and rss is not None and anterior["rss_mb"] is not None
+                                    and e["usuarios"] > anterior["usuarios"] else None),
+            "hilos_max": max(s[2] for s in servidor) if servidor else None,
+            "ia": {"llamadas": len(ia), "en_vuelo_max": en_vuelo_max(ia),
+                   **percentiles([r["latencia_s"] * 1000 for r in ia if r["desenlace"] == "ok"])},
+        }
+        informe.append(fila)
+        anterior = fila
+    return informe
+
+
+def imprimir(informe, rss_base):
+    def ms(v):
+        return f"{v:9.0f}" if v is not None else f"{'—':>9}"
+    if rss_base:
+        print(f"RSS del servidor en reposo (tras calentar): {rss_base:.0f} MB")
+    for f in informe:
+        por_sesion = f" (+{f['mb_por_sesion']:.1f} MB/sesión" + (
+            f", +{f['mb_por_sesion_nueva']:.1f} las nuevas)" if f["mb_por_sesion_nueva"] is not None else ")") \
+            if f["mb_por_sesion"] is not None else ""
+        print(f"\n== {f['usuarios']} usuarios · {f['interacciones_s']:.2f} interacciones/s · {f['fallos']} fallos")
+        if f["rss_mb"] is not None:
+            print(f"   servidor: RSS {f['rss_mb']:.0f} MB{por_sesion} · {f['hilos_max']} hilos")
+        ia = f["ia"]
+        print(f"   IA: {ia['llamadas']} llamadas · {ia['en_vuelo_max']} en vuelo como mucho · "
+              f"p50 {ms(ia['p50_ms']).strip()} ms · p95 {ms(ia['p95_ms']).strip()} ms")
+        print(f"   {'interacción':<26} {'n':>5} {'ok':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        for nombre, r in f["interacciones"].items():
+            print(f"   {nombre:<26} {r['n']:>5} {r['ok']:>5.0%} {ms(r['p50_ms'])} {ms(r['p95_ms'])} {ms(r['p99_ms'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--usuarios", default="1,5,10,20", help="escalones de sesiones simultáneas")
+    parser.add_argument("--duracion", type=float, default=60, help="segundos medidos en cada escalón")
+    parser.add_argument("--rampa-s", type=float, default=5, help="en cuánto se reparten las entradas de un escalón")
+    parser.add_argument("--latencia-ms", type=float, default=6000, help="latencia media de una llamada a la IA")
+    parser.add_argument("--ttft-ms", type=float, default=1500, help="hasta el primer trozo en streaming")
+    parser.add_argument("--sigma", type=float, default=0.5, help="sigma del log-normal de la latencia")
+    parser.add_argument("--pensar-s", type=float, default=3, help="pausa media de la persona entre acciones")
+    parser.add_argument("--mezcla", default="checkin=4,series=5,plan=1", help="peso de cada flujo")
+    parser.add_argument("--series", type=int, default=3, help="series registradas por visita al entreno")
+    parser.add_argument("--cache", action="store_true", help="deja la caché de respuestas de la IA encendida")
+    parser.add_argument("--entorno", action="append", default=[], help="CLAVE=VALOR extra para el servidor")
+    parser.add_argument("--url", help="servidor ya levantado (entonces no se arranca uno; --pid para su RSS)")
+    parser.add_argument("--pid", type=int)
+    parser.add_argument("--semilla", type=int, default=7)
+    parser.add_argument("--salida", help="guarda el informe en JSON")
+    args = parser.parse_args()
+    args.usuarios = [int(n) for n in args.usuarios.split(",")]
+    mezcla = {k: float(v) for k, v in (par.split("=") for par in args.mezcla.split(","))}
+    if set(mezcla) - set(FLUJOS):
+        parser.error(f"flujos desconocidos: {', '.join(set(mezcla) - set(FLUJOS))} (vale: {', '.join(FLUJOS)})")
+
+    sys.path.insert(0, RAIZ)
+    with tempfile.TemporaryDirectory(prefix="fitchef-carga-") as carpeta:
+        proceso = None
+        url, pid = args.url, args.pid
+        if not url:
+            proceso, url = arrancar_servidor(carpeta, args)
+            pid = proceso.pid
+        try:
+            asyncio.run(calentar(url, args))
+            escalones, medidas, muestras, rss_base, usuarios = asyncio.run(escalonar(url, pid, args, mezcla))
+        finally:
+            if proceso:
+                proceso.terminate()  # Al salir, la telemetría vuelca lo que le quedaba
+                proceso.wait(30)
+        llamadas = llamadas_ia(os.path.join(carpeta, "telemetria.jsonl") if proceso else None)
+        informe = resumir(escalones, medidas, muestras, rss_base, llamadas)
+
+    imprimir(informe, rss_base)
+    print(f"\nRecibido por WebSocket: {sum(u.bytes for u in usuarios) / 2**20:.1f} MB en {len(usuarios)} sesiones")
+    if args.salida:
+        import streamlit
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump({"meta": {"fecha": datetime.datetime.now().isoformat(timespec="seconds"),
+                                "python": platform.python_version(), "streamlit": streamlit.__version__,
+                                **{k: v for k, v in vars(args).items() if k not in ("salida", "pid", "url")}},
+                       "rss_base_mb": rss_base, "escalones": informe}, f, ensure_ascii=False, indent=2)
+        print(f"Informe guardado en {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
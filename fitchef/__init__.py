@@ -0,0 +1 @@
+"""Motor interno de FitChef AI (todo lo que no es pantalla vive aquí)."""
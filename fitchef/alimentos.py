@@ -0,0 +1,241 @@
+"""Tabla de composición de alimentos en local: macros de "150 g de pollo" sin preguntar a la IA.
+
+Los datos vienen de datos/alimentos.csv (por 100 g, valores de referencia tipo BEDCA) y se
+vuelcan a SQLite con un índice de trigramas para buscar nombres aproximados en español.
+"""
+import csv
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+
+from fitchef.despensa import quitar_tildes, singular
+
+log = logging.getLogger("fitchef.alimentos")
+
+CSV_INCLUIDO = os.path.join(os.path.dirname(__file__), "datos", "alimentos.csv")
+MACROS = ("kcal", "prot", "cho", "fat")
+UMBRAL = 0.5  # Parecido mínimo para dar un alimento por bueno
+
+# ==========================================
+# 1. CANTIDADES ("150 g de pollo", "2 huevos", "media taza de avena")
+# ==========================================
+NUMEROS = {"un": 1, "una": 1, "uno": 1, "dos": 2, "tres": 3, "cuatro": 4, "cinco": 5, "seis": 6,
+           "siete": 7, "ocho": 8, "diez": 10, "doce": 12, "medio": 0.5, "media": 0.5, "cuarto": 0.25}
+# Gramos por unidad de medida (ml ≈ g; para aceites la diferencia no llega al 10 %)
+UNIDADES = {
+    "g": 1, "gr": 1, "grs": 1, "gramo": 1, "gramos": 1, "kg": 1000, "kilo": 1000, "kilos": 1000, "mg": 0.001,
+    "ml": 1, "cl": 10, "dl": 100, "l": 1000, "litro": 1000, "litros": 1000,
+    "cucharada": 15, "cucharadas": 15, "cda": 15, "cdas": 15, "cucharadita": 5, "cucharaditas": 5, "cdta": 5,
+    "taza": 240, "tazas": 240, "vaso": 200, "vasos": 200, "puñado": 30, "puñados": 30, "pizca": 1, "pizcas": 1,
+    "chorrito": 10, "chorro": 15, "lata": 120, "latas": 120, "loncha": 20, "lonchas": 20,
+    "rebanada": 30, "rebanadas": 30, "scoop": 30, "scoops": 30, "cacito": 30, "cacitos": 30,
+}
+# Cuentan como "unidades" del alimento (2 filetes de pollo = 2 × lo que pesa uno)
+PIEZAS = {"unidad", "unidades", "ud", "uds", "pieza", "piezas", "filete", "filetes", "diente", "dientes"}
+
+_NUMERO = r"\d+(?:[.,]\d+)?(?:\s*/\s*\d+)?"
+# La unidad empieza palabra (o va pegada al número: "150g"): la "taza" de "mostaza" no es una unidad
+_CON_UNIDAD = re.compile(rf"(?P<num>{_NUMERO}|\b(?:{'|'.join(NUMEROS)})\b)?\s*(?:(?<=\d)|\b)(?P<unidad>{'|'.join(sorted(UNIDADES, key=len, reverse=True))})\b\.?(?:\s+de\b)?", re.I)
+_AL_INICIO = re.compile(rf"^\s*(?P<num>{_NUMERO}|(?:{'|'.join(NUMEROS)})\b)\s*(?:(?P<pieza>{'|'.join(PIEZAS)})\b\s*(?:de\b)?)?", re.I)
+
+
+def _numero(texto):
+    texto = texto.strip().lower().replace(",", ".")
+    if texto in NUMEROS:
+        return float(NUMEROS[texto])
+    if "/" in texto:
+        a, b = texto.split("/")
+        return float(a) / float(b) if float(b) else 0.0
+    return float(texto)
+
+
+def interpretar_cantidad(texto):
+    """'150 g de pollo' → (150.0, 'g', 'pollo'); '2 huevos' → (2.0, 'ud', 'huevos'); 'sal' → (None, None, 'sal')"""
+    texto = texto.strip()
+    m = _CON_UNIDAD.search(texto)
+    # "1 cucharada de aceite", "pollo (150 g)"... pero no la "l" de "1 lima" sin número delante
+    if m and (m.group("num") or len(m.group("unidad")) > 2):
+        cantidad = _numero(m.group("num")) if m.group("num") else 1.0
+        nombre = (texto[:m.start()] + " " + texto[m.end():])
+        return cantidad * UNIDADES[m.group("unidad").lower()], "g", _limpiar_nombre(nombre)
+    m = _AL_INICIO.match(texto)
+    if m:
+        return _numero(m.group("num")), "ud", _limpiar_nombre(texto[m.end():])
+    return None, None, _limpiar_nombre(texto)
+
+
+def _limpiar_nombre(nombre):
+    return re.sub(r"\s+", " ", re.sub(r"[()\[\],;:]", " ", nombre)).strip(" -.")
+
+
+# ==========================================
+# 2. NOMBRES Y TRIGRAMAS
+# ==========================================
+_VACIAS = frozenset("de del la el los las al a con sin en y o para por su sus".split())
+
+
+def normalizar(nombre):
+    """'Pechugas de Pollo' → 'pechuga pollo' (sin tildes, en singular, sin palabras de relleno)"""
+    texto = unicodedata.normalize("NFC", quitar_tildes(nombre.lower()))
+    return " ".join(singular(p) for p in re.split(r"[^a-zñ0-9%]+", texto) if p and p not in _VACIAS)
+
+
+def trigramas(nombre_normalizado):
+    """Trigramas de cada palabra con relleno ('  p', ' po', 'pol'...), como pg_trgm"""
+    vistos = set()
+    for palabra in nombre_normalizado.split():
+        relleno = f"  {palabra} "
+        vistos.update(relleno[i:i + 3] for i in range(len(relleno) - 2))
+    return vistos
+
+
+# ==========================================
+# 3. LA BASE
+# ==========================================
+class BaseAlimentos:
+    """Alimentos + nombres (con sinónimos) + índice trigrama → nombre, en SQLite.
+
+    Con 'ruta' la base se guarda en disco y solo se reconstruye si cambia el CSV;
+    por defecto vive en memoria (la tabla incluida se carga en milisegundos).
+    buscar() y costear() recuerdan lo ya resuelto (LRU de MEMO_MAX entradas: la base vive lo que
+    el proceso y cada sesión trae sus propios ingredientes): repetir uno no toca SQLite.
+    """
+    MEMO_MAX = 5000
+
+    def __init__(self, csv_ruta=CSV_INCLUIDO, ruta=":memory:"):
+        self._candado = threading.Lock()
+        self._memo = OrderedDict()
+        if ruta != ":memory:" and os.path.dirname(ruta):
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        self._db = sqlite3.connect(ruta, check_same_thread=False)
+        with open(csv_ruta, encoding="utf-8") as f:
+            texto = f.read()
+        huella = hashlib.sha256(texto.encode()).hexdigest()
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (clave TEXT PRIMARY KEY, valor TEXT)")
+        previa = self._db.execute("SELECT valor FROM meta WHERE clave = 'huella_csv'").fetchone()
+        if not previa or previa[0] != huella:
+            self._construir(list(csv.DictReader(texto.splitlines())), huella)
+        self.n_alimentos = self._db.execute("SELECT COUNT(*) FROM alimentos").fetchone()[0]
+
+    def _construir(self, filas, huella):
+        db = self._db
+        for tabla in ("alimentos", "nombres", "trigramas"):
+            db.execute(f"DROP TABLE IF EXISTS {tabla}")
+        db.execute("""CREATE TABLE alimentos (id INTEGER PRIMARY KEY, nombre TEXT, kcal REAL, prot REAL,
+                      cho REAL, fat REAL, unidad_g REAL, racion_g REAL)""")
+        db.execute("CREATE TABLE nombres (id INTEGER PRIMARY KEY, alimento INTEGER, texto TEXT, n_trigramas INTEGER)")
+        db.execute("CREATE TABLE trigramas (trigrama TEXT, nombre INTEGER)")
+        nombres, trigs = [], []
+        for i, fila in enumerate(filas):
+            db.execute("INSERT INTO alimentos VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                       (i, fila["nombre"], *(float(fila[m] or 0) for m in MACROS),
+                        float(fila["unidad_g"] or 0), float(fila["racion_g"] or 100)))
+            for alias in [fila["nombre"], *filter(None, fila["sinonimos"].split("|"))]:
+                texto = normalizar(alias)
+                t = trigramas(texto)
+                nombres.append((len(nombres), i, texto, len(t)))
+                trigs += [(g, nombres[-1][0]) for g in t]
+        db.executemany("INSERT INTO nombres VALUES (?, ?, ?, ?)", nombres)
+        db.executemany("INSERT INTO trigramas VALUES (?, ?)", trigs)
+        db.execute("CREATE INDEX idx_trigramas ON trigramas(trigrama)")
+        db.execute("INSERT OR REPLACE INTO meta VALUES ('huella_csv', ?)", (huella,))
+        db.commit()
+        log.info("Tabla de alimentos construida: %s alimentos, %s nombres", len(filas), len(nombres))
+
+    def buscar(self, nombre):
+        """Mejor alimento para un nombre aproximado: dict con macros por 100 g y 'parecido' (o None)"""
+        clave = normalizar(nombre)
+        encontrado, mejor = self._recordado(clave)
+        if encontrado:
+            return mejor
+        consulta = trigramas(clave)
+        mejor = None
+        if consulta:
+            with self._candado:
+                candidatos = self._db.execute(f"""
+                    SELECT n.alimento, n.texto, n.n_trigramas, COUNT(*) FROM trigramas t JOIN nombres n ON n.id = t.nombre
+                    WHERE t.trigrama IN ({','.join('?' * len(consulta))}) GROUP BY t.nombre""", tuple(consulta)).fetchall()
+            # Cuánto del nombre del alimento aparece en la consulta ("pollo" en "pollo de corral troceado")
+            # y cuánto se parecen en conjunto (Dice), para desempatar "leche" de "leche de avena"
+            puntuados = [(0.6 * comunes / n + 0.4 * 2 * comunes / (n + len(consulta)), alimento, texto)
+                         for alimento, texto, n, comunes in candidatos]
+            if puntuados:
+                parecido, alimento, texto = max(puntuados)
+                if parecido >= UMBRAL:
+                    mejor = self._alimento(alimento, parecido, texto)
+        self._recordar(clave, mejor)
+        return mejor
+
+    def _recordado(self, clave):
+        with self._candado:
+            if clave not in self._memo:
+                return False, None
+            self._memo.move_to_end(clave)
+            return True, self._memo[clave]
+
+    def _recordar(self, clave, valor):
+        with self._candado:
+            self._memo[clave] = valor
+            self._memo.move_to_end(clave)
+            while len(self._memo) > self.MEMO_MAX:
+                self._memo.popitem(last=False)
+
+    def _alimento(self, id_alimento, parecido, texto):
+        with self._candado:
+            fila = self._db.execute("SELECT nombre, kcal, prot, cho, fat, unidad_g, racion_g FROM alimentos WHERE id = ?",
+                                    (id_alimento,)).fetchone()
+        nombre, *macros, unidad_g, racion_g = fila
+        return {"nombre": nombre, **dict(zip(MACROS, macros)), "unidad_g": unidad_g, "racion_g": racion_g,
+                "parecido": round(parecido, 2), "encontrado_como": texto}
+
+    def costear(self, ingrediente):
+        """'150 g de pollo' → dict con alimento, gramos y macros (o None si no se reconoce el alimento)"""
+        memo = ("costear", ingrediente)
+        encontrado, linea = self._recordado(memo)
+        if encontrado:
+            return linea
+        cantidad, unidad, nombre = interpretar_cantidad(ingrediente)
+        alimento = self.buscar(nombre) if nombre else None
+        linea = None
+        if alimento:
+            if unidad == "g":
+                gramos = cantidad
+            elif unidad == "ud":
+                gramos = cantidad * (alimento["unidad_g"] or alimento["racion_g"])
+            else:
+                gramos = alimento["racion_g"]  # Sin cantidad: una ración normal
+            linea = {"ingrediente": ingrediente, "alimento": alimento["nombre"], "gramos": round(gramos),
+                     "estimado": unidad is None, "parecido": alimento["parecido"],
+                     **{m: alimento[m] * gramos / 100 for m in MACROS}}
+        self._recordar(memo, linea)
+        return linea
+
+    def macros_ingredientes(self, ingredientes):
+        """Suma de una lista de ingredientes. 'cobertura' = parte de los ingredientes reconocidos"""
+        lineas, sin_datos = [], []
+        for ing in ingredientes:
+            linea = self.costear(ing)
+            (lineas.append(linea) if linea else sin_datos.append(ing))
+        total = {m: round(sum(l[m] for l in lineas)) for m in MACROS}
+        return {"total": total, "lineas": lineas, "sin_datos": sin_datos,
+                "cobertura": len(lineas) / len(ingredientes) if ingredientes else 0.0}
+
+    def contrastar(self, comida):
+        """Macros que dio la IA para una comida vs los calculados con sus ingredientes"""
+        local = self.macros_ingredientes(comida.get("ingredientes", []))
+        ia = {m: comida.get(m) or 0 for m in MACROS}
+        desvio = (ia["kcal"] - local["total"]["kcal"]) / local["total"]["kcal"] * 100 if local["total"]["kcal"] else None
+        return {**local, "ia": ia, "desvio_kcal_pct": desvio}
+
+
+def base_desde_entorno(carpeta_base):
+    """FITCHEF_ALIMENTOS_CSV para usar otra tabla (misma cabecera) y FITCHEF_ALIMENTOS_RUTA para guardarla en disco"""
+    csv_ruta = os.getenv("FITCHEF_ALIMENTOS_CSV", CSV_INCLUIDO)
+    ruta = os.getenv("FITCHEF_ALIMENTOS_RUTA", ":memory:" if csv_ruta == CSV_INCLUIDO
+                     else os.path.join(carpeta_base, ".fitchef", "alimentos.sqlite"))
+    return BaseAlimentos(csv_ruta, ruta)
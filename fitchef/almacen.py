@@ -0,0 +1,360 @@
+"""Persistencia del estado de cada usuario: valor vigente por clave + registro recortado de cambios (deltas)."""
+import datetime
+import json
+import logging
+import os
+import re
+import secrets
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+
+import pandas as pd
+
+from fitchef.biometria import SerieBiometrica
+
+log = logging.getLogger("fitchef.almacen")
+
+# ==========================================
+# 1. CODIFICACIÓN (lo que hay en session_state → texto JSON y vuelta)
+# ==========================================
+def _codificar(valor):
+    """Tipos que json no sabe escribir. Van etiquetados para poder reconstruirlos al leer"""
+    if isinstance(valor, datetime.datetime):
+        return {"__fechahora__": valor.isoformat()}
+    if isinstance(valor, datetime.date):
+        return {"__fecha__": valor.isoformat()}
+    if isinstance(valor, datetime.time):
+        return {"__hora__": valor.strftime("%H:%M:%S")}
+    if isinstance(valor, pd.DataFrame):
+        return {"__tabla__": {"columnas": list(valor.columns), "filas": valor.values.tolist()}}
+    if isinstance(valor, SerieBiometrica):
+        return {"__serie__": valor.a_dict()}
+    if isinstance(valor, (set, frozenset)):
+        return sorted(valor)
+    if hasattr(valor, "item"):  # escalares de numpy
+        return valor.item()
+    raise TypeError(f"No sé guardar {type(valor).__name__}")
+
+
+def _decodificar(d):
+    if len(d) == 1:
+        (etiqueta, v), = d.items()
+        if etiqueta == "__fechahora__":
+            return datetime.datetime.fromisoformat(v)
+        if etiqueta == "__fecha__":
+            return datetime.date.fromisoformat(v)
+        if etiqueta == "__hora__":
+            return datetime.time.fromisoformat(v)
+        if etiqueta == "__tabla__":
+            return pd.DataFrame(v["filas"], columns=v["columnas"])
+        if etiqueta == "__serie__":
+            return SerieBiometrica.desde_dict(v)
+    return d
+
+
+def a_json(valor):
+    return json.dumps(valor, default=_codificar, ensure_ascii=False, separators=(",", ":"))
+
+
+def de_json(texto):
+    return json.loads(texto, object_hook=_decodificar)
+
+
+def _a_texto_plano(valor):
+    """Para la Bóveda descargable: horas como "07:00" y tablas como lista de filas (legible y como siempre)"""
+    if isinstance(valor, datetime.time):
+        return valor.strftime("%H:%M")
+    if isinstance(valor, (datetime.date, datetime.datetime)):
+        return valor.isoformat()
+    if isinstance(valor, pd.DataFrame):
+        return valor.to_dict(orient="records")
+    if isinstance(valor, SerieBiometrica):
+        return valor.a_registros()
+    return _codificar(valor)
+
+
+# ==========================================
+# 2. DELTAS (lo que cambia de un valor JSON al siguiente)
+# ==========================================
+def calcular_delta(anterior, nuevo):
+    """Cambio de 'anterior' a 'nuevo' (ambos ya como JSON plano): claves puestas/quitadas de un dict,
+    elementos añadidos al final de una lista o, si no, el valor entero"""
+    if isinstance(anterior, dict) and isinstance(nuevo, dict):
+        return {"poner": {k: v for k, v in nuevo.items() if k not in anterior or anterior[k] != v},
+                "quitar": [k for k in anterior if k not in nuevo]}
+    if isinstance(anterior, list) and isinstance(nuevo, list) and nuevo[:len(anterior)] == anterior:
+        return {"anadir": nuevo[len(anterior):]}
+    return {"valor": nuevo}
+
+
+def aplicar_delta(anterior, delta):
+    """Inversa de calcular_delta: aplicar_delta(a, calcular_delta(a, b)) == b"""
+    if "valor" in delta:
+        return delta["valor"]
+    if "anadir" in delta:
+        return anterior + delta["anadir"]
+    resultado = {k: v for k, v in anterior.items() if k not in delta["quitar"]}
+    resultado.update(delta["poner"])
+    return resultado
+
+
+# ==========================================
+# 3. BACKENDS (intercambiables: todos hablan en texto JSON por clave)
+# ==========================================
+class Almacen(ABC):
+    """Interfaz de un backend: leer claves sueltas de un usuario y apuntar las que cambian"""
+
+    @abstractmethod
+    def leer(self, usuario, claves):
+        """{clave: texto} de las claves pedidas que existan"""
+
+    @abstractmethod
+    def escribir(self, usuario, cambios):
+        """Apunta {clave: texto} (solo lo que ha cambiado)"""
+
+    @abstractmethod
+    def leer_todo(self, usuario):
+        """{clave: texto} de todo lo guardado del usuario"""
+
+    def estadisticas(self):
+        return {}
+
+
+class AlmacenMemoria(Almacen):
+    """Dura lo que dura el proceso. Para pruebas o para desactivar el disco"""
+
+    def __init__(self):
+        self._datos = {}
+        self._candado = threading.Lock()
+
+    def leer(self, usuario, claves):
+        with self._candado:
+            datos = self._datos.get(usuario, {})
+            return {c: datos[c] for c in claves if c in datos}
+
+    def escribir(self, usuario, cambios):
+        with self._candado:
+            self._datos.setdefault(usuario, {}).update(cambios)
+
+    def leer_todo(self, usuario):
+        with self._candado:
+            return dict(self._datos.get(usuario, {}))
+
+    def estadisticas(self):
+        with self._candado:
+            return {"usuarios": len(self._datos)}
+
+
+class AlmacenSQLite(Almacen):
+    """'instantaneas' guarda el valor vigente de cada clave (se sobrescribe en su sitio) y cada cambio
+    añade a 'eventos' solo su delta. Del registro se guardan entre 'cada_n_eventos' y el doble por usuario.
+
+    Leer una clave = una fila de 'instantaneas'. Thread-safe (una conexión + candado).
+    """
+
+    def __init__(self, ruta, cada_n_eventos=200):
+        self.ruta = ruta
+        self.cada_n_eventos = cada_n_eventos
+        self._candado = threading.Lock()
+        self._pendientes = {}  # usuario → eventos desde su última instantánea
+        self.contadores = {"lecturas": 0, "eventos": 0, "recortes": 0}
+        carpeta = os.path.dirname(ruta)
+        if carpeta:
+            os.makedirs(carpeta, exist_ok=True)
+        self._db = sqlite3.connect(ruta, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS instantaneas (
+                usuario TEXT NOT NULL, clave TEXT NOT NULL, valor TEXT NOT NULL,
+                hasta_evento INTEGER NOT NULL, ts REAL NOT NULL, PRIMARY KEY (usuario, clave)
+            )""")
+        self._migrar_eventos_enteros()
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS eventos (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, usuario TEXT NOT NULL, clave TEXT NOT NULL,
+                delta TEXT NOT NULL, ts REAL NOT NULL
+            )""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_eventos_usuario ON eventos(usuario, id)")
+
+    def _migrar_eventos_enteros(self):
+        """Bases de antes de los deltas: sus eventos llevaban el valor entero. El último de cada clave
+        pasa a 'instantaneas' y el registro viejo se descarta"""
+        columnas = {fila[1] for fila in self._db.execute("PRAGMA table_info(eventos)")}
+        if "valor" not in columnas:
+            return
+        self._db.execute("BEGIN")
+        self._db.execute("""
+            INSERT OR REPLACE INTO instantaneas (usuario, clave, valor, hasta_evento, ts)
+            SELECT usuario, clave, valor, id, ts FROM eventos WHERE id IN (
+                SELECT MAX(id) FROM eventos GROUP BY usuario, clave)""")
+        self._db.execute("DROP TABLE eventos")
+        self._db.execute("COMMIT")
+        log.info("Registro de eventos con valores enteros migrado a instantáneas")
+
+    def leer(self, usuario, claves):
+        claves = list(claves)
+        if not claves:
+            return {}
+        marcas = ",".join("?" * len(claves))
+        with self._candado:
+            self.contadores["lecturas"] += 1
+            return dict(self._db.execute(
+                f"SELECT clave, valor FROM instantaneas WHERE usuario = ? AND clave IN ({marcas})",
+                (usuario, *claves)).fetchall())
+
+    def escribir(self, usuario, cambios):
+        if not cambios:
+            return
+        ahora = time.time()
+        marcas = ",".join("?" * len(cambios))
+        with self._candado:
+            self._db.execute("BEGIN")
+            anteriores = dict(self._db.execute(
+                f"SELECT clave, valor FROM instantaneas WHERE usuario = ? AND clave IN ({marcas})",
+                (usuario, *cambios)).fetchall())
+            for clave, texto in cambios.items():
+                anterior = anteriores.get(clave)
+                delta = {"valor": json.loads(texto)} if anterior is None else \
+                    calcular_delta(json.loads(anterior), json.loads(texto))
+                id_evento = self._db.execute(
+                    "INSERT INTO eventos (usuario, clave, delta, ts) VALUES (?, ?, ?, ?)",
+                    (usuario, clave, json.dumps(delta, ensure_ascii=False, separators=(",", ":")), ahora)).lastrowid
+                self._db.execute("INSERT OR REPLACE INTO instantaneas (usuario, clave, valor, hasta_evento, ts) "
+                                 "VALUES (?, ?, ?, ?, ?)", (usuario, clave, texto, id_evento, ahora))
+            self._db.execute("COMMIT")
+            self.contadores["eventos"] += len(cambios)
+            if usuario not in self._pendientes:
+                self._pendientes[usuario] = self._db.execute(
+                    "SELECT COUNT(*) FROM eventos WHERE usuario = ?", (usuario,)).fetchone()[0]
+            else:
+                self._pendientes[usuario] += len(cambios)
+            if self._pendientes[usuario] >= 2 * self.cada_n_eventos:
+                self._recortar(usuario)
+
+    def _recortar(self, usuario):
+        """Deja en el registro solo los últimos 'cada_n_eventos' deltas del usuario (se recorta a rachas,
+        no en cada escritura). El valor vigente no depende de ellos: está entero en instantaneas"""
+        self._db.execute("""
+            DELETE FROM eventos WHERE usuario = ? AND id <= (
+                SELECT id FROM eventos WHERE usuario = ? ORDER BY id DESC LIMIT 1 OFFSET ?)""",
+                         (usuario, usuario, self.cada_n_eventos))
+        self._pendientes[usuario] = self.cada_n_eventos
+        self.contadores["recortes"] += 1
+        log.info("Registro de %s recortado a sus últimos %s cambios", usuario, self.cada_n_eventos)
+
+    def historial(self, usuario, clave):
+        """Deltas que quedan en el registro para una clave, del más viejo al más nuevo: [(ts, delta)]"""
+        with self._candado:
+            filas = self._db.execute("SELECT ts, delta FROM eventos WHERE usuario = ? AND clave = ? ORDER BY id",
+                                     (usuario, clave)).fetchall()
+        return [(ts, json.loads(delta)) for ts, delta in filas]
+
+    def leer_todo(self, usuario):
+        with self._candado:
+            claves = [c for (c,) in self._db.execute(
+                "SELECT clave FROM instantaneas WHERE usuario = ?", (usuario,)).fetchall()]
+        return self.leer(usuario, claves)
+
+    def estadisticas(self):
+        with self._candado:
+            eventos = self._db.execute("SELECT COUNT(*) FROM eventos").fetchone()[0]
+            usuarios = self._db.execute(
+                "SELECT COUNT(*) FROM (SELECT usuario FROM instantaneas UNION SELECT usuario FROM eventos)").fetchone()[0]
+        return {**self.contadores, "eventos_en_registro": eventos, "usuarios": usuarios}
+
+
+def almacen_desde_entorno(carpeta_base):
+    """Backend según FITCHEF_ALMACEN ('sqlite' por defecto o 'memoria')"""
+    tipo = os.getenv("FITCHEF_ALMACEN", "sqlite").lower()
+    if tipo == "memoria":
+        return AlmacenMemoria()
+    if tipo != "sqlite":
+        raise ValueError(f"FITCHEF_ALMACEN desconocido: {tipo}")
+    ruta = os.getenv("FITCHEF_ALMACEN_RUTA", os.path.join(carpeta_base, ".fitchef", "usuarios.sqlite"))
+    return AlmacenSQLite(ruta, cada_n_eventos=int(os.getenv("FITCHEF_ALMACEN_INSTANTANEA", "200")))
+
+
+# ==========================================
+# 4. PUENTE CON LA SESIÓN
+# ==========================================
+# El id de usuario viaja en la URL (?u=...) y es la única llave de sus datos: quien tenga el enlace
+# los lee y los cambia. Por eso es largo y al azar (no se puede adivinar ni recorrer).
+_FORMA_USUARIO = re.compile(r"[A-Za-z0-9_-]{12,64}")
+
+
+def nuevo_usuario():
+    """Id para un usuario nuevo: 128 bits al azar, apto para URL"""
+    return secrets.token_urlsafe(16)
+
+
+def usuario_valido(usuario):
+    """¿Tiene forma de id de usuario? (los de 12 caracteres de versiones anteriores siguen valiendo)"""
+    return bool(usuario) and _FORMA_USUARIO.fullmatch(usuario) is not None
+
+
+class EstadoUsuario:
+    """Une el session_state de una sesión con el almacén de su usuario.
+
+    Solo se sincronizan las claves ya hidratadas: una clave que esta sesión nunca leyó
+    (pantalla no visitada) no puede pisar lo guardado con su valor por defecto.
+    """
+
+    def __init__(self, almacen, usuario):
+        self.almacen = almacen
+        self.usuario = usuario
+        self._huellas = {}  # clave → hash del último texto leído/escrito (None = aún no está guardada)
+        self._vistos = {}  # clave → (objeto, version) tal como se leyó o guardó por última vez
+
+    def hidratar(self, estado, claves):
+        """Trae del almacén las claves que aún no se han leído en esta sesión"""
+        faltan = [c for c in claves if c not in self._huellas]
+        if not faltan:
+            return
+        for clave, texto in self.almacen.leer(self.usuario, faltan).items():
+            try:
+                estado[clave] = de_json(texto)
+                self._huellas[clave] = hash(texto)
+                self._vistos[clave] = (estado[clave], getattr(estado[clave], "version", None))
+            except (ValueError, TypeError) as e:
+                log.warning("No se pudo leer '%s' de %s: %s", clave, self.usuario, e)
+        for clave in faltan:
+            self._huellas.setdefault(clave, None)
+
+    def sincronizar(self, estado, claves=None):
+        """Escribe solo las claves cuyo contenido ha cambiado. Devuelve cuántas.
+
+        'claves' son las que han podido cambiar por dentro en este rerun (None = todas). Las demás
+        solo se serializan si se les ha asignado otro objeto; las versionadas, solo si sube su versión.
+        """
+        en_juego = None if claves is None else set(claves)
+        cambios = {}
+        for clave, previa in self._huellas.items():
+            if clave not in estado:
+                continue
+            valor = estado[clave]
+            version = getattr(valor, "version", None)
+            visto = self._vistos.get(clave)
+            if visto is not None and visto[0] is valor and visto[1] == version and (
+                    version is not None or (en_juego is not None and clave not in en_juego)):
+                continue  # Mismo objeto y nada que lo haya podido tocar: ni siquiera se serializa
+            try:
+                texto = a_json(valor)
+            except TypeError as e:
+                log.warning("'%s' no se puede guardar: %s", clave, e)
+                continue
+            self._vistos[clave] = (valor, version)
+            if hash(texto) != previa:
+                cambios[clave] = texto
+        if cambios:
+            self.almacen.escribir(self.usuario, cambios)
+            for clave, texto in cambios.items():
+                self._huellas[clave] = hash(texto)
+        return len(cambios)
+
+    def exportar(self):
+        """Bóveda completa (JSON con sangría) leída del almacén. No toca la sesión: vale desde otro hilo"""
+        datos = {clave: de_json(texto) for clave, texto in self.almacen.leer_todo(self.usuario).items()}
+        return json.dumps(datos, default=_a_texto_plano, ensure_ascii=False, indent=4)
@@ -0,0 +1,277 @@
+"""Códigos de barras en local: lectura EAN-13/UPC-A por líneas de escaneo (numpy) e índice de productos en disco.
+
+La IA solo entra si la foto no se deja leer o el código aún no está en el índice; lo que
+contesta se guarda en el índice, así el mismo producto ya no vuelve a costar una llamada.
+"""
+import csv
+import io
+import logging
+import os
+import threading
+from collections import Counter
+
+import numpy as np
+from PIL import Image, ImageOps
+
+log = logging.getLogger("fitchef.barras")
+
+# ==========================================
+# 1. LECTOR EAN-13 / UPC-A
+# ==========================================
+# Anchos (en módulos) de cada dígito en código L: espacio, barra, espacio, barra.
+# R tiene los mismos anchos empezando por barra; G son los de L al revés.
+ANCHOS_L = np.array([
+    [3, 2, 1, 1], [2, 2, 2, 1], [2, 1, 2, 2], [1, 4, 1, 1], [1, 1, 3, 2],
+    [1, 2, 3, 1], [1, 1, 1, 4], [1, 3, 1, 2], [1, 2, 1, 3], [3, 1, 1, 2],
+], dtype=np.float64)
+ANCHOS_G = ANCHOS_L[:, ::-1]
+# Primer dígito según la paridad (L/G) de los 6 de la izquierda
+PARIDADES = {"LLLLLL": 0, "LLGLGG": 1, "LLGGLG": 2, "LLGGGL": 3, "LGLLGG": 4,
+             "LGGLLG": 5, "LGGGLG": 6, "LGLGGL": 7, "LGLGLG": 8, "LGGLGL": 9}
+TRAMOS = 59  # 3 guarda + 6×4 + 5 guarda central + 6×4 + 3 guarda
+ERROR_MAX = 1.8  # Suma de desvíos (en módulos) para aceptar un dígito
+LADO_MAX = 1200  # La foto se reduce a esto antes de escanear
+
+
+def digito_control(doce):
+    """Dígito de control EAN de los 12 primeros"""
+    suma = sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(doce))
+    return (10 - suma % 10) % 10
+
+
+def codigo_valido(codigo):
+    """13 dígitos con su control. Todo ceros no es un producto (y en el índice marca un hueco libre)"""
+    return (len(codigo) == 13 and codigo.isdigit() and codigo != "0" * 13
+            and digito_control(codigo[:12]) == int(codigo[12]))
+
+
+def _tramos(fila, umbral):
+    """Fila de grises → (anchos de cada tramo, ¿es barra?). Los bordes se sitúan con precisión
+    de subpíxel (donde la fila cruza el umbral), que con módulos de 2-3 px es lo que decide"""
+    d = fila - umbral
+    negra = d < 0
+    i = np.flatnonzero(negra[1:] != negra[:-1])
+    cruces = i + d[i] / (d[i] - d[i + 1]) + 0.5
+    bordes = np.concatenate(([0.0], cruces, [float(len(fila))]))
+    return np.diff(bordes), negra[np.concatenate(([0], i + 1))]
+
+
+def _digito(anchos, patrones):
+    """(dígito, error) del patrón más parecido a 4 anchos normalizados a 7 módulos"""
+    norm = anchos * 7 / anchos.sum()
+    errores = np.abs(patrones - norm).sum(axis=1)
+    d = int(errores.argmin())
+    return d, errores[d]
+
+
+def _guarda(tramos, modulo):
+    return np.all((tramos > 0.4 * modulo) & (tramos < 2.0 * modulo))
+
+
+def _leer_tramos(anchos, barras, inicio):
+    """Intenta leer un EAN-13 que empiece en el tramo 'inicio' (una barra). None si no cuadra"""
+    seg = anchos[inicio:inicio + TRAMOS]
+    modulo = seg.sum() / 95
+    if not (_guarda(seg[:3], modulo) and _guarda(seg[27:32], modulo) and _guarda(seg[56:], modulo)):
+        return None
+    if inicio and anchos[inicio - 1] < 3 * modulo:  # Hace falta margen en blanco delante
+        return None
+    digitos, paridad = [], ""
+    for k in range(6):
+        w = seg[3 + 4 * k:7 + 4 * k]
+        dl, el = _digito(w, ANCHOS_L)
+        dg, eg = _digito(w, ANCHOS_G)
+        if min(el, eg) > ERROR_MAX:
+            return None
+        digitos.append(dl if el <= eg else dg)
+        paridad += "L" if el <= eg else "G"
+    for k in range(6):
+        d, e = _digito(seg[32 + 4 * k:36 + 4 * k], ANCHOS_L)
+        if e > ERROR_MAX:
+            return None
+        digitos.append(d)
+    if paridad not in PARIDADES:
+        return None
+    codigo = str(PARIDADES[paridad]) + "".join(map(str, digitos))
+    return codigo if codigo_valido(codigo) else None
+
+
+def _leer_fila(fila):
+    """Una línea de escaneo (grises) en los dos sentidos, con umbral global y luego local (sombras)"""
+    bajo, alto = np.percentile(fila, (5, 95))
+    if alto - bajo < 40:  # Sin contraste: aquí no hay barras
+        return None
+    local = np.convolve(fila, np.ones(15) / 15, mode="same")
+    for umbral in (np.full_like(fila, (bajo + alto) / 2), local):
+        for f, u in ((fila, umbral), (fila[::-1], umbral[::-1])):
+            anchos, barras = _tramos(f, u)
+            if len(barras) < TRAMOS:  # Con este umbral no salen barras suficientes: probamos el siguiente
+                continue
+            for inicio in np.flatnonzero(barras[:len(barras) - TRAMOS + 1]):
+                codigo = _leer_tramos(anchos, barras, inicio)
+                if codigo:
+                    return codigo
+    return None
+
+
+def _grises(imagen):
+    """bytes/PIL → array de grises reducido a LADO_MAX"""
+    if not isinstance(imagen, Image.Image):
+        imagen = Image.open(io.BytesIO(imagen))
+        imagen.draft("L", (LADO_MAX, LADO_MAX))
+        imagen = ImageOps.exif_transpose(imagen)
+    imagen = imagen.convert("L")
+    imagen.thumbnail((LADO_MAX, LADO_MAX))
+    return np.asarray(imagen, dtype=np.float64)
+
+
+def leer_codigo(imagen, lineas=40, votos=2):
+    """EAN-13 (o UPC-A como EAN con 0 delante) de una foto, o None.
+
+    Barre 'lineas' filas repartidas por la imagen (y columnas, por si el código está de pie);
+    cada fila se suaviza con sus vecinas. Solo vale un código que lean al menos 'votos' líneas:
+    el dígito de control deja pasar 1 de cada 10 lecturas con ruido, dos iguales ya no.
+    """
+    grises = _grises(imagen)
+    lecturas = Counter()
+    for matriz in (grises, grises.T):
+        alto = matriz.shape[0]
+        filas = np.linspace(alto * 0.1, alto * 0.9, lineas).astype(int)
+        for y in sorted(filas, key=lambda y: abs(y - alto / 2)):  # Del centro hacia fuera: se suele encuadrar centrado
+            fila = matriz[max(0, y - 1):y + 2].mean(axis=0)
+            codigo = _leer_fila(fila)
+            if codigo:
+                lecturas[codigo] += 1
+                if lecturas[codigo] >= votos:
+                    return codigo
+    return None
+
+
+# ==========================================
+# 2. ÍNDICE DE PRODUCTOS (tabla hash en un fichero mapeado en memoria)
+# ==========================================
+REGISTRO = np.dtype([("codigo", "<u8"), ("nombre", "S56")])  # 64 bytes por producto; código 0 = hueco libre
+
+
+def _hueco(tabla, mascara, codigo):
+    """Posición del código o del primer hueco libre de su secuencia de sondeo"""
+    i = (codigo * 0x9E3779B97F4A7C15 >> 17) & mascara
+    while True:
+        actual = int(tabla["codigo"][i])
+        if actual == codigo or actual == 0:
+            return i
+        i = (i + 1) & mascara
+
+
+def _nombre_corto(nombre):
+    """En minúsculas y recortado a los 56 bytes del registro sin partir un carácter"""
+    return nombre.strip().lower().encode("utf-8")[:56].decode("utf-8", "ignore").encode("utf-8")
+
+
+class IndiceProductos:
+    """Código EAN → nombre genérico. Direccionamiento abierto sobre un np.memmap: buscar es leer
+    un par de huecos del fichero (sin cargarlo entero) y cada alta se escribe al momento.
+
+    Al pasar del 70 % de ocupación el fichero se rehace con el doble de huecos.
+    """
+
+    def __init__(self, ruta, capacidad=4096):
+        self.ruta = ruta
+        self._candado = threading.Lock()
+        if os.path.dirname(ruta):
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        if not os.path.exists(ruta):
+            self._crear(ruta, capacidad)
+        self._abrir()
+
+    def _crear(self, ruta, capacidad):
+        tabla = np.memmap(ruta, dtype=REGISTRO, mode="w+", shape=(capacidad,))
+        tabla.flush()
+        del tabla
+
+    def _abrir(self):
+        self._tabla = np.memmap(self.ruta, dtype=REGISTRO, mode="r+")
+        self._mascara = len(self._tabla) - 1
+        self.ocupados = int(np.count_nonzero(self._tabla["codigo"]))
+
+    def _hueco(self, codigo):
+        return _hueco(self._tabla, self._mascara, codigo)
+
+    def buscar(self, codigo):
+        if not codigo_valido(codigo):
+            return None
+        with self._candado:
+            i = self._hueco(int(codigo))
+            if int(self._tabla["codigo"][i]) != int(codigo):
+                return None
+            return self._tabla["nombre"][i].decode("utf-8", "ignore")
+
+    def guardar(self, codigo, nombre):
+        """Alta o cambio de un producto (se escribe a disco ya)"""
+        if not codigo_valido(codigo):
+            raise ValueError(f"Código EAN no válido: {codigo}")
+        self.guardar_lote({codigo: nombre})
+
+    def guardar_lote(self, productos):
+        """Muchas altas de golpe ({código: nombre}, ya validados): como mucho un crecimiento y un flush"""
+        with self._candado:
+            if self.ocupados + len(productos) > 0.7 * len(self._tabla):
+                self._crecer(self.ocupados + len(productos))
+            for codigo, nombre in productos.items():
+                i = self._hueco(int(codigo))
+                if int(self._tabla["codigo"][i]) == 0:
+                    self.ocupados += 1
+                self._tabla[i] = (int(codigo), _nombre_corto(nombre))
+            self._tabla.flush()
+
+    def _crecer(self, ocupados):
+        """Rehace el índice con huecos de sobra para 'ocupados': el nuevo se llena y se vuelca en un
+        temporal y solo entonces sustituye al viejo (si algo falla a medias, el viejo sigue intacto)"""
+        capacidad = len(self._tabla)
+        while ocupados > 0.7 * capacidad:
+            capacidad *= 2
+        viejos = np.array(self._tabla[self._tabla["codigo"] != 0])
+        temporal = self.ruta + ".nuevo"
+        nueva = np.memmap(temporal, dtype=REGISTRO, mode="w+", shape=(capacidad,))
+        for codigo, nombre in viejos:
+            nueva[_hueco(nueva, capacidad - 1, int(codigo))] = (codigo, nombre)
+        nueva.flush()
+        del nueva
+        del self._tabla
+        os.replace(temporal, self.ruta)
+        self._abrir()
+        log.info("Índice de productos ampliado a %s huecos", len(self._tabla))
+
+    def importar_csv(self, ruta, col_codigo="codigo", col_nombre="nombre"):
+        """Carga masiva (p. ej. un volcado de Open Food Facts). Devuelve cuántos códigos válidos entraron"""
+        productos = {}
+        with open(ruta, encoding="utf-8") as f:
+            for fila in csv.DictReader(f):
+                codigo = (fila.get(col_codigo) or "").strip().zfill(13)
+                if codigo_valido(codigo) and fila.get(col_nombre):
+                    productos[codigo] = fila[col_nombre]
+        self.guardar_lote(productos)
+        return len(productos)
+
+    def __len__(self):
+        return self.ocupados
+
+
+def indice_desde_entorno(carpeta_base):
+    """FITCHEF_PRODUCTOS_RUTA (por defecto .fitchef/productos.idx); FITCHEF_PRODUCTOS_CSV para precargarlo"""
+    ruta = os.getenv("FITCHEF_PRODUCTOS_RUTA", os.path.join(carpeta_base, ".fitchef", "productos.idx"))
+    indice = IndiceProductos(ruta)
+    csv_inicial = os.getenv("FITCHEF_PRODUCTOS_CSV")
+    if csv_inicial and not len(indice):
+        log.info("Precargados %s productos de %s", indice.importar_csv(csv_inicial), csv_inicial)
+    return indice
+
+
+def interpretar_respuesta(texto):
+    """'8410000000000 | leche semidesnatada' o 'sin código | leche' → (código o None, nombre)"""
+    partes = [p.strip() for p in texto.strip().splitlines()[0].split("|")] if texto.strip() else [""]
+    if len(partes) >= 2:
+        digitos = "".join(ch for ch in partes[0] if ch.isdigit())
+        codigo = digitos.zfill(13) if len(digitos) in (12, 13) else ""  # UPC-A: 12 dígitos
+        return (codigo if codigo_valido(codigo) else None), partes[1].lower()
+    return None, partes[0].lower()
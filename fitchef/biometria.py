@@ -0,0 +1,181 @@
+"""Series biométricas (peso...) sobre arrays: añadir es O(1) amortizado y las estadísticas van al día."""
+import datetime
+
+import numpy as np
+import pandas as pd
+
+_EPOCA = datetime.date(1970, 1, 1)
+
+
+def _a_dia(fecha):
+    """'2024-05-01', date o datetime → días desde 1970 (int)"""
+    if isinstance(fecha, str):
+        fecha = datetime.date.fromisoformat(fecha[:10])
+    elif isinstance(fecha, datetime.datetime):
+        fecha = fecha.date()
+    return (fecha - _EPOCA).days
+
+
+def _a_fecha(dia):
+    return _EPOCA + datetime.timedelta(days=int(dia))
+
+
+class SerieBiometrica:
+    """Una medida por día, ordenada por fecha, en arrays de numpy que crecen al doble.
+
+    Junto a cada valor se guardan la EMA (tendencia) y la suma acumulada, así las medias de
+    7/30 días y el ritmo semanal salen en O(log n) sin recorrer el historial. Si se anota dos
+    veces el mismo día, gana la última.
+    """
+
+    def __init__(self, nombre="Peso (kg)", alfa=0.1, capacidad=64):
+        self.nombre = nombre
+        self.alfa = alfa  # EMA diaria: 0.1 ≈ la tendencia "suavizada" clásica del peso
+        self.version = 0  # Sube con cada cambio (el almacén no re-serializa si no cambia)
+        self._n = 0
+        self._dias = np.zeros(capacidad, dtype=np.int64)
+        self._valores = np.zeros(capacidad, dtype=np.float64)
+        self._ema = np.zeros(capacidad, dtype=np.float64)
+        self._acumulado = np.zeros(capacidad, dtype=np.float64)
+        self._grafica = None  # (version, max_puntos, DataFrame)
+
+    def __len__(self):
+        return self._n
+
+    # --- Escritura ---
+    def _crecer(self):
+        capacidad = 2 * len(self._dias)
+        for nombre in ("_dias", "_valores", "_ema", "_acumulado"):
+            viejo = getattr(self, nombre)
+            nuevo = np.zeros(capacidad, dtype=viejo.dtype)
+            nuevo[:self._n] = viejo[:self._n]
+            setattr(self, nombre, nuevo)
+
+    def _recalcular_desde(self, i):
+        """EMA y acumulado desde la posición i (solo hace falta al corregir el pasado)"""
+        for j in range(i, self._n):
+            valor = self._valores[j]
+            if j == 0:
+                self._ema[j] = valor
+                self._acumulado[j] = valor
+                continue
+            # Con huecos de varios días la EMA "se olvida" en proporción al hueco
+            peso = 1 - (1 - self.alfa) ** max(1, self._dias[j] - self._dias[j - 1])
+            self._ema[j] = self._ema[j - 1] + peso * (valor - self._ema[j - 1])
+            self._acumulado[j] = self._acumulado[j - 1] + valor
+
+    def anotar(self, fecha, valor):
+        """Añade (o corrige, si ya hay dato ese día) una medida"""
+        dia = _a_dia(fecha)
+        valor = float(valor)
+        n = self._n
+        if n and self._dias[n - 1] == dia:
+            i = n - 1                                  # Mismo día que la última: se sobrescribe
+            self._valores[i] = valor
+        elif n == 0 or self._dias[n - 1] < dia:
+            if n == len(self._dias):                   # Lo normal: un día nuevo al final, O(1)
+                self._crecer()
+            i = n
+            self._dias[i], self._valores[i] = dia, valor
+            self._n += 1
+        else:
+            i = int(np.searchsorted(self._dias[:n], dia))
+            if self._dias[i] == dia:                   # Corrección de un día pasado
+                self._valores[i] = valor
+            else:                                      # Un día olvidado en medio: O(n), raro
+                if n == len(self._dias):
+                    self._crecer()
+                for nombre in ("_dias", "_valores"):
+                    arr = getattr(self, nombre)
+                    arr[i + 1:n + 1] = arr[i:n]
+                self._dias[i], self._valores[i] = dia, valor
+                self._n += 1
+        self._recalcular_desde(i)
+        self.version += 1
+
+    # --- Lectura ---
+    @property
+    def fechas(self):
+        return [_a_fecha(d) for d in self._dias[:self._n]]
+
+    @property
+    def valores(self):
+        return self._valores[:self._n]
+
+    def _media_desde(self, dia_inicio):
+        i = int(np.searchsorted(self._dias[:self._n], dia_inicio))
+        if i >= self._n:
+            return None
+        antes = self._acumulado[i - 1] if i else 0.0
+        return (self._acumulado[self._n - 1] - antes) / (self._n - i)
+
+    def _ema_en(self, dia):
+        """Tendencia en el último registro anterior o igual a 'dia' (None si no hay)"""
+        i = int(np.searchsorted(self._dias[:self._n], dia, side="right")) - 1
+        return self._ema[i] if i >= 0 else None
+
+    def estadisticas(self):
+        """Último valor, tendencia (EMA), medias de 7 y 30 días y ritmo en unidades por semana"""
+        if not self._n:
+            return None
+        ultimo_dia = self._dias[self._n - 1]
+        ema = self._ema[self._n - 1]
+        ema_antes = self._ema_en(ultimo_dia - 7)
+        dias_ritmo = ultimo_dia - self._dias[0] if ema_antes is None else 7
+        ema_antes = self._ema[0] if ema_antes is None else ema_antes
+        return {
+            "fecha": _a_fecha(ultimo_dia),
+            "ultimo": float(self._valores[self._n - 1]),
+            "tendencia": float(ema),
+            "media_7d": float(self._media_desde(ultimo_dia - 6)),
+            "media_30d": float(self._media_desde(ultimo_dia - 29)),
+            "ritmo_semanal": float((ema - ema_antes) * 7 / dias_ritmo) if dias_ritmo else 0.0,
+            "registros": self._n,
+        }
+
+    def para_grafica(self, max_puntos=365):
+        """DataFrame (índice Fecha) con el valor y la tendencia, promediado por tramos si hay más de max_puntos"""
+        if self._grafica is not None and self._grafica[:2] == (self.version, max_puntos):
+            return self._grafica[2]
+        n = self._n
+        dias, valores, ema = self._dias[:n], self._valores[:n], self._ema[:n]
+        if n > max_puntos:
+            cortes = np.linspace(0, n, max_puntos + 1).astype(np.int64)[:-1]
+            tamanos = np.diff(np.append(cortes, n))
+            dias = dias[cortes + tamanos // 2]
+            valores = np.add.reduceat(valores, cortes) / tamanos
+            ema = np.add.reduceat(ema, cortes) / tamanos
+        tabla = pd.DataFrame({self.nombre: valores, "Tendencia": ema},
+                             index=pd.to_datetime(dias, unit="D").rename("Fecha"))
+        self._grafica = (self.version, max_puntos, tabla)
+        return tabla
+
+    # --- Conversión (almacén y Bóveda) ---
+    def a_registros(self):
+        """[{"Fecha": "2024-05-01", "Peso (kg)": 80.1}, ...] como en las Bóvedas de siempre"""
+        return [{"Fecha": f.isoformat(), self.nombre: float(v)} for f, v in zip(self.fechas, self.valores)]
+
+    def a_dict(self):
+        return {"nombre": self.nombre, "alfa": self.alfa,
+                "dias": self._dias[:self._n].tolist(), "valores": self._valores[:self._n].tolist()}
+
+    @classmethod
+    def desde_dict(cls, d):
+        serie = cls(d.get("nombre", "Peso (kg)"), d.get("alfa", 0.1), capacidad=max(64, len(d["dias"])))
+        serie._n = len(d["dias"])
+        serie._dias[:serie._n] = d["dias"]
+        serie._valores[:serie._n] = d["valores"]
+        serie._recalcular_desde(0)
+        return serie
+
+    @classmethod
+    def desde(cls, datos, nombre="Peso (kg)"):
+        """Acepta lo que hubiera antes: otra serie, el DataFrame Fecha/Peso o la lista de la Bóveda"""
+        if isinstance(datos, cls):
+            return datos
+        if isinstance(datos, pd.DataFrame):
+            datos = datos.to_dict(orient="records")
+        serie = cls(nombre)
+        for fila in sorted(datos or [], key=lambda f: str(f["Fecha"])):
+            serie.anotar(fila["Fecha"], fila[nombre])
+        return serie
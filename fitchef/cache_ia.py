@@ -0,0 +1,209 @@
+"""Caché persistente de respuestas de Gemini (SQLite con TTL y expulsión LRU por tamaño)."""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# ==========================================
+# 1. HUELLA DE LA PETICIÓN (modelo + prompt normalizado + adjuntos)
+# ==========================================
+def normalizar_prompt(texto):
+    """Quita sangrías y espacios de más: dos prompts iguales dan la misma clave"""
+    return " ".join(texto.split())
+
+
+def _digerir(parte, h):
+    """Mete una parte del 'contents' en el hash. Devuelve False si no sabemos cachearla"""
+    if parte is None:
+        h.update(b"n:")
+    elif isinstance(parte, str):
+        h.update(b"t:" + normalizar_prompt(parte).encode("utf-8"))
+    elif isinstance(parte, (bytes, bytearray, memoryview)):
+        h.update(b"b:" + hashlib.sha256(bytes(parte)).digest())
+    elif isinstance(parte, (list, tuple)):
+        h.update(b"l:%d:" % len(parte))
+        return all(_digerir(p, h) for p in parte)
+    elif isinstance(parte, dict):
+        h.update(b"d:" + json.dumps(parte, sort_keys=True, default=str).encode("utf-8"))
+    elif hasattr(parte, "tobytes") and hasattr(parte, "mode"):
+        # Imagen PIL: los píxeles mandan, no el objeto
+        h.update(f"i:{parte.mode}:{parte.size}:".encode() + hashlib.sha256(parte.tobytes()).digest())
+    elif hasattr(parte, "getvalue"):
+        # UploadedFile de Streamlit, BytesIO... (audio, vídeo, imágenes sin abrir)
+        h.update(b"f:" + hashlib.sha256(parte.getvalue()).digest())
+    elif getattr(parte, "inline_data", None) is not None:
+        h.update(f"p:{parte.inline_data.mime_type}:".encode() + hashlib.sha256(parte.inline_data.data).digest())
+    elif getattr(parte, "text", None) is not None:
+        h.update(b"t:" + normalizar_prompt(parte.text).encode("utf-8"))
+    elif getattr(parte, "file_data", None) is not None:
+        h.update(f"u:{parte.file_data.file_uri}".encode())
+    else:
+        return False
+    return True
+
+
+def clave_peticion(model, contents, config=None):
+    """Clave SHA-256 de una llamada a generate_content (None si no es cacheable)"""
+    h = hashlib.sha256(f"m:{model}|".encode())
+    if not _digerir(contents, h):
+        return None
+    if config is not None:
+        if hasattr(config, "model_dump"):
+            config = config.model_dump(mode="json", exclude_none=True)
+        h.update(b"|c:" + json.dumps(config, sort_keys=True, default=str).encode("utf-8"))
+    return h.hexdigest()
+
+
+# ==========================================
+# 2. ALMACÉN SQLITE
+# ==========================================
+class CacheRespuestas:
+    """Guarda el texto de cada respuesta en SQLite. Thread-safe (una conexión + candado)"""
+
+    def __init__(self, ruta, ttl_segundos=7 * 24 * 3600, max_bytes=50 * 1024 * 1024):
+        self.ruta = ruta
+        self.ttl = ttl_segundos
+        self.max_bytes = max_bytes
+        self._candado = threading.Lock()
+        self.contadores = {"aciertos": 0, "fallos": 0, "escrituras": 0, "expulsiones": 0}
+        carpeta = os.path.dirname(ruta)
+        if carpeta:
+            os.makedirs(carpeta, exist_ok=True)
+        self._db = sqlite3.connect(ruta, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS respuestas (
+                clave TEXT PRIMARY KEY, modelo TEXT, texto TEXT NOT NULL,
+                bytes INTEGER NOT NULL, creado REAL NOT NULL, usado REAL NOT NULL
+            )""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_respuestas_usado ON respuestas(usado)")
+
+    def obtener(self, clave):
+        """Texto cacheado o None (las entradas caducadas cuentan como fallo y se borran)"""
+        ahora = time.time()
+        with self._candado:
+            fila = self._db.execute("SELECT texto, creado FROM respuestas WHERE clave = ?", (clave,)).fetchone()
+            if fila is None or ahora - fila[1] > self.ttl:
+                if fila is not None:
+                    self._db.execute("DELETE FROM respuestas WHERE clave = ?", (clave,))
+                self.contadores["fallos"] += 1
+                return None
+            self._db.execute("UPDATE respuestas SET usado = ? WHERE clave = ?", (ahora, clave))
+            self.contadores["aciertos"] += 1
+            return fila[0]
+
+    def guardar(self, clave, modelo, texto):
+        tam = len(texto.encode("utf-8"))
+        if tam > self.max_bytes:
+            return
+        ahora = time.time()
+        with self._candado:
+            self._db.execute(
+                "INSERT OR REPLACE INTO respuestas VALUES (?, ?, ?, ?, ?, ?)",
+                (clave, modelo, texto, tam, ahora, ahora))
+            self.contadores["escrituras"] += 1
+            self._expulsar(ahora)
+
+    def olvidar(self, clave):
+        with self._candado:
+            self._db.execute("DELETE FROM respuestas WHERE clave = ?", (clave,))
+
+    def _expulsar(self, ahora):
+        """Primero lo caducado; luego lo menos usado hasta volver bajo el límite de bytes"""
+        self._db.execute("DELETE FROM respuestas WHERE creado < ?", (ahora - self.ttl,))
+        total = self._db.execute("SELECT COALESCE(SUM(bytes), 0) FROM respuestas").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for clave, tam in self._db.execute("SELECT clave, bytes FROM respuestas ORDER BY usado").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._db.execute("DELETE FROM respuestas WHERE clave = ?", (clave,))
+            total -= tam
+            self.contadores["expulsiones"] += 1
+
+    def estadisticas(self):
+        with self._candado:
+            n, total = self._db.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM respuestas").fetchone()
+        consultas = self.contadores["aciertos"] + self.contadores["fallos"]
+        return {**self.contadores, "entradas": n, "bytes": total,
+                "ratio_aciertos": self.contadores["aciertos"] / consultas if consultas else 0.0}
+
+
+# ==========================================
+# 3. ENVOLTORIO DEL CLIENTE (misma API que genai.Client)
+# ==========================================
+class RespuestaCacheada:
+    """Imita lo que usamos de GenerateContentResponse: el .text"""
+    desde_cache = True
+    usage_metadata = None
+
+    def __init__(self, texto):
+        self.text = texto
+
+
+class ModelosConCache:
+    """Sustituto de client.models: mira la caché antes de pagar otra llamada"""
+
+    def __init__(self, modelos, cache):
+        self._modelos = modelos
+        self.cache = cache
+
+    def generate_content(self, *, model, contents, config=None, **kwargs):
+        clave = clave_peticion(model, contents, config)
+        if clave is not None:
+            texto = self.cache.obtener(clave)
+            if texto is not None:
+                return RespuestaCacheada(texto)
+        res = self._modelos.generate_content(model=model, contents=contents, config=config, **kwargs)
+        texto = getattr(res, "text", None)
+        if clave is not None and texto:
+            self.cache.guardar(clave, model, texto)
+        return res
+
+    def generate_content_stream(self, *, model, contents, config=None, **kwargs):
+        """Igual pero en trozos; un acierto de caché llega en un único trozo"""
+        clave = clave_peticion(model, contents, config)
+        if clave is not None:
+            texto = self.cache.obtener(clave)
+            if texto is not None:
+                yield RespuestaCacheada(texto)
+                return
+        trozos = []
+        for trozo in self._modelos.generate_content_stream(model=model, contents=contents, config=config, **kwargs):
+            trozos.append(getattr(trozo, "text", None) or "")
+            yield trozo
+        texto = "".join(trozos)
+        if clave is not None and texto:
+            self.cache.guardar(clave, model, texto)
+
+    def olvidar(self, *, model, contents, config=None):
+        """Borra una respuesta que resultó inservible (JSON roto) para que el reintento sea real"""
+        clave = clave_peticion(model, contents, config)
+        if clave is not None:
+            self.cache.olvidar(clave)
+
+    def __getattr__(self, nombre):
+        return getattr(self._modelos, nombre)
+
+
+class ClienteConCache:
+    """Envuelve genai.Client: client.models.generate_content pasa por la caché, el resto igual"""
+
+    def __init__(self, cliente, cache):
+        self._cliente = cliente
+        self.cache = cache
+        self.models = ModelosConCache(cliente.models, cache)
+
+    def __getattr__(self, nombre):
+        return getattr(self._cliente, nombre)
+
+
+def cache_desde_entorno(carpeta_base):
+    """Abre la caché con la configuración de las variables FITCHEF_CACHE_IA*"""
+    ruta = os.getenv("FITCHEF_CACHE_IA", os.path.join(carpeta_base, ".fitchef", "cache_ia.sqlite"))
+    ttl = float(os.getenv("FITCHEF_CACHE_IA_TTL_H", "168")) * 3600
+    max_mb = float(os.getenv("FITCHEF_CACHE_IA_MB", "50"))
+    return CacheRespuestas(ruta, ttl_segundos=ttl, max_bytes=int(max_mb * 1024 * 1024))
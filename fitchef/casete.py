@@ -0,0 +1,217 @@
+"""Casete de llamadas a la IA: grabar las respuestas de verdad una vez y reproducirlas sin red.
+
+Va pegado al cliente de genai (por debajo de planificador, caché y telemetría, que siguen
+funcionando igual). Cada interacción es una línea JSONL con la huella de la petición (la misma
+clave que usa la caché: modelo + prompt normalizado + hashes de los adjuntos + config), el
+texto de la respuesta, los trozos si fue en streaming, la latencia y el uso de tokens.
+
+Modos (FITCHEF_CASETE_MODO):
+- grabar: todo va a la IA y se graba (el casete empieza de cero)
+- reproducir: lo grabado sale del casete; lo que no está va a la IA y se añade
+- estricto: solo casete; una petición sin grabar es un error (CaseteSinRespuesta)
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from fitchef.cache_ia import clave_peticion, normalizar_prompt
+
+log = logging.getLogger("fitchef.casete")
+
+MODOS = ("grabar", "reproducir", "estricto")
+
+
+class CaseteSinRespuesta(Exception):
+    """Modo estricto (o sin red) y la petición no está grabada en el casete"""
+
+
+def _adjuntos(contents):
+    """Resumen legible de la petición: (texto del prompt, [sha256 de cada adjunto])"""
+    partes = contents if isinstance(contents, (list, tuple)) else [contents]
+    textos, hashes = [], []
+    for p in partes:
+        if isinstance(p, str):
+            textos.append(normalizar_prompt(p))
+        elif getattr(p, "inline_data", None) is not None:
+            hashes.append(hashlib.sha256(p.inline_data.data).hexdigest())
+        elif hasattr(p, "getvalue"):
+            hashes.append(hashlib.sha256(p.getvalue()).hexdigest())
+        elif getattr(p, "text", None) is not None:
+            textos.append(normalizar_prompt(p.text))
+    return " ".join(textos), hashes
+
+
+def _uso_a_dict(respuesta):
+    uso = getattr(respuesta, "usage_metadata", None)
+    if uso is None:
+        return None
+    return {k: getattr(uso, k, None) for k in ("prompt_token_count", "candidates_token_count", "thoughts_token_count")}
+
+
+class _Uso:
+    def __init__(self, datos):
+        for k, v in (datos or {}).items():
+            setattr(self, k, v)
+
+
+class RespuestaGrabada:
+    """Imita lo que usamos de GenerateContentResponse: .text y .usage_metadata"""
+    desde_casete = True
+
+    def __init__(self, texto, uso=None):
+        self.text = texto
+        self.usage_metadata = _Uso(uso) if uso else None
+
+
+# ==========================================
+# 1. EL CASETE (fichero JSONL + índice en memoria)
+# ==========================================
+class Casete:
+    """Interacciones grabadas por huella. Si la misma petición se grabó varias veces (p. ej.
+    "dame otro"), se reproducen en el mismo orden; pasada la última, se repite la última."""
+
+    def __init__(self, ruta, modo="reproducir", escala=1.0):
+        if modo not in MODOS:
+            raise ValueError(f"Modo de casete desconocido: {modo} (vale: {', '.join(MODOS)})")
+        self.ruta = ruta
+        self.modo = modo
+        self.escala = escala
+        self._candado = threading.Lock()
+        self._grabadas = {}  # clave → [interacción, ...]
+        self._vistas = {}  # clave → cuántas se han reproducido ya
+        self.contadores = {"reproducidas": 0, "grabadas": 0, "sin_grabar": 0}
+        if os.path.dirname(ruta):
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        if modo == "grabar":
+            open(ruta, "w", encoding="utf-8").close()
+        elif os.path.exists(ruta):
+            with open(ruta, encoding="utf-8") as f:
+                for linea in f:
+                    if linea.strip():
+                        interaccion = json.loads(linea)
+                        self._grabadas.setdefault(interaccion["clave"], []).append(interaccion)
+        log.info("Casete %s en modo %s (%s peticiones grabadas)", ruta, modo, len(self._grabadas))
+
+    def buscar(self, clave):
+        """Siguiente interacción grabada para esta huella, o None"""
+        if self.modo == "grabar":
+            return None
+        with self._candado:
+            grabadas = self._grabadas.get(clave)
+            if not grabadas:
+                self.contadores["sin_grabar"] += 1
+                return None
+            n = self._vistas.get(clave, 0)
+            self._vistas[clave] = n + 1
+            self.contadores["reproducidas"] += 1
+            return grabadas[min(n, len(grabadas) - 1)]
+
+    def grabar(self, clave, model, contents, texto, trozos, latencia_s, ttft_s, uso):
+        prompt, adjuntos = _adjuntos(contents)
+        interaccion = {
+            "clave": clave, "modelo": model, "prompt": prompt, "adjuntos": adjuntos,
+            "texto": texto, "trozos": trozos, "latencia_s": latencia_s, "ttft_s": ttft_s, "uso": uso,
+            "grabada": time.time(),
+        }
+        with self._candado:
+            self._grabadas.setdefault(clave, []).append(interaccion)
+            self._vistas[clave] = len(self._grabadas[clave])  # Lo recién grabado ya cuenta como visto
+            with open(self.ruta, "a", encoding="utf-8") as f:
+                f.write(json.dumps(interaccion, ensure_ascii=False) + "\n")
+            self.contadores["grabadas"] += 1
+
+    def esperar(self, segundos):
+        """La latencia grabada, escalada (0 = al instante)"""
+        if segundos and self.escala > 0:
+            time.sleep(segundos * self.escala)
+
+    def estadisticas(self):
+        with self._candado:
+            return {**self.contadores, "huellas": len(self._grabadas), "modo": self.modo}
+
+
+# ==========================================
+# 2. ENVOLTORIO DEL CLIENTE (misma API que genai.Client)
+# ==========================================
+class ModelosConCasete:
+    """Sustituto de client.models. 'modelos' puede ser None (sin API key): entonces solo casete"""
+
+    def __init__(self, modelos, casete):
+        self._modelos = modelos
+        self.casete = casete
+
+    def _sin_grabar(self, model, contents):
+        if self.casete.modo == "estricto" or self._modelos is None:
+            prompt, _ = _adjuntos(contents)
+            raise CaseteSinRespuesta(f"Petición a {model} sin grabar en {self.casete.ruta}: {prompt[:120]!r}")
+
+    def generate_content(self, *, model, contents, config=None, **kwargs):
+        clave = clave_peticion(model, contents, config)
+        grabada = self.casete.buscar(clave) if clave else None
+        if grabada is not None:
+            self.casete.esperar(grabada["latencia_s"])
+            return RespuestaGrabada(grabada["texto"], grabada["uso"])
+        self._sin_grabar(model, contents)
+        t0 = time.perf_counter()
+        res = self._modelos.generate_content(model=model, contents=contents, config=config, **kwargs)
+        latencia = time.perf_counter() - t0
+        if clave and getattr(res, "text", None):
+            self.casete.grabar(clave, model, contents, res.text, None, latencia, latencia, _uso_a_dict(res))
+        return res
+
+    def generate_content_stream(self, *, model, contents, config=None, **kwargs):
+        """En reproducción salen los mismos trozos, con el primero a su TTFT y el resto repartidos"""
+        clave = clave_peticion(model, contents, config)
+        grabada = self.casete.buscar(clave) if clave else None
+        if grabada is not None:
+            trozos = grabada["trozos"] or [grabada["texto"]]
+            self.casete.esperar(grabada["ttft_s"])
+            resto = max(0.0, grabada["latencia_s"] - (grabada["ttft_s"] or 0)) / max(1, len(trozos) - 1)
+            for n, trozo in enumerate(trozos):
+                if n:
+                    self.casete.esperar(resto)
+                yield RespuestaGrabada(trozo, grabada["uso"] if n == len(trozos) - 1 else None)
+            return
+        self._sin_grabar(model, contents)
+        t0 = time.perf_counter()
+        ttft, trozos, ultimo = None, [], None
+        for trozo in self._modelos.generate_content_stream(model=model, contents=contents, config=config, **kwargs):
+            if ttft is None:
+                ttft = time.perf_counter() - t0
+            trozos.append(getattr(trozo, "text", None) or "")
+            ultimo = trozo
+            yield trozo
+        texto = "".join(trozos)
+        if clave and texto:
+            self.casete.grabar(clave, model, contents, texto, trozos, time.perf_counter() - t0, ttft,
+                               _uso_a_dict(ultimo))
+
+    def __getattr__(self, nombre):
+        if self._modelos is None:
+            raise AttributeError(nombre)
+        return getattr(self._modelos, nombre)
+
+
+class ClienteConCasete:
+    def __init__(self, cliente, casete):
+        self._cliente = cliente
+        self.casete = casete
+        self.models = ModelosConCasete(cliente.models if cliente is not None else None, casete)
+
+    def __getattr__(self, nombre):
+        if self._cliente is None:
+            raise AttributeError(nombre)
+        return getattr(self._cliente, nombre)
+
+
+def casete_desde_entorno():
+    """FITCHEF_CASETE (ruta del .jsonl), FITCHEF_CASETE_MODO y FITCHEF_CASETE_ESCALA (latencia ×).
+    None si no hay casete"""
+    ruta = os.getenv("FITCHEF_CASETE")
+    if not ruta:
+        return None
+    return Casete(ruta, os.getenv("FITCHEF_CASETE_MODO", "reproducir"),
+                  float(os.getenv("FITCHEF_CASETE_ESCALA", "1")))
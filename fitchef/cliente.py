@@ -0,0 +1,94 @@
+"""Conexión única a Gemini para todo el proceso: un genai.Client sobre un pool HTTP con keep-alive."""
+import logging
+import os
+import threading
+import time
+
+import httpx
+from google import genai
+from google.genai import types
+
+log = logging.getLogger("fitchef.cliente")
+
+
+def config_pool_desde_entorno():
+    """Parámetros del pool HTTP (variables FITCHEF_POOL_*)"""
+    return {
+        "max_conexiones": int(os.getenv("FITCHEF_POOL_CONEXIONES", "32")),
+        "max_keepalive": int(os.getenv("FITCHEF_POOL_KEEPALIVE", "16")),
+        "keepalive_s": float(os.getenv("FITCHEF_POOL_KEEPALIVE_S", "90")),
+        "timeout_s": float(os.getenv("FITCHEF_POOL_TIMEOUT_S", "180")),
+        "conectar_s": float(os.getenv("FITCHEF_POOL_CONECTAR_S", "10")),
+        "intervalo_salud_s": float(os.getenv("FITCHEF_POOL_SALUD_S", "300")),
+    }
+
+
+class ConexionGemini:
+    """genai.Client compartido por todas las sesiones + chequeo de salud en segundo plano.
+
+    httpx.Client es thread-safe: todas las sesiones reutilizan las mismas conexiones TLS abiertas.
+    Si un chequeo falla, `sana` pasa a False y quien la cachea (st.cache_resource) la reconstruye.
+    """
+
+    def __init__(self, api_key, modelo, max_conexiones=32, max_keepalive=16, keepalive_s=90.0,
+                 timeout_s=180.0, conectar_s=10.0, intervalo_salud_s=300.0):
+        self.modelo = modelo
+        self.gracia_s = timeout_s  # Lo que puede tardar la llamada más larga que siga en vuelo al retirarla
+        self.http = httpx.Client(
+            limits=httpx.Limits(max_connections=max_conexiones, max_keepalive_connections=max_keepalive,
+                                keepalive_expiry=keepalive_s),
+            timeout=httpx.Timeout(timeout_s, connect=conectar_s),
+        )
+        try:
+            self.cliente = genai.Client(
+                api_key=api_key,
+                http_options=types.HttpOptions(httpx_client=self.http, timeout=int(timeout_s * 1000)),
+            )
+        except Exception:
+            self.http.close()  # Sin cliente nadie cerraría el pool (p.ej. API key vacía)
+            raise
+        self.sana = True
+        self.ultimo_chequeo = None
+        self.ultimo_error = None
+        self._parar = threading.Event()
+        if intervalo_salud_s > 0:
+            threading.Thread(target=self._vigilar, args=(intervalo_salud_s,), daemon=True,
+                             name="fitchef-salud-gemini").start()
+
+    def comprobar(self):
+        """Llamada barata (metadatos del modelo) para saber si la API y la red responden"""
+        try:
+            self.cliente.models.get(model=self.modelo)
+            self.sana, self.ultimo_error = True, None
+        except Exception as e:
+            self.sana, self.ultimo_error = False, str(e)
+            log.warning("Chequeo de salud de Gemini fallido: %s", e)
+        self.ultimo_chequeo = time.time()
+        return self.sana
+
+    def _vigilar(self, intervalo):
+        while not self._parar.wait(intervalo):
+            self.comprobar()
+
+    def cerrar(self):
+        self._parar.set()
+        self.http.close()
+
+    def retirar(self, gracia_s=None):
+        """Para cuando se sustituye por otra: deja de vigilar ya, pero el pool se cierra pasado
+        'gracia_s' (por defecto el timeout), así las llamadas que otras sesiones tengan en vuelo terminan"""
+        self._parar.set()
+        temporizador = threading.Timer(self.gracia_s if gracia_s is None else gracia_s, self.http.close)
+        temporizador.daemon = True
+        temporizador.name = "fitchef-retirar-gemini"
+        temporizador.start()
+        return temporizador
+
+
+def conexion_desde_entorno(api_key, modelo):
+    """ConexionGemini de verdad o, con FITCHEF_BACKEND_IA=stub, la IA simulada (sin red ni API key)"""
+    if os.getenv("FITCHEF_BACKEND_IA", "gemini") == "stub":
+        from fitchef.ia_simulada import ConexionSimulada, config_simulada_desde_entorno
+        log.info("Backend de IA simulado (FITCHEF_BACKEND_IA=stub)")
+        return ConexionSimulada(modelo, **config_simulada_desde_entorno())
+    return ConexionGemini(api_key, modelo, **config_pool_desde_entorno())
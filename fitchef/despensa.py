@@ -0,0 +1,112 @@
+"""Índice de la despensa: "¿tengo X?" y "¿qué gasta X?" sin recorrer la despensa entera cada vez."""
+import re
+import unicodedata
+
+# Palabras que no dicen qué alimento es (artículos, unidades, cantidades...)
+PALABRAS_VACIAS = frozenset("""
+    de del la el los las lo un una unos unas y e o u con sin en a al para por su sus
+    g gr gramo gramos kg kilo kilos mg ml l litro litros cl
+    cucharada cucharadas cucharadita cucharaditas taza tazas vaso vasos pizca pizcas chorrito chorro
+    puñado puñados lata latas bote botes paquete paquetes loncha lonchas rebanada rebanadas trozo trozos
+    unidad unidades diente dientes racion raciones porcion porciones
+    al gusto opcional fresco fresca frescos frescas natural
+""".split())
+_NO_LETRAS = re.compile(r"[^a-zñ]+")
+
+
+def singular(palabra):
+    """Plural → singular a lo bruto (basta con que ingredientes y despensa queden igual)"""
+    if len(palabra) <= 3:
+        return palabra
+    if palabra.endswith("ces"):
+        return palabra[:-3] + "z"                      # nueces → nuez
+    if palabra.endswith("es") and palabra[-3] in "lnrdj":
+        return palabra[:-2]                            # limones → limon, frijoles → frijol
+    if palabra.endswith("s") and not palabra.endswith("ss"):
+        return palabra[:-1]                            # huevos → huevo, aguacates → aguacate
+    return palabra
+
+
+def quitar_tildes(texto):
+    return "".join(ch for ch in unicodedata.normalize("NFKD", texto) if not unicodedata.combining(ch) or ch == "̃")
+
+
+def tokens(texto):
+    """'2 Huevos camperos' → {'huevo', 'campero'} (sin tildes, en singular, sin palabras vacías)"""
+    texto = unicodedata.normalize("NFC", quitar_tildes(texto.lower()))
+    return frozenset(
+        singular(p) for p in _NO_LETRAS.split(texto)
+        if p and p not in PALABRAS_VACIAS and len(p) > 1
+    )
+
+
+class IndiceDespensa:
+    """Índice invertido token → posiciones de la despensa. Se construye una vez por cambio de despensa.
+
+    Un ingrediente "gasta" un item si los tokens de uno contienen a los del otro
+    (igual que el antiguo `d in i or i in d`, pero por palabras y no por letras).
+    """
+
+    def __init__(self, items):
+        self.items = tuple(items)
+        self._tokens = [tokens(i) for i in self.items]
+        self._indice = {}
+        for pos, toks in enumerate(self._tokens):
+            for t in toks:
+                self._indice.setdefault(t, []).append(pos)
+        self._memo = {}
+
+    def _posiciones(self, ingrediente):
+        if ingrediente in self._memo:
+            return self._memo[ingrediente]
+        t_ing = tokens(ingrediente)
+        candidatos = set()
+        for t in t_ing:
+            candidatos.update(self._indice.get(t, ()))
+        res = tuple(sorted(
+            pos for pos in candidatos
+            if self._tokens[pos] <= t_ing or t_ing <= self._tokens[pos]
+        ))
+        self._memo[ingrediente] = res
+        return res
+
+    def tiene(self, ingrediente):
+        """¿Hay algo en la despensa que sirva para este ingrediente?"""
+        return bool(self._posiciones(ingrediente))
+
+    def consume(self, ingrediente):
+        """Items de la despensa que gastaría este ingrediente"""
+        return [self.items[pos] for pos in self._posiciones(ingrediente)]
+
+    def faltantes(self, ingredientes):
+        return [i for i in ingredientes if not self.tiene(i)]
+
+    def restar(self, ingredientes):
+        """Despensa tras gastar un item por ingrediente (como el botón 'Hecho'). Devuelve (nueva, gastados)"""
+        gastadas = set()
+        for ing in ingredientes:
+            for pos in self._posiciones(ing):
+                if pos not in gastadas:
+                    gastadas.add(pos)
+                    break
+        nueva = [item for pos, item in enumerate(self.items) if pos not in gastadas]
+        return nueva, [self.items[pos] for pos in sorted(gastadas)]
+
+
+def fusionar(despensa, nuevos):
+    """Despensa + nuevos sin repetir alimento ('Huevos' y 'huevo' son el mismo: mismos tokens).
+
+    Mantiene el orden de la despensa y añade al final. Devuelve (despensa_nueva, añadidos).
+    """
+    vistos = {tokens(i) for i in despensa}
+    vistos.discard(frozenset())
+    nueva, anadidos = list(despensa), []
+    for item in nuevos:
+        item = item.strip(" \t.-*·").lower()
+        clave = tokens(item)
+        if not clave or clave in vistos:
+            continue
+        vistos.add(clave)
+        nueva.append(item)
+        anadidos.append(item)
+    return nueva, anadidos
@@ -0,0 +1,48 @@
+"""Plan semanal de dieta: validación por día y generación en paralelo (un hilo por día)."""
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from fitchef.esquemas import Comida
+
+DIAS_SEMANA = ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado", "Domingo"]
+MACROS = ("kcal", "prot", "cho", "fat")
+
+
+def validar_dia(comidas):
+    """Comprueba un día del plan (lista de comidas) y lo devuelve limpio. Lanza ValueError si no vale"""
+    if not isinstance(comidas, list) or not comidas:
+        raise ValueError("El día no trae ninguna comida.")
+    return [Comida.desde(c).a_dict() for c in comidas]
+
+
+def ordenar_plan(plan):
+    """Devuelve el plan con los días en orden de Lunes a Domingo (lo que no sea un día, al final)"""
+    orden = {d: i for i, d in enumerate(DIAS_SEMANA)}
+    return {d: plan[d] for d in sorted(plan, key=lambda d: orden.get(d, len(orden)))}
+
+
+def generar_plan_paralelo(generar_dia, dias=DIAS_SEMANA, max_hilos=7, rondas=3, al_terminar=None):
+    """Lanza generar_dia(dia) para cada día a la vez y reintenta SOLO los días que fallen.
+
+    generar_dia devuelve la lista de comidas del día o lanza una excepción.
+    al_terminar(dia, comidas_o_None, error_o_None) se llama en el hilo que invoca (apto para la UI).
+    Devuelve (plan_ordenado, {dia: último_error}) con los días que no salieron tras todas las rondas.
+    """
+    plan, errores = {}, {}
+    pendientes = list(dias)
+    with ThreadPoolExecutor(max_workers=max(1, min(max_hilos, len(pendientes)))) as pool:
+        for _ in range(rondas):
+            if not pendientes:
+                break
+            futuros = {pool.submit(lambda d: validar_dia(generar_dia(d)), d): d for d in pendientes}
+            pendientes = []
+            for fut in as_completed(futuros):
+                dia = futuros[fut]
+                try:
+                    plan[dia] = fut.result()
+                    errores.pop(dia, None)
+                    if al_terminar: al_terminar(dia, plan[dia], None)
+                except Exception as e:
+                    errores[dia] = e
+                    pendientes.append(dia)
+                    if al_terminar: al_terminar(dia, None, e)
+    return ordenar_plan(plan), errores
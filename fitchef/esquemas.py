@@ -0,0 +1,216 @@
+"""Registros tipados de lo que genera la IA: esquema JSON para pedirlo y validación para aceptarlo."""
+import re
+
+OBLIGATORIO = object()
+
+
+class Lista:
+    def __init__(self, tipo):
+        self.tipo = tipo
+
+
+class Mapa:
+    """Objeto con claves libres ("Día 1", "Día 2"...) y valores del mismo tipo"""
+
+    def __init__(self, tipo):
+        self.tipo = tipo
+
+
+def _esquema(tipo):
+    if tipo is str:
+        return {"type": "string"}
+    if tipo is int:
+        return {"type": "integer"}
+    if tipo is list:
+        return {"type": "array", "items": {"type": "object"}}
+    if isinstance(tipo, Lista):
+        return {"type": "array", "items": _esquema(tipo.tipo)}
+    if isinstance(tipo, Mapa):
+        return {"type": "object", "additionalProperties": _esquema(tipo.tipo)}
+    return tipo.esquema()
+
+
+def _entero(valor):
+    """3, 3.0, "3" o "3 series" → 3"""
+    if isinstance(valor, bool):
+        raise ValueError
+    if isinstance(valor, (int, float)):
+        return int(round(valor))
+    m = re.search(r"-?\d+(?:[.,]\d+)?", str(valor))
+    if not m:
+        raise ValueError
+    return int(round(float(m.group().replace(",", "."))))
+
+
+def _convertir(tipo, valor, donde):
+    """Valor de la IA → valor del tipo declarado (o ValueError diciendo dónde falla)"""
+    try:
+        if tipo is str:
+            if isinstance(valor, (dict, list)):
+                raise ValueError
+            return "" if valor is None else str(valor)
+        if tipo is int:
+            return 0 if valor is None else _entero(valor)
+        if tipo is list:
+            return list(valor or [])
+        if isinstance(tipo, Lista):
+            if not isinstance(valor, list):
+                raise ValueError
+            return [_convertir(tipo.tipo, v, f"{donde}[{i}]") for i, v in enumerate(valor)]
+        if isinstance(tipo, Mapa):
+            if not isinstance(valor, dict):
+                raise ValueError
+            return {k: _convertir(tipo.tipo, v, f"{donde}.{k}") for k, v in valor.items()}
+        return tipo.desde(valor).a_dict()
+    except ValueError as e:
+        if str(e):
+            raise
+        raise ValueError(f"'{donde}' no tiene el formato esperado: {valor!r:.60}") from None
+
+
+class Registro:
+    """Base de los registros. Cada subclase declara CAMPOS = {nombre: (tipo, por_defecto)}.
+
+    Los campos con por_defecto OBLIGATORIO tienen que venir; al resto se les pone el defecto.
+    En el esquema que se manda a la IA van todos como requeridos (menos los de NO_GENERADOS).
+    """
+    CAMPOS = {}
+    NO_GENERADOS = ()
+    VISIBLE = None  # Campo que identifica al registro en los mensajes de error (por defecto, el primero)
+
+    def __init__(self, **valores):
+        for nombre in self.CAMPOS:
+            setattr(self, nombre, valores.get(nombre))
+
+    @classmethod
+    def esquema(cls):
+        generados = [n for n in cls.CAMPOS if n not in cls.NO_GENERADOS]
+        return {"type": "object", "properties": {n: _esquema(cls.CAMPOS[n][0]) for n in generados},
+                "required": generados}
+
+    @classmethod
+    def desde(cls, datos):
+        if not isinstance(datos, dict):
+            raise ValueError(f"Se esperaba un objeto {cls.__name__} y llegó: {datos!r:.60}")
+        valores = {}
+        for nombre, (tipo, defecto) in cls.CAMPOS.items():
+            if datos.get(nombre) is None:
+                if defecto is OBLIGATORIO:
+                    visible = datos.get(cls.VISIBLE or next(iter(cls.CAMPOS)), "?")
+                    raise ValueError(f"A {cls.__name__} '{visible}' le falta: {nombre}")
+                valores[nombre] = list(defecto) if isinstance(defecto, list) else defecto
+            else:
+                valores[nombre] = _convertir(tipo, datos[nombre], nombre)
+        return cls(**valores)
+
+    def a_dict(self):
+        """Lo que se guarda en la sesión (la UI trabaja con dicts)"""
+        return {nombre: getattr(self, nombre) for nombre in self.CAMPOS}
+
+
+# ==========================================
+# REGISTROS
+# ==========================================
+class Comida(Registro):
+    CAMPOS = {
+        "tipo": (str, OBLIGATORIO),
+        "plato": (str, OBLIGATORIO),
+        "ingredientes": (Lista(str), OBLIGATORIO),
+        "instrucciones": (str, ""),
+        "nota_ciencia": (str, ""),
+        "kcal": (int, 0),
+        "prot": (int, 0),
+        "cho": (int, 0),
+        "fat": (int, 0),
+    }
+    VISIBLE = "plato"
+
+
+class Ejercicio(Registro):
+    CAMPOS = {
+        "nombre": (str, OBLIGATORIO),
+        "calentamiento": (str, ""),
+        "series": (int, 3),
+        "reps": (str, "8-12"),
+        "rir": (str, "1-2"),
+        "tut": (str, "Controlado"),
+        "descanso": (str, "90s"),
+        "video": (str, "#"),
+        "series_completadas": (list, []),
+    }
+    NO_GENERADOS = ("series_completadas",)
+
+
+class Microciclo(Registro):
+    CAMPOS = {
+        "diagnostico_semanal": (str, ""),
+        "dias": (Mapa(Lista(Ejercicio)), OBLIGATORIO),
+    }
+
+
+class SesionAdaptativa(Registro):
+    CAMPOS = {
+        "diagnostico": (str, ""),
+        "rutina": (Lista(Ejercicio), OBLIGATORIO),
+    }
+
+
+# ==========================================
+# FORMATOS (esquema que se pide + validación de lo que llega)
+# ==========================================
+class Formato:
+    def __init__(self, nombre, esquema, validar):
+        self.nombre = nombre
+        self.esquema = esquema
+        self.validar = validar
+
+
+def _validar_no_vacio(validar, que):
+    def validar_y_comprobar(valor):
+        valor = validar(valor)
+        if not valor:
+            raise ValueError(f"La IA devolvió {que} vacío.")
+        return valor
+    return validar_y_comprobar
+
+
+def formato_registro(nombre, clase, no_vacio=None):
+    """Formato de un registro; 'no_vacio' es un campo que además no puede llegar vacío"""
+    def validar(valor):
+        registro = clase.desde(valor)
+        if no_vacio and not getattr(registro, no_vacio):
+            raise ValueError(f"La IA devolvió '{no_vacio}' vacío.")
+        return registro.a_dict()
+    return Formato(nombre, clase.esquema(), validar)
+
+
+def formato_lista(nombre, clase):
+    """Lista no vacía de registros (un día de dieta, un día de entreno)"""
+    tipo = Lista(clase)
+    return Formato(nombre, _esquema(tipo), _validar_no_vacio(lambda v: _convertir(tipo, v, "día"), "un día"))
+
+
+def formato_dia():
+    return formato_lista("dia_dieta", Comida)
+
+
+def formato_plan(dias):
+    """Semana completa: un array de comidas por cada día de 'dias'"""
+    tipo = Lista(Comida)
+    esquema = {"type": "object", "properties": {d: _esquema(tipo) for d in dias}, "required": list(dias)}
+
+    def validar(valor):
+        if not isinstance(valor, dict):
+            raise ValueError("El plan no es un objeto por días.")
+        faltan = [d for d in dias if not valor.get(d)]
+        if faltan:
+            raise ValueError(f"Al plan le faltan días: {', '.join(faltan)}")
+        return {d: _convertir(tipo, comidas, d) for d, comidas in valor.items()}
+    return Formato("plan_semanal", esquema, _validar_no_vacio(validar, "un plan"))
+
+
+FORMATO_MICROCICLO = formato_registro("microciclo", Microciclo, no_vacio="dias")
+FORMATO_SESION = formato_registro("sesion_adaptativa", SesionAdaptativa, no_vacio="rutina")
+FORMATO_SUSTITUTO = formato_registro("sustituto", Ejercicio)
+FORMATO_COMIDA = formato_registro("comida", Comida)
+FORMATO_DIA_ENTRENO = formato_lista("dia_entreno", Ejercicio)
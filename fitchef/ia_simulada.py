@@ -0,0 +1,241 @@
+"""IA simulada para benchmarks y pruebas sin API key (FITCHEF_BACKEND_IA=stub).
+
+Imita la parte de genai.Client que usa la app (models.generate_content y generate_content_stream)
+con respuestas deterministas: la misma petición da siempre la misma respuesta. Si la llamada
+trae esquema JSON, la respuesta se construye a partir del esquema; si no, se elige un texto
+según lo que pide el prompt (lista por comas, "código | nombre", líneas "- 150 g de ..."...).
+La latencia es configurable para que los benchmarks midan algo parecido a la realidad: con
+reparto 'uniforme' sale de la huella (misma petición, misma espera); con 'lognormal' cambia en
+cada llamada y tiene la cola larga de la API de verdad (las pruebas de carga la necesitan).
+"""
+import csv
+import hashlib
+import json
+import os
+import random
+import time
+
+CARPETA_DATOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "datos")
+TIPOS_COMIDA = ["Desayuno", "Almuerzo", "Comida", "Merienda", "Cena"]
+EJERCICIOS = ["Sentadilla", "Press Banca", "Peso Muerto Rumano", "Dominadas", "Press Militar", "Remo con Barra",
+              "Zancadas", "Hip Thrust", "Fondos", "Curl Femoral", "Face Pull", "Elevaciones Laterales"]
+PREPARACIONES = ["a la plancha", "al horno", "salteado", "en bowl", "con verduras", "al curry", "en tortilla"]
+TROZO = 64  # Caracteres por trozo en streaming
+REPARTOS = ("uniforme", "lognormal")
+
+
+def _alimentos():
+    with open(os.path.join(CARPETA_DATOS, "alimentos.csv"), encoding="utf-8") as f:
+        return [fila["nombre"] for fila in csv.DictReader(f)]
+
+
+ALIMENTOS = _alimentos()
+
+
+class _Uso:
+    """Lo mismo que usage_metadata (estimado a ~4 caracteres por token)"""
+
+    def __init__(self, entrada, salida):
+        self.prompt_token_count = entrada
+        self.candidates_token_count = salida
+        self.thoughts_token_count = 0
+
+
+class RespuestaSimulada:
+    def __init__(self, text, uso=None):
+        self.text = text
+        self.usage_metadata = uso
+
+
+def _texto_prompt(contents):
+    partes = contents if isinstance(contents, (list, tuple)) else [contents]
+    return " ".join(p for p in partes if isinstance(p, str))
+
+
+def _bytes_adjuntos(contents):
+    partes = contents if isinstance(contents, (list, tuple)) else [contents]
+    total = 0
+    for p in partes:
+        datos = getattr(getattr(p, "inline_data", None), "data", None)
+        total += len(datos) if datos else int(getattr(p, "size", 0) or 0)
+    return total
+
+
+# ==========================================
+# RESPUESTAS
+# ==========================================
+def _ingrediente(rnd):
+    nombre = rnd.choice(ALIMENTOS)
+    return rnd.choice([f"{rnd.randrange(50, 250, 10)} g de {nombre}", f"{rnd.randint(1, 3)} {nombre}", nombre])
+
+
+def _cadena(clave, rnd, i):
+    if clave == "tipo":
+        return TIPOS_COMIDA[i % len(TIPOS_COMIDA)]
+    if clave == "plato":
+        return f"{rnd.choice(ALIMENTOS).capitalize()} {rnd.choice(PREPARACIONES)}"
+    if clave == "nombre":
+        return EJERCICIOS[(i + rnd.randrange(len(EJERCICIOS))) % len(EJERCICIOS)]
+    return {
+        "reps": rnd.choice(["6-8", "8-10", "8-12", "10-15"]),
+        "rir": rnd.choice(["1", "1-2", "2", "2-3"]),
+        "tut": rnd.choice(["3-1-1", "2-0-2", "Controlado"]),
+        "descanso": rnd.choice(["60s", "90s", "120s", "180s"]),
+        "video": "#",
+    }.get(clave, f"Texto simulado de {clave}: " + " ".join(rnd.choice(ALIMENTOS) for _ in range(8)) + ".")
+
+
+def _entero(clave, rnd):
+    rangos = {"kcal": (250, 850), "prot": (15, 60), "cho": (10, 110), "fat": (5, 35), "series": (3, 5)}
+    return rnd.randint(*rangos.get(clave, (1, 10)))
+
+
+def desde_esquema(esquema, rnd, clave="", i=0):
+    """Un valor que cumple el esquema JSON (el mismo que la app manda en response_json_schema)"""
+    tipo = esquema.get("type")
+    if tipo == "object":
+        if "properties" in esquema:
+            return {k: desde_esquema(sub, rnd, k, i) for k, sub in esquema["properties"].items()}
+        if isinstance(esquema.get("additionalProperties"), dict):  # Mapa: "Día 1", "Día 2"...
+            return {f"Día {n + 1}": desde_esquema(esquema["additionalProperties"], rnd, clave, n)
+                    for n in range(rnd.randint(3, 5))}
+        return {}
+    if tipo == "array":
+        n = {"ingredientes": rnd.randint(4, 7)}.get(clave, rnd.randint(4, 6))
+        return [desde_esquema(esquema.get("items", {}), rnd, clave, k) for k in range(n)]
+    if tipo == "integer":
+        return _entero(clave, rnd)
+    if tipo == "number":
+        return float(_entero(clave, rnd))
+    return _cadena(clave, rnd, i)
+
+
+def responder(prompt, esquema, rnd):
+    """Texto de la respuesta simulada para un prompt (y su esquema, si lo hay)"""
+    if esquema:
+        return json.dumps(desde_esquema(esquema, rnd), ensure_ascii=False)
+    bajo = prompt.lower()
+    if "código de barras" in bajo and "|" in prompt:
+        return f"sin código | {rnd.choice(ALIMENTOS)}"
+    if "uno por línea" in bajo:
+        return "\n".join(f"- {_ingrediente(rnd)}" for _ in range(rnd.randint(3, 5))) + "\nBuena cantidad de proteína."
+    if "por comas" in bajo:
+        return ", ".join(rnd.sample(ALIMENTOS, rnd.randint(4, 8)))
+    return " ".join(rnd.choice(ALIMENTOS) for _ in range(rnd.randint(20, 40))).capitalize() + "."
+
+
+# ==========================================
+# CLIENTE
+# ==========================================
+class ModelosSimulados:
+    """client.models de mentira: latencia_s por llamada; en streaming, ttft_s hasta el primer trozo.
+    'variacion' es el ±% del reparto uniforme o la sigma del log-normal (de media 1)"""
+
+    def __init__(self, latencia_s=0.0, ttft_s=None, variacion=0.0, reparto="uniforme"):
+        if reparto not in REPARTOS:
+            raise ValueError(f"Reparto de latencia desconocido: {reparto} (vale: {', '.join(REPARTOS)})")
+        self.latencia_s = latencia_s
+        self.ttft_s = latencia_s * 0.2 if ttft_s is None else ttft_s
+        self.variacion = variacion
+        self.reparto = reparto
+        self.llamadas = 0
+
+    def _preparar(self, contents, config):
+        prompt = _texto_prompt(contents)
+        esquema = getattr(config, "response_json_schema", None)
+        huella = hashlib.blake2b(
+            json.dumps([prompt, esquema, _bytes_adjuntos(contents)], sort_keys=True, default=str).encode(),
+            digest_size=8).digest()
+        rnd = random.Random(huella)
+        texto = responder(prompt, esquema, rnd)
+        if self.reparto == "lognormal":
+            azar = random.Random(huella + self.llamadas.to_bytes(8, "little"))  # Otra espera en cada llamada
+            factor = azar.lognormvariate(-self.variacion ** 2 / 2, self.variacion)
+        else:
+            factor = 1 + self.variacion * (2 * rnd.random() - 1)  # Jitter determinista: también sale de la huella
+        self.llamadas += 1
+        return texto, _Uso(len(prompt) // 4 + _bytes_adjuntos(contents) // 750, len(texto) // 4), factor
+
+    def generate_content(self, *, model, contents, config=None, **kwargs):
+        texto, uso, factor = self._preparar(contents, config)
+        if self.latencia_s:
+            time.sleep(self.latencia_s * factor)
+        return RespuestaSimulada(texto, uso)
+
+    def generate_content_stream(self, *, model, contents, config=None, **kwargs):
+        texto, uso, factor = self._preparar(contents, config)
+        trozos = [texto[i:i + TROZO] for i in range(0, len(texto), TROZO)] or [""]
+        pausa = max(0.0, self.latencia_s - self.ttft_s) * factor / len(trozos)
+        if self.ttft_s:
+            time.sleep(self.ttft_s * factor)
+        for n, trozo in enumerate(trozos):
+            if n and pausa:
+                time.sleep(pausa)
+            yield RespuestaSimulada(trozo, uso if n == len(trozos) - 1 else None)
+
+    def get(self, *, model, **kwargs):
+        return {"name": model}
+
+
+class ArchivoSimulado:
+    """Lo que usa la app de types.File"""
+
+    def __init__(self, name, uri, mime_type, size_bytes):
+        self.name = name
+        self.uri = uri
+        self.mime_type = mime_type
+        self.size_bytes = size_bytes
+        self.state = "ACTIVE"
+
+
+class ArchivosSimulados:
+    """client.files de mentira: la URI sale del contenido (la misma subida, la misma URI)"""
+
+    def __init__(self):
+        self.subidas = 0
+
+    def upload(self, *, file, config=None):
+        datos = file.read()
+        self.subidas += 1
+        nombre = "files/" + hashlib.blake2b(datos, digest_size=8).hexdigest()
+        mime = (config or {}).get("mime_type", "application/octet-stream")
+        return ArchivoSimulado(nombre, f"simulado://{nombre}", mime, len(datos))
+
+
+class ClienteSimulado:
+    def __init__(self, latencia_s=0.0, ttft_s=None, variacion=0.0, reparto="uniforme"):
+        self.models = ModelosSimulados(latencia_s, ttft_s, variacion, reparto)
+        self.files = ArchivosSimulados()
+
+
+class ConexionSimulada:
+    """Misma cara que ConexionGemini (cliente, sana, comprobar, cerrar, retirar), sin red"""
+
+    def __init__(self, modelo, latencia_s=0.0, ttft_s=None, variacion=0.0, reparto="uniforme"):
+        self.modelo = modelo
+        self.cliente = ClienteSimulado(latencia_s, ttft_s, variacion, reparto)
+        self.sana = True
+        self.ultimo_chequeo = None
+        self.ultimo_error = None
+
+    def comprobar(self):
+        self.ultimo_chequeo = time.time()
+        return True
+
+    def cerrar(self):
+        pass
+
+    def retirar(self, gracia_s=None):
+        pass
+
+
+def config_simulada_desde_entorno():
+    """FITCHEF_IA_SIMULADA_MS (latencia por llamada), _TTFT_MS (primer trozo), _VARIACION (0-1)
+    y _REPARTO (uniforme o lognormal)"""
+    ttft = os.getenv("FITCHEF_IA_SIMULADA_TTFT_MS")
+    return {
+        "latencia_s": float(os.getenv("FITCHEF_IA_SIMULADA_MS", "0")) / 1000,
+        "ttft_s": float(ttft) / 1000 if ttft else None,
+        "variacion": float(os.getenv("FITCHEF_IA_SIMULADA_VARIACION", "0")),
+        "reparto": os.getenv("FITCHEF_IA_SIMULADA_REPARTO", "uniforme"),
+    }
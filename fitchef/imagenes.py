@@ -0,0 +1,93 @@
+"""Preprocesado de imágenes antes de mandarlas a la IA (orientación, tamaño, recompresión, sin metadatos)."""
+import io
+import logging
+import threading
+import time
+
+from PIL import Image, ImageOps
+
+log = logging.getLogger("fitchef.imagenes")
+
+# Lado máximo (px), formato y calidad por función. Lo que tiene letra pequeña (tickets, analíticas,
+# cartas, pantallas de reloj) va más nítido que una foto de nevera o de un plato.
+POLITICAS = {
+    "ticket":    {"lado": 2048, "formato": "JPEG", "calidad": 90},
+    "analitica": {"lado": 2400, "formato": "JPEG", "calidad": 92},
+    "carta":     {"lado": 2048, "formato": "JPEG", "calidad": 88},
+    "reloj":     {"lado": 1600, "formato": "WEBP", "calidad": 88},
+    "barras":    {"lado": 1600, "formato": "WEBP", "calidad": 90},
+    "nevera":    {"lado": 1280, "formato": "WEBP", "calidad": 80},
+    "plato":     {"lado": 1024, "formato": "WEBP", "calidad": 80},
+    "rebelde":   {"lado": 1024, "formato": "WEBP", "calidad": 80},
+    "espejo":    {"lado": 1280, "formato": "WEBP", "calidad": 82},
+    "general":   {"lado": 1536, "formato": "WEBP", "calidad": 85},
+}
+MIME = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+
+# Métricas acumuladas por función (bytes ahorrados, tiempo de preprocesado y de la llamada)
+METRICAS = {}
+_candado = threading.Lock()
+
+
+def _metrica(funcion):
+    return METRICAS.setdefault(funcion, {
+        "imagenes": 0, "bytes_entrada": 0, "bytes_salida": 0, "ms_preproceso": 0.0,
+        "llamadas": 0, "s_llamadas": 0.0,
+    })
+
+
+def preparar_imagen(subida, funcion="general"):
+    """Devuelve (bytes, mime) listos para la IA: EXIF aplicado, sin alfa ni metadatos, redimensionada y recomprimida"""
+    bruto = subida.getvalue() if hasattr(subida, "getvalue") else bytes(subida)
+    politica = POLITICAS.get(funcion, POLITICAS["general"])
+    t0 = time.perf_counter()
+
+    img = Image.open(io.BytesIO(bruto))
+    img.draft("RGB", (politica["lado"], politica["lado"]))  # JPEG: decodifica ya reducido (mucho más rápido)
+    img = ImageOps.exif_transpose(img)  # Las fotos de móvil vienen "tumbadas" y con la rotación en el EXIF
+    if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+        fondo = Image.new("RGB", img.size, (255, 255, 255))
+        fondo.paste(img.convert("RGBA"), mask=img.convert("RGBA").getchannel("A"))
+        img = fondo
+    img = img.convert("RGB")
+    img.thumbnail((politica["lado"], politica["lado"]), Image.Resampling.LANCZOS)
+
+    salida = io.BytesIO()
+    if politica["formato"] == "WEBP":
+        img.save(salida, format="WEBP", quality=politica["calidad"], method=4)
+    else:
+        img.save(salida, format="JPEG", quality=politica["calidad"], optimize=True, progressive=True)
+    datos = salida.getvalue()
+    ms = (time.perf_counter() - t0) * 1000
+
+    with _candado:
+        m = _metrica(funcion)
+        m["imagenes"] += 1
+        m["bytes_entrada"] += len(bruto)
+        m["bytes_salida"] += len(datos)
+        m["ms_preproceso"] += ms
+    log.info("[%s] %s → %s bytes (%.0f%% menos) %sx%s en %.1f ms", funcion, len(bruto), len(datos),
+             100 * (1 - len(datos) / max(1, len(bruto))), img.width, img.height, ms)
+    return datos, MIME[politica["formato"]]
+
+
+def anotar_llamada(funcion, segundos, bytes_enviados):
+    """Latencia de la llamada a la IA con la imagen ya preparada (para ver el efecto del recorte)"""
+    with _candado:
+        m = _metrica(funcion)
+        m["llamadas"] += 1
+        m["s_llamadas"] += segundos
+    log.info("[%s] llamada IA con %s bytes de imagen: %.2f s", funcion, bytes_enviados, segundos)
+
+
+def resumen_metricas():
+    """Por función: ahorro medio de bytes y latencia media de la llamada"""
+    with _candado:
+        return {
+            f: {
+                **m,
+                "ahorro_pct": 100 * (1 - m["bytes_salida"] / m["bytes_entrada"]) if m["bytes_entrada"] else 0.0,
+                "s_media_llamada": m["s_llamadas"] / m["llamadas"] if m["llamadas"] else 0.0,
+            }
+            for f, m in METRICAS.items()
+        }
@@ -0,0 +1,30 @@
+"""Ingesta por lotes: varias fotos (tickets, nevera) a la vez con un tope de hilos y un solo resultado."""
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+def separar_items(texto):
+    """'Pollo, arroz\n- huevos' → ['pollo', 'arroz', 'huevos']"""
+    return [i.strip(" \t.-*·").lower() for i in re.split(r"[,\n;]", texto) if i.strip(" \t.-*·")]
+
+
+def procesar_lote(subidas, procesar_una, max_hilos=4, al_terminar=None):
+    """Lanza procesar_una(subida) para todas con como mucho 'max_hilos' a la vez.
+
+    al_terminar(i, resultado_o_None, error_o_None) se llama en el hilo que invoca (apto para la UI),
+    en orden de llegada. Devuelve ({i: resultado}, {i: error}) por posición en 'subidas'.
+    """
+    resultados, errores = {}, {}
+    if not subidas:
+        return resultados, errores
+    with ThreadPoolExecutor(max_workers=max(1, min(max_hilos, len(subidas)))) as pool:
+        futuros = {pool.submit(procesar_una, s): i for i, s in enumerate(subidas)}
+        for fut in as_completed(futuros):
+            i = futuros[fut]
+            try:
+                resultados[i] = fut.result()
+                if al_terminar: al_terminar(i, resultados[i], None)
+            except Exception as e:
+                errores[i] = e
+                if al_terminar: al_terminar(i, None, e)
+    return resultados, errores
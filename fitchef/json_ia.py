@@ -0,0 +1,189 @@
+"""Limpieza de las respuestas JSON que devuelve la IA (y reparación local antes de pagar otra generación)."""
+import itertools
+import json
+import logging
+import threading
+
+log = logging.getLogger("fitchef.json_ia")
+
+# Por formato: cuántas respuestas valen tal cual, cuántas se arreglan en local y cuántas se tiran
+METRICAS = {}
+_candado = threading.Lock()
+
+
+class JSONCortado(ValueError):
+    """La respuesta se corta (límite de tokens...) dentro de algo obligatorio: cerrarla sería perder datos"""
+
+
+def _quitar_vallas(texto):
+    return texto.replace("```json", "").replace("```", "").strip()
+
+
+def extraer_json(texto):
+    """Quita los ```json``` y se queda con lo que va del primer { o [ al último } o ]"""
+    texto = _quitar_vallas(texto)
+    inicios = [i for i in (texto.find("{"), texto.find("[")) if i != -1]
+    if not inicios:
+        raise ValueError("La IA no devolvió corchetes de JSON.")
+    inicio = min(inicios)
+    fin = texto.rfind("}" if texto[inicio] == "{" else "]") + 1
+    if fin <= inicio:
+        raise ValueError("El JSON de la IA está cortado.")
+    return json.loads(texto[inicio:fin])
+
+
+def _quitar_coma_final(salida):
+    while salida and salida[-1].isspace():
+        salida.pop()
+    if salida and salida[-1] == ",":
+        salida.pop()
+
+
+def _cerrar(salida, pila):
+    """Texto + los cierres que falten, sin comas ni claves colgando al final"""
+    salida = list(salida)
+    _quitar_coma_final(salida)
+    if salida and salida[-1] == ":":  # "clave": <cortado> → fuera la clave entera
+        texto = "".join(salida[:-1]).rstrip()
+        salida = list(texto[:texto.rstrip('"').rfind('"')])
+        _quitar_coma_final(salida)
+    return "".join(salida) + "".join(reversed(pila))
+
+
+def reparaciones(texto, max_intentos=50, protegidas=()):
+    """Arregla lo típico sin volver a llamar a la IA: comas finales, cierres que faltan, charla
+    detrás y arrays cortados a mitad. De un array cortado se quitan los elementos a medias (el
+    último, luego el anterior...): solo se recorta por la frontera entre elementos de un array
+    que sigue abierto al final, nunca un objeto (le faltarían campos que luego se rellenan con
+    el defecto) ni un elemento que la IA sí cerró.
+
+    'protegidas' son claves cuyo valor no se puede recortar (un día del plan, los ingredientes):
+    si el texto acaba con una de ellas abierta, lanza JSONCortado.
+    """
+    texto = _quitar_vallas(texto)
+    inicios = [i for i in (texto.find("{"), texto.find("[")) if i != -1]
+    if not inicios:
+        raise ValueError("La IA no devolvió corchetes de JSON.")
+    salida, pila, claves, abiertos, cortes = [], [], [], [], []
+    en_cadena = escapado = False
+    inicio_cadena, cadena, clave = 0, "", None
+    numeros = itertools.count()
+    for ch in texto[min(inicios):]:
+        if en_cadena:
+            salida.append(ch)
+            if escapado:
+                escapado = False
+            elif ch == "\\":
+                escapado = True
+            elif ch == '"':
+                en_cadena = False
+                cadena = "".join(salida[inicio_cadena + 1:-1])
+            continue
+        if ch == '"':
+            en_cadena = True
+            inicio_cadena = len(salida)
+        elif ch == ":":
+            clave = cadena
+        elif ch in "{[":
+            pila.append("}" if ch == "{" else "]")
+            claves.append(clave)
+            abiertos.append(next(numeros))
+            clave = None
+        elif ch in "}]":
+            _quitar_coma_final(salida)
+            if not pila:
+                break
+            salida.append(pila.pop())  # El cierre que toca, aunque la IA pusiera el otro
+            claves.pop()
+            abiertos.pop()
+            if not pila:
+                break  # JSON completo: lo que venga detrás es charla
+            continue
+        elif ch == ",":
+            clave = None
+            if pila[-1] == "]":
+                cortes.append((len(salida), tuple(pila), tuple(abiertos)))  # Aquí acababa un elemento entero
+        salida.append(ch)
+    cortadas = [c for c in claves if c in protegidas]
+    if cortadas:
+        raise JSONCortado(f"El JSON de la IA se corta a medias dentro de '{cortadas[-1]}'.")
+    candidatos = []
+    ultimo = "".join(salida[-20:]).rstrip()[-1:]
+    if not pila or (not en_cadena and pila[-1] == "]" and ultimo in '"]},'):
+        candidatos.append((salida, pila))  # Completo, o cortado justo tras un elemento entero (un número podría seguir)
+    # Quitando los últimos elementos de los arrays que siguen abiertos (no de los que la IA cerró)
+    candidatos += [(salida[:pos], list(p)) for pos, p, ids in reversed(cortes[-max_intentos:])
+                   if ids == tuple(abiertos[:len(ids)])]
+    for trozo, pila_trozo in candidatos:
+        reparado = _cerrar(trozo, pila_trozo)
+        try:
+            json.loads(reparado)
+        except ValueError:
+            continue
+        yield reparado
+
+
+def protegidas_del_esquema(esquema):
+    """Claves obligatorias del esquema cuyo valor es un array u objeto: recortarlas es perder datos"""
+    claves = set()
+    if not isinstance(esquema, dict):
+        return claves
+    propiedades = esquema.get("properties", {})
+    for nombre in esquema.get("required", ()):
+        if propiedades.get(nombre, {}).get("type") in ("array", "object"):
+            claves.add(nombre)
+    for hijo in (*propiedades.values(), esquema.get("items"), esquema.get("additionalProperties")):
+        claves |= protegidas_del_esquema(hijo)
+    return claves
+
+
+def anotar_generacion(formato, desenlace):
+    """desenlace: 'ok' (valió tal cual), 'reparado' (arreglado en local) o 'regenerar' (hay que volver a pedirlo)"""
+    with _candado:
+        m = METRICAS.setdefault(formato, {"ok": 0, "reparado": 0, "regenerar": 0})
+        m[desenlace] += 1
+
+
+def interpretar(texto, formato=None, nombre="general"):
+    """Texto de la IA → valor validado por el formato. Primero tal cual; si no, reparado en local.
+
+    De una respuesta cortada se quitan los elementos a medias y decide el formato (a un plan
+    cortado en el miércoles le faltan días); si se corta dentro de algo obligatorio del esquema,
+    o si ni así sale, apunta una regeneración desperdiciada y lanza ValueError.
+    """
+    nombre = formato.nombre if formato is not None else nombre
+    validar = formato.validar if formato is not None else (lambda v: v)
+    protegidas = protegidas_del_esquema(formato.esquema) if formato is not None else ()
+    try:
+        valor = validar(extraer_json(texto))
+        anotar_generacion(nombre, "ok")
+        return valor
+    except ValueError as e:
+        error = e
+    ultimo = None
+    try:
+        for reparado in reparaciones(texto, protegidas=protegidas):
+            try:
+                valor = validar(json.loads(reparado))
+                break
+            except ValueError as e:
+                ultimo = e  # Quizá sin el último elemento (el cortado) sí valga
+        else:
+            raise ultimo or ValueError("El JSON de la IA no tiene arreglo.")
+    except ValueError as e:
+        log.warning("[%s] JSON inservible (%s; tras reparar: %s)", nombre, error, e)
+        anotar_generacion(nombre, "regenerar")
+        raise
+    log.info("[%s] JSON reparado en local (%s)", nombre, error)
+    anotar_generacion(nombre, "reparado")
+    return valor
+
+
+def resumen_metricas():
+    """Totales y tasa de regeneraciones desperdiciadas (respuestas que hubo que tirar)"""
+    with _candado:
+        por_formato = {f: dict(m) for f, m in METRICAS.items()}
+    total = {k: sum(m[k] for m in por_formato.values()) for k in ("ok", "reparado", "regenerar")}
+    n = sum(total.values())
+    return {**total, "generaciones": n, "tasa_regeneracion": total["regenerar"] / n if n else 0.0,
+            "por_formato": por_formato}
@@ -0,0 +1,100 @@
+"""Parser JSON incremental: suelta cada objeto/lista en cuanto se cierra mientras la IA sigue escribiendo."""
+import bisect
+import json
+
+
+class ParserJSONIncremental:
+    """Se alimenta con trozos de texto (streaming) y devuelve lo que se va completando.
+
+    Cada evento es (ruta, valor): la ruta es la tupla de claves/índices desde la raíz,
+    p.ej. ("Lunes", 0) para la primera comida del lunes o ("dias", "Día 1", 2) para un ejercicio.
+    Ignora la basura de antes de la primera { o [ (```json, saludos...) y de después de la raíz.
+    """
+
+    def __init__(self):
+        self._trozos = []        # trozos del JSON desde la raíz (sin la basura previa), tal cual llegan
+        self._inicios = []       # posición global donde empieza cada trozo
+        self._largo = 0          # caracteres recibidos desde la raíz
+        self._pila = []          # [apertura, inicio, ruta, nº de elementos, clave pendiente, escalar sin contar]
+        self._en_cadena = False
+        self._escape = False
+        self._inicio_cadena = 0
+        self._ultima_cadena = None
+        self.terminado = False
+
+    def alimentar(self, trozo):
+        eventos = []
+        if self.terminado or not trozo:
+            return eventos
+        if not self._pila and not self._trozos:
+            # Todavía buscando la raíz
+            inicios = [i for i in (trozo.find("{"), trozo.find("[")) if i != -1]
+            if not inicios:
+                return eventos
+            trozo = trozo[min(inicios):]
+        # Solo se recorre el trozo nuevo: el texto anterior no se vuelve a unir ni a mirar
+        base = self._largo
+        self._trozos.append(trozo)
+        self._inicios.append(base)
+        self._largo += len(trozo)
+        for k, ch in enumerate(trozo):
+            i = base + k
+            if self._en_cadena:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._en_cadena = False
+                    self._ultima_cadena = (self._inicio_cadena, i + 1)
+                continue
+            if ch.isspace():
+                continue
+            if ch == '"':
+                self._en_cadena = True
+                self._inicio_cadena = i
+                self._marcar_escalar()
+            elif ch == ":" and self._pila and self._pila[-1][0] == "{" and self._ultima_cadena:
+                ini, fin = self._ultima_cadena
+                self._pila[-1][4] = json.loads(self._tramo(ini, fin))
+            elif ch in "{[":
+                self._pila.append([ch, i, self._ruta_hijo(), 0, None, False])
+            elif ch in "}]":
+                apertura, inicio, ruta, _, _, _ = self._pila.pop()
+                try:
+                    eventos.append((ruta, json.loads(self._tramo(inicio, i + 1))))
+                except ValueError:
+                    pass  # Objeto mal formado: no lo emitimos, el parseo final dirá qué pasa
+                if self._pila:
+                    self._pila[-1][3] += 1
+                    self._pila[-1][4] = None
+                else:
+                    self.terminado = True
+                    return eventos
+            elif ch == "," and self._pila:
+                padre = self._pila[-1]
+                if padre[5]:
+                    padre[3] += 1  # Elemento escalar de una lista (los objetos/listas se cuentan al cerrarse)
+                    padre[5] = False
+                padre[4] = None
+            else:
+                self._marcar_escalar()  # número, true, false, null
+        return eventos
+
+    def _marcar_escalar(self):
+        if self._pila and self._pila[-1][0] == "[":
+            self._pila[-1][5] = True
+
+    def _tramo(self, ini, fin):
+        """texto[ini:fin] uniendo solo los trozos que lo cubren"""
+        j = bisect.bisect_right(self._inicios, ini) - 1
+        return "".join(self._trozos[j:])[ini - self._inicios[j]:fin - self._inicios[j]]
+
+    def _ruta_hijo(self):
+        if not self._pila:
+            return ()
+        padre = self._pila[-1]
+        return padre[2] + ((padre[4],) if padre[0] == "{" else (padre[3],))
+
+    def texto(self):
+        return "".join(self._trozos)
@@ -0,0 +1,107 @@
+"""Analítica de macros del plan: el plan se pasa una vez a tabla (por columnas) y de ahí sale todo de golpe."""
+import hashlib
+import json
+
+import numpy as np
+import pandas as pd
+
+from fitchef.dieta import MACROS
+
+KCAL_POR_GRAMO = {"prot": 4, "cho": 4, "fat": 9}
+FACTOR_ACTIVIDAD = {"Sedentaria": 1.2, "Ligera": 1.375, "Moderada": 1.55, "Muy Activa": 1.725}
+# (ajuste calórico sobre el mantenimiento, gramos de proteína por kg)
+POR_OBJETIVO = {
+    "Estética Funcional": (0.9, 2.0),
+    "Powerbuilding": (1.1, 2.2),
+    "Longevidad": (1.0, 1.6),
+    "Rendimiento Atlético": (1.15, 1.8),
+}
+GRASA_MIN_KG = 1.0  # "Grasas min 1g/kg" del prompt de dieta
+REFEED = 0.15  # Hidratos extra en la semana de descarga
+
+
+def huella_plan(plan):
+    """Hash del contenido del plan (mismo plan → misma huella, venga de donde venga)"""
+    texto = json.dumps(plan, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.blake2b(texto.encode(), digest_size=16).hexdigest()
+
+
+def objetivos_macros(perfil):
+    """Kcal y gramos diarios objetivo del perfil: Mifflin-St Jeor × actividad, ajustado al programa.
+
+    Aplica las mismas reglas que se piden a la IA: grasa mínima 1 g/kg y, en la semana 4
+    del mesociclo (descarga), un 15 % más de hidratos (refeed). En Keto no hay refeed: los 50 g son el tope.
+    """
+    peso = float(perfil.get("peso", 70))
+    basal = 10 * peso + 6.25 * float(perfil.get("altura", 170)) - 5 * float(perfil.get("edad", 25))
+    basal += 5 if perfil.get("sexo", "Hombre") == "Hombre" else -161
+    ajuste, prot_kg = POR_OBJETIVO.get(perfil.get("objetivo"), (1.0, 1.8))
+    kcal = basal * FACTOR_ACTIVIDAD.get(perfil.get("actividad"), 1.55) * ajuste
+    prot = prot_kg * peso
+    keto = perfil.get("protocolo_metabolico") == "Keto Cíclica"
+    if keto:
+        cho = 50.0
+        fat = (kcal - prot * 4 - cho * 4) / 9
+    else:
+        fat = max(kcal * 0.25 / 9, GRASA_MIN_KG * peso)
+        cho = (kcal - prot * 4 - fat * 9) / 4
+    if int(perfil.get("semana_mesociclo", 1)) == 4 and not keto:
+        extra = max(cho, 0) * REFEED
+        cho, kcal = cho + extra, kcal + extra * 4
+    return {"kcal": round(kcal), "prot": round(prot), "cho": max(0, round(cho)), "fat": max(0, round(fat))}
+
+
+def reglas_dia(totales, perfil, objetivos, tolerancia=0.1):
+    """Avisos de un día contra las reglas del plan (lo que la IA promete y nadie comprobaba)"""
+    peso = float(perfil.get("peso", 70))
+    avisos = []
+    if totales["fat"] < GRASA_MIN_KG * peso:
+        avisos.append(f"Grasa por debajo de {GRASA_MIN_KG:g} g/kg ({totales['fat']:.0f} g de {GRASA_MIN_KG * peso:.0f} g)")
+    if objetivos["kcal"] and abs(totales["kcal"] / objetivos["kcal"] - 1) > tolerancia:
+        avisos.append(f"Kcal {totales['kcal']:.0f} de {objetivos['kcal']} objetivo ({totales['kcal'] / objetivos['kcal'] - 1:+.0%})")
+    if totales["prot"] < objetivos["prot"] * (1 - tolerancia):
+        avisos.append(f"Proteína {totales['prot']:.0f} g de {objetivos['prot']} g objetivo")
+    return avisos
+
+
+def tabla_plan(plan):
+    """Plan {día: [comidas]} → DataFrame (dia, orden, tipo, kcal, prot, cho, fat). Los días, en el orden del plan"""
+    filas = [(dia, i, c.get("tipo", ""), *(c.get(m) or 0 for m in MACROS))
+             for dia, comidas in (plan or {}).items() for i, c in enumerate(comidas)]
+    tabla = pd.DataFrame(filas, columns=["dia", "orden", "tipo", *MACROS])
+    tabla["dia"] = pd.Categorical(tabla["dia"], categories=list(plan or {}), ordered=True)
+    tabla[list(MACROS)] = tabla[list(MACROS)].astype(np.float64)
+    return tabla
+
+
+class AnaliticaPlan:
+    """Todas las vistas del plan, calculadas de una vez al crearla (luego solo se leen).
+
+    - por_dia: totales de cada día
+    - reparto: % de las kcal de cada día que vienen de prot/cho/fat
+    - desvio / desvio_pct: cada día contra los objetivos (gramos y %)
+    - semana: total y media diaria de la semana
+    - por_tipo: media por tipo de comida (desayuno, comida...)
+    """
+
+    def __init__(self, plan, objetivos):
+        self.objetivos = dict(objetivos)
+        self.tabla = tabla_plan(plan)
+        macros = list(MACROS)
+        self.por_dia = self.tabla.groupby("dia", observed=False)[macros].sum()
+        kcal_macro = self.por_dia[list(KCAL_POR_GRAMO)] * pd.Series(KCAL_POR_GRAMO)
+        total = kcal_macro.sum(axis=1).replace(0, np.nan)
+        self.reparto = kcal_macro.div(total, axis=0).mul(100).fillna(0)
+        objetivo = pd.Series(self.objetivos, dtype=np.float64)[macros]
+        self.desvio = self.por_dia - objetivo
+        self.desvio_pct = self.desvio.div(objetivo.replace(0, np.nan)).mul(100).fillna(0)
+        self.semana = pd.DataFrame({"total": self.por_dia.sum(), "media": self.por_dia.mean(),
+                                    "objetivo": objetivo})
+        self.por_tipo = self.tabla.groupby("tipo", sort=False)[macros].mean()
+
+    def dia(self, dia):
+        """{macro: total} de un día (ceros si el día no está)"""
+        if dia not in self.por_dia.index:
+            return {m: 0 for m in MACROS}
+        return {m: int(round(v)) for m, v in self.por_dia.loc[dia].items()}
+
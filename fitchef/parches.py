@@ -0,0 +1,57 @@
+"""Edición parcial de planes: una comida, un día o un ejercicio se cambian sin regenerar la semana."""
+from fitchef.dieta import MACROS
+
+
+def aplicar(estructura, ruta, valor):
+    """Copia de 'estructura' con 'valor' en 'ruta' (tupla de claves/índices). Solo se copia el camino.
+
+    La ruta tiene que existir ya: un parche sustituye, no inventa días ni huecos.
+    """
+    if not ruta:
+        return valor
+    clave, resto = ruta[0], ruta[1:]
+    if isinstance(estructura, dict):
+        if clave not in estructura:
+            raise ValueError(f"'{clave}' no está en el plan.")
+        copia = dict(estructura)
+    elif isinstance(estructura, list):
+        if not isinstance(clave, int) or not 0 <= clave < len(estructura):
+            raise ValueError(f"No hay posición {clave} (hay {len(estructura)}).")
+        copia = list(estructura)
+    else:
+        raise ValueError(f"No se puede entrar en '{clave}'.")
+    copia[clave] = aplicar(estructura[clave], resto, valor)
+    return copia
+
+
+# ==========================================
+# REGLAS DE FUSIÓN (lo ya registrado no se pierde)
+# ==========================================
+def tiene_registro(ejercicio):
+    return bool(ejercicio.get("series_completadas"))
+
+
+def _mismo_ejercicio(a, b):
+    return " ".join(str(a.get("nombre", "")).lower().split()) == " ".join(str(b.get("nombre", "")).lower().split())
+
+
+def fusionar_ejercicio(viejo, nuevo):
+    """Si la IA repite el ejercicio, sus series ya hechas se quedan; si es otro, empieza de cero
+    (los kilos de un press no son series de una sentadilla)"""
+    series = list(viejo.get("series_completadas") or []) if _mismo_ejercicio(viejo, nuevo) else []
+    return {**nuevo, "series_completadas": series}
+
+
+def fusionar_dia_entreno(viejos, nuevos):
+    """Día nuevo por posiciones; los ejercicios que ya tienen series registradas se quedan como estaban"""
+    fusion = [v if tiene_registro(v) else n for v, n in zip(viejos, nuevos)]
+    fusion += nuevos[len(viejos):]
+    fusion += [v for v in viejos[len(nuevos):] if tiene_registro(v)]
+    return fusion
+
+
+def presupuesto_comida(comidas, i):
+    """Macros que tiene que cubrir la comida i para que el día cuadre (los del hueco actual) y el total del día"""
+    total = {m: sum(c.get(m, 0) or 0 for c in comidas) for m in MACROS}
+    hueco = {m: comidas[i].get(m, 0) or 0 for m in MACROS}
+    return hueco, total
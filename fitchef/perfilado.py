@@ -0,0 +1,131 @@
+"""Perfilado de reruns: cuánto tarda cada parte del script (barra lateral, pantalla, pestañas...).
+
+Se activa con ?perfil=1 o FITCHEF_PERFIL=1. Con ?perfil=cprofile además se saca un volcado
+pstats de ese rerun. Cada rerun medido se añade a un JSONL para comparar entre versiones.
+"""
+import cProfile
+import contextlib
+import io
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+
+log = logging.getLogger("fitchef.perfilado")
+
+MODOS = ("1", "cprofile")
+SEPARADOR = " › "
+_NULO = contextlib.nullcontext()
+_candado_disco = threading.Lock()
+_candado_cprofile = threading.Lock()  # Solo puede haber un cProfile activo a la vez en el proceso
+
+
+class PerfilRerun:
+    """Cronómetro de un rerun. Las secciones se anidan ("Nutrición Pro › Nevera") y las que se
+    repiten (una por ejercicio, p. ej.) se suman. Inactivo, seccion() no cuesta casi nada."""
+
+    def __init__(self, modo=None, carpeta=None):
+        self.activo = modo in MODOS
+        self.carpeta = carpeta
+        self.terminado = False
+        self.pantalla = None
+        self._t0 = time.perf_counter_ns()
+        self._fin = self._t0
+        self._pila = []
+        self._tiempos = {}  # ruta → [ns, veces, nivel]
+        self._perfilador = None
+        if self.activo and modo == "cprofile" and _candado_cprofile.acquire(blocking=False):
+            self._perfilador = cProfile.Profile()
+            self._perfilador.enable()
+
+    # --- Medición ---
+    def abrir(self, nombre):
+        if self.activo and not self.terminado:
+            ruta = SEPARADOR.join([*(r for r, _ in self._pila[-1:]), nombre])
+            self._tiempos.setdefault(ruta, [0, 0, len(self._pila)])  # En orden de apertura: el padre antes que sus hijos
+            self._pila.append((ruta, time.perf_counter_ns()))
+
+    def cerrar(self):
+        if not (self.activo and self._pila) or self.terminado:
+            return
+        ahora = time.perf_counter_ns()
+        ruta, t0 = self._pila.pop()
+        acumulado = self._tiempos[ruta]
+        acumulado[0] += ahora - t0
+        acumulado[1] += 1
+        self._fin = ahora
+
+    def seccion(self, nombre):
+        """with perfilador.seccion("Barra lateral"): ..."""
+        if not self.activo or self.terminado:
+            return _NULO
+        return self._seccion(nombre)
+
+    @contextlib.contextmanager
+    def _seccion(self, nombre):
+        self.abrir(nombre)
+        try:
+            yield
+        finally:
+            self.cerrar()
+
+    # --- Cierre ---
+    def terminar(self, interrumpido=False):
+        """Cierra el rerun y devuelve su registro (None si el perfilado está apagado).
+
+        interrumpido=True es un rerun cortado por st.rerun()/st.stop(): solo cuenta hasta la
+        última sección que llegó a cerrarse (lo que quedó abierto se descarta)."""
+        if not self.activo or self.terminado:
+            return None
+        if not interrumpido:
+            while self._pila:
+                self.cerrar()
+            self._fin = time.perf_counter_ns()
+        self.terminado = True
+        registro = {
+            "ts": time.time(), "pantalla": self.pantalla, "interrumpido": interrumpido,
+            "total_ms": (self._fin - self._t0) / 1e6,
+            "secciones": [{"seccion": ruta, "ms": ns / 1e6, "veces": veces, "nivel": nivel}
+                          for ruta, (ns, veces, nivel) in self._tiempos.items() if veces],
+            "pstats": None, "pstats_top": None,
+        }
+        if self._perfilador is not None:
+            self._perfilador.disable()
+            _candado_cprofile.release()
+            registro["pstats"], registro["pstats_top"] = self._volcar_pstats()
+        self._guardar(registro)
+        return registro
+
+    def _volcar_pstats(self, top=25):
+        texto = io.StringIO()
+        pstats.Stats(self._perfilador, stream=texto).sort_stats("cumulative").print_stats(top)
+        if not self.carpeta:
+            return None, texto.getvalue()
+        ruta = os.path.join(self.carpeta, f"rerun-{time.strftime('%Y%m%d-%H%M%S')}-{threading.get_ident()}.pstats")
+        try:
+            os.makedirs(self.carpeta, exist_ok=True)
+            self._perfilador.dump_stats(ruta)
+        except OSError as e:
+            log.warning("No se pudo guardar el pstats: %s", e)
+            ruta = None
+        return ruta, texto.getvalue()
+
+    def _guardar(self, registro):
+        if not self.carpeta:
+            return
+        linea = json.dumps({k: v for k, v in registro.items() if k != "pstats_top"}, ensure_ascii=False)
+        try:
+            os.makedirs(self.carpeta, exist_ok=True)
+            with _candado_disco, open(os.path.join(self.carpeta, "reruns.jsonl"), "a", encoding="utf-8") as f:
+                f.write(linea + "\n")
+        except OSError as e:
+            log.warning("No se pudo guardar el perfil del rerun: %s", e)
+
+
+def perfil_desde_entorno(carpeta_base, parametro=None):
+    """?perfil=... manda sobre FITCHEF_PERFIL; FITCHEF_PERFIL_RUTA es la carpeta de los volcados"""
+    modo = parametro or os.getenv("FITCHEF_PERFIL")
+    carpeta = os.getenv("FITCHEF_PERFIL_RUTA", os.path.join(carpeta_base, ".fitchef", "perfil"))
+    return PerfilRerun(modo, carpeta)
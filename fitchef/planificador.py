@@ -0,0 +1,223 @@
+"""Planificador global de llamadas a Gemini: límite de ritmo, tope de llamadas en vuelo, carriles de prioridad y reintentos."""
+import heapq
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+
+import httpx
+
+log = logging.getLogger("fitchef.planificador")
+
+# Carriles: menor número = pasa antes
+PRIORIDAD_INTERACTIVA = 0   # sustitutos, escáneres, voz: el usuario está mirando la pantalla
+PRIORIDAD_NORMAL = 1
+PRIORIDAD_MASIVA = 2        # plan semanal, microciclo, análisis largos
+NOMBRES_PRIORIDAD = {PRIORIDAD_INTERACTIVA: "interactiva", PRIORIDAD_NORMAL: "normal", PRIORIDAD_MASIVA: "masiva"}
+
+
+class IASaturada(Exception):
+    """La API sigue devolviendo 429/5xx después de todos los reintentos"""
+
+
+def es_reintentable(error):
+    """429 (cuota) y 5xx de la API, o fallos de red/timeouts del transporte"""
+    codigo = getattr(error, "code", None) or getattr(error, "status_code", None)
+    if isinstance(codigo, int):
+        return codigo == 429 or codigo >= 500
+    return isinstance(error, httpx.TransportError)
+
+
+class CuboTokens:
+    """Token bucket: 'tasa' llamadas por segundo de media con ráfagas de hasta 'capacidad'"""
+
+    def __init__(self, tasa, capacidad):
+        self.tasa = tasa
+        self.capacidad = capacidad
+        self._tokens = float(capacidad)
+        self._ultimo = time.monotonic()
+        self._candado = threading.Lock()
+
+    def intentar(self):
+        """Gasta un token si lo hay (devuelve 0) o devuelve los segundos que faltan para el siguiente"""
+        with self._candado:
+            ahora = time.monotonic()
+            self._tokens = min(self.capacidad, self._tokens + (ahora - self._ultimo) * self.tasa)
+            self._ultimo = ahora
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.tasa
+
+    def tomar(self):
+        """Bloquea hasta que haya un token y lo gasta. Devuelve los segundos esperados"""
+        esperado = 0.0
+        while falta := self.intentar():
+            time.sleep(falta)
+            esperado += falta
+        return esperado
+
+
+class Planificador:
+    """Todas las llamadas de todas las sesiones pasan por aquí (es un recurso de proceso)"""
+
+    def __init__(self, max_en_vuelo=8, llamadas_por_minuto=60, rafaga=10, reintentos=4,
+                 espera_base_s=1.0, espera_max_s=30.0):
+        self.max_en_vuelo = max_en_vuelo
+        self.cubo = CuboTokens(llamadas_por_minuto / 60.0, rafaga)
+        self.reintentos = reintentos
+        self.espera_base_s = espera_base_s
+        self.espera_max_s = espera_max_s
+        self._cola = []
+        self._turnos = itertools.count()
+        self._en_vuelo = 0
+        self._cond = threading.Condition()
+        self._metricas = {
+            "llamadas": 0, "reintentos": 0, "errores": 0, "saturaciones": 0,
+            "espera_cola_s": 0.0, "espera_ritmo_s": 0.0, "cola_maxima": 0,
+            "por_prioridad": {n: 0 for n in NOMBRES_PRIORIDAD.values()},
+        }
+
+    def _sumar(self, **incrementos):
+        """Las métricas se tocan desde todos los hilos: siempre bajo el mismo candado que la cola"""
+        with self._cond:
+            for clave, cantidad in incrementos.items():
+                self._metricas[clave] += cantidad
+
+    def _contar_llamada(self, prioridad):
+        with self._cond:
+            self._metricas["llamadas"] += 1
+            self._metricas["por_prioridad"][NOMBRES_PRIORIDAD.get(prioridad, "normal")] += 1
+
+    # --- Admisión por prioridad ---
+    def _entrar(self, prioridad):
+        # Los tokens se reparten en orden de prioridad: solo la cabeza de la cola los pide, y espera
+        # sin ocupar hueco, así que una llamada interactiva adelanta a un lote masivo aunque el límite sea el ritmo
+        t0 = time.monotonic()
+        espera_ritmo = 0.0
+        with self._cond:
+            turno = (prioridad, next(self._turnos))
+            heapq.heappush(self._cola, turno)
+            self._metricas["cola_maxima"] = max(self._metricas["cola_maxima"], len(self._cola))
+            self._cond.notify_all()
+            while True:
+                if self._cola[0] != turno or self._en_vuelo >= self.max_en_vuelo:
+                    self._cond.wait()
+                    continue
+                falta = self.cubo.intentar()
+                if not falta:
+                    break
+                t_ritmo = time.monotonic()
+                self._cond.wait(falta)
+                espera_ritmo += time.monotonic() - t_ritmo
+            heapq.heappop(self._cola)
+            self._en_vuelo += 1
+            self._metricas["espera_ritmo_s"] += espera_ritmo
+            self._metricas["espera_cola_s"] += time.monotonic() - t0 - espera_ritmo
+            self._cond.notify_all()
+
+    def _salir(self):
+        with self._cond:
+            self._en_vuelo -= 1
+            self._cond.notify_all()
+
+    def _espera_reintento(self, intento):
+        """Backoff exponencial con 'full jitter' (evita que todas las sesiones reintenten a la vez)"""
+        return random.uniform(0, min(self.espera_max_s, self.espera_base_s * 2 ** intento))
+
+    def _fallo(self, error, intento):
+        """Decide si se reintenta (y espera) o se propaga el error"""
+        if not es_reintentable(error):
+            self._sumar(errores=1)
+            raise error
+        if intento >= self.reintentos:
+            self._sumar(errores=1, saturaciones=1)
+            raise IASaturada(f"La IA está saturada ahora mismo ({error}). Prueba en un minuto.") from error
+        self._sumar(reintentos=1)
+        espera = self._espera_reintento(intento)
+        log.info("Reintento %s en %.1f s tras: %s", intento + 1, espera, error)
+        time.sleep(espera)
+
+    # --- API ---
+    def ejecutar(self, funcion, prioridad=PRIORIDAD_NORMAL):
+        """Ejecuta funcion() respetando cola, ritmo y tope; reintenta 429/5xx"""
+        self._contar_llamada(prioridad)
+        for intento in itertools.count():
+            self._entrar(prioridad)
+            try:
+                return funcion()
+            except Exception as e:
+                error = e
+            finally:
+                self._salir()
+            self._fallo(error, intento)
+
+    def ejecutar_stream(self, crear_stream, prioridad=PRIORIDAD_NORMAL):
+        """Igual para streaming: el hueco se ocupa mientras dura el stream; solo se reintenta antes del primer trozo"""
+        self._contar_llamada(prioridad)
+        for intento in itertools.count():
+            self._entrar(prioridad)
+            emitido = False
+            try:
+                for trozo in crear_stream():
+                    emitido = True
+                    yield trozo
+                return
+            except Exception as e:
+                if emitido:
+                    self._sumar(errores=1)
+                    raise
+                error = e
+            finally:
+                self._salir()
+            self._fallo(error, intento)
+
+    def metricas(self):
+        with self._cond:
+            profundidad = {n: 0 for n in NOMBRES_PRIORIDAD.values()}
+            for prioridad, _ in self._cola:
+                profundidad[NOMBRES_PRIORIDAD.get(prioridad, "normal")] += 1
+            return {**self._metricas, "por_prioridad": dict(self._metricas["por_prioridad"]),
+                    "en_cola": len(self._cola), "en_cola_por_prioridad": profundidad, "en_vuelo": self._en_vuelo}
+
+
+def planificador_desde_entorno():
+    """Planificador con la configuración de las variables FITCHEF_IA_*"""
+    return Planificador(
+        max_en_vuelo=int(os.getenv("FITCHEF_IA_MAX_EN_VUELO", "8")),
+        llamadas_por_minuto=float(os.getenv("FITCHEF_IA_RPM", "60")),
+        rafaga=int(os.getenv("FITCHEF_IA_RAFAGA", "10")),
+        reintentos=int(os.getenv("FITCHEF_IA_REINTENTOS", "4")),
+    )
+
+
+# ==========================================
+# ENVOLTORIO DEL CLIENTE (misma API que genai.Client)
+# ==========================================
+class ModelosPlanificados:
+    """Sustituto de client.models: cada llamada hace cola en el planificador. Acepta prioridad=..."""
+
+    def __init__(self, modelos, planificador):
+        self._modelos = modelos
+        self.planificador = planificador
+
+    def generate_content(self, *, prioridad=PRIORIDAD_NORMAL, **kwargs):
+        return self.planificador.ejecutar(lambda: self._modelos.generate_content(**kwargs), prioridad)
+
+    def generate_content_stream(self, *, prioridad=PRIORIDAD_NORMAL, **kwargs):
+        return self.planificador.ejecutar_stream(lambda: self._modelos.generate_content_stream(**kwargs), prioridad)
+
+    def __getattr__(self, nombre):
+        return getattr(self._modelos, nombre)
+
+
+class ClientePlanificado:
+    def __init__(self, cliente, planificador):
+        self._cliente = cliente
+        self.planificador = planificador
+        self.models = ModelosPlanificados(cliente.models, planificador)
+
+    def __getattr__(self, nombre):
+        return getattr(self._cliente, nombre)
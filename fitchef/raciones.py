@@ -0,0 +1,120 @@
+"""Ajuste de raciones en local: reescala las cantidades de un día para cuadrar los macros objetivo.
+
+Mínimos cuadrados con cotas sobre multiplicadores de ración (numpy, descenso por coordenadas).
+La IA pone las recetas; las cantidades se cuadran aquí, en milisegundos y siempre igual.
+"""
+import re
+
+import numpy as np
+
+from fitchef.alimentos import interpretar_cantidad
+from fitchef.dieta import MACROS
+
+# Cuánto importa fallar cada macro (en error relativo al objetivo): la proteína manda
+PESOS = {"kcal": 1.0, "prot": 2.0, "cho": 0.5, "fat": 1.0}
+LIMITES = (0.5, 2.0)  # Ninguna ración baja de la mitad ni pasa del doble
+SUAVIDAD = 0.01  # Entre dos soluciones igual de buenas, la que menos cambia el plan
+_SUFIJO_RACION = re.compile(r"\s*\(ración ×([\d.]+)\)$")
+
+
+def resolver(A, b, pesos, inferior, superior, suavidad=SUAVIDAD, max_vueltas=500, tol=1e-7):
+    """min Σ pesos·(A·x - b)² + suavidad·|x - 1|²  con inferior ≤ x ≤ superior.
+
+    A: macros × piezas. Descenso por coordenadas con recorte a las cotas (convexo: converge).
+    """
+    raiz = np.sqrt(pesos)[:, None]
+    M = A * raiz
+    y = b * raiz[:, 0]
+    x = np.ones(A.shape[1])
+    resto = y - M @ x
+    normas = (M * M).sum(axis=0) + suavidad
+    for _ in range(max_vueltas):
+        cambio = 0.0
+        for j in range(len(x)):
+            col = M[:, j]
+            nuevo = (col @ resto + col @ col * x[j] + suavidad) / normas[j]
+            nuevo = min(max(nuevo, inferior[j]), superior[j])
+            if nuevo != x[j]:
+                resto -= col * (nuevo - x[j])
+                cambio = max(cambio, abs(nuevo - x[j]))
+                x[j] = nuevo
+        if cambio < tol:
+            break
+    return x
+
+
+def _redondear(cantidad, unidad):
+    """Raciones que se puedan pesar o contar: gramos de 5 en 5, unidades de media en media"""
+    if unidad == "ud":
+        return max(0.5, round(cantidad * 2) / 2)
+    return max(5.0, round(cantidad / 5) * 5)
+
+
+def _texto(cantidad, unidad, nombre):
+    n = f"{cantidad:g}"
+    return f"{n} {nombre}" if unidad == "ud" else f"{n} g de {nombre}"
+
+
+def _con_racion(plato, f):
+    """'Plato' → 'Plato (ración ×f)'. Si ya se había ajustado, el sufijo se sustituye por el factor acumulado"""
+    previo = _SUFIJO_RACION.search(plato)
+    if previo:
+        plato, f = plato[:previo.start()], f * float(previo.group(1))
+    f = round(f, 2)
+    return plato if f == 1 else f"{plato} (ración ×{f:g})"
+
+
+def _piezas(comidas, base):
+    """Una pieza por ingrediente reconocido (macros locales) o, si la comida no tiene ninguno,
+    la comida entera (macros de la IA). Devuelve [(comida, índice_ingrediente o None, línea, macros)]"""
+    piezas = []
+    for i, c in enumerate(comidas):
+        propias = []
+        for k, ing in enumerate(c.get("ingredientes", [])):
+            linea = base.costear(ing)
+            if linea and any(linea[m] for m in MACROS):
+                propias.append((i, k, linea, np.array([linea[m] for m in MACROS])))
+        piezas += propias or [(i, None, None, np.array([c.get(m) or 0 for m in MACROS], dtype=float))]
+    return piezas
+
+
+def ajustar_dia(comidas, objetivos, base, limites=LIMITES):
+    """Comidas de un día con las raciones reescaladas hacia 'objetivos'. Devuelve (comidas, informe).
+
+    Los macros de cada comida parten de los de la IA y se corrigen con lo que cambian sus
+    ingredientes según la tabla local (así no se mezclan dos fuentes en el mismo número).
+    """
+    piezas = _piezas(comidas, base)
+    objetivo = np.array([float(objetivos[m]) for m in MACROS])
+    ia = np.array([sum(c.get(m) or 0 for c in comidas) for m in MACROS], dtype=float)
+    A = np.column_stack([p[3] for p in piezas]) if piezas else np.zeros((len(MACROS), 0))
+    # Total del día = IA + Σ (x_j - 1)·pieza_j para las líneas; las comidas enteras escalan lo suyo
+    fijo = ia - A.sum(axis=1)
+    escala = np.where(objetivo > 0, objetivo, 1.0)
+    x = resolver(A / escala[:, None], (objetivo - fijo) / escala, np.array([PESOS[m] for m in MACROS]),
+                 np.full(len(piezas), limites[0]), np.full(len(piezas), limites[1]))
+
+    nuevas = [dict(c, ingredientes=list(c.get("ingredientes", []))) for c in comidas]
+    factores = []
+    for (i, k, linea, macros), f in zip(piezas, x):
+        c = nuevas[i]
+        if k is None:
+            f = round(f * 4) / 4  # Comida sin ingredientes reconocibles: ración ×1.25, ×1.5...
+            if f != 1:
+                for m in MACROS:
+                    c[m] = round((c.get(m) or 0) * f)
+                c["plato"] = _con_racion(c["plato"], f)
+        else:
+            cantidad, unidad, nombre = interpretar_cantidad(linea["ingrediente"])
+            if unidad is None:
+                cantidad, unidad = linea["gramos"], "g"
+            nueva = _redondear(cantidad * f, unidad)
+            f = nueva / cantidad if cantidad else 1.0
+            if f != 1:
+                c["ingredientes"][k] = _texto(nueva, unidad, nombre or linea["alimento"])
+                for m, v in zip(MACROS, macros):
+                    c[m] = round((c.get(m) or 0) + (f - 1) * v)
+        factores.append({"comida": i, "ingrediente": k, "factor": round(f, 2)})
+    antes = {m: int(v) for m, v in zip(MACROS, ia.round())}
+    despues = {m: sum(c.get(m) or 0 for c in nuevas) for m in MACROS}
+    return nuevas, {"antes": antes, "despues": despues, "objetivos": dict(objetivos), "factores": factores}
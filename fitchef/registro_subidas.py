@@ -0,0 +1,51 @@
+"""Libro de subidas ya procesadas: la misma foto/audio no vuelve a la IA en cada rerun."""
+import hashlib
+from collections import OrderedDict
+
+
+def huella(subida):
+    """SHA-256 del contenido (UploadedFile de Streamlit, BytesIO o bytes)"""
+    datos = subida.getvalue() if hasattr(subida, "getvalue") else bytes(subida)
+    return hashlib.sha256(datos).hexdigest()
+
+
+class RegistroSubidas:
+    """(función, sha256 de la subida) → lo que produjo. Se guarda en la sesión del usuario"""
+
+    def __init__(self, max_entradas=200):
+        self.max_entradas = max_entradas
+        self._libro = OrderedDict()
+
+    def buscar(self, funcion, subida):
+        """(True, resultado) si esta subida ya pasó por esta función; (False, None) si es nueva"""
+        return self._buscar((funcion, huella(subida)))
+
+    def anotar(self, funcion, subida, resultado):
+        if resultado is not None:
+            self._anotar((funcion, huella(subida)), resultado)
+
+    def procesar(self, funcion, subida, procesador, anotar_si=None):
+        """Devuelve (resultado, es_nuevo). Solo llama a procesador() hasta que sale algo que apuntar.
+
+        Un fallo (excepción), un None o lo que no pase anotar_si(resultado) no se apunta: la misma
+        subida se vuelve a intentar (p. ej. cuando se activa la IA).
+        """
+        clave = (funcion, huella(subida))
+        ya_hecho, resultado = self._buscar(clave)
+        if ya_hecho:
+            return resultado, False
+        resultado = procesador()
+        if resultado is not None and (anotar_si is None or anotar_si(resultado)):
+            self._anotar(clave, resultado)
+        return resultado, True
+
+    def _buscar(self, clave):
+        if clave in self._libro:
+            self._libro.move_to_end(clave)
+            return True, self._libro[clave]
+        return False, None
+
+    def _anotar(self, clave, resultado):
+        self._libro[clave] = resultado
+        while len(self._libro) > self.max_entradas:
+            self._libro.popitem(last=False)
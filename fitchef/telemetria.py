@@ -0,0 +1,260 @@
+"""Telemetría de las llamadas a la IA: quién llama, cuánto tarda, cuántos tokens y cuánto cuesta.
+
+Cada llamada deja un registro en un buffer circular en memoria (para los percentiles de la
+pantalla de admin) y, en lotes desde un hilo aparte, en un JSONL que rota por tamaño. Si un
+registro se corrige después de volcado, se añade una línea {"corrige": id, ...}: leer_jsonl las aplica.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+log = logging.getLogger("fitchef.telemetria")
+
+# USD por millón de tokens (entrada, salida). Se pueden pisar con FITCHEF_PRECIO_ENTRADA/SALIDA
+PRECIOS = {
+    "gemini-2.5-pro": (1.25, 10.0),
+    "gemini-2.5-flash": (0.30, 2.50),
+}
+DESENLACES = ("ok", "json_invalido", "error_api")
+
+
+def _bytes_contenido(contents):
+    """(bytes de texto, bytes de adjuntos) de lo que se manda a la IA"""
+    partes = contents if isinstance(contents, (list, tuple)) else [contents]
+    texto = adjuntos = 0
+    for p in partes:
+        if isinstance(p, str):
+            texto += len(p.encode("utf-8"))
+        elif getattr(p, "inline_data", None) is not None and getattr(p.inline_data, "data", None):
+            adjuntos += len(p.inline_data.data)
+        elif getattr(p, "text", None):
+            texto += len(p.text.encode("utf-8"))
+        elif hasattr(p, "size"):  # Ficheros subidos (audio de Streamlit...)
+            adjuntos += int(p.size or 0)
+    return texto, adjuntos
+
+
+def _tokens(respuesta):
+    uso = getattr(respuesta, "usage_metadata", None)
+    if uso is None:
+        return None, None
+    salida = (getattr(uso, "candidates_token_count", None) or 0) + (getattr(uso, "thoughts_token_count", None) or 0)
+    return getattr(uso, "prompt_token_count", None), salida or None
+
+
+class Telemetria:
+    """Buffer circular de los últimos 'capacidad' registros + volcado a JSONL rotatorio.
+
+    El volcado va con un poco de retraso a propósito: así generar_json suele marcar como
+    'json_invalido' una llamada que ya terminó bien a nivel de API antes de que se escriba.
+    Si llega tarde, la corrección va al JSONL como una línea aparte.
+    """
+
+    def __init__(self, ruta=None, capacidad=5000, max_bytes=5 * 1024 * 1024, copias=3,
+                 intervalo_s=2.0, retraso_s=1.0, precios=None):
+        self.ruta = ruta
+        self.max_bytes = max_bytes
+        self.copias = copias
+        self.retraso_s = retraso_s
+        self.precios = {**PRECIOS, **(precios or {})}
+        self._registros = deque(maxlen=capacidad)
+        self._pendientes = deque()
+        self._candado = threading.Lock()
+        self._local = threading.local()
+        self._parar = threading.Event()
+        self._siguiente_id = 0
+        if ruta:
+            if os.path.dirname(ruta):
+                os.makedirs(os.path.dirname(ruta), exist_ok=True)
+            threading.Thread(target=self._vigilar, args=(intervalo_s,), daemon=True,
+                             name="fitchef-telemetria").start()
+            atexit.register(self.volcar, True)
+
+    # --- Escritura ---
+    def anotar(self, **registro):
+        """Añade un registro (dict) y lo deja como 'el último' de este hilo"""
+        precio_in, precio_out = self.precios.get(registro.get("modelo"), (0.0, 0.0))
+        registro["coste_usd"] = ((registro.get("tokens_entrada") or 0) * precio_in +
+                                 (registro.get("tokens_salida") or 0) * precio_out) / 1e6
+        with self._candado:
+            registro["id"] = self._siguiente_id
+            self._siguiente_id += 1
+            self._registros.append(registro)
+            if self.ruta:
+                self._pendientes.append(registro)
+        self._local.ultimo = registro
+        return registro
+
+    def marcar_ultimo(self, desenlace):
+        """Corrige el desenlace de la última llamada de este hilo (p. ej. la API contestó pero el JSON no vale)"""
+        ultimo = getattr(self._local, "ultimo", None)
+        if ultimo is None:
+            return
+        with self._candado:
+            ultimo["desenlace"] = desenlace
+            if self.ruta and not any(r is ultimo for r in self._pendientes):  # Ya está en disco
+                self._pendientes.append({"ts": time.time(), "corrige": ultimo["id"], "desenlace": desenlace})
+
+    # --- Disco ---
+    def _vigilar(self, intervalo):
+        while not self._parar.wait(intervalo):
+            try:
+                self.volcar()
+            except OSError as e:
+                log.warning("No se pudo volcar la telemetría: %s", e)
+
+    def volcar(self, todo=False):
+        """Escribe al JSONL los registros pendientes con más de retraso_s (todos si todo=True)"""
+        limite = time.time() - (0 if todo else self.retraso_s)
+        lineas = []
+        with self._candado:  # Se serializa aquí dentro: marcar_ultimo no puede cambiar un registro a medio escribir
+            while self._pendientes and (todo or self._pendientes[0]["ts"] <= limite):
+                lineas.append(json.dumps(self._pendientes.popleft(), ensure_ascii=False) + "\n")
+        if not lineas or not self.ruta:
+            return 0
+        self._rotar()
+        with open(self.ruta, "a", encoding="utf-8") as f:
+            f.writelines(lineas)
+        return len(lineas)
+
+    def _rotar(self):
+        """telemetria.jsonl → .1 → .2 ... (se conservan 'copias')"""
+        if not os.path.exists(self.ruta) or os.path.getsize(self.ruta) < self.max_bytes:
+            return
+        for i in range(self.copias - 1, 0, -1):
+            if os.path.exists(f"{self.ruta}.{i}"):
+                os.replace(f"{self.ruta}.{i}", f"{self.ruta}.{i + 1}")
+        os.replace(self.ruta, f"{self.ruta}.1")
+
+    def cerrar(self):
+        self._parar.set()
+        self.volcar(True)
+
+    # --- Lectura ---
+    def registros(self):
+        with self._candado:
+            return list(self._registros)
+
+    def resumen(self):
+        """Por función: llamadas, p50/p95/p99 de latencia, TTFT, tokens, coste, aciertos de caché y desenlaces"""
+        por_funcion = {}
+        for r in self.registros():
+            por_funcion.setdefault(r["funcion"], []).append(r)
+        filas = []
+        for funcion, rs in sorted(por_funcion.items()):
+            lat = np.array([r["latencia_s"] for r in rs])
+            ttft = np.array([r["ttft_s"] for r in rs if r.get("ttft_s") is not None])
+            p50, p95, p99 = np.percentile(lat, (50, 95, 99))
+            filas.append({
+                "funcion": funcion, "llamadas": len(rs),
+                "p50_s": p50, "p95_s": p95, "p99_s": p99,
+                "ttft_p50_s": float(np.percentile(ttft, 50)) if len(ttft) else None,
+                "tokens_entrada": sum(r.get("tokens_entrada") or 0 for r in rs),
+                "tokens_salida": sum(r.get("tokens_salida") or 0 for r in rs),
+                "kb_adjuntos": sum(r["bytes_adjuntos"] for r in rs) / 1024,
+                "coste_usd": sum(r["coste_usd"] for r in rs),
+                "aciertos_cache": sum(1 for r in rs if r["cache"]) / len(rs),
+                **{d: sum(1 for r in rs if r["desenlace"] == d) for d in DESENLACES},
+            })
+        return filas
+
+
+def leer_jsonl(ruta):
+    """Registros de un JSONL de telemetría con las correcciones ya aplicadas (las líneas 'corrige' no salen)"""
+    registros, por_id = [], {}
+    with open(ruta, encoding="utf-8") as f:
+        for linea in f:
+            if not linea.strip():
+                continue
+            r = json.loads(linea)
+            if "corrige" in r:
+                corregido = por_id.get(r["corrige"])
+                if corregido is not None:
+                    corregido.update({k: v for k, v in r.items() if k not in ("ts", "corrige")})
+                continue
+            registros.append(r)
+            por_id[r["id"]] = r
+    return registros
+
+
+# ==========================================
+# ENVOLTORIO DEL CLIENTE (capa más externa: mide lo que ve el usuario, caché y cola incluidas)
+# ==========================================
+class ModelosMedidos:
+    """Sustituto de client.models que acepta funcion="plan_dia", "jarvis"... y anota cada llamada"""
+
+    def __init__(self, modelos, telemetria):
+        self._modelos = modelos
+        self.telemetria = telemetria
+
+    def _anotar(self, funcion, kwargs, t0, ttft, respuesta, error, stream):
+        texto_b, adjuntos_b = _bytes_contenido(kwargs.get("contents"))
+        entrada, salida = _tokens(respuesta) if respuesta is not None else (None, None)
+        self.telemetria.anotar(
+            ts=time.time(), funcion=funcion, modelo=kwargs.get("model"), stream=stream,
+            bytes_prompt=texto_b, bytes_adjuntos=adjuntos_b,
+            ttft_s=ttft, latencia_s=time.perf_counter() - t0,
+            tokens_entrada=entrada, tokens_salida=salida,
+            cache=bool(getattr(respuesta, "desde_cache", False)),
+            desenlace="ok" if error is None else "error_api",
+            error=None if error is None else f"{type(error).__name__}: {error}"[:300],
+        )
+
+    def generate_content(self, *, funcion="general", **kwargs):
+        t0 = time.perf_counter()
+        try:
+            res = self._modelos.generate_content(**kwargs)
+        except Exception as e:
+            self._anotar(funcion, kwargs, t0, None, None, e, False)
+            raise
+        self._anotar(funcion, kwargs, t0, None, res, None, False) # Sin stream no hay primer trozo: ttft queda vacío
+        return res
+
+    def generate_content_stream(self, *, funcion="general", **kwargs):
+        t0 = time.perf_counter()
+        ttft, ultimo, error = None, None, None
+        try:
+            for trozo in self._modelos.generate_content_stream(**kwargs):
+                if ttft is None:
+                    ttft = time.perf_counter() - t0
+                ultimo = trozo  # El uso de tokens llega completo en el último trozo
+                yield trozo
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._anotar(funcion, kwargs, t0, ttft, ultimo, error, True)
+
+    def __getattr__(self, nombre):
+        return getattr(self._modelos, nombre)
+
+
+class ClienteMedido:
+    def __init__(self, cliente, telemetria):
+        self._cliente = cliente
+        self.telemetria = telemetria
+        self.models = ModelosMedidos(cliente.models, telemetria)
+
+    def __getattr__(self, nombre):
+        return getattr(self._cliente, nombre)
+
+
+def telemetria_desde_entorno(carpeta_base):
+    """FITCHEF_TELEMETRIA=0 desactiva el disco; FITCHEF_TELEMETRIA_RUTA, _MB y _COPIAS para el JSONL"""
+    ruta = None
+    if os.getenv("FITCHEF_TELEMETRIA", "1") != "0":
+        ruta = os.getenv("FITCHEF_TELEMETRIA_RUTA", os.path.join(carpeta_base, ".fitchef", "telemetria.jsonl"))
+    precios = {}
+    if os.getenv("FITCHEF_PRECIO_ENTRADA") or os.getenv("FITCHEF_PRECIO_SALIDA"):
+        modelo = os.getenv("FITCHEF_MODELO_PRECIO", "gemini-2.5-pro")
+        base = PRECIOS.get(modelo, (0.0, 0.0))
+        precios[modelo] = (float(os.getenv("FITCHEF_PRECIO_ENTRADA", base[0])),
+                           float(os.getenv("FITCHEF_PRECIO_SALIDA", base[1])))
+    return Telemetria(ruta, max_bytes=int(float(os.getenv("FITCHEF_TELEMETRIA_MB", "5")) * 1024 * 1024),
+                      copias=int(os.getenv("FITCHEF_TELEMETRIA_COPIAS", "3")), precios=precios)
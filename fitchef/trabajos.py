@@ -0,0 +1,108 @@
+"""Trabajos en segundo plano: las generaciones largas no congelan el script ni se pierden al navegar."""
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger("fitchef.trabajos")
+
+EN_COLA, EN_CURSO, HECHO, ERROR = "en_cola", "en_curso", "hecho", "error"
+
+
+class Trabajo:
+    """Un encargo de un usuario. El hilo va dejando líneas de progreso que la UI pinta al sondear"""
+
+    def __init__(self, usuario, tipo, etiqueta):
+        self.id = uuid.uuid4().hex[:8]
+        self.usuario = usuario
+        self.tipo = tipo
+        self.etiqueta = etiqueta
+        self.estado = EN_COLA
+        self.progreso = []
+        self.parciales = {}
+        self.resultado = None
+        self.error = None
+        self.creado = time.time()
+        self.terminado = None
+
+    @property
+    def activo(self):
+        return self.estado in (EN_COLA, EN_CURSO)
+
+    def avisar(self, linea):
+        """Para el hilo de trabajo: añade una línea de progreso (list.append es atómico)"""
+        self.progreso.append(linea)
+
+    def entregar(self, clave, valor):
+        """Para el hilo de trabajo: deja un trozo del resultado ya listo, antes de que acabe todo"""
+        self.parciales[clave] = valor
+
+    @property
+    def segundos(self):
+        return (self.terminado or time.time()) - self.creado
+
+
+class GestorTrabajos:
+    """Registro (usuario, tipo) → Trabajo sobre un pool de hilos. Es un recurso de proceso.
+
+    Los trabajos van por usuario (el ?u= persistido), no por sesión: sobreviven a reruns, cambios
+    de pestaña y a recargar el navegador. Mandar dos veces el mismo tipo mientras el primero
+    sigue en marcha devuelve el que ya existe.
+    """
+
+    def __init__(self, max_hilos=4, caducidad_s=3600):
+        self._pool = ThreadPoolExecutor(max_workers=max_hilos, thread_name_prefix="fitchef-trabajo")
+        self._trabajos = {}
+        self._candado = threading.Lock()
+        self.caducidad_s = caducidad_s
+
+    def enviar(self, usuario, tipo, funcion, *args, etiqueta=None, **kwargs):
+        """Lanza funcion(trabajo, *args, **kwargs) en segundo plano. Devuelve (trabajo, es_nuevo)"""
+        with self._candado:
+            self._limpiar()
+            previo = self._trabajos.get((usuario, tipo))
+            if previo is not None and previo.activo:
+                return previo, False
+            trabajo = Trabajo(usuario, tipo, etiqueta or tipo)
+            self._trabajos[(usuario, tipo)] = trabajo
+        self._pool.submit(self._ejecutar, trabajo, funcion, args, kwargs)
+        return trabajo, True
+
+    def _ejecutar(self, trabajo, funcion, args, kwargs):
+        trabajo.estado = EN_CURSO
+        try:
+            resultado, estado = funcion(trabajo, *args, **kwargs), HECHO
+        except Exception as e:
+            trabajo.error, resultado, estado = e, None, ERROR
+            log.warning("Trabajo %s (%s) fallido: %s", trabajo.id, trabajo.tipo, e)
+        trabajo.resultado = resultado
+        trabajo.terminado = time.time()
+        trabajo.estado = estado  # Lo último: quien lo vea terminado ya tiene resultado y hora
+
+    def obtener(self, usuario, tipo):
+        with self._candado:
+            return self._trabajos.get((usuario, tipo))
+
+    def de_usuario(self, usuario):
+        with self._candado:
+            return [t for (u, _), t in self._trabajos.items() if u == usuario]
+
+    def recoger(self, usuario, tipo):
+        """Quita del registro un trabajo terminado y lo devuelve (None si sigue en marcha o no existe)"""
+        with self._candado:
+            trabajo = self._trabajos.get((usuario, tipo))
+            if trabajo is None or trabajo.activo:
+                return None
+            return self._trabajos.pop((usuario, tipo))
+
+    def _limpiar(self):
+        """Olvida trabajos terminados que nadie ha venido a recoger (usuarios que no han vuelto)"""
+        limite = time.time() - self.caducidad_s
+        for clave in [c for c, t in self._trabajos.items() if not t.activo and t.terminado < limite]:
+            del self._trabajos[clave]
+
+
+def gestor_desde_entorno():
+    return GestorTrabajos(max_hilos=int(os.getenv("FITCHEF_HILOS_TRABAJOS", "4")))
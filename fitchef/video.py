@@ -0,0 +1,216 @@
+"""Preprocesado de vídeo para el Coach Técnico: recorte a la serie, fotogramas clave y caché por contenido."""
+import hashlib
+import io
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import cv2
+except ImportError:  # Sin OpenCV se manda el vídeo tal cual (como antes)
+    cv2 = None
+
+log = logging.getLogger("fitchef.video")
+
+VIDEO_DISPONIBLE = cv2 is not None
+
+
+class VideoPreparado:
+    """Fotogramas JPEG ya listos para la IA + de dónde salen"""
+
+    def __init__(self, huella, fotogramas, instantes, duracion, ventana, bytes_originales):
+        self.huella = huella
+        self.fotogramas = fotogramas      # lista de bytes JPEG
+        self.instantes = instantes        # segundo de cada fotograma
+        self.duracion = duracion
+        self.ventana = ventana            # (inicio, fin) en segundos
+        self.bytes_originales = bytes_originales
+
+    @property
+    def bytes_enviados(self):
+        return sum(len(f) for f in self.fotogramas)
+
+
+def _abrir(datos):
+    """OpenCV solo lee de disco: volcamos el vídeo a un temporal"""
+    tmp = tempfile.NamedTemporaryFile(suffix=".mp4", delete=False)
+    tmp.write(datos)
+    tmp.close()
+    cap = cv2.VideoCapture(tmp.name)
+    return cap, tmp.name
+
+
+def _info(cap):
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    n = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    return fps, n, n / fps if fps else 0.0
+
+
+def duracion_video(datos):
+    """Duración en segundos (0 si no se puede leer)"""
+    if not VIDEO_DISPONIBLE:
+        return 0.0
+    cap, ruta = _abrir(datos)
+    try:
+        return _info(cap)[2]
+    finally:
+        cap.release()
+        os.unlink(ruta)
+
+
+def ventana_de_movimiento(cap, fps_origen, n, muestras_por_s=4, umbral=0.25, margen_s=0.5):
+    """Busca dónde está la serie: el tramo con movimiento (diferencia entre fotogramas) por encima del umbral"""
+    paso = max(1, int(round(fps_origen / muestras_por_s)))
+    energias, instantes, previo = [], [], None
+    for idx in range(0, n, paso):
+        cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
+        ok, frame = cap.read()
+        if not ok:
+            break
+        gris = cv2.cvtColor(cv2.resize(frame, (96, 96)), cv2.COLOR_BGR2GRAY)
+        if previo is not None:
+            energias.append(float(cv2.absdiff(gris, previo).mean()))
+            instantes.append(idx / fps_origen)
+        previo = gris
+    if not energias or max(energias) <= 0:
+        return 0.0, n / fps_origen
+    corte = umbral * max(energias)
+    activos = [t for t, e in zip(instantes, energias) if e >= corte]
+    return max(0.0, activos[0] - margen_s), min(n / fps_origen, activos[-1] + margen_s)
+
+
+def preparar_video(datos, fps=2.0, ventana=None, lado=768, max_fotogramas=40, calidad=80):
+    """Recorta a la ventana (o la detecta), muestrea a 'fps' y reduce cada fotograma a 'lado' px en JPEG"""
+    t0 = time.perf_counter()
+    huella = hashlib.sha256(datos).hexdigest()
+    cap, ruta = _abrir(datos)
+    try:
+        fps_origen, n, duracion = _info(cap)
+        if n <= 0:
+            raise ValueError("No se puede leer el vídeo.")
+        inicio, fin = ventana if ventana else ventana_de_movimiento(cap, fps_origen, n)
+        fin = min(fin, duracion)
+        # Si a este fps salen demasiados fotogramas, espaciamos más (mejor cubrir toda la serie)
+        paso_s = max(1.0 / fps, (fin - inicio) / max_fotogramas)
+        fotogramas, instantes = [], []
+        t = inicio
+        while t < fin and len(fotogramas) < max_fotogramas:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, int(t * fps_origen))
+            ok, frame = cap.read()
+            if not ok:
+                break
+            alto, ancho = frame.shape[:2]
+            escala = lado / max(alto, ancho)
+            if escala < 1:
+                frame = cv2.resize(frame, (int(ancho * escala), int(alto * escala)), interpolation=cv2.INTER_AREA)
+            ok, jpg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, calidad])
+            if ok:
+                fotogramas.append(jpg.tobytes())
+                instantes.append(round(t, 2))
+            t += paso_s
+    finally:
+        cap.release()
+        os.unlink(ruta)
+    prep = VideoPreparado(huella, fotogramas, instantes, duracion, (inicio, fin), len(datos))
+    log.info("vídeo %s: %s bytes → %s fotogramas (%s bytes) de %.1f-%.1f s en %.0f ms", huella[:8], len(datos),
+             len(fotogramas), prep.bytes_enviados, inicio, fin, (time.perf_counter() - t0) * 1000)
+    return prep
+
+
+class CacheVideos:
+    """Vídeos ya preparados por (sha256, parámetros): re-analizar o preguntar otra cosa no repite el trabajo"""
+
+    def __init__(self, max_videos=8):
+        self.max_videos = max_videos
+        self._videos = OrderedDict()
+        self._candado = threading.Lock()
+
+    def obtener(self, datos, **parametros):
+        clave = (hashlib.sha256(datos).hexdigest(), tuple(sorted(parametros.items())))
+        with self._candado:
+            if clave in self._videos:
+                self._videos.move_to_end(clave)
+                return self._videos[clave]
+        prep = preparar_video(datos, **parametros)
+        with self._candado:
+            self._videos[clave] = prep
+            while len(self._videos) > self.max_videos:
+                self._videos.popitem(last=False)
+        return prep
+
+
+def adjuntos_video(cache, datos, mime, **parametros):
+    """Lo que se manda a la IA, en orden: textos y (bytes, mime). Con OpenCV, los fotogramas clave de la
+    serie con su instante; sin OpenCV (o si no se puede trocear), el vídeo entero"""
+    prep = None
+    if VIDEO_DISPONIBLE:
+        try:
+            prep = cache.obtener(datos, **parametros)
+        except Exception as e:
+            log.warning("No se pudo trocear el vídeo, va entero: %s", e)
+    if prep is None or not prep.fotogramas:
+        return [(datos, mime or "video/mp4")]
+    adjuntos = [f"Fotogramas de la serie en orden ({prep.ventana[0]:.1f}-{prep.ventana[1]:.1f} s del vídeo):"]
+    for t, jpg in zip(prep.instantes, prep.fotogramas):
+        adjuntos += [f"t={t}s", (jpg, "image/jpeg")]
+    return adjuntos
+
+
+def _estado(archivo):
+    """Estado de un types.File ('PROCESSING', 'ACTIVE', 'FAILED'...) venga como enum o como texto"""
+    estado = getattr(archivo, "state", None)
+    return getattr(estado, "name", estado)
+
+
+class ArchivosSubidos:
+    """URI de client.files por sha256 del contenido: cada fotograma (o vídeo) se sube una sola vez y el
+    análisis y las preguntas de seguimiento mandan solo la referencia. La API borra los archivos a las
+    48 h, así que una referencia se da por caducada antes ('vida_s')"""
+
+    def __init__(self, vida_s=46 * 3600, max_archivos=512, espera_max_s=120.0):
+        self.vida_s = vida_s
+        self.max_archivos = max_archivos
+        self.espera_max_s = espera_max_s
+        self._uris = OrderedDict()  # sha256 → (uri, mime, subido_en)
+        self._candado = threading.Lock()
+        self.contadores = {"subidas": 0, "reutilizadas": 0, "bytes_subidos": 0}
+
+    def referencia(self, archivos, datos, mime):
+        """(uri, mime) del contenido, subiéndolo con 'archivos' (client.files) si no está o ha caducado"""
+        huella = hashlib.sha256(datos).hexdigest()
+        with self._candado:
+            guardada = self._uris.get(huella)
+            if guardada is not None and time.time() - guardada[2] < self.vida_s:
+                self._uris.move_to_end(huella)
+                self.contadores["reutilizadas"] += 1
+                return guardada[0], guardada[1]
+        subido = self._esperar_activo(archivos, archivos.upload(file=io.BytesIO(datos), config={"mime_type": mime}))
+        uri, mime = subido.uri, getattr(subido, "mime_type", None) or mime
+        with self._candado:
+            self._uris[huella] = (uri, mime, time.time())
+            self._uris.move_to_end(huella)
+            while len(self._uris) > self.max_archivos:
+                self._uris.popitem(last=False)
+            self.contadores["subidas"] += 1
+            self.contadores["bytes_subidos"] += len(datos)
+        log.info("archivo %s (%s, %s bytes) subido: %s", huella[:8], mime, len(datos), uri)
+        return uri, mime
+
+    def _esperar_activo(self, archivos, subido):
+        """Los vídeos pasan un rato en PROCESSING antes de poder usarse (las imágenes salen ya activas)"""
+        limite = time.monotonic() + self.espera_max_s
+        while _estado(subido) == "PROCESSING":
+            if time.monotonic() > limite:
+                raise TimeoutError(f"{subido.name} sigue procesándose tras {self.espera_max_s:.0f} s")
+            time.sleep(1.0)
+            subido = archivos.get(name=subido.name)
+        if _estado(subido) == "FAILED":
+            raise ValueError(f"La API no pudo procesar {subido.name}")
+        return subido
+
+    def estadisticas(self):
+        with self._candado:
+            return {**self.contadores, "referencias": len(self._uris)}
@@ -0,0 +1,34 @@
+import pytest
+
+from fitchef.alimentos import BaseAlimentos, interpretar_cantidad
+
+
+@pytest.mark.parametrize("texto, esperado", [
+    ("150 g de pollo", (150.0, "g", "pollo")),
+    ("150g de pollo", (150.0, "g", "pollo")),
+    ("pollo (150 g)", (150.0, "g", "pollo")),
+    ("media taza de avena", (120.0, "g", "avena")),
+    ("2 tazas de arroz", (480.0, "g", "arroz")),
+    ("1 cucharada de aceite", (15.0, "g", "aceite")),
+    ("200ml de leche", (200.0, "g", "leche")),
+    ("2 huevos", (2.0, "ud", "huevos")),
+    ("1 lima", (1.0, "ud", "lima")),
+    ("sal", (None, None, "sal")),
+])
+def test_cantidades(texto, esperado):
+    assert interpretar_cantidad(texto) == esperado
+
+
+@pytest.mark.parametrize("texto", ["mostaza", "salsa de mostaza", "tazón de leche", "salsa", "vasito", "galleta"])
+def test_unidad_dentro_de_una_palabra_no_cuenta(texto):
+    assert interpretar_cantidad(texto) == (None, None, texto)
+
+
+
+def test_memo_acotado():
+    base = BaseAlimentos()
+    base.MEMO_MAX = 100
+    for i in range(300):
+        base.costear(f"{i} g de pollo")
+    assert len(base._memo) == 100
+    assert base.costear("299 g de pollo")["gramos"] == 299
@@ -0,0 +1,120 @@
+import datetime
+import sqlite3
+
+import pytest
+
+import fitchef.almacen as almacen_mod
+from fitchef.almacen import Almacen, AlmacenMemoria, AlmacenSQLite, EstadoUsuario
+from fitchef.biometria import SerieBiometrica
+
+
+def test_un_backend_a_medias_no_se_puede_crear():
+    class SoloLee(Almacen):
+        def leer(self, usuario, claves):
+            return {}
+
+    with pytest.raises(TypeError):
+        SoloLee()
+
+
+@pytest.mark.parametrize("crear", [AlmacenMemoria, lambda: AlmacenSQLite(":memory:")])
+def test_backends_guardan_y_leen(crear):
+    almacen = crear()
+    almacen.escribir("ana", {"despensa": '["arroz"]', "racha": "3"})
+    almacen.escribir("ana", {"racha": "4"})
+    assert almacen.leer("ana", ["racha", "no_existe"]) == {"racha": "4"}
+    assert almacen.leer_todo("ana") == {"despensa": '["arroz"]', "racha": "4"}
+
+
+def test_sincronizar_solo_serializa_lo_que_ha_podido_cambiar(monkeypatch):
+    almacen = AlmacenMemoria()
+    almacen.escribir("ana", {"plan": '{"Lunes":[]}', "perfil": '{"peso":70}'})
+    estado = {}
+    usuario = EstadoUsuario(almacen, "ana")
+    usuario.hidratar(estado, ["plan", "perfil", "racha"])
+    estado["racha"] = 1
+    serializadas = []
+    original = almacen_mod.a_json
+    monkeypatch.setattr(almacen_mod, "a_json", lambda v: serializadas.append(v) or original(v))
+
+    assert usuario.sincronizar(estado, ["perfil", "racha"]) == 1  # 'racha' no estaba guardada
+    assert len(serializadas) == 2  # 'plan' (mismo objeto, fuera de juego) ni se mira
+
+    estado["perfil"]["peso"] = 71  # Cambio por dentro de una clave en juego
+    estado["plan"]["Martes"] = []  # ...y de una fuera de juego: no se ve hasta que entre en juego
+    assert usuario.sincronizar(estado, ["perfil"]) == 1
+    assert usuario.sincronizar(estado, ["plan"]) == 1
+    estado["plan"] = {}  # Otro objeto: se guarda aunque no esté en juego
+    assert usuario.sincronizar(estado, []) == 1
+    assert almacen.leer("ana", ["plan", "perfil"]) == {"plan": "{}", "perfil": '{"peso":71}'}
+
+
+def test_sincronizar_objetos_versionados_solo_si_sube_la_version():
+    estado = {"serie": SerieBiometrica()}
+    usuario = EstadoUsuario(AlmacenMemoria(), "ana")
+    usuario.hidratar(estado, ["serie"])
+    assert usuario.sincronizar(estado) == 1
+    assert usuario.sincronizar(estado) == 0
+    estado["serie"].anotar(datetime.date(2026, 1, 1), 70.0)
+    assert usuario.sincronizar(estado) == 1
+
+
+@pytest.mark.parametrize("anterior, nuevo", [
+    ({"a": 1, "b": [1]}, {"a": 1, "b": [1, 2], "c": None}),
+    ({"a": 1, "b": 2}, {"b": 2}),
+    ([1, 2], [1, 2, 3]),
+    ([1, 2], [2]),
+    ({"a": 1}, [1]),
+    (3, 4),
+])
+def test_aplicar_delta_deshace_calcular_delta(anterior, nuevo):
+    assert almacen_mod.aplicar_delta(anterior, almacen_mod.calcular_delta(anterior, nuevo)) == nuevo
+
+
+def test_sqlite_apunta_solo_el_delta():
+    almacen = AlmacenSQLite(":memory:")
+    almacen.escribir("ana", {"plan": '{"Lunes":[1],"Martes":[2]}', "cargas": "[1,2]"})
+    almacen.escribir("ana", {"plan": '{"Lunes":[1],"Martes":[3]}', "cargas": "[1,2,3]"})
+    assert almacen.historial("ana", "plan")[-1][1] == {"poner": {"Martes": [3]}, "quitar": []}
+    assert almacen.historial("ana", "cargas")[-1][1] == {"anadir": [3]}
+    assert almacen.leer("ana", ["plan"]) == {"plan": '{"Lunes":[1],"Martes":[3]}'}
+
+
+def test_sqlite_recorta_el_registro_pero_no_el_valor():
+    almacen = AlmacenSQLite(":memory:", cada_n_eventos=5)
+    for i in range(23):
+        almacen.escribir("ana", {"racha": str(i)})
+    almacen.escribir("luis", {"racha": "0"})
+    assert 5 <= len(almacen.historial("ana", "racha")) < 10
+    assert almacen.historial("ana", "racha")[-1][1] == {"valor": 22}
+    assert almacen.leer("ana", ["racha"]) == {"racha": "22"}
+    assert [delta for _, delta in almacen.historial("luis", "racha")] == [{"valor": 0}]
+
+
+def test_sqlite_migra_un_registro_de_valores_enteros(tmp_path):
+    ruta = str(tmp_path / "viejo.sqlite")
+    db = sqlite3.connect(ruta)
+    db.execute("CREATE TABLE eventos (id INTEGER PRIMARY KEY AUTOINCREMENT, usuario TEXT NOT NULL, "
+               "clave TEXT NOT NULL, valor TEXT NOT NULL, ts REAL NOT NULL)")
+    db.executemany("INSERT INTO eventos (usuario, clave, valor, ts) VALUES (?, ?, ?, 0)",
+                   [("ana", "racha", "1"), ("ana", "racha", "2"), ("ana", "perfil", '{"peso":70}')])
+    db.commit()
+    db.close()
+
+    almacen = AlmacenSQLite(ruta)
+    assert almacen.leer_todo("ana") == {"racha": "2", "perfil": '{"peso":70}'}
+    almacen.escribir("ana", {"racha": "3"})
+    assert [delta for _, delta in almacen.historial("ana", "racha")] == [{"valor": 3}]  # el registro viejo se fue
+
+
+@pytest.mark.parametrize("usuario, valido", [
+    ("3f9a0c1b2d4e", True),  # los de antes (12 hex)
+    (None, False), ("", False), ("corto", False), ("../../etc", False), ("a" * 65, False),
+])
+def test_usuario_valido(usuario, valido):
+    assert almacen_mod.usuario_valido(usuario) is valido
+
+
+def test_nuevo_usuario_es_valido_y_distinto():
+    assert almacen_mod.usuario_valido(almacen_mod.nuevo_usuario())
+    assert almacen_mod.nuevo_usuario() != almacen_mod.nuevo_usuario()
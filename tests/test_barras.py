@@ -0,0 +1,127 @@
+import numpy as np
+import pytest
+from PIL import Image, ImageFilter
+
+from fitchef.barras import ANCHOS_L, PARIDADES, IndiceProductos, digito_control, leer_codigo
+
+CODIGO = "4006381333931"
+
+
+def _modulos(codigo):
+    """95 módulos del EAN-13 (1 = barra)"""
+    paridad = {v: k for k, v in PARIDADES.items()}[int(codigo[0])]
+    bits = [1, 0, 1]
+    for d, p in zip(codigo[1:7], paridad):
+        anchos = ANCHOS_L[int(d)] if p == "L" else ANCHOS_L[int(d)][::-1]
+        bits += [b for w, b in zip(anchos.astype(int), (0, 1, 0, 1)) for _ in range(w)]
+    bits += [0, 1, 0, 1, 0]
+    for d in codigo[7:]:
+        bits += [b for w, b in zip(ANCHOS_L[int(d)].astype(int), (1, 0, 1, 0)) for _ in range(w)]
+    return bits + [1, 0, 1]
+
+
+def _dibujar(codigo=CODIGO, px=3, alto=120, margen=12):
+    fila = np.repeat(1 - np.array(_modulos(codigo)), px) * 215 + 20
+    fila = np.concatenate((np.full(margen * px, 235), fila, np.full(margen * px, 235)))
+    return Image.fromarray(np.tile(fila, (alto, 1)).astype(np.uint8))
+
+
+def _codigo(n):
+    doce = f"84{n:010d}"
+    return doce + str(digito_control(doce))
+
+
+def test_lee_un_codigo_limpio():
+    assert leer_codigo(_dibujar()) == CODIGO
+
+
+def test_lee_un_codigo_borroso():
+    assert leer_codigo(_dibujar(px=2).filter(ImageFilter.GaussianBlur(1))) == CODIGO
+
+
+def test_lee_un_codigo_con_sombra():
+    # Con el degradado el umbral global falla: tiene que entrar el local
+    imagen = np.asarray(_dibujar(px=2), dtype=np.float64) * np.linspace(0.25, 1.0, 2 * 119)
+    assert leer_codigo(Image.fromarray(imagen.astype(np.uint8))) == CODIGO
+
+
+@pytest.mark.parametrize("grados", [90, 3])
+def test_lee_un_codigo_girado(grados):
+    assert leer_codigo(_dibujar().rotate(grados, expand=True, fillcolor=235)) == CODIGO
+
+
+def test_sin_codigo_no_lee_nada():
+    ruido = np.random.default_rng(0).integers(0, 255, (120, 300)).astype(np.uint8)
+    assert leer_codigo(Image.fromarray(ruido)) is None
+    assert leer_codigo(Image.new("L", (300, 120), 200)) is None
+
+
+def test_indice_resuelve_colisiones_por_sondeo(tmp_path):
+    indice = IndiceProductos(str(tmp_path / "p.idx"), capacidad=16)
+    codigos = [_codigo(n) for n in range(200)]
+    huecos = {}
+    for c in codigos:  # Dos códigos que caen en el mismo hueco de partida
+        huecos.setdefault(indice._hueco(int(c)), []).append(c)
+    a, b = next(v for v in huecos.values() if len(v) > 1)[:2]
+    indice.guardar(a, "Leche")
+    indice.guardar(b, "avena ")
+    assert (indice.buscar(a), indice.buscar(b)) == ("leche", "avena")
+    indice.guardar(a, "leche entera")  # Cambio, no alta
+    assert len(indice) == 2 and indice.buscar(a) == "leche entera"
+    assert indice.buscar(_codigo(999)) is None
+
+
+def test_indice_crece_al_pasar_del_70_por_ciento(tmp_path):
+    indice = IndiceProductos(str(tmp_path / "p.idx"), capacidad=8)
+    for n in range(6):
+        indice.guardar(_codigo(n), f"producto {n}")
+    assert len(indice._tabla) == 16 and len(indice) == 6
+    assert all(indice.buscar(_codigo(n)) == f"producto {n}" for n in range(6))
+
+
+def test_indice_se_reabre_desde_disco(tmp_path):
+    ruta = str(tmp_path / "sub" / "p.idx")
+    indice = IndiceProductos(ruta, capacidad=8)
+    for n in range(10):
+        indice.guardar(_codigo(n), f"producto {n}")
+    del indice
+    otra = IndiceProductos(ruta)
+    assert len(otra) == 10
+    assert otra.buscar(_codigo(7)) == "producto 7"
+
+
+def test_indice_rechaza_codigos_invalidos(tmp_path):
+    indice = IndiceProductos(str(tmp_path / "p.idx"))
+    assert indice.buscar("4006381333932") is None
+    for codigo in ("123", "0000000000000"):  # El código 0 es la marca de hueco libre
+        with pytest.raises(ValueError):
+            indice.guardar(codigo, "nada")
+
+
+def test_si_crecer_falla_a_medias_el_indice_viejo_sigue_entero(tmp_path, monkeypatch):
+    ruta = str(tmp_path / "p.idx")
+    indice = IndiceProductos(ruta, capacidad=8)
+    for n in range(5):
+        indice.guardar(_codigo(n), f"producto {n}")
+    monkeypatch.setattr("fitchef.barras.os.replace", lambda *a: (_ for _ in ()).throw(OSError("disco lleno")))
+    with pytest.raises(OSError):
+        indice.guardar(_codigo(5), "producto 5")
+    monkeypatch.undo()
+    otra = IndiceProductos(ruta)
+    assert len(otra) == 5 and all(otra.buscar(_codigo(n)) == f"producto {n}" for n in range(5))
+
+
+def test_importar_csv_reserva_sitio_una_vez_y_vuelca_una_vez(tmp_path, monkeypatch):
+    csv = tmp_path / "off.csv"
+    filas = [f"{_codigo(n)},Producto {n}" for n in range(100)] + ["12x,roto", f"{_codigo(1)},Producto uno"]
+    csv.write_text("codigo,nombre\n" + "\n".join(filas) + "\n", encoding="utf-8")
+    indice = IndiceProductos(str(tmp_path / "p.idx"), capacidad=8)
+    crecimientos, volcados = [], []
+    crecer, flush = indice._crecer, np.memmap.flush
+    monkeypatch.setattr(indice, "_crecer", lambda n: crecimientos.append(n) or crecer(n))
+    monkeypatch.setattr(np.memmap, "flush", lambda self: volcados.append(1) or flush(self))
+
+    assert indice.importar_csv(str(csv)) == 100
+    assert crecimientos == [100] and len(indice._tabla) == 256
+    assert len(volcados) == 2  # El del fichero nuevo al crecer y el del lote
+    assert len(indice) == 100 and indice.buscar(_codigo(1)) == "producto uno"
@@ -0,0 +1,116 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from fitchef.biometria import SerieBiometrica
+
+DIA0 = datetime.date(2026, 1, 1)
+
+
+def dia(n):
+    return DIA0 + datetime.timedelta(days=n)
+
+
+def ema_de_referencia(dias, valores, alfa=0.1):
+    ema = [valores[0]]
+    for j in range(1, len(valores)):
+        peso = 1 - (1 - alfa) ** max(1, dias[j] - dias[j - 1])
+        ema.append(ema[-1] + peso * (valores[j] - ema[-1]))
+    return ema
+
+
+def test_crece_al_doble_sin_perder_datos():
+    serie = SerieBiometrica(capacidad=4)
+    for n in range(10):
+        serie.anotar(dia(n), 80 + n)
+    assert len(serie) == 10 and len(serie._dias) == 16
+    assert serie.fechas == [dia(n) for n in range(10)]
+    assert list(serie.valores) == [80 + n for n in range(10)]
+
+
+def test_anotar_un_dia_olvidado_lo_mete_en_su_sitio():
+    serie = SerieBiometrica(capacidad=4)
+    for n, v in [(0, 80), (1, 81), (3, 83), (4, 84)]:
+        serie.anotar(dia(n), v)
+    serie.anotar(dia(2).isoformat(), 82)  # Hueco en medio y además con el array lleno
+    assert serie.fechas == [dia(n) for n in range(5)]
+    assert list(serie.valores) == [80, 81, 82, 83, 84]
+    assert np.allclose(serie._ema[:5], ema_de_referencia(range(5), [80, 81, 82, 83, 84]))
+    assert np.allclose(serie._acumulado[:5], np.cumsum([80, 81, 82, 83, 84]))
+
+
+def test_mismo_dia_sobrescribe():
+    serie = SerieBiometrica()
+    for n in range(3):
+        serie.anotar(dia(n), 80)
+    version = serie.version
+    serie.anotar(datetime.datetime.combine(dia(2), datetime.time(21, 0)), 79)  # La última
+    serie.anotar(dia(0), 78)  # Una pasada
+    assert len(serie) == 3 and list(serie.valores) == [78, 80, 79]
+    assert np.allclose(serie._ema[:3], ema_de_referencia([0, 1, 2], [78, 80, 79]))
+    assert serie.version == version + 2
+
+
+def test_la_ema_olvida_en_proporcion_al_hueco():
+    serie = SerieBiometrica(alfa=0.1)
+    serie.anotar(dia(0), 80)
+    serie.anotar(dia(10), 70)
+    assert serie.estadisticas()["tendencia"] == pytest.approx(80 - (1 - 0.9 ** 10) * 10)
+
+
+def test_medias_con_sumas_acumuladas():
+    rnd = np.random.default_rng(1)
+    dias = np.sort(rnd.choice(120, 60, replace=False))
+    valores = 80 + rnd.normal(0, 1, 60)
+    serie = SerieBiometrica()
+    for d, v in zip(dias, valores):
+        serie.anotar(dia(int(d)), v)
+    e = serie.estadisticas()
+    ultimo = dias[-1]
+    assert e["media_7d"] == pytest.approx(valores[dias >= ultimo - 6].mean())
+    assert e["media_30d"] == pytest.approx(valores[dias >= ultimo - 29].mean())
+    assert e["ultimo"] == pytest.approx(valores[-1]) and e["registros"] == 60
+    assert e["fecha"] == dia(int(ultimo))
+
+
+def test_ritmo_semanal_sigue_la_tendencia():
+    serie = SerieBiometrica()
+    for n in range(60):
+        serie.anotar(dia(n), 90 - 0.1 * n)  # -0.7 kg/semana
+    assert serie.estadisticas()["ritmo_semanal"] == pytest.approx(-0.7, abs=0.05)
+    assert SerieBiometrica().estadisticas() is None
+
+
+def test_grafica_promedia_por_tramos_y_se_cachea():
+    serie = SerieBiometrica()
+    for n in range(1000):
+        serie.anotar(dia(n), n % 2)
+    tabla = serie.para_grafica(max_puntos=100)
+    assert len(tabla) == 100 and tabla.index.name == "Fecha"
+    assert np.allclose(tabla["Peso (kg)"], 0.5)  # Cada tramo de 10 días promedia 0 y 1
+    assert serie.para_grafica(max_puntos=100) is tabla
+    serie.anotar(dia(1000), 1)
+    assert serie.para_grafica(max_puntos=100) is not tabla
+    assert len(serie.para_grafica(max_puntos=2000)) == 1001
+
+
+def test_ida_y_vuelta_por_dict():
+    serie = SerieBiometrica("Cintura (cm)", alfa=0.2)
+    for n in (0, 2, 5):
+        serie.anotar(dia(n), 90 - n)
+    copia = SerieBiometrica.desde_dict(serie.a_dict())
+    assert (copia.nombre, copia.alfa, copia.fechas) == ("Cintura (cm)", 0.2, serie.fechas)
+    assert np.allclose(copia._ema[:3], serie._ema[:3])
+    assert copia.estadisticas() == serie.estadisticas()
+
+
+def test_desde_dataframe_y_boveda():
+    tabla = pd.DataFrame({"Fecha": [dia(2).isoformat(), dia(0).isoformat(), dia(1).isoformat()],
+                          "Peso (kg)": [82.0, 80.0, 81.0]})
+    serie = SerieBiometrica.desde(tabla)
+    assert serie.fechas == [dia(0), dia(1), dia(2)]
+    assert SerieBiometrica.desde(serie.a_registros()).a_dict() == serie.a_dict()
+    assert SerieBiometrica.desde(serie) is serie
+    assert len(SerieBiometrica.desde(None)) == 0
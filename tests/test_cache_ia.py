@@ -0,0 +1,82 @@
+import pytest
+from google.genai import types
+
+import fitchef.cache_ia as cache_mod
+from fitchef.cache_ia import CacheRespuestas, ClienteConCache, clave_peticion
+from fitchef.ia_simulada import ClienteSimulado
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    ahora = [1000.0]
+    monkeypatch.setattr(cache_mod.time, "time", lambda: ahora[0])
+    return ahora
+
+
+def test_acierto_y_fallo(tmp_path):
+    cliente = ClienteConCache(ClienteSimulado(), CacheRespuestas(str(tmp_path / "c.sqlite")))
+    primera = cliente.models.generate_content(model="m", contents="  Dame una   receta ")
+    segunda = cliente.models.generate_content(model="m", contents="Dame una receta")  # Mismo prompt normalizado
+    assert not getattr(primera, "desde_cache", False) and segunda.desde_cache
+    assert segunda.text == primera.text
+    stats = cliente.cache.estadisticas()
+    assert (stats["aciertos"], stats["fallos"], stats["entradas"]) == (1, 1, 1)
+
+
+def test_el_stream_se_guarda_entero_y_vuelve_en_un_trozo(tmp_path):
+    cliente = ClienteConCache(ClienteSimulado(), CacheRespuestas(str(tmp_path / "c.sqlite")))
+    trozos = list(cliente.models.generate_content_stream(model="m", contents="Dame una receta larga"))
+    repetida = list(cliente.models.generate_content_stream(model="m", contents="Dame una receta larga"))
+    assert len(repetida) == 1 and repetida[0].text == "".join(t.text for t in trozos)
+
+
+def test_caduca_pasado_el_ttl(tmp_path, reloj):
+    cache = CacheRespuestas(str(tmp_path / "c.sqlite"), ttl_segundos=60)
+    cache.guardar("k", "m", "hola")
+    reloj[0] += 59
+    assert cache.obtener("k") == "hola"
+    reloj[0] += 2
+    assert cache.obtener("k") is None
+    assert cache.estadisticas()["entradas"] == 0  # La caducada se borra al pedirla
+
+
+def test_expulsa_primero_lo_menos_usado(tmp_path, reloj):
+    cache = CacheRespuestas(str(tmp_path / "c.sqlite"), max_bytes=10)
+    for clave in ("a", "b", "c"):
+        cache.guardar(clave, "m", "xxx")
+        reloj[0] += 1
+    cache.obtener("a")  # 'a' pasa a ser la más reciente
+    reloj[0] += 1
+    cache.guardar("d", "m", "xxx")  # 12 bytes > 10: sale una
+    assert cache.obtener("b") is None
+    assert all(cache.obtener(c) == "xxx" for c in ("a", "c", "d"))
+    assert cache.estadisticas()["expulsiones"] == 1
+
+
+def test_lo_que_no_cabe_no_se_guarda(tmp_path):
+    cache = CacheRespuestas(str(tmp_path / "c.sqlite"), max_bytes=4)
+    cache.guardar("k", "m", "demasiado")
+    assert cache.estadisticas()["entradas"] == 0
+
+
+def test_otra_config_u_otro_adjunto_es_otra_clave():
+    base = clave_peticion("m", ["Analiza", b"foto1"], {"temperature": 0.2})
+    assert base == clave_peticion("m", ["Analiza", b"foto1"], {"temperature": 0.2})
+    assert base != clave_peticion("m", ["Analiza", b"foto1"], {"temperature": 0.9})
+    assert base != clave_peticion("m", ["Analiza", b"foto2"], {"temperature": 0.2})
+    assert base != clave_peticion("otro", ["Analiza", b"foto1"], {"temperature": 0.2})
+    assert clave_peticion("m", "x", types.GenerateContentConfig(temperature=0.2)) == \
+        clave_peticion("m", "x", {"temperature": 0.2})
+    parte = types.Part.from_bytes(data=b"foto1", mime_type="image/jpeg")
+    assert clave_peticion("m", [parte]) != clave_peticion("m", [types.Part.from_bytes(data=b"foto1", mime_type="image/png")])
+
+
+def test_lo_que_no_se_sabe_huellar_no_se_cachea():
+    assert clave_peticion("m", ["hola", object()]) is None
+
+
+def test_olvidar_fuerza_una_llamada_real(tmp_path):
+    cliente = ClienteConCache(ClienteSimulado(), CacheRespuestas(str(tmp_path / "c.sqlite")))
+    cliente.models.generate_content(model="m", contents="Dame un plan")
+    cliente.models.olvidar(model="m", contents="Dame un plan")
+    assert not getattr(cliente.models.generate_content(model="m", contents="Dame un plan"), "desde_cache", False)
@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+from fitchef.casete import Casete, CaseteSinRespuesta, ClienteConCasete
+from fitchef.ia_simulada import ClienteSimulado
+
+
+def _grabar(ruta, *prompts):
+    """Graba con la IA simulada; devuelve {prompt: texto}"""
+    cliente = ClienteConCasete(ClienteSimulado(), Casete(ruta, "grabar", escala=0))
+    return {p: cliente.models.generate_content(model="m", contents=p).text for p in prompts}
+
+
+def test_lo_grabado_se_reproduce_sin_backend(tmp_path):
+    ruta = str(tmp_path / "casete.jsonl")
+    textos = _grabar(ruta, "Dame una receta", "Dame otra cosa")
+    sin_red = ClienteConCasete(None, Casete(ruta, "reproducir", escala=0))
+    res = sin_red.models.generate_content(model="m", contents="  Dame   una receta")  # Misma huella
+    assert res.desde_casete and res.text == textos["Dame una receta"]
+    assert res.usage_metadata.prompt_token_count is not None
+    assert sin_red.casete.estadisticas()["reproducidas"] == 1
+
+
+def test_el_stream_reproduce_los_mismos_trozos(tmp_path):
+    ruta = str(tmp_path / "casete.jsonl")
+    grabando = ClienteConCasete(ClienteSimulado(), Casete(ruta, "grabar", escala=0))
+    trozos = [t.text for t in grabando.models.generate_content_stream(model="m", contents="Dame un texto largo")]
+    sin_red = ClienteConCasete(None, Casete(ruta, "estricto", escala=0))
+    assert [t.text for t in sin_red.models.generate_content_stream(model="m", contents="Dame un texto largo")] == trozos
+
+
+def test_la_misma_peticion_grabada_dos_veces_sale_en_orden(tmp_path):
+    ruta = str(tmp_path / "casete.jsonl")
+    casete = Casete(ruta, "grabar", escala=0)
+    for texto in ("uno", "dos"):
+        casete.grabar("k", "m", "hola", texto, None, 0.0, 0.0, None)
+    reproductor = Casete(ruta, "reproducir", escala=0)
+    assert [reproductor.buscar("k")["texto"] for _ in range(3)] == ["uno", "dos", "dos"]
+
+
+def test_estricto_falla_con_una_peticion_sin_grabar(tmp_path):
+    ruta = str(tmp_path / "casete.jsonl")
+    _grabar(ruta, "Dame una receta")
+    estricto = ClienteConCasete(ClienteSimulado(), Casete(ruta, "estricto", escala=0))
+    with pytest.raises(CaseteSinRespuesta, match="Dame otra receta"):
+        estricto.models.generate_content(model="m", contents="Dame otra receta")
+    with pytest.raises(CaseteSinRespuesta):
+        list(estricto.models.generate_content_stream(model="m", contents="Dame otra receta"))
+    assert estricto.casete.estadisticas()["sin_grabar"] == 2
+
+
+def test_reproducir_sin_backend_tambien_falla_con_lo_no_grabado(tmp_path):
+    sin_red = ClienteConCasete(None, Casete(str(tmp_path / "vacio.jsonl"), "reproducir", escala=0))
+    with pytest.raises(CaseteSinRespuesta):
+        sin_red.models.generate_content(model="m", contents="hola")
+
+
+def test_reproducir_con_backend_graba_lo_que_falta(tmp_path):
+    ruta = str(tmp_path / "casete.jsonl")
+    _grabar(ruta, "Dame una receta")
+    cliente = ClienteConCasete(ClienteSimulado(), Casete(ruta, "reproducir", escala=0))
+    cliente.models.generate_content(model="m", contents="Dame otra receta")
+    with open(ruta, encoding="utf-8") as f:
+        assert [json.loads(linea)["prompt"] for linea in f] == ["Dame una receta", "Dame otra receta"]
+
+
+def test_modo_desconocido():
+    with pytest.raises(ValueError):
+        Casete("x.jsonl", "rebobinar")
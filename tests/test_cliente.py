@@ -0,0 +1,30 @@
+import httpx
+import pytest
+
+from fitchef import cliente
+
+
+def test_pool_se_cierra_si_genai_falla(monkeypatch):
+    pools, crear_pool = [], httpx.Client
+
+    def pool(*args, **kwargs):
+        pools.append(crear_pool(*args, **kwargs))
+        return pools[-1]
+
+    def genai_roto(**kwargs):
+        raise ValueError("API key vacía")
+
+    monkeypatch.setattr(cliente.httpx, "Client", pool)
+    monkeypatch.setattr(cliente.genai, "Client", genai_roto)
+    with pytest.raises(ValueError):
+        cliente.ConexionGemini("", "gemini-2.5-pro", intervalo_salud_s=0)
+    assert pools[0].is_closed
+
+
+def test_retirar_deja_terminar_lo_que_esta_en_vuelo():
+    conexion = cliente.ConexionGemini("clave", "gemini-2.5-pro", timeout_s=30, intervalo_salud_s=0)
+    assert conexion.gracia_s == 30
+    temporizador = conexion.retirar(gracia_s=0.05)
+    assert not conexion.http.is_closed  # Las sesiones con llamadas en vuelo aún lo usan
+    temporizador.join(1)
+    assert conexion.http.is_closed
@@ -0,0 +1,57 @@
+import pytest
+
+from fitchef.despensa import IndiceDespensa, fusionar, singular, tokens
+
+
+@pytest.mark.parametrize("texto, esperado", [
+    ("2 Huevos camperos", {"huevo", "campero"}),
+    ("150 g de pechuga de pollo", {"pechuga", "pollo"}),
+    ("Limones", {"limon"}),
+    ("1 puñado de nueces", {"nuez"}),
+    ("Plátano maduro", {"platano", "maduro"}),
+    ("piñones", {"piñon"}),  # La ñ no es una tilde
+    ("sal al gusto", {"sal"}),
+])
+def test_tokens(texto, esperado):
+    assert tokens(texto) == esperado
+
+
+@pytest.mark.parametrize("plural, singular_", [
+    ("huevos", "huevo"), ("frijoles", "frijol"), ("nueces", "nuez"), ("aguacates", "aguacate"),
+    ("mas", "mas"), ("espinacas", "espinaca"), ("maíz", "maíz"),
+])
+def test_singular(plural, singular_):
+    assert singular(plural) == singular_
+
+
+DESPENSA = ["huevos", "pechuga de pollo", "arroz integral", "Aguacate", "nueces", "aceite de oliva"]
+
+
+def test_tiene_por_palabras_y_no_por_letras():
+    indice = IndiceDespensa(DESPENSA)
+    assert indice.tiene("2 huevos camperos")  # Ingrediente más concreto que el item
+    assert indice.tiene("pollo")  # Item más concreto que el ingrediente
+    assert indice.tiene("1 aguacate maduro") and indice.tiene("30 g de nuez")
+    assert not indice.tiene("arroz basmati")  # Ni uno contiene al otro
+    assert not indice.tiene("sal")  # 'sal' no está en 'salmón' aunque las letras sí
+    assert IndiceDespensa(["salmón"]).faltantes(["sal", "200 g de salmon"]) == ["sal"]
+
+
+def test_faltantes_y_consume():
+    indice = IndiceDespensa(DESPENSA)
+    assert indice.faltantes(["huevos", "tomate", "aceite de oliva virgen", "pimienta"]) == ["tomate", "pimienta"]
+    assert indice.consume("aceite") == ["aceite de oliva"]
+    assert IndiceDespensa(["leche", "leche de avena"]).consume("leche") == ["leche", "leche de avena"]
+    assert indice.consume("tomate") == []
+
+
+def test_restar_gasta_un_item_por_ingrediente():
+    indice = IndiceDespensa(["leche", "leche de avena", "avena"])
+    nueva, gastados = indice.restar(["leche", "leche", "tomate"])
+    assert gastados == ["leche", "leche de avena"] and nueva == ["avena"]
+
+
+def test_fusionar_sin_repetidos():
+    nueva, anadidos = fusionar(["Huevos", "arroz"], ["huevo", " - Tomates.", "tomate", "", "de", "Atún"])
+    assert nueva == ["Huevos", "arroz", "tomates", "atún"]
+    assert anadidos == ["tomates", "atún"]
@@ -0,0 +1,74 @@
+import json
+import threading
+from collections import Counter
+
+import pytest
+
+from fitchef.dieta import DIAS_SEMANA, generar_plan_paralelo, ordenar_plan, validar_dia
+
+
+class _Respuesta:
+    def __init__(self, text):
+        self.text = text
+
+
+class _ModelosQueFallan:
+    """client.models de prueba: el día de 'fallos' devuelve un JSON roto las primeras 'veces' llamadas"""
+
+    def __init__(self, fallos):
+        self.fallos = dict(fallos)
+        self.pedidos = Counter()
+        self._candado = threading.Lock()
+
+    def generate_content(self, *, model, contents, config=None):
+        dia = contents.split(":")[1].strip()
+        with self._candado:
+            self.pedidos[dia] += 1
+            falla = self.pedidos[dia] <= self.fallos.get(dia, 0)
+        if falla:
+            return _Respuesta('[{"tipo": "Desayuno", "plato": "Tost')
+        return _Respuesta(json.dumps([{"tipo": "Comida", "plato": f"Plato del {dia}", "ingredientes": ["arroz"]}]))
+
+
+def _generar_dia(modelos):
+    return lambda dia: json.loads(modelos.generate_content(model="m", contents=f"Plan para el día: {dia}").text)
+
+
+def test_solo_se_vuelve_a_pedir_el_dia_que_fallo():
+    modelos, avisos = _ModelosQueFallan({"Miércoles": 1}), []
+    plan, errores = generar_plan_paralelo(_generar_dia(modelos), al_terminar=lambda d, c, e: avisos.append((d, e is None)))
+    assert errores == {}
+    assert list(plan) == DIAS_SEMANA and plan["Miércoles"][0]["plato"] == "Plato del Miércoles"
+    assert modelos.pedidos == {**{d: 1 for d in DIAS_SEMANA}, "Miércoles": 2}
+    assert avisos.count(("Miércoles", False)) == 1 and avisos[-1] == ("Miércoles", True)
+
+
+def test_un_dia_que_no_sale_en_ninguna_ronda_se_devuelve_como_error():
+    modelos = _ModelosQueFallan({"Domingo": 99})
+    plan, errores = generar_plan_paralelo(_generar_dia(modelos), rondas=3)
+    assert list(errores) == ["Domingo"] and isinstance(errores["Domingo"], ValueError)
+    assert "Domingo" not in plan and len(plan) == 6
+    assert modelos.pedidos["Domingo"] == 3 and modelos.pedidos["Lunes"] == 1
+
+
+def test_un_dia_que_no_valida_tambien_se_repite():
+    llamadas = Counter()
+
+    def generar_dia(dia):
+        llamadas[dia] += 1
+        if dia == "Lunes" and llamadas[dia] == 1:
+            return [{"tipo": "Comida", "ingredientes": []}]  # Le falta el plato
+        return [{"tipo": "Comida", "plato": "ok", "ingredientes": []}]
+
+    plan, errores = generar_plan_paralelo(generar_dia, dias=["Martes", "Lunes"], max_hilos=1)
+    assert errores == {} and list(plan) == ["Lunes", "Martes"] and llamadas == {"Lunes": 2, "Martes": 1}
+
+
+def test_validar_dia_rechaza_un_dia_vacio():
+    with pytest.raises(ValueError):
+        validar_dia([])
+    assert validar_dia([{"tipo": "Cena", "plato": "x", "ingredientes": []}])[0]["kcal"] == 0
+
+
+def test_ordenar_plan_deja_lo_que_no_es_un_dia_al_final():
+    assert list(ordenar_plan({"Domingo": [], "extra": [], "Lunes": []})) == ["Lunes", "Domingo", "extra"]
@@ -0,0 +1,69 @@
+import pytest
+
+from fitchef.esquemas import (FORMATO_COMIDA, FORMATO_DIA_ENTRENO, FORMATO_MICROCICLO, FORMATO_SESION,
+                              FORMATO_SUSTITUTO, Comida, Ejercicio, formato_dia, formato_plan)
+
+
+def test_el_esquema_pide_todo_menos_lo_no_generado():
+    esquema = Ejercicio.esquema()
+    assert "series_completadas" not in esquema["properties"]
+    assert esquema["required"] == [n for n in Ejercicio.CAMPOS if n != "series_completadas"]
+    assert esquema["properties"]["series"] == {"type": "integer"}
+    dias = FORMATO_MICROCICLO.esquema["properties"]["dias"]
+    assert dias["additionalProperties"]["items"]["properties"]["nombre"] == {"type": "string"}
+
+
+def test_rellena_defectos_y_convierte_tipos():
+    ejercicio = FORMATO_SUSTITUTO.validar({"nombre": "Remo", "series": "4 series", "reps": 10, "rir": None})
+    assert ejercicio["series"] == 4 and ejercicio["reps"] == "10" and ejercicio["rir"] == "1-2"
+    assert ejercicio["series_completadas"] == []
+    otro = FORMATO_SUSTITUTO.validar({"nombre": "Remo"})
+    assert otro["series_completadas"] is not ejercicio["series_completadas"]  # El defecto no se comparte
+
+
+@pytest.mark.parametrize("valor, esperado", [(3.6, 4), ("2,5", 2), ("-1", -1), (None, 0)])
+def test_enteros_flexibles(valor, esperado):
+    assert Comida.desde({"tipo": "Cena", "plato": "x", "ingredientes": [], "kcal": valor}).kcal == esperado
+
+
+@pytest.mark.parametrize("datos, mensaje", [
+    ({"tipo": "Cena", "ingredientes": []}, "le falta: plato"),
+    ({"tipo": "Cena", "plato": "Tortilla", "ingredientes": "huevo"}, "'ingredientes'"),
+    ({"tipo": "Cena", "plato": "Tortilla", "ingredientes": [], "kcal": True}, "'kcal'"),
+    ({"tipo": "Cena", "plato": {"a": 1}, "ingredientes": []}, "'plato'"),
+    (["no", "es", "un", "objeto"], "Se esperaba un objeto Comida"),
+])
+def test_errores_dicen_donde_fallan(datos, mensaje):
+    with pytest.raises(ValueError, match=mensaje):
+        FORMATO_COMIDA.validar(datos)
+
+
+def test_falta_un_campo_dice_que_registro():
+    with pytest.raises(ValueError, match="Comida 'Tortilla' le falta: ingredientes"):
+        FORMATO_COMIDA.validar({"tipo": "Cena", "plato": "Tortilla"})
+
+
+def test_el_error_anidado_lleva_la_ruta():
+    with pytest.raises(ValueError, match=r"'ingredientes\[1\]' no tiene el formato"):
+        FORMATO_COMIDA.validar({"tipo": "Cena", "plato": "Tortilla", "ingredientes": ["huevo", ["patata"]]})
+    with pytest.raises(ValueError, match="Se esperaba un objeto Ejercicio"):
+        FORMATO_DIA_ENTRENO.validar([{"nombre": "Remo"}, "Sentadilla"])
+
+
+def test_listas_y_registros_no_vacios():
+    with pytest.raises(ValueError, match="vacío"):
+        formato_dia().validar([])
+    with pytest.raises(ValueError, match="'rutina' vacío"):
+        FORMATO_SESION.validar({"diagnostico": "", "rutina": []})
+    with pytest.raises(ValueError, match="'dias' vacío"):
+        FORMATO_MICROCICLO.validar({"dias": {}})
+
+
+def test_plan_semanal_pide_los_dias_dados():
+    formato = formato_plan(["Lunes", "Martes"])
+    assert formato.esquema["required"] == ["Lunes", "Martes"]
+    comida = {"tipo": "Cena", "plato": "Tortilla", "ingredientes": ["huevo"]}
+    with pytest.raises(ValueError, match="faltan días: Martes"):
+        formato.validar({"Lunes": [comida]})
+    plan = formato.validar({"Lunes": [comida], "Martes": [comida]})
+    assert plan["Martes"][0]["kcal"] == 0 and plan["Lunes"][0]["ingredientes"] == ["huevo"]
@@ -0,0 +1,66 @@
+import io
+
+import pytest
+from PIL import Image
+
+import fitchef.imagenes as imagenes_mod
+from fitchef.imagenes import POLITICAS, preparar_imagen, resumen_metricas
+
+
+@pytest.fixture(autouse=True)
+def metricas_limpias(monkeypatch):
+    monkeypatch.setattr(imagenes_mod, "METRICAS", {})
+
+
+def _foto(ancho=3000, alto=2000, modo="RGB", formato="JPEG", **guardar):
+    img = Image.new(modo, (ancho, alto), (200, 30, 30, 128)[:len(modo)] if modo != "L" else 120)
+    salida = io.BytesIO()
+    img.save(salida, format=formato, **guardar)
+    return salida.getvalue()
+
+
+def _abrir(datos):
+    return Image.open(io.BytesIO(datos))
+
+
+@pytest.mark.parametrize("funcion", ["plato", "ticket", "reloj", "desconocida"])
+def test_reduce_al_lado_de_su_politica_sin_deformar(funcion):
+    datos, mime = preparar_imagen(_foto(), funcion)
+    politica = POLITICAS.get(funcion, POLITICAS["general"])
+    img = _abrir(datos)
+    assert max(img.size) == politica["lado"]
+    assert img.size[0] / img.size[1] == pytest.approx(1.5, rel=0.01)
+    assert mime == {"JPEG": "image/jpeg", "WEBP": "image/webp"}[politica["formato"]] and img.format == politica["formato"]
+
+
+def test_una_foto_pequena_no_se_agranda():
+    img = _abrir(preparar_imagen(_foto(400, 300), "plato")[0])
+    assert img.size == (400, 300)
+
+
+def test_aplica_la_rotacion_del_exif_y_quita_metadatos():
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Girada 90°: la cámara la guardó tumbada
+    exif[0x010F] = "Marca del móvil"
+    datos = preparar_imagen(_foto(3000, 2000, exif=exif.tobytes()), "ticket")[0]
+    img = _abrir(datos)
+    assert img.size[1] > img.size[0]
+    assert not img.getexif()
+
+
+def test_la_transparencia_va_sobre_blanco():
+    img = _abrir(preparar_imagen(_foto(200, 200, modo="RGBA", formato="PNG"), "plato")[0])
+    assert img.mode == "RGB"
+    r, g, b = img.getpixel((100, 100))
+    assert r > 200 and g > 100 and b > 100  # Rojo a medias sobre blanco, no sobre negro
+
+
+def test_anota_bytes_ahorrados_y_latencia():
+    bruto = _foto()
+    datos, _ = preparar_imagen(bruto, "plato")
+    imagenes_mod.anotar_llamada("plato", 2.0, len(datos))
+    imagenes_mod.anotar_llamada("plato", 4.0, len(datos))
+    m = resumen_metricas()["plato"]
+    assert (m["imagenes"], m["bytes_entrada"], m["bytes_salida"]) == (1, len(bruto), len(datos))
+    assert m["ahorro_pct"] == pytest.approx(100 * (1 - len(datos) / len(bruto)))
+    assert m["s_media_llamada"] == pytest.approx(3.0)
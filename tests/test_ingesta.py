@@ -0,0 +1,67 @@
+import threading
+import time
+
+import pytest
+
+from fitchef.despensa import fusionar
+from fitchef.ingesta import procesar_lote, separar_items
+
+
+@pytest.mark.parametrize("texto, esperado", [
+    ("Pollo, arroz\n- huevos", ["pollo", "arroz", "huevos"]),
+    ("* Leche.\n· Tomate; ,\n\n", ["leche", "tomate"]),
+    ("", []),
+])
+def test_separar_items(texto, esperado):
+    assert separar_items(texto) == esperado
+
+
+def test_el_lote_se_junta_en_el_orden_de_las_fotos_y_sin_repetidos():
+    respuestas = {"ticket1": "Leche, huevos", "nevera": "huevo, Tomates\n- leche", "ticket2": "atún"}
+    esperas = {"ticket1": 0.05, "nevera": 0.0, "ticket2": 0.02}  # Terminan en otro orden
+
+    def leer(foto):
+        time.sleep(esperas[foto])
+        return separar_items(respuestas[foto])
+
+    llegadas = []
+    subidas = list(respuestas)
+    resultados, errores = procesar_lote(subidas, leer, al_terminar=lambda i, r, e: llegadas.append(i))
+    assert errores == {} and sorted(llegadas) == [0, 1, 2] and llegadas != [0, 1, 2]
+    items = [item for i in sorted(resultados) for item in resultados[i]]
+    despensa, anadidos = fusionar(["arroz"], items)
+    assert despensa == ["arroz", "leche", "huevos", "tomates", "atún"]
+    assert anadidos == ["leche", "huevos", "tomates", "atún"]
+
+
+def test_una_foto_que_falla_no_tumba_el_lote():
+    def leer(foto):
+        if foto == "borrosa":
+            raise RuntimeError("429")
+        return [foto]
+
+    avisos = []
+    resultados, errores = procesar_lote(["a", "borrosa", "b"], leer, al_terminar=lambda i, r, e: avisos.append((i, r, e)))
+    assert resultados == {0: ["a"], 2: ["b"]}
+    assert list(errores) == [1] and str(errores[1]) == "429"
+    assert (1, None, errores[1]) in avisos
+
+
+def test_respeta_el_tope_de_hilos():
+    en_vuelo, maximo, candado = [0], [0], threading.Lock()
+
+    def leer(foto):
+        with candado:
+            en_vuelo[0] += 1
+            maximo[0] = max(maximo[0], en_vuelo[0])
+        time.sleep(0.02)
+        with candado:
+            en_vuelo[0] -= 1
+        return [foto]
+
+    resultados, _ = procesar_lote([str(i) for i in range(10)], leer, max_hilos=3)
+    assert len(resultados) == 10 and maximo[0] <= 3
+
+
+def test_sin_fotos_no_hay_nada():
+    assert procesar_lote([], lambda s: [s]) == ({}, {})
@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+from fitchef.dieta import DIAS_SEMANA
+from fitchef.esquemas import FORMATO_DIA_ENTRENO, FORMATO_MICROCICLO, formato_dia, formato_plan
+from fitchef.json_ia import METRICAS, JSONCortado, interpretar, reparaciones
+
+
+def comida(n):
+    return {"tipo": "Comida", "plato": f"Plato {n}", "ingredientes": ["150 g de pollo", "100 g de arroz"],
+            "instrucciones": "", "nota_ciencia": "", "kcal": 600, "prot": 45, "cho": 60, "fat": 15}
+
+
+PLAN = {d: [comida(i), comida(i + 1)] for i, d in enumerate(DIAS_SEMANA)}
+MICROCICLO = {"diagnostico_semanal": "ok",
+              "dias": {f"Día {n}": [{"nombre": "Sentadilla", "series": 4}, {"nombre": "Press Banca"}] for n in (1, 2, 3)}}
+
+
+def test_plan_completo_vale_tal_cual():
+    assert interpretar("```json\n" + json.dumps(PLAN) + "\n```", formato_plan(DIAS_SEMANA)) == PLAN
+
+
+def test_coma_final_y_charla_se_reparan():
+    texto = json.dumps(PLAN)[:-1] + ",}\nEspero que te guste."
+    assert interpretar(texto, formato_plan(DIAS_SEMANA)) == PLAN
+    assert METRICAS["plan_semanal"]["reparado"] >= 1
+
+
+@pytest.mark.parametrize("fraccion", [0.33, 0.6, 0.99])
+def test_plan_cortado_se_regenera(fraccion):
+    texto = json.dumps(PLAN)
+    antes = METRICAS.get("plan_semanal", {}).get("regenerar", 0)
+    with pytest.raises(ValueError):
+        interpretar(texto[:int(len(texto) * fraccion)], formato_plan(DIAS_SEMANA))
+    assert METRICAS["plan_semanal"]["regenerar"] == antes + 1
+
+
+def test_plan_sin_todos_los_dias_no_vale():
+    incompleto = {d: PLAN[d] for d in DIAS_SEMANA[:3]}
+    with pytest.raises(ValueError, match="faltan días"):
+        interpretar(json.dumps(incompleto), formato_plan(DIAS_SEMANA))
+
+
+def test_microciclo_cortado_se_regenera():
+    texto = json.dumps(MICROCICLO)
+    with pytest.raises(ValueError):
+        interpretar(texto[:len(texto) // 2], FORMATO_MICROCICLO)
+
+
+def test_dia_cortado_pierde_solo_la_comida_a_medias():
+    dia = [comida(1), comida(2), comida(3)]
+    texto = json.dumps(dia)
+    cortado = texto[:texto.index('"Plato 3"') + 4]
+    antes = METRICAS.get("dia_dieta", {}).get("reparado", 0)
+    assert interpretar(cortado, formato_dia()) == dia[:2]
+    assert METRICAS["dia_dieta"]["reparado"] == antes + 1
+
+
+def test_dia_entreno_cortado_entre_ejercicios_se_cierra():
+    dia = [{"nombre": "Sentadilla", "series": 4}, {"nombre": "Press Banca", "series": 3}]
+    texto = json.dumps(dia)
+    assert [e["nombre"] for e in interpretar(texto[:-1] + ",", FORMATO_DIA_ENTRENO)] == ["Sentadilla", "Press Banca"]
+
+
+def test_ingredientes_cortados_se_regeneran():
+    texto = json.dumps([comida(1), comida(2)])
+    with pytest.raises(JSONCortado):
+        interpretar(texto[:texto.rindex("100 g de arroz")], formato_dia())
+
+
+def test_no_se_recorta_un_array_que_la_ia_cerro():
+    assert list(reparaciones('{"a": [1, 2], "b": [3, 4')) == ['{"a": [1, 2], "b": [3]}']
+    assert list(reparaciones('{"a": [1, 2]')) == []  # Al objeto le pueden faltar campos
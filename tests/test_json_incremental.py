@@ -0,0 +1,31 @@
+import json
+
+import pytest
+
+from fitchef.json_incremental import ParserJSONIncremental
+
+DOC = {"Lunes": [{"plato": "Tortilla, \"la de siempre\"", "ingredientes": ["2 huevos", 3, None, ["sal"]]},
+                 {"plato": "Arroz [integral]", "ingredientes": []}],
+       "Martes": [1, [2], {"x": 3}, 4]}
+
+
+def eventos(texto, tamano):
+    parser = ParserJSONIncremental()
+    return [e for i in range(0, len(texto), tamano) for e in parser.alimentar(texto[i:i + tamano])], parser
+
+
+@pytest.mark.parametrize("tamano", [1, 3, 7, 1000])
+def test_eventos_no_dependen_del_troceo(tamano):
+    evs, parser = eventos("```json\n" + json.dumps(DOC, indent=2, ensure_ascii=False) + "\n```", tamano)
+    assert parser.terminado
+    assert evs[-1] == ((), DOC)
+    rutas = dict(evs)
+    assert rutas[("Lunes", 0)] == DOC["Lunes"][0]
+    assert rutas[("Lunes", 0, "ingredientes", 3)] == ["sal"]  # tras tres escalares
+    assert rutas[("Martes", 2)] == {"x": 3}  # escalar, lista, objeto
+
+
+def test_objeto_cortado_no_se_emite():
+    evs, parser = eventos(json.dumps(DOC)[:40], 5)
+    assert not parser.terminado
+    assert all(ruta != () for ruta, _ in evs)
@@ -0,0 +1,81 @@
+import pytest
+
+from fitchef.macros import AnaliticaPlan, objetivos_macros, reglas_dia, tabla_plan
+
+PERFIL = {"peso": 80, "altura": 180, "edad": 30, "sexo": "Hombre", "objetivo": "Powerbuilding", "actividad": "Moderada"}
+
+
+def test_refeed_en_descarga():
+    normal, descarga = objetivos_macros(PERFIL), objetivos_macros(dict(PERFIL, semana_mesociclo=4))
+    assert descarga["cho"] > normal["cho"] and descarga["kcal"] > normal["kcal"]
+    assert descarga["prot"] == normal["prot"] and descarga["fat"] == normal["fat"]
+
+
+def test_keto_no_hace_refeed():
+    keto = dict(PERFIL, protocolo_metabolico="Keto Cíclica")
+    assert objetivos_macros(dict(keto, semana_mesociclo=4)) == objetivos_macros(keto)
+    assert objetivos_macros(keto)["cho"] == 50
+
+
+def comida(tipo, kcal, prot, cho, fat):
+    return {"tipo": tipo, "plato": tipo, "kcal": kcal, "prot": prot, "cho": cho, "fat": fat}
+
+
+PLAN = {
+    "Lunes": [comida("Desayuno", 400, 20, 50, 10), comida("Cena", 600, 40, 50, 20)],
+    "Martes": [],
+    "Miércoles": [comida("Desayuno", 300, 30, 20, None), comida("Cena", 900, 50, 100, 30)],
+}
+OBJETIVOS = {"kcal": 1000, "prot": 60, "cho": 0, "fat": 30}
+
+
+def test_tabla_plan_respeta_el_orden_y_rellena_huecos():
+    tabla = tabla_plan(PLAN)
+    assert list(tabla["dia"].cat.categories) == ["Lunes", "Martes", "Miércoles"]
+    assert len(tabla) == 4 and tabla["fat"].iloc[2] == 0  # None → 0
+    assert tabla_plan({}).empty and tabla_plan(None).empty
+
+
+def test_totales_por_dia_y_semana():
+    analitica = AnaliticaPlan(PLAN, OBJETIVOS)
+    assert analitica.dia("Lunes") == {"kcal": 1000, "prot": 60, "cho": 100, "fat": 30}
+    assert analitica.dia("Martes") == {"kcal": 0, "prot": 0, "cho": 0, "fat": 0}  # Día vacío: ceros, no falta
+    assert analitica.dia("Domingo") == {"kcal": 0, "prot": 0, "cho": 0, "fat": 0}
+    assert analitica.semana.loc["kcal", "total"] == 2200
+    assert analitica.semana.loc["kcal", "media"] == pytest.approx(2200 / 3)  # El día vacío cuenta
+    assert list(analitica.por_tipo.index) == ["Desayuno", "Cena"]
+    assert analitica.por_tipo.loc["Cena", "kcal"] == 750
+
+
+def test_reparto_en_porcentaje_de_kcal():
+    reparto = AnaliticaPlan(PLAN, OBJETIVOS).reparto
+    # Lunes: 60 g prot (240 kcal), 100 g cho (400), 30 g fat (270) → 910 kcal de macros
+    assert reparto.loc["Lunes"].tolist() == pytest.approx([240 / 9.1, 400 / 9.1, 270 / 9.1])
+    assert reparto.loc["Martes"].tolist() == [0, 0, 0]  # Sin kcal no hay reparto (ni NaN)
+
+
+def test_desvio_con_objetivo_cero():
+    analitica = AnaliticaPlan(PLAN, OBJETIVOS)
+    assert analitica.desvio.loc["Lunes", "cho"] == 100
+    assert analitica.desvio_pct.loc["Lunes", "cho"] == 0  # Sin objetivo no hay %
+    assert analitica.desvio_pct.loc["Miércoles", "kcal"] == pytest.approx(20)
+    assert analitica.desvio_pct.loc["Martes", "prot"] == pytest.approx(-100)
+
+
+def test_objetivos_macros_mifflin_y_grasa_minima():
+    perfil = dict(PERFIL, objetivo="Longevidad", actividad="Sedentaria")
+    basal = 10 * 80 + 6.25 * 180 - 5 * 30 + 5
+    objetivos = objetivos_macros(perfil)
+    assert objetivos["kcal"] == round(basal * 1.2)
+    assert objetivos["prot"] == round(1.6 * 80)
+    assert objetivos["fat"] >= 80  # 1 g/kg
+    kcal_macros = objetivos["prot"] * 4 + objetivos["cho"] * 4 + objetivos["fat"] * 9
+    assert kcal_macros == pytest.approx(objetivos["kcal"], abs=10)
+
+
+def test_reglas_dia():
+    avisos = reglas_dia({"kcal": 1500, "prot": 100, "cho": 150, "fat": 50}, PERFIL,
+                        {"kcal": 2000, "prot": 160, "cho": 200, "fat": 80})
+    assert len(avisos) == 3
+    assert reglas_dia({"kcal": 2000, "prot": 160, "cho": 200, "fat": 80}, PERFIL,
+                      {"kcal": 2000, "prot": 160, "cho": 200, "fat": 80}) == []
@@ -0,0 +1,53 @@
+import pytest
+
+from fitchef.parches import aplicar, fusionar_dia_entreno, fusionar_ejercicio, presupuesto_comida
+
+
+def _ejercicio(nombre, series=()):
+    return {"nombre": nombre, "series": 3, "series_completadas": list(series)}
+
+
+def test_aplicar_solo_copia_el_camino():
+    plan = {"Lunes": [{"plato": "a"}, {"plato": "b"}], "Martes": [{"plato": "c"}]}
+    nuevo = aplicar(plan, ("Lunes", 1), {"plato": "x"})
+    assert nuevo["Lunes"] == [{"plato": "a"}, {"plato": "x"}]
+    assert plan["Lunes"][1] == {"plato": "b"}  # El original no se toca
+    assert nuevo["Martes"] is plan["Martes"] and nuevo["Lunes"][0] is plan["Lunes"][0]
+
+
+@pytest.mark.parametrize("ruta", [("Domingo",), ("Lunes", 2), ("Lunes", -1), ("Lunes", "0"), ("Lunes", 0, "plato", 0)])
+def test_aplicar_no_inventa_huecos(ruta):
+    with pytest.raises(ValueError):
+        aplicar({"Lunes": [{"plato": "a"}]}, ruta, "x")
+
+
+def test_aplicar_sin_ruta_sustituye_todo():
+    assert aplicar({"a": 1}, (), {"b": 2}) == {"b": 2}
+
+
+def test_el_mismo_ejercicio_conserva_sus_series():
+    viejo = _ejercicio("Press Banca", [{"peso": 60, "rir": 2}])
+    fusion = fusionar_ejercicio(viejo, {**_ejercicio(" press  banca "), "reps": "6-8"})
+    assert fusion["series_completadas"] == [{"peso": 60, "rir": 2}] and fusion["reps"] == "6-8"
+    assert fusion["series_completadas"] is not viejo["series_completadas"]
+
+
+def test_otro_ejercicio_empieza_sin_series():
+    viejo = _ejercicio("Press Banca", [{"peso": 60, "rir": 2}])
+    assert fusionar_ejercicio(viejo, _ejercicio("Sentadilla"))["series_completadas"] == []
+
+
+def test_fusionar_dia_deja_en_su_sitio_lo_registrado():
+    hecho = _ejercicio("Sentadilla", [{"peso": 100, "rir": 1}])
+    viejos = [_ejercicio("Press Banca"), hecho, _ejercicio("Remo"), _ejercicio("Curl", [{"peso": 12, "rir": 0}])]
+    nuevos = [_ejercicio("Fondos"), _ejercicio("Prensa"), _ejercicio("Jalón")]
+    fusion = fusionar_dia_entreno(viejos, nuevos)
+    assert [e["nombre"] for e in fusion] == ["Fondos", "Sentadilla", "Jalón", "Curl"]
+    assert fusionar_dia_entreno(viejos[:1], nuevos)[1:] == nuevos[1:]  # Si el día nuevo es más largo, se añade
+
+
+def test_presupuesto_de_una_comida():
+    comidas = [{"kcal": 500, "prot": 30}, {"kcal": 700, "prot": None}]
+    hueco, total = presupuesto_comida(comidas, 1)
+    assert hueco["kcal"] == 700 and hueco["prot"] == 0
+    assert total["kcal"] == 1200 and total["prot"] == 30
@@ -0,0 +1,54 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import pytest
+
+from fitchef.planificador import PRIORIDAD_INTERACTIVA, PRIORIDAD_MASIVA, IASaturada, Planificador
+
+
+def test_metricas_cuadran_con_muchos_hilos():
+    plan = Planificador(max_en_vuelo=4, llamadas_por_minuto=600000, rafaga=1000)
+    with ThreadPoolExecutor(16) as hilos:
+        list(hilos.map(lambda i: plan.ejecutar(lambda: i, PRIORIDAD_INTERACTIVA if i % 2 else 1), range(400)))
+    m = plan.metricas()
+    assert m["llamadas"] == 400
+    assert m["por_prioridad"]["interactiva"] == m["por_prioridad"]["normal"] == 200
+    assert m["en_vuelo"] == 0 and m["en_cola"] == 0
+
+
+def test_saturacion_cuenta_reintentos_y_errores():
+    plan = Planificador(reintentos=2, espera_base_s=0, espera_max_s=0)
+
+    def caida():
+        raise httpx.ConnectError("sin red")
+
+    with pytest.raises(IASaturada):
+        plan.ejecutar(caida)
+    m = plan.metricas()
+    assert (m["reintentos"], m["errores"], m["saturaciones"]) == (2, 1, 1)
+
+
+def _esperar(condicion, limite_s=2.0):
+    fin = time.monotonic() + limite_s
+    while not condicion() and time.monotonic() < fin:
+        time.sleep(0.005)
+
+
+def test_interactiva_adelanta_a_la_masiva_cuando_limita_el_ritmo():
+    plan = Planificador(max_en_vuelo=8, llamadas_por_minuto=240, rafaga=1)
+    plan.cubo.tomar()  # cubo vacío: cada llamada espera su token
+    orden = []
+    hilos = [threading.Thread(target=plan.ejecutar, args=(lambda: orden.append("masiva"), PRIORIDAD_MASIVA))
+             for _ in range(4)]
+    for h in hilos:
+        h.start()
+    _esperar(lambda: plan.metricas()["en_cola"] == 4)
+    assert plan.metricas()["en_cola_por_prioridad"]["masiva"] == 4  # quien espera token cuenta en la cola
+    plan.ejecutar(lambda: orden.append("interactiva"), PRIORIDAD_INTERACTIVA)
+    for h in hilos:
+        h.join()
+    assert orden[0] == "interactiva" and orden.count("masiva") == 4
+    m = plan.metricas()
+    assert m["en_cola"] == 0 and m["espera_ritmo_s"] > 0
@@ -0,0 +1,42 @@
+import numpy as np
+
+from fitchef.alimentos import BaseAlimentos
+from fitchef.raciones import LIMITES, ajustar_dia, resolver
+
+PESOS = np.ones(3)
+
+
+def test_resolver_encuentra_la_solucion_exacta():
+    A = np.array([[1.0, 0.0], [0.0, 2.0], [1.0, 1.0]])
+    x = resolver(A, A @ np.array([1.5, 0.8]), PESOS, np.full(2, 0.5), np.full(2, 2.0), suavidad=0)
+    assert np.allclose(x, [1.5, 0.8], atol=1e-4)
+
+
+def test_resolver_respeta_las_cotas():
+    A = np.eye(3)
+    x = resolver(A, np.array([10.0, 0.0, 1.0]), PESOS, np.full(3, 0.5), np.full(3, 2.0))
+    assert np.allclose(x, [2.0, 0.5, 1.0], atol=1e-3)
+
+
+def test_ajustar_dia_se_acerca_al_objetivo():
+    comidas = [{"tipo": "Comida", "plato": "Pollo con arroz", "ingredientes": ["150 g de pollo", "100 g de arroz"],
+                "kcal": 600, "prot": 45, "cho": 60, "fat": 15},
+               {"tipo": "Cena", "plato": "Sopa misteriosa", "ingredientes": [], "kcal": 300, "prot": 10, "cho": 30, "fat": 10}]
+    objetivos = {"kcal": 1400, "prot": 90, "cho": 120, "fat": 30}
+    nuevas, informe = ajustar_dia(comidas, objetivos, BaseAlimentos())
+    error = lambda t: sum(abs(t[m] / objetivos[m] - 1) for m in objetivos)
+    assert error(informe["despues"]) < error(informe["antes"])
+    assert all(LIMITES[0] <= f["factor"] <= LIMITES[1] for f in informe["factores"])
+    assert comidas[0]["ingredientes"] == ["150 g de pollo", "100 g de arroz"]  # el original no se toca
+    assert nuevas[0]["ingredientes"] != comidas[0]["ingredientes"]
+
+
+def test_ajustar_dos_veces_no_apila_sufijos():
+    sopa = {"tipo": "Cena", "plato": "Sopa misteriosa", "ingredientes": [], "kcal": 300, "prot": 10, "cho": 30, "fat": 10}
+    objetivos = {"kcal": 600, "prot": 20, "cho": 60, "fat": 20}
+    una, _ = ajustar_dia([sopa], objetivos, BaseAlimentos())
+    assert una[0]["plato"] == "Sopa misteriosa (ración ×2)"
+    dos, _ = ajustar_dia(una, {m: v * 1.5 for m, v in objetivos.items()}, BaseAlimentos())
+    assert dos[0]["plato"] == "Sopa misteriosa (ración ×3)"  # Factor acumulado, un solo sufijo
+    vuelta, _ = ajustar_dia(una, {m: v / 2 for m, v in objetivos.items()}, BaseAlimentos())
+    assert vuelta[0]["plato"] == "Sopa misteriosa"  # Acumulado ×1: sin sufijo
@@ -0,0 +1,36 @@
+import pytest
+
+from fitchef.registro_subidas import RegistroSubidas
+
+
+def test_la_misma_subida_no_se_procesa_dos_veces():
+    registro, llamadas = RegistroSubidas(), []
+    procesar = lambda: llamadas.append(1) or ["pollo"]
+    assert registro.procesar("ticket", b"foto", procesar) == (["pollo"], True)
+    assert registro.procesar("ticket", b"foto", procesar) == (["pollo"], False)
+    assert registro.procesar("nevera", b"foto", procesar) == (["pollo"], True)  # Otra función
+    assert len(llamadas) == 2
+
+
+def test_none_y_fallos_no_se_apuntan():
+    registro = RegistroSubidas()
+    assert registro.procesar("barras", b"foto", lambda: None) == (None, True)
+    with pytest.raises(RuntimeError):
+        registro.procesar("barras", b"foto", lambda: (_ for _ in ()).throw(RuntimeError("429")))
+    sin_ia = (None, "8410000000000", "sin IA")
+    assert registro.procesar("barras", b"foto", lambda: sin_ia, anotar_si=lambda r: r[0] is not None) == (sin_ia, True)
+    registro.anotar("barras", b"foto", None)
+    assert registro.buscar("barras", b"foto") == (False, None)
+    con_ia = ("leche", "8410000000000", "IA")
+    assert registro.procesar("barras", b"foto", lambda: con_ia, anotar_si=lambda r: r[0] is not None) == (con_ia, True)
+    assert registro.procesar("barras", b"foto", lambda: None) == (con_ia, False)
+
+
+def test_olvida_las_mas_antiguas():
+    registro = RegistroSubidas(max_entradas=2)
+    for foto in (b"a", b"b"):
+        registro.anotar("plato", foto, foto.decode())
+    registro.buscar("plato", b"a")  # 'a' vuelve a ser reciente
+    registro.anotar("plato", b"c", "c")
+    assert registro.buscar("plato", b"a") == (True, "a")
+    assert registro.buscar("plato", b"b") == (False, None)
@@ -0,0 +1,105 @@
+import json
+import os
+import threading
+
+import pytest
+
+from fitchef.telemetria import ModelosMedidos, Telemetria, leer_jsonl
+
+
+def _registro(**extra):
+    base = dict(ts=0.0, funcion="plan_dia", modelo="gemini-2.5-flash", stream=False, bytes_prompt=10,
+                bytes_adjuntos=0, ttft_s=None, latencia_s=1.0, tokens_entrada=1000, tokens_salida=100,
+                cache=False, desenlace="ok", error=None)
+    return {**base, **extra}
+
+
+class _Uso:
+    prompt_token_count, candidates_token_count, thoughts_token_count = 40, 10, 0
+
+
+class _Respuesta:
+    text, usage_metadata = "hola", _Uso()
+
+
+class _Modelos:
+    def generate_content(self, **kwargs):
+        return _Respuesta()
+
+    def generate_content_stream(self, **kwargs):
+        yield _Respuesta()
+        yield _Respuesta()
+
+
+def test_el_buffer_circular_guarda_solo_los_ultimos():
+    telemetria = Telemetria(capacidad=3)
+    for i in range(5):
+        telemetria.anotar(**_registro(latencia_s=float(i)))
+    assert [r["latencia_s"] for r in telemetria.registros()] == [2.0, 3.0, 4.0]
+    assert [r["id"] for r in telemetria.registros()] == [2, 3, 4]
+
+
+def test_coste_y_resumen_por_funcion():
+    telemetria = Telemetria()
+    telemetria.anotar(**_registro())
+    telemetria.anotar(**_registro(latencia_s=3.0, desenlace="error_api", tokens_entrada=None))
+    telemetria.anotar(**_registro(funcion="jarvis", stream=True, ttft_s=0.2))
+    assert telemetria.registros()[0]["coste_usd"] == pytest.approx((1000 * 0.30 + 100 * 2.50) / 1e6)
+    plan, jarvis = sorted(telemetria.resumen(), key=lambda f: f["funcion"], reverse=True)
+    assert (plan["llamadas"], plan["ok"], plan["error_api"], plan["tokens_entrada"]) == (2, 1, 1, 1000)
+    assert plan["ttft_p50_s"] is None  # Sin stream no hay primer trozo
+    assert jarvis["ttft_p50_s"] == pytest.approx(0.2)
+
+
+def test_sin_stream_el_ttft_queda_vacio_y_con_stream_no():
+    telemetria = Telemetria()
+    modelos = ModelosMedidos(_Modelos(), telemetria)
+    modelos.generate_content(model="gemini-2.5-flash", contents="hola", funcion="sin_stream")
+    list(modelos.generate_content_stream(model="gemini-2.5-flash", contents="hola", funcion="con_stream"))
+    sin_stream, con_stream = telemetria.registros()
+    assert sin_stream["ttft_s"] is None
+    assert con_stream["ttft_s"] is not None and con_stream["ttft_s"] <= con_stream["latencia_s"]
+    assert (con_stream["tokens_entrada"], con_stream["tokens_salida"]) == (40, 10)
+
+
+def test_vuelca_con_retraso_y_rota_por_tamano(tmp_path):
+    ruta = str(tmp_path / "t.jsonl")
+    telemetria = Telemetria(ruta, max_bytes=600, copias=2, intervalo_s=3600, retraso_s=60)
+    telemetria.anotar(**_registro(ts=10 ** 10))  # Aún no ha pasado el retraso
+    assert telemetria.volcar() == 0 and not os.path.exists(ruta)
+    for _ in range(6):
+        telemetria.anotar(**_registro(ts=0.0))
+        telemetria.volcar(True)
+    assert os.path.exists(ruta + ".1") and os.path.exists(ruta + ".2") and not os.path.exists(ruta + ".3")
+    ids = sorted(r["id"] for sufijo in ("", ".1", ".2") for r in leer_jsonl(ruta + sufijo))
+    assert ids == list(range(ids[0], 7))  # Lo que se pierde es lo más viejo
+    telemetria.cerrar()
+
+
+def test_marcar_despues_del_volcado_anade_una_correccion(tmp_path):
+    ruta = str(tmp_path / "t.jsonl")
+    telemetria = Telemetria(ruta, intervalo_s=3600)
+    telemetria.anotar(**_registro())
+    telemetria.marcar_ultimo("json_invalido")  # Antes del volcado: se escribe ya corregido
+    telemetria.volcar(True)
+    telemetria.anotar(**_registro())
+    telemetria.volcar(True)
+    telemetria.marcar_ultimo("json_invalido")  # Después: va una línea de corrección
+    telemetria.volcar(True)
+
+    with open(ruta, encoding="utf-8") as f:
+        lineas = [json.loads(linea) for linea in f]
+    assert lineas[-1]["corrige"] == 1
+    assert [r["desenlace"] for r in leer_jsonl(ruta)] == ["json_invalido", "json_invalido"]
+    assert [r["desenlace"] for r in telemetria.registros()] == ["json_invalido", "json_invalido"]
+    telemetria.cerrar()
+
+
+def test_marcar_ultimo_es_por_hilo():
+    telemetria = Telemetria()
+    telemetria.anotar(**_registro())
+    otro = threading.Thread(target=lambda: telemetria.anotar(**_registro()))
+    otro.start()
+    otro.join()
+    telemetria.marcar_ultimo("json_invalido")
+    assert [r["desenlace"] for r in telemetria.registros()] == ["json_invalido", "ok"]
@@ -0,0 +1,81 @@
+import threading
+import time
+
+from fitchef.trabajos import ERROR, HECHO, GestorTrabajos
+
+
+def esperar(trabajo, limite_s=2.0):
+    fin = time.monotonic() + limite_s
+    while trabajo.activo and time.monotonic() < fin:
+        time.sleep(0.005)
+
+
+def test_no_duplica_mientras_sigue_en_marcha():
+    gestor = GestorTrabajos(max_hilos=2)
+    soltar = threading.Event()
+    llamadas = []
+
+    def lento(trabajo, n):
+        llamadas.append(n)
+        trabajo.avisar(f"voy por {n}")
+        soltar.wait(2)
+        return n * 2
+
+    primero, nuevo = gestor.enviar("ana", "plan", lento, 1, etiqueta="Plan")
+    segundo, otra_vez = gestor.enviar("ana", "plan", lento, 2)
+    otro_usuario, _ = gestor.enviar("luis", "plan", lento, 3)
+    assert nuevo and not otra_vez and segundo is primero
+    assert otro_usuario is not primero
+    assert gestor.recoger("ana", "plan") is None  # Sigue en marcha
+    soltar.set()
+    esperar(primero)
+    assert (primero.estado, primero.resultado, primero.etiqueta) == (HECHO, 2, "Plan")
+    assert sorted(llamadas) == [1, 3]
+    assert gestor.recoger("ana", "plan") is primero
+    assert gestor.obtener("ana", "plan") is None
+    tercero, nuevo = gestor.enviar("ana", "plan", lento, 4)  # Ya recogido: se puede volver a lanzar
+    assert nuevo and tercero is not primero
+    esperar(tercero)
+
+
+def test_el_error_llega_al_trabajo():
+    gestor = GestorTrabajos()
+
+    def falla(trabajo):
+        raise RuntimeError("sin cuota")
+
+    trabajo, _ = gestor.enviar("ana", "microciclo", falla)
+    esperar(trabajo)
+    assert trabajo.estado == ERROR and str(trabajo.error) == "sin cuota"
+    assert trabajo.terminado is not None and trabajo.resultado is None
+    assert gestor.de_usuario("ana") == [trabajo]
+
+
+def test_los_terminados_sin_recoger_caducan():
+    gestor = GestorTrabajos(caducidad_s=60)
+    viejo, _ = gestor.enviar("ana", "plan", lambda t: "ok")
+    esperar(viejo)
+    viejo.terminado -= 120  # Nadie volvió a por él
+    reciente, _ = gestor.enviar("luis", "plan", lambda t: "ok")
+    assert gestor.obtener("ana", "plan") is None
+    assert gestor.obtener("luis", "plan") is reciente
+
+
+def test_los_parciales_se_ven_antes_de_terminar():
+    gestor = GestorTrabajos(max_hilos=1)
+    soltar = threading.Event()
+
+    def por_dias(trabajo):
+        trabajo.entregar("Lunes", ["tortilla"])
+        soltar.wait(2)
+        trabajo.entregar("Martes", ["lentejas"])
+        return dict(trabajo.parciales)
+
+    trabajo, _ = gestor.enviar("ana", "plan", por_dias)
+    fin = time.monotonic() + 2
+    while not trabajo.parciales and time.monotonic() < fin:
+        time.sleep(0.005)
+    assert trabajo.activo and trabajo.parciales == {"Lunes": ["tortilla"]}
+    soltar.set()
+    esperar(trabajo)
+    assert trabajo.resultado == {"Lunes": ["tortilla"], "Martes": ["lentejas"]}
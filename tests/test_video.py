@@ -0,0 +1,108 @@
+import io
+
+import numpy as np
+import pytest
+
+import fitchef.video as video_mod
+from fitchef.ia_simulada import ArchivosSimulados
+from fitchef.video import ArchivosSubidos, CacheVideos, adjuntos_video
+
+cv2 = video_mod.cv2
+con_opencv = pytest.mark.skipif(cv2 is None, reason="sin OpenCV")
+
+
+def _video(tmp_path, quieto_s=2.0, serie_s=2.0, fps=10, lado=160):
+    """mp4 con un cuadrado quieto, luego moviéndose ('la serie') y luego quieto otra vez"""
+    ruta = str(tmp_path / "serie.mp4")
+    escritor = cv2.VideoWriter(ruta, cv2.VideoWriter_fourcc(*"mp4v"), fps, (lado, lado))
+    quietos, moviendo = int(quieto_s * fps), int(serie_s * fps)
+    for i in range(2 * quietos + moviendo):
+        y = 20 + (i - quietos) * 4 if quietos <= i < quietos + moviendo else (20 if i < quietos else 20 + moviendo * 4)
+        frame = np.zeros((lado, lado, 3), np.uint8)
+        frame[y % (lado - 20):y % (lado - 20) + 20, 60:100] = 255
+        escritor.write(frame)
+    escritor.release()
+    with open(ruta, "rb") as f:
+        return f.read()
+
+
+@con_opencv
+def test_la_ventana_detectada_cubre_solo_la_serie(tmp_path):
+    prep = video_mod.preparar_video(_video(tmp_path), fps=2.0)
+    inicio, fin = prep.ventana
+    assert 1.0 <= inicio <= 2.0 and 4.0 <= fin <= 5.0
+    assert prep.fotogramas and all(round(inicio, 2) <= t < fin for t in prep.instantes)
+    assert prep.instantes == sorted(prep.instantes)
+
+
+@con_opencv
+def test_respeta_ventana_tope_de_fotogramas_y_tamano(tmp_path):
+    datos = _video(tmp_path)
+    prep = video_mod.preparar_video(datos, fps=5.0, ventana=(0.0, 6.0), max_fotogramas=6, lado=64)
+    assert len(prep.fotogramas) == 6
+    assert prep.instantes[-1] >= 4.0  # Espacia los fotogramas para cubrir la ventana entera
+    alto, ancho = cv2.imdecode(np.frombuffer(prep.fotogramas[0], np.uint8), cv2.IMREAD_COLOR).shape[:2]
+    assert max(alto, ancho) <= 64
+
+
+@con_opencv
+def test_adjuntos_con_opencv_son_fotogramas_con_su_instante(tmp_path):
+    adjuntos = adjuntos_video(CacheVideos(), _video(tmp_path), "video/mp4", fps=1.0, ventana=(0.0, 3.0))
+    assert isinstance(adjuntos[0], str)
+    etiquetas, imagenes = adjuntos[1::2], adjuntos[2::2]
+    assert etiquetas == ["t=0.0s", "t=1.0s", "t=2.0s"]
+    assert all(mime == "image/jpeg" for _, mime in imagenes)
+
+
+def test_sin_opencv_va_el_video_entero(monkeypatch):
+    monkeypatch.setattr(video_mod, "cv2", None)
+    monkeypatch.setattr(video_mod, "VIDEO_DISPONIBLE", False)
+    assert video_mod.duracion_video(b"no importa") == 0.0
+    assert adjuntos_video(CacheVideos(), b"video", None) == [(b"video", "video/mp4")]
+    assert adjuntos_video(CacheVideos(), b"video", "video/quicktime") == [(b"video", "video/quicktime")]
+
+
+@con_opencv
+def test_si_no_se_puede_trocear_va_el_video_entero():
+    assert adjuntos_video(CacheVideos(), b"esto no es un video", "video/mp4") == [(b"esto no es un video", "video/mp4")]
+
+
+def test_cada_contenido_se_sube_una_sola_vez():
+    archivos, subidos = ArchivosSimulados(), ArchivosSubidos()
+    primera = subidos.referencia(archivos, b"jpg1", "image/jpeg")
+    assert subidos.referencia(archivos, b"jpg1", "image/jpeg") == primera
+    assert subidos.referencia(archivos, b"jpg2", "image/jpeg") != primera
+    assert archivos.subidas == 2
+    assert subidos.estadisticas()["reutilizadas"] == 1
+
+
+def test_una_referencia_caducada_se_vuelve_a_subir(monkeypatch):
+    archivos, subidos = ArchivosSimulados(), ArchivosSubidos(vida_s=10)
+    ahora = [1000.0]
+    monkeypatch.setattr(video_mod.time, "time", lambda: ahora[0])
+    subidos.referencia(archivos, b"jpg", "image/jpeg")
+    ahora[0] += 11
+    subidos.referencia(archivos, b"jpg", "image/jpeg")
+    assert archivos.subidas == 2
+
+
+def test_espera_a_que_un_video_termine_de_procesarse(monkeypatch):
+    monkeypatch.setattr(video_mod.time, "sleep", lambda s: None)
+
+    class Archivos(ArchivosSimulados):
+        consultas = 0
+
+        def upload(self, *, file, config=None):
+            subido = super().upload(file=file, config=config)
+            subido.state = "PROCESSING"
+            return subido
+
+        def get(self, *, name):
+            self.consultas += 1
+            listo = super().upload(file=io.BytesIO(b"video"), config={"mime_type": "video/mp4"})
+            listo.state = "ACTIVE" if self.consultas >= 2 else "PROCESSING"
+            return listo
+
+    archivos = Archivos()
+    uri, mime = ArchivosSubidos().referencia(archivos, b"video", "video/mp4")
+    assert archivos.consultas == 2 and uri.startswith("simulado://") and mime == "video/mp4"